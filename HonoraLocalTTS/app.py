@@ -6,6 +6,8 @@ import json
 import time
 from TTS.api import TTS
 
+from speaker_latents import SpeakerLatentCache, synthesize_to_file
+
 app = Flask(__name__)
 app.config["UPLOAD_FOLDER"] = "uploads"
 app.config["OUTPUT_FOLDER"] = "output"
@@ -47,6 +49,9 @@ else:
 
 DEFAULT_MODEL = "clone"
 
+# Speaker latents per (voice file, model), reused across all files of a book
+LATENT_CACHE = SpeakerLatentCache()
+
 
 @app.route("/")
 def home():
@@ -179,12 +184,7 @@ def generate_audio():
             progress_data["filename"] = wav_filename
             
             print(f"Generating {wav_filename}...")
-            MODELS[model_key].tts_to_file(
-                text=text,
-                speaker_wav=voice_path,
-                language="en",
-                file_path=output_path
-            )
+            synthesize_to_file(MODELS[model_key], text, voice_path, "en", output_path, LATENT_CACHE, model_tag=model_key)
             generated_files.append(output_path)
 
         # Create result ZIP
@@ -209,12 +209,7 @@ def generate_audio():
         output_path = os.path.join(app.config["OUTPUT_FOLDER"], "audiobook.wav")
 
         print(f"Generating audiobook.wav...")
-        MODELS[model_key].tts_to_file(
-            text=text,
-            speaker_wav=voice_path,
-            language="en",
-            file_path=output_path
-        )
+        synthesize_to_file(MODELS[model_key], text, voice_path, "en", output_path, LATENT_CACHE, model_tag=model_key)
         
         # Create ZIP even for single file (for consistency)
         result_zip_path = os.path.join(app.config["UPLOAD_FOLDER"], "audiobooks.zip")
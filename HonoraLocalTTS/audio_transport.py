@@ -0,0 +1,226 @@
+"""
+Audio transport between the RunPod worker and the API.
+
+The worker used to return every segment as a full WAV in base64. A job can now ask
+for another transport format with "audio_format" in its input:
+
+    wav    WAV file as written by XTTS (default, what older workers always return)
+    flac   lossless, typically ~50-60% of the WAV size for speech
+    opus   lossy, Ogg/Opus at "audio_bitrate" (default 32k)
+    aac    lossy, ADTS AAC at "audio_bitrate" (default 64k)
+    pcm    raw samples without a container, "sample_format" s16le, plus
+           "sample_rate" and "channels" in the response
+
+encode_audio() runs on the worker (ffmpeg for the compressed formats). write_audio()
+runs on the API side: WAV and PCM are written directly, compressed formats are
+decoded to WAV when the output path ends in .wav (what the chapter encoder reads)
+and passed through unchanged when the output path already has the format's
+extension. The payload is still base64 inside the RunPod JSON response.
+
+TransportStats records payload sizes and per-segment times so the formats can be
+compared on real books.
+"""
+
+import os
+import subprocess
+import threading
+import time
+import wave
+
+FORMATS = ("wav", "flac", "opus", "aac", "pcm")
+PCM_SAMPLE_FORMATS = ("s16le",)
+
+DEFAULT_BITRATES = {"opus": "32k", "aac": "64k"}
+LOSSY_FORMATS = ("opus", "aac")
+
+# ffmpeg codec + container per compressed format
+_ENCODERS = {
+    "flac": ["-c:a", "flac", "-f", "flac"],
+    "opus": ["-c:a", "libopus", "-f", "ogg"],
+    "aac": ["-c:a", "aac", "-f", "adts"],
+}
+_DEMUXERS = {"flac": "flac", "opus": "ogg", "aac": "aac"}
+_EXTENSIONS = {"flac": (".flac",), "opus": (".opus", ".ogg"), "aac": (".aac",)}
+
+
+def check_format(audio_format: str, sample_format: str = None) -> str:
+    """
+    Normalized transport format name.
+
+    Raises:
+        ValueError: for unknown formats or an unsupported PCM sample format
+    """
+    audio_format = (audio_format or "wav").lower()
+    if audio_format not in FORMATS:
+        raise ValueError(f"Unsupported audio_format '{audio_format}' (use one of {', '.join(FORMATS)})")
+    if audio_format == "pcm" and (sample_format or "s16le") not in PCM_SAMPLE_FORMATS:
+        raise ValueError(f"Unsupported sample_format '{sample_format}' (use one of {', '.join(PCM_SAMPLE_FORMATS)})")
+    return audio_format
+
+
+def cache_variant(audio_format: str, bitrate: str = None) -> str:
+    """
+    Suffix that keeps cached audio of a lossy transport apart from lossless audio.
+
+    Returns "" for wav, flac and pcm (bit-identical samples), else e.g. "opus-32k".
+    """
+    audio_format = check_format(audio_format)
+    if audio_format not in LOSSY_FORMATS:
+        return ""
+    return f"{audio_format}-{bitrate or DEFAULT_BITRATES[audio_format]}"
+
+
+def encode_audio(wav_path: str, audio_format: str = "wav", bitrate: str = None) -> tuple:
+    """
+    Read a synthesized WAV in the requested transport format (worker side).
+
+    Args:
+        wav_path: WAV written by the TTS model
+        audio_format: One of FORMATS
+        bitrate: Target bitrate for opus/aac, e.g. "48k"
+
+    Returns:
+        (audio_bytes, meta) - meta has "audio_format", "wav_size", "sample_rate",
+        "channels" and, for pcm, "sample_format"
+    """
+    audio_format = check_format(audio_format)
+    with wave.open(wav_path, "rb") as w:
+        sample_rate, channels, sample_width = w.getframerate(), w.getnchannels(), w.getsampwidth()
+        pcm = w.readframes(w.getnframes()) if audio_format == "pcm" else None
+    meta = {
+        "audio_format": audio_format,
+        "wav_size": os.path.getsize(wav_path),
+        "sample_rate": sample_rate,
+        "channels": channels,
+    }
+
+    if audio_format == "wav":
+        with open(wav_path, "rb") as f:
+            return f.read(), meta
+
+    if audio_format == "pcm":
+        if sample_width != 2:
+            raise ValueError(f"Expected 16-bit WAV for s16le, got {sample_width * 8}-bit")
+        meta["sample_format"] = "s16le"
+        return pcm, meta
+
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", wav_path, *_ENCODERS[audio_format]]
+    if audio_format in DEFAULT_BITRATES:
+        cmd[-2:-2] = ["-b:a", bitrate or DEFAULT_BITRATES[audio_format]]
+    result = subprocess.run(cmd + ["pipe:1"], capture_output=True)
+    if result.returncode != 0 or not result.stdout:
+        raise RuntimeError(f"ffmpeg {audio_format} encode failed: {result.stderr.decode(errors='replace')[:300]}")
+    return result.stdout, meta
+
+
+def write_audio(data: bytes, output_path: str, audio_format: str = "wav", meta: dict = None):
+    """
+    Write transported audio to output_path via tmp + rename (API side).
+
+    wav bytes are written as-is and pcm gets a WAV header. flac/opus/aac are written
+    as-is if output_path has the format's extension, otherwise decoded to WAV with
+    ffmpeg reading from stdin (the compressed bytes never touch the disk).
+    """
+    audio_format = check_format(audio_format, (meta or {}).get("sample_format"))
+    meta = meta or {}
+    tmp_path = f"{output_path}.part"
+
+    try:
+        if audio_format == "pcm":
+            with wave.open(tmp_path, "wb") as w:
+                w.setnchannels(meta.get("channels") or 1)
+                w.setsampwidth(2)
+                w.setframerate(meta["sample_rate"])
+                w.writeframes(data)
+        elif audio_format == "wav" or output_path.lower().endswith(_EXTENSIONS[audio_format]):
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+        else:
+            cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+                   "-f", _DEMUXERS[audio_format], "-i", "pipe:0", "-c:a", "pcm_s16le"]
+            if meta.get("sample_rate"):
+                # libopus decodes at 48 kHz; keep the model's rate
+                cmd += ["-ar", str(meta["sample_rate"])]
+            result = subprocess.run(cmd + ["-f", "wav", tmp_path], input=data, capture_output=True)
+            if result.returncode != 0:
+                raise RuntimeError(f"ffmpeg {audio_format} decode failed: {result.stderr.decode(errors='replace')[:300]}")
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class TransportStats:
+    """Payload bytes and per-segment timings for one engine, thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._formats = {}
+
+    def record(self, audio_format: str, payload_bytes: int, audio_bytes: int, wav_bytes: int,
+               write_seconds: float, segment_seconds: float = None):
+        """
+        Args:
+            audio_format: Format the worker actually returned
+            payload_bytes: Length of the base64 string received
+            audio_bytes: Decoded transport bytes
+            wav_bytes: WAV size on the worker (as reported, else audio_bytes)
+            write_seconds: Time spent decoding/writing on the API side
+            segment_seconds: End-to-end time from job submit until the file was written
+        """
+        with self._lock:
+            entry = self._formats.setdefault(audio_format, {
+                "segments": 0, "payload_bytes": 0, "audio_bytes": 0, "wav_bytes": 0,
+                "write_seconds": 0.0, "segment_seconds": 0.0,
+            })
+            entry["segments"] += 1
+            entry["payload_bytes"] += payload_bytes
+            entry["audio_bytes"] += audio_bytes
+            entry["wav_bytes"] += wav_bytes or audio_bytes
+            entry["write_seconds"] += write_seconds
+            entry["segment_seconds"] += segment_seconds or 0.0
+
+    def summary(self) -> dict:
+        """Per format: totals plus payload/WAV ratio and average seconds per segment."""
+        with self._lock:
+            summary = {}
+            for audio_format, entry in self._formats.items():
+                segments = entry["segments"]
+                summary[audio_format] = {
+                    **entry,
+                    "write_seconds": round(entry["write_seconds"], 3),
+                    "segment_seconds": round(entry["segment_seconds"], 2),
+                    "payload_ratio": round(entry["payload_bytes"] / entry["wav_bytes"], 3) if entry["wav_bytes"] else 0.0,
+                    "avg_payload_bytes": entry["payload_bytes"] // segments,
+                    "avg_segment_seconds": round(entry["segment_seconds"] / segments, 3),
+                }
+            return summary
+
+
+def timed_write(stats: TransportStats, output: dict, output_path: str, segment_start: float = None) -> dict:
+    """
+    Decode one worker output ({"audio_b64", "audio_format", ...}) to output_path and record it.
+
+    Outputs without "audio_format" come from workers that predate transport formats
+    and are WAV.
+
+    Returns:
+        {"audio_format", "payload_bytes"} for the segment result
+    """
+    import base64
+
+    audio_b64 = output["audio_b64"]
+    audio_format = output.get("audio_format") or "wav"
+    start = time.monotonic()
+    data = base64.b64decode(audio_b64)
+    write_audio(data, output_path, audio_format, output)
+    now = time.monotonic()
+    stats.record(
+        audio_format,
+        payload_bytes=len(audio_b64),
+        audio_bytes=len(data),
+        wav_bytes=output.get("wav_size") or 0,
+        write_seconds=now - start,
+        segment_seconds=now - segment_start if segment_start is not None else None,
+    )
+    return {"audio_format": audio_format, "payload_bytes": len(audio_b64)}
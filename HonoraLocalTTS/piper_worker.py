@@ -0,0 +1,315 @@
+"""
+Long-lived Piper workers.
+
+PiperEngine used to run the `piper` CLI once per segment, reloading the ONNX voice
+model for every ~300 characters of text. A worker started from this file loads one
+model once and then serves JSON requests, one per line, on stdin:
+
+    request:  {"id": 1, "text": "...", "output_path": "/tmp/seg_1.wav"}
+    response: {"id": 1, "ok": true, "audio_ms": 5120, "inference_ms": 410}
+
+Without "output_path" the response carries the audio as "pcm_b64" (16-bit mono
+PCM) plus "sample_rate". The first line a worker prints is {"ready": true, ...}
+once the model is loaded.
+
+PiperWorkerPool keeps up to `size` workers per model (PIPER_WORKERS, default half
+the CPU count) and hands each request to an idle one. A worker that crashes or
+times out is killed and replaced on the next request.
+
+Run a worker by hand:
+    python piper_worker.py --model piper_models/en_US-lessac-medium.onnx
+"""
+
+import argparse
+import base64
+import io
+import json
+import logging
+import os
+import queue
+import select
+import subprocess
+import sys
+import threading
+import time
+import wave
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 60
+STARTUP_TIMEOUT = 120
+
+
+def default_pool_size() -> int:
+    """PIPER_WORKERS, or half the CPUs (onnxruntime already uses several threads per worker)."""
+    configured = os.getenv("PIPER_WORKERS")
+    if configured:
+        return max(0, int(configured))
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+class PiperWorkerError(RuntimeError):
+    """Raised when a worker crashes or stops responding."""
+    pass
+
+
+class PiperWorkerStartError(PiperWorkerError):
+    """Raised when a worker cannot load its model (e.g. piper is not installed)."""
+    pass
+
+
+# =============================================================================
+# CLIENT SIDE
+# =============================================================================
+
+class PiperWorker:
+    """One worker process speaking the JSON-lines protocol."""
+
+    def __init__(self, command: list):
+        self.command = command
+        self.proc = None
+        self.sample_rate = None
+        self._next_id = 0
+
+    def start(self, timeout: float = STARTUP_TIMEOUT):
+        self.proc = subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+        )
+        try:
+            ready = self._read_line(timeout)
+        except PiperWorkerError as e:
+            raise PiperWorkerStartError(f"Piper worker failed to start: {e}")
+        if not ready.get("ready"):
+            self.close()
+            raise PiperWorkerStartError(f"Piper worker failed to start: {ready.get('error', ready)}")
+        self.sample_rate = ready.get("sample_rate")
+
+    @property
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def _read_line(self, timeout: float) -> dict:
+        readable, _, _ = select.select([self.proc.stdout], [], [], timeout)
+        if not readable:
+            self.close(kill=True)
+            raise PiperWorkerError(f"Piper worker did not answer within {timeout}s")
+        line = self.proc.stdout.readline()
+        if not line:
+            code = self.proc.wait()
+            raise PiperWorkerError(f"Piper worker exited with code {code}")
+        try:
+            return json.loads(line)
+        except ValueError:
+            self.close()
+            raise PiperWorkerError(f"Unexpected output from Piper worker: {line[:200]!r}")
+
+    def request(self, text: str, output_path: str = None, timeout: float = DEFAULT_TIMEOUT) -> dict:
+        """Synthesize one text; returns the worker's response dict."""
+        self._next_id += 1
+        payload = {"id": self._next_id, "text": text}
+        if output_path:
+            payload["output_path"] = output_path
+        try:
+            self.proc.stdin.write(json.dumps(payload, ensure_ascii=False) + "\n")
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            self.close()
+            raise PiperWorkerError(f"Piper worker is gone: {e}")
+
+        response = self._read_line(timeout)
+        if response.get("id") != self._next_id:
+            self.close()
+            raise PiperWorkerError(f"Piper worker answered request {response.get('id')}, expected {self._next_id}")
+        return response
+
+    def close(self, kill: bool = False):
+        if self.proc is None:
+            return
+        if kill:
+            self.proc.kill()
+        if self.proc.poll() is None:
+            try:
+                self.proc.stdin.close()
+                self.proc.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self.proc.kill()
+                self.proc.wait()
+        self.proc = None
+
+
+class PiperWorkerPool:
+    """Up to `size` workers for one model; requests go to whichever worker is idle."""
+
+    def __init__(self, model_path: str, size: int = None, command: list = None):
+        self.model_path = model_path
+        self.size = size or default_pool_size()
+        self.command = command or [sys.executable, os.path.abspath(__file__), "--model", model_path]
+        self._idle: "queue.Queue[PiperWorker]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = 0
+        self._closed = False
+        self.requests = 0
+        self.restarts = 0
+
+    def _acquire(self) -> PiperWorker:
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            with self._lock:
+                start_new = self._started < self.size
+                if start_new:
+                    self._started += 1
+            if start_new:
+                break
+            # Pool is full: wait for a worker, re-checking in case a busy one died
+            try:
+                return self._idle.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+        worker = PiperWorker(self.command)
+        try:
+            worker.start()
+        except Exception:
+            with self._lock:
+                self._started -= 1
+            raise
+        logger.info(f"Piper: worker {self._started}/{self.size} ready for {os.path.basename(self.model_path)}")
+        return worker
+
+    def _release(self, worker: PiperWorker):
+        if worker.alive and not self._closed:
+            self._idle.put(worker)
+            return
+        worker.close()
+        with self._lock:
+            self._started -= 1
+            if not self._closed:
+                self.restarts += 1
+
+    def synthesize(self, text: str, output_path: str = None, timeout: float = DEFAULT_TIMEOUT) -> dict:
+        """
+        Synthesize on an idle worker (starting one if the pool is not full yet).
+
+        Raises:
+            PiperWorkerStartError: if a new worker could not load the model
+            PiperWorkerError: if the worker crashed or timed out
+        """
+        worker = self._acquire()
+        try:
+            response = worker.request(text, output_path, timeout)
+            self.requests += 1
+            return response
+        finally:
+            self._release(worker)
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        self._started = 0
+
+    def stats(self) -> dict:
+        return {
+            "model": os.path.basename(self.model_path),
+            "size": self.size,
+            "running": self._started,
+            "requests": self.requests,
+            "restarts": self.restarts,
+        }
+
+
+# =============================================================================
+# WORKER SIDE
+# =============================================================================
+
+def _load_voice(model_path: str):
+    from piper import PiperVoice
+    return PiperVoice.load(model_path)
+
+
+def _synthesize_wav(voice, text: str, wav_file):
+    # piper-tts >= 1.3 renamed the WAV writer to synthesize_wav()
+    if hasattr(voice, "synthesize_wav"):
+        voice.synthesize_wav(text, wav_file)
+    else:
+        voice.synthesize(text, wav_file)
+
+
+def _handle(voice, request: dict) -> dict:
+    start = time.time()
+    output_path = request.get("output_path")
+    buffer = None if output_path else io.BytesIO()
+    wav_file = wave.open(output_path or buffer, "wb")
+    try:
+        _synthesize_wav(voice, request["text"], wav_file)
+        frames = wav_file.getnframes()
+        rate = wav_file.getframerate()
+        wav_file.close()
+    except Exception:
+        try:
+            wav_file.close()
+        except wave.Error:
+            pass  # failed before the WAV header was set - report the original error
+        if output_path and os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+
+    response = {
+        "id": request.get("id"),
+        "ok": True,
+        "sample_rate": rate,
+        "audio_ms": int(frames * 1000 / rate) if rate else 0,
+        "inference_ms": int((time.time() - start) * 1000),
+    }
+    if buffer is not None:
+        buffer.seek(0)
+        with wave.open(buffer, "rb") as wav_in:
+            response["pcm_b64"] = base64.b64encode(wav_in.readframes(frames)).decode()
+    return response
+
+
+def serve(model_path: str):
+    """Load the model once and answer requests from stdin until it closes."""
+    # Keep the protocol channel clean: anything the libraries print goes to stderr
+    protocol = os.fdopen(os.dup(sys.stdout.fileno()), "w", buffering=1, encoding="utf-8")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    def send(message: dict):
+        protocol.write(json.dumps(message) + "\n")
+        protocol.flush()
+
+    try:
+        voice = _load_voice(model_path)
+    except Exception as e:
+        send({"ready": False, "error": f"{type(e).__name__}: {e}"})
+        return 1
+    send({"ready": True, "model": os.path.basename(model_path), "sample_rate": voice.config.sample_rate})
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        request = {}
+        try:
+            request = json.loads(line)
+            send(_handle(voice, request))
+        except Exception as e:
+            send({"id": request.get("id"), "ok": False, "error": f"{type(e).__name__}: {e}"})
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Persistent Piper TTS worker (JSON lines on stdin/stdout)")
+    parser.add_argument("--model", required=True, help="Path to the .onnx voice model")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    sys.exit(serve(args.model))
@@ -1,11 +1,15 @@
 """
 Honora TTS Worker - RunPod Serverless Handler
-Version: simple_mode_v3 (2026-01-10)
+Version: audio_transport_v6 (2026-10-16)
 
 Supports:
 1. Simple mode: text + voice_url -> returns audio_b64
-2. Batch mode: sections + voice_url -> uploads to supabase
-3. Legacy: text + speaker_wav_b64 (deprecated, for transition only)
+2. Segments mode: segments [{segment_id, text}] + voice_url -> returns audio_b64 per segment
+3. Batch mode: sections + voice_url -> uploads to supabase (legacy sections table)
+4. Legacy: text + speaker_wav_b64 (deprecated, for transition only)
+
+Simple and segments mode accept "audio_format" (wav, flac, opus, aac, pcm) plus
+"audio_bitrate" / "sample_format" to choose how audio is returned (see audio_transport.py).
 
 All responses include VERSION info for deployment verification.
 """
@@ -21,12 +25,15 @@ import time
 from datetime import datetime
 from pathlib import Path
 
+from audio_transport import check_format, encode_audio
+from speaker_latents import SpeakerLatentCache, synthesize_to_file
+
 # =============================================================================
 # VERSION INFO - CRITICAL FOR DEPLOYMENT VERIFICATION
 # =============================================================================
 
 VERSION = {
-    "handler_version": "simple_mode_v3",
+    "handler_version": "audio_transport_v6",
     "build_time": datetime.utcnow().isoformat() + "Z",
     "git_sha": os.getenv("GIT_SHA", "unknown"),
     "python_version": sys.version.split()[0],
@@ -96,6 +103,11 @@ def download_voice_cached(voice_url: str) -> str:
     return str(cache_path)
 
 
+# Conditioning latents per voice file, so segments of the same voice skip the
+# reference-audio encoder (memory + disk, see speaker_latents.py)
+latent_cache = SpeakerLatentCache()
+
+
 # =============================================================================
 # TTS MODEL - Warm load at startup, reuse for all requests
 # =============================================================================
@@ -158,6 +170,83 @@ def success_response(data: dict) -> dict:
     return data
 
 
+# =============================================================================
+# HELPER: Voice resolution and multi-segment synthesis
+# =============================================================================
+
+def resolve_voice_path(voice_url: str, speaker_wav_b64: str, request_id: str):
+    """
+    Get a local WAV path for the speaker voice.
+    
+    Returns:
+        (voice_path, is_temp) - is_temp files must be deleted by the caller;
+        (None, False) if neither voice_url nor speaker_wav_b64 was given
+    """
+    if voice_url:
+        # Preferred: Download from URL (with caching)
+        return download_voice_cached(voice_url), False
+    if speaker_wav_b64:
+        # Legacy: Decode base64 (deprecated)
+        print(f"[{request_id}] WARNING: Using deprecated speaker_wav_b64 field")
+        voice_data = base64.b64decode(speaker_wav_b64)
+        print(f"[{request_id}] Voice decoded: {len(voice_data)} bytes")
+        voice_path = tempfile.mktemp(suffix=".wav")
+        with open(voice_path, "wb") as f:
+            f.write(voice_data)
+        return voice_path, True
+    return None, False
+
+
+def synthesize_segments(model, segments: list, voice_path: str, language: str, request_id: str,
+                        audio_format: str = "wav", audio_bitrate: str = None):
+    """
+    Synthesize segments one after another with the same model and voice.
+    
+    A failing segment is reported in its own result and does not stop the rest.
+    
+    Yields:
+        {"segment_id", "audio_b64", "audio_format", "audio_size", "wav_size", "inference_time",
+        "error"} per segment, in input order (pcm adds "sample_rate", "channels", "sample_format")
+    """
+    for i, segment in enumerate(segments):
+        segment_id = segment.get("segment_id")
+        segment_text = (segment.get("text") or "").strip()
+        result = {
+            "segment_id": segment_id,
+            "audio_b64": None,
+            "audio_format": audio_format,
+            "audio_size": 0,
+            "wav_size": 0,
+            "inference_time": 0.0,
+            "error": None,
+        }
+        
+        if not segment_text:
+            result["error"] = "Empty text"
+            yield result
+            continue
+        
+        output_path = tempfile.mktemp(suffix=".wav")
+        inference_start = time.time()
+        try:
+            synthesize_to_file(model, segment_text, voice_path, language, output_path, latent_cache)
+            audio_data, meta = encode_audio(output_path, audio_format, audio_bitrate)
+            result.update(meta)
+            result["audio_b64"] = base64.b64encode(audio_data).decode()
+            result["audio_size"] = len(audio_data)
+        except Exception as e:
+            print(f"[{request_id}] ❌ Segment {segment_id} failed: {e}")
+            result["error"] = str(e)
+        finally:
+            if os.path.exists(output_path):
+                os.unlink(output_path)
+        
+        result["inference_time"] = round(time.time() - inference_start, 3)
+        print(f"[{request_id}] [{i+1}/{len(segments)}] Segment {segment_id}: "
+              f"{'ok' if not result['error'] else 'failed'} in {result['inference_time']:.2f}s")
+        yield result
+
+
 # =============================================================================
 # MAIN HANDLER
 # =============================================================================
@@ -168,13 +257,21 @@ def handler(job):
     
     Simple Mode (preferred):
         Input: { "text": "...", "voice_url": "https://...", "language": "en", "request_id": "..." }
-        Output: { "status": "complete", "audio_b64": "...", "version": {...} }
+        Output: { "status": "complete", "audio_b64": "...", "audio_format": "wav", "version": {...} }
     
     Legacy Simple Mode (deprecated):
         Input: { "text": "...", "speaker_wav_b64": "...", "language": "en" }
         Output: { "status": "complete", "audio_b64": "...", "version": {...} }
     
-    Batch Mode:
+    Segments Mode (many segments per job, voice loaded once):
+        Input: { "segments": [{segment_id, text}], "voice_url": "...", "language": "en", "request_id": "..." }
+        Output: { "status": "complete", "segments": [{segment_id, audio_b64, audio_format, audio_size,
+                  wav_size, inference_time, error}], "processed": N, "failed": N, "version": {...} }
+    
+    Transport (simple and segments mode):
+        Input: { ..., "audio_format": "wav|flac|opus|aac|pcm", "audio_bitrate": "48k", "sample_format": "s16le" }
+    
+    Batch Mode (legacy, writes to the sections table):
         Input: { "sections": [{id, text}], "voice_url": "...", "supabase_url": "...", "supabase_key": "..." }
         Output: { "status": "complete", "processed": N, "version": {...} }
     
@@ -204,15 +301,22 @@ def handler(job):
                 "version": get_version_info(),
                 "cache_dir": str(VOICE_CACHE_DIR),
                 "cached_voices": len(list(VOICE_CACHE_DIR.glob("*.wav"))),
+                "latent_cache": latent_cache.stats(),
                 "model_loaded": tts_model is not None,
             }
         
         # Extract common fields
         text = job_input.get("text")
+        segments = job_input.get("segments", [])
         sections = job_input.get("sections", [])
         voice_url = job_input.get("voice_url")
         speaker_wav_b64 = job_input.get("speaker_wav_b64")  # Legacy
         language = job_input.get("language", "en")
+        audio_bitrate = job_input.get("audio_bitrate")
+        try:
+            audio_format = check_format(job_input.get("audio_format"), job_input.get("sample_format"))
+        except ValueError as e:
+            return error_response(str(e), {"request_id": request_id})
         
         # ========== SIMPLE MODE (text present) ==========
         if text:
@@ -220,20 +324,8 @@ def handler(job):
             print(f"[{request_id}] Simple mode: text={len(text)} chars")
             
             # Get voice path
-            voice_path = None
-            
-            if voice_url:
-                # Preferred: Download from URL (with caching)
-                voice_path = download_voice_cached(voice_url)
-            elif speaker_wav_b64:
-                # Legacy: Decode base64 (deprecated)
-                print(f"[{request_id}] WARNING: Using deprecated speaker_wav_b64 field")
-                voice_data = base64.b64decode(speaker_wav_b64)
-                print(f"[{request_id}] Voice decoded: {len(voice_data)} bytes")
-                voice_path = tempfile.mktemp(suffix=".wav")
-                with open(voice_path, "wb") as f:
-                    f.write(voice_data)
-            else:
+            voice_path, voice_is_temp = resolve_voice_path(voice_url, speaker_wav_b64, request_id)
+            if not voice_path:
                 return error_response(
                     "Missing voice data: provide 'voice_url' (preferred) or 'speaker_wav_b64'",
                     {"request_id": request_id, "mode": mode}
@@ -246,24 +338,18 @@ def handler(job):
             print(f"[{request_id}] Generating audio...")
             inference_start = time.time()
             
-            model.tts_to_file(
-                text=text,
-                speaker_wav=voice_path,
-                language=language,
-                file_path=output_path
-            )
+            synthesize_to_file(model, text, voice_path, language, output_path, latent_cache)
             
             inference_time = time.time() - inference_start
             print(f"[{request_id}] ✅ Inference complete in {inference_time:.2f}s")
             
-            # Read and encode result
-            with open(output_path, "rb") as f:
-                audio_data = f.read()
+            # Read and encode result in the requested transport format
+            audio_data, meta = encode_audio(output_path, audio_format, audio_bitrate)
             audio_b64 = base64.b64encode(audio_data).decode()
             
             # Cleanup temp files (but NOT cached voice files)
             os.unlink(output_path)
-            if speaker_wav_b64 and voice_path and os.path.exists(voice_path):
+            if voice_is_temp and os.path.exists(voice_path):
                 os.unlink(voice_path)
             
             total_time = time.time() - request_start
@@ -272,11 +358,45 @@ def handler(job):
             return success_response({
                 "audio_b64": audio_b64,
                 "audio_size": len(audio_data),
+                **meta,
                 "inference_time": inference_time,
                 "total_time": total_time,
                 "request_id": request_id,
             })
         
+        # ========== SEGMENTS MODE (segments present) ==========
+        elif segments:
+            mode = "segments"
+            print(f"[{request_id}] Segments mode: {len(segments)} segments")
+            
+            voice_path, voice_is_temp = resolve_voice_path(voice_url, speaker_wav_b64, request_id)
+            if not voice_path:
+                return error_response(
+                    "Missing voice data: provide 'voice_url' (preferred) or 'speaker_wav_b64'",
+                    {"request_id": request_id, "mode": mode}
+                )
+            
+            model = get_tts_model()
+            try:
+                results = list(synthesize_segments(model, segments, voice_path, language, request_id,
+                                                   audio_format, audio_bitrate))
+            finally:
+                if voice_is_temp and os.path.exists(voice_path):
+                    os.unlink(voice_path)
+            
+            failed = sum(1 for r in results if r["error"])
+            total_time = time.time() - request_start
+            print(f"[{request_id}] Segments complete: {len(results) - failed}/{len(results)} in {total_time:.2f}s")
+            
+            return success_response({
+                "segments": results,
+                "processed": len(results) - failed,
+                "failed": failed,
+                "inference_time": round(sum(r["inference_time"] for r in results), 3),
+                "total_time": total_time,
+                "request_id": request_id,
+            })
+        
         # ========== BATCH MODE (sections present) ==========
         elif sections:
             mode = "batch"
@@ -316,12 +436,7 @@ def handler(job):
                     print(f"[{request_id}] [{i+1}/{len(sections)}] Processing: {section_text[:50]}...")
                     
                     with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
-                        model.tts_to_file(
-                            text=section_text,
-                            speaker_wav=voice_path,
-                            language=language,
-                            file_path=tmp.name
-                        )
+                        synthesize_to_file(model, section_text, voice_path, language, tmp.name, latent_cache)
                         
                         with open(tmp.name, "rb") as f:
                             audio_data = f.read()
@@ -362,7 +477,8 @@ def handler(job):
         # ========== NO VALID INPUT ==========
         else:
             return error_response(
-                "Invalid input: provide 'text' (simple mode), 'sections' (batch mode), or 'health' (health check)",
+                "Invalid input: provide 'text' (simple mode), 'segments' (segments mode), "
+                "'sections' (batch mode), or 'health' (health check)",
                 {
                     "request_id": request_id,
                     "received_keys": list(job_input.keys()),
@@ -385,6 +501,47 @@ def handler(job):
         )
 
 
+def stream_handler(job):
+    """
+    Generator variant of handler() for RUNPOD_STREAM_SEGMENTS=1 deployments.
+    
+    Segments mode yields one partial output per segment as soon as it is synthesized
+    (readable via /stream/{id}; /status returns the aggregated list). Every other mode
+    yields the single handler() response.
+    """
+    job_input = job.get("input", {})
+    segments = job_input.get("segments")
+    if not segments or job_input.get("text"):
+        yield handler(job)
+        return
+    
+    request_id = job_input.get("request_id", f"auto_{int(time.time()*1000)}")
+    try:
+        audio_format = check_format(job_input.get("audio_format"), job_input.get("sample_format"))
+        voice_path, voice_is_temp = resolve_voice_path(
+            job_input.get("voice_url"), job_input.get("speaker_wav_b64"), request_id
+        )
+        if not voice_path:
+            yield error_response(
+                "Missing voice data: provide 'voice_url' (preferred) or 'speaker_wav_b64'",
+                {"request_id": request_id, "mode": "segments"}
+            )
+            return
+        model = get_tts_model()
+    except Exception as e:
+        traceback.print_exc()
+        yield error_response(str(e), {"request_id": request_id, "mode": "segments"})
+        return
+    
+    try:
+        for result in synthesize_segments(model, segments, voice_path, job_input.get("language", "en"), request_id,
+                                          audio_format, job_input.get("audio_bitrate")):
+            yield result
+    finally:
+        if voice_is_temp and os.path.exists(voice_path):
+            os.unlink(voice_path)
+
+
 # =============================================================================
 # STARTUP - Load model when container starts (warm start)
 # =============================================================================
@@ -410,6 +567,10 @@ if __name__ == "__main__":
     print(f"Transformers: {VERSION['transformers_version']}")
     print(f"TTS: {VERSION['tts_version']}")
     print("=" * 60)
-    print("Starting RunPod Serverless handler...")
     
-    runpod.serverless.start({"handler": handler})
+    if os.getenv("RUNPOD_STREAM_SEGMENTS") == "1":
+        print("Starting RunPod Serverless handler (streaming segments)...")
+        runpod.serverless.start({"handler": stream_handler, "return_aggregate_stream": True})
+    else:
+        print("Starting RunPod Serverless handler...")
+        runpod.serverless.start({"handler": handler})
@@ -0,0 +1,255 @@
+"""
+Local stand-in for the RunPod Serverless API (for tests and offline development).
+
+Implements the endpoints the TTS engines use:
+  POST /v2/{endpoint}/run          -> {"id": ..., "status": "IN_QUEUE"}
+  GET  /v2/{endpoint}/status/{id}  -> {"id": ..., "status": ..., "output": {...}}
+  POST /v2/{endpoint}/runsync      -> completed job (blocks for the job's latency)
+  POST /v2/{endpoint}/cancel/{id}  -> {"id": ..., "status": "CANCELLED"}
+
+Jobs run on a fixed number of fake "GPU workers" with a configurable per-job latency
+(plus segment_latency per segment in segments mode) and return short silent WAVs as
+audio_b64, shaped like runpod_handler.py output (in the job's "audio_format", see
+audio_transport.py). Text containing FAIL_MARKER produces a FAILED job (simple mode)
+or a failed segment entry (segments mode). With segments_mode=False the stand-in
+answers segments-mode jobs like a worker on the older handler (an "Invalid input"
+error response without "segments").
+
+Usage:
+  python runpod_standin.py --port 8765 --workers 4 --latency 0.5
+  RUNPOD_API_BASE=http://127.0.0.1:8765/v2 RUNPOD_ENDPOINT_ID=local RUNPOD_API_KEY=x ...
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from audio_transport import encode_audio
+
+FAIL_MARKER = "[[FAIL]]"
+SAMPLE_RATE = 24000
+
+
+def silent_wav(seconds: float) -> bytes:
+    """Mono 16-bit silent WAV of the given length."""
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(SAMPLE_RATE)
+        w.writeframes(b"\x00\x00" * int(seconds * SAMPLE_RATE))
+    return buf.getvalue()
+
+
+def _audio_output(text: str, job_input: dict) -> dict:
+    """
+    audio_b64 + transport fields for one text, ~60 ms of audio per character like a slow
+    narrator. Encoding errors (e.g. no ffmpeg for flac) come back as {"audio_b64": None, "error"}.
+    """
+    if FAIL_MARKER in text:
+        return {"audio_b64": None, "error": "Synthesis failed (stand-in)"}
+    fd, wav_path = tempfile.mkstemp(suffix=".wav")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(silent_wav(max(0.1, len(text) * 0.06)))
+        audio, meta = encode_audio(wav_path, job_input.get("audio_format") or "wav", job_input.get("audio_bitrate"))
+    except (OSError, RuntimeError, ValueError) as e:
+        return {"audio_b64": None, "error": str(e)}
+    finally:
+        os.remove(wav_path)
+    return {"audio_b64": base64.b64encode(audio).decode(), "audio_size": len(audio), **meta, "error": None}
+
+
+class RunPodStandIn:
+    """Job store + fake GPU workers behind the HTTP handler."""
+
+    def __init__(self, workers: int = 4, latency: float = 0.5, segment_latency: float = 0.0,
+                 segments_mode: bool = True):
+        self.latency = latency
+        self.segment_latency = segment_latency
+        self.segments_mode = segments_mode
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.running = 0
+        self.max_running = 0
+        self.requests = {"run": 0, "status": 0, "runsync": 0, "cancel": 0}
+
+    def _execute(self, job_id: str):
+        with self.lock:
+            job = self.jobs[job_id]
+            if job["status"] == "CANCELLED":
+                return
+            job["status"] = "IN_PROGRESS"
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+
+        start = time.time()
+        segments = job["input"].get("segments")
+        time.sleep(self.latency + self.segment_latency * len(segments or []))
+        text = job["input"].get("text", "")
+
+        with self.lock:
+            self.running -= 1
+            if job["status"] == "CANCELLED":
+                return
+            if segments and not self.segments_mode:
+                job["status"] = "COMPLETED"
+                job["output"] = {
+                    "status": "error",
+                    "error": "Invalid input: provide 'text' (simple mode), 'sections' (batch mode), "
+                             "or 'health' (health check)",
+                    "version": {"handler_version": "standin-legacy"},
+                }
+            elif segments:
+                results = [
+                    {
+                        "segment_id": seg.get("segment_id"),
+                        **_audio_output(seg.get("text", ""), job["input"]),
+                        "inference_time": self.segment_latency,
+                    }
+                    for seg in segments
+                ]
+                failed = sum(1 for r in results if r["error"])
+                job["status"] = "COMPLETED"
+                job["output"] = {
+                    "status": "complete",
+                    "segments": results,
+                    "processed": len(results) - failed,
+                    "failed": failed,
+                    "request_id": job["input"].get("request_id"),
+                    "version": {"handler_version": "standin"},
+                }
+            else:
+                output = _audio_output(text, job["input"])
+                if output["error"]:
+                    job["status"] = "FAILED"
+                    job["error"] = output["error"]
+                else:
+                    job["status"] = "COMPLETED"
+                    job["output"] = {
+                        **output,
+                        "inference_time": round(time.time() - start, 3),
+                        "request_id": job["input"].get("request_id"),
+                        "version": {"handler_version": "standin"},
+                    }
+            job["executionTime"] = int((time.time() - start) * 1000)
+
+    def submit(self, payload: dict) -> dict:
+        job_id = str(uuid.uuid4())
+        with self.lock:
+            self.jobs[job_id] = {"id": job_id, "status": "IN_QUEUE", "input": payload.get("input", {})}
+        future = self.pool.submit(self._execute, job_id)
+        return {"id": job_id, "status": "IN_QUEUE", "future": future}
+
+    def status(self, job_id: str) -> dict:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            return {k: v for k, v in job.items() if k != "input"}
+
+    def cancel(self, job_id: str) -> dict:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job["status"] in ("IN_QUEUE", "IN_PROGRESS"):
+                job["status"] = "CANCELLED"
+            return {"id": job_id, "status": job["status"]}
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)
+
+
+def make_handler(standin: RunPodStandIn):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, code: int, body: dict):
+            data = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+
+            if re.fullmatch(r"/v2/[^/]+/run", self.path):
+                standin.requests["run"] += 1
+                job = standin.submit(payload)
+                return self._send(200, {"id": job["id"], "status": job["status"]})
+
+            if re.fullmatch(r"/v2/[^/]+/runsync", self.path):
+                standin.requests["runsync"] += 1
+                job = standin.submit(payload)
+                job["future"].result()
+                return self._send(200, standin.status(job["id"]))
+
+            match = re.fullmatch(r"/v2/[^/]+/cancel/([^/]+)", self.path)
+            if match:
+                standin.requests["cancel"] += 1
+                job = standin.cancel(match.group(1))
+                if job is None:
+                    return self._send(404, {"error": "job not found"})
+                return self._send(200, job)
+
+            self._send(404, {"error": "not found"})
+
+        def do_GET(self):
+            match = re.fullmatch(r"/v2/[^/]+/status/([^/]+)", self.path)
+            if match:
+                standin.requests["status"] += 1
+                job = standin.status(match.group(1))
+                if job is None:
+                    return self._send(404, {"error": "job not found"})
+                return self._send(200, job)
+            self._send(404, {"error": "not found"})
+
+    return Handler
+
+
+def start_standin(port: int = 0, workers: int = 4, latency: float = 0.5, segment_latency: float = 0.0,
+                  segments_mode: bool = True):
+    """
+    Start the stand-in on a background thread.
+
+    Returns:
+        (server, standin, api_base) - call server.shutdown() when done
+    """
+    standin = RunPodStandIn(workers=workers, latency=latency, segment_latency=segment_latency,
+                            segments_mode=segments_mode)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(standin))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_base = f"http://127.0.0.1:{server.server_address[1]}/v2"
+    return server, standin, api_base
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local RunPod API stand-in")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent fake GPU jobs")
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds per job")
+    parser.add_argument("--segment-latency", type=float, default=0.0, help="Extra seconds per segment (segments mode)")
+    args = parser.parse_args()
+
+    server, _, api_base = start_standin(args.port, args.workers, args.latency, args.segment_latency)
+    print(f"RunPod stand-in listening on {api_base} ({args.workers} workers, {args.latency}s/job)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,246 @@
+"""
+Speaker conditioning latent cache for XTTS.
+
+tts_to_file(text, speaker_wav=path) recomputes the GPT conditioning latent and the
+speaker embedding from the reference WAV on every call - once per segment, for a
+voice that stays the same for the whole book. SpeakerLatentCache computes them once
+per (voice file content, model, conditioning settings):
+
+- In memory: LRU of XTTS_LATENT_CACHE_ENTRIES entries (default 32)
+- On disk: XTTS_LATENT_CACHE_DIR (default /tmp/honora_latent_cache), bounded by
+  XTTS_LATENT_CACHE_MAX_MB (default 512), least recently used entries evicted first
+
+synthesize_to_file() is a drop-in for model.tts_to_file() that runs XTTS inference
+with the cached latents. It mirrors what tts_to_file does for XTTS (sentence split,
+per-sentence inference with the model's config, the same pause between sentences,
+Synthesizer.save_wav) and falls back to tts_to_file for non-XTTS models.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_CACHE_DIR = "/tmp/honora_latent_cache"
+
+# Synthesizer.tts() appends this many zero samples after every sentence
+SENTENCE_PAUSE_SAMPLES = 10000
+
+_file_hashes = {}  # (path, size, mtime_ns) -> sha256
+_file_hashes_lock = threading.Lock()
+
+
+def file_sha256(path: str) -> str:
+    """Content hash of a voice file (memoized while the file is unchanged)."""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _file_hashes_lock:
+        if memo_key in _file_hashes:
+            return _file_hashes[memo_key]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    with _file_hashes_lock:
+        _file_hashes[memo_key] = digest.hexdigest()
+    return _file_hashes[memo_key]
+
+
+def get_xtts(model):
+    """The Xtts model inside a TTS.api.TTS object, or None for other model types."""
+    xtts = getattr(getattr(model, "synthesizer", None), "tts_model", None)
+    if hasattr(xtts, "get_conditioning_latents") and hasattr(xtts, "inference"):
+        return xtts
+    return None
+
+
+def _conditioning_settings(xtts) -> dict:
+    """get_conditioning_latents() arguments Xtts.synthesize() would use (XttsConfig defaults)."""
+    config = getattr(xtts, "config", None)
+    return {
+        "gpt_cond_len": getattr(config, "gpt_cond_len", 12),
+        "gpt_cond_chunk_len": getattr(config, "gpt_cond_chunk_len", 4),
+        "max_ref_length": getattr(config, "max_ref_len", 10),
+        "sound_norm_refs": getattr(config, "sound_norm_refs", False),
+    }
+
+
+def _inference_settings(xtts) -> dict:
+    """inference() sampling arguments Xtts.synthesize() would use."""
+    config = getattr(xtts, "config", None)
+    settings = {}
+    for name in ("temperature", "length_penalty", "repetition_penalty", "top_k", "top_p"):
+        if hasattr(config, name):
+            settings[name] = getattr(config, name)
+    return settings
+
+
+def _to_device(value, device):
+    return value.to(device) if device is not None and hasattr(value, "to") else value
+
+
+def _to_cpu(value):
+    return value.cpu() if hasattr(value, "cpu") else value
+
+
+class SpeakerLatentCache:
+    """Memory LRU + disk store of (gpt_cond_latent, speaker_embedding) per voice."""
+
+    def __init__(self, cache_dir: str = None, max_entries: int = None, max_bytes: int = None):
+        self.cache_dir = cache_dir or os.getenv("XTTS_LATENT_CACHE_DIR", DEFAULT_CACHE_DIR)
+        self.max_entries = max_entries or int(os.getenv("XTTS_LATENT_CACHE_ENTRIES", "32"))
+        self.max_bytes = max_bytes or int(os.getenv("XTTS_LATENT_CACHE_MAX_MB", "512")) * 1024 * 1024
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.compute_seconds = 0.0
+
+    def key(self, xtts, voice_path: str, model_tag: str) -> str:
+        payload = json.dumps({
+            "voice": file_sha256(voice_path),
+            "model": model_tag,
+            "settings": _conditioning_settings(xtts),
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.latents")
+
+    def _remember(self, key: str, latents: tuple):
+        with self._lock:
+            self._memory[key] = latents
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _load_disk(self, key: str, device):
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                gpt_cond_latent, speaker_embedding = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError, ValueError):
+            return None
+        try:
+            os.utime(path, None)  # LRU order for disk eviction
+        except OSError:
+            pass
+        return _to_device(gpt_cond_latent, device), _to_device(speaker_embedding, device)
+
+    def _store_disk(self, key: str, latents: tuple):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(tuple(_to_cpu(v) for v in latents), f)
+        os.replace(tmp_path, path)
+        self._evict_disk()
+
+    def _evict_disk(self):
+        """Remove least recently used files until the directory is within budget."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".latents"):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                self.evictions += 1
+            except FileNotFoundError:
+                continue
+
+    def get(self, xtts, voice_path: str, model_tag: str = "xtts_v2") -> tuple:
+        """
+        Conditioning latents for a voice file, computed at most once per cache.
+
+        Args:
+            xtts: Xtts model (see get_xtts())
+            voice_path: Reference WAV
+            model_tag: Identifies the checkpoint (latents differ between fine-tunes)
+
+        Returns:
+            (gpt_cond_latent, speaker_embedding) on the model's device
+        """
+        key = self.key(xtts, voice_path, model_tag)
+        with self._lock:
+            latents = self._memory.get(key)
+            if latents is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return latents
+
+        device = getattr(xtts, "device", None)
+        latents = self._load_disk(key, device)
+        if latents is not None:
+            with self._lock:
+                self.disk_hits += 1
+            self._remember(key, latents)
+            return latents
+
+        start = time.time()
+        latents = tuple(xtts.get_conditioning_latents(audio_path=voice_path, **_conditioning_settings(xtts)))
+        with self._lock:
+            self.misses += 1
+            self.compute_seconds += time.time() - start
+        self._remember(key, latents)
+        try:
+            self._store_disk(key, latents)
+        except OSError as e:
+            print(f"[LATENTS] Could not write latent cache: {e}")
+        return latents
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+                "compute_seconds": round(self.compute_seconds, 2),
+                "memory_entries": len(self._memory),
+                "evictions": self.evictions,
+            }
+
+
+def synthesize_to_file(model, text: str, voice_path: str, language: str, file_path: str,
+                       cache: SpeakerLatentCache, model_tag: str = "xtts_v2"):
+    """
+    model.tts_to_file(text, speaker_wav=voice_path, ...) with cached speaker latents.
+
+    Args:
+        model: TTS.api.TTS instance
+        text: Text to speak
+        voice_path: Reference WAV for voice cloning
+        language: Language code
+        file_path: Output WAV path
+        cache: Latent cache to use
+        model_tag: Cache namespace for this checkpoint
+    """
+    xtts = get_xtts(model)
+    if xtts is None:
+        model.tts_to_file(text=text, speaker_wav=voice_path, language=language, file_path=file_path)
+        return
+
+    gpt_cond_latent, speaker_embedding = cache.get(xtts, voice_path, model_tag)
+    settings = _inference_settings(xtts)
+    wav = []
+    for sentence in model.synthesizer.split_into_sentences(text):
+        out = xtts.inference(sentence, language, gpt_cond_latent, speaker_embedding, **settings)
+        wav += list(out["wav"])
+        wav += [0] * SENTENCE_PAUSE_SAMPLES
+    model.synthesizer.save_wav(wav=wav, path=file_path)
@@ -21,6 +21,7 @@ from supabase import create_client
 
 # Import our engine manager
 from tts_engines import engine_manager, TTSEngine
+from voice_registry import invalidate_all as invalidate_voices
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -545,6 +546,12 @@ def get_voices():
     
     return jsonify(voices)
 
+@app.route("/api/voices/refresh", methods=["POST"])
+def refresh_voices():
+    """Forget cached voice listings/URLs (after adding or replacing a voice file)"""
+    invalidate_voices()
+    return jsonify({"status": "ok"})
+
 
 # =============================================================================
 # ROUTES - Local Files
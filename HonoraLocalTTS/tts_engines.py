@@ -4,21 +4,31 @@ Supports:
   - Piper (free, fast, local CPU)
   - XTTS-v2 Local (free, slow on CPU, high quality)
   - XTTS-v2 RunPod (paid, fast GPU, high quality)
+  - Router (picks among the above per segment, with failover)
 """
 
 import os
 import uuid
 import time
+import asyncio
 import logging
 import subprocess
 import tempfile
+import threading
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 
 # Load environment variables from .env file
 from dotenv import load_dotenv
 load_dotenv()
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
 
+from audio_transport import TransportStats, cache_variant, check_format, timed_write
+from piper_worker import PiperWorkerError, PiperWorkerPool, PiperWorkerStartError, default_pool_size
+from speaker_latents import SpeakerLatentCache, synthesize_to_file
+from tts_router import TIERS, EngineStats, engine_profiles
+from voice_registry import VoiceRegistry, get_voice_registry
+
 logger = logging.getLogger(__name__)
 
 # =============================================================================
@@ -54,7 +64,14 @@ class TTSEngine(ABC):
 # =============================================================================
 
 class PiperEngine(TTSEngine):
-    """Piper TTS - Fast local CPU inference"""
+    """
+    Piper TTS - Fast local CPU inference
+    
+    Segments are synthesized by long-lived workers (piper_worker.py) that load each
+    voice model once. PIPER_WORKERS sets the workers per model (default: half the
+    CPUs, 0 = run the piper CLI once per segment as before). If a worker cannot
+    start (e.g. the piper Python package is missing) the CLI is used instead.
+    """
     
     # Model folder
     MODEL_DIR = "piper_models"
@@ -64,8 +81,12 @@ class PiperEngine(TTSEngine):
         "en-us-lessac": {"file": "en_US-lessac-medium.onnx", "name": "Lessac (US English)"},
     }
     
-    def __init__(self):
+    def __init__(self, workers: int = None):
         self._voice_cache = None
+        self.workers = default_pool_size() if workers is None else workers
+        self._pools = {}  # model path -> PiperWorkerPool
+        self._pool_lock = threading.Lock()
+        self._pool_disabled = self.workers <= 0
         # Ensure model dir exists
         os.makedirs(self.MODEL_DIR, exist_ok=True)
     
@@ -77,11 +98,11 @@ class PiperEngine(TTSEngine):
     def description(self) -> str:
         return "Fast local TTS (free, ~10x faster than XTTS on CPU)"
     
-    def get_voices(self) -> list:
+    def _list_voices(self) -> list:
         voices = []
         # Check which models are actually downloaded
         if os.path.exists(self.MODEL_DIR):
-            for f in os.listdir(self.MODEL_DIR):
+            for f in sorted(os.listdir(self.MODEL_DIR)):
                 if f.endswith(".onnx"):
                     voice_name = f.replace(".onnx", "")
                     voices.append({
@@ -90,26 +111,62 @@ class PiperEngine(TTSEngine):
                         "path": os.path.join(self.MODEL_DIR, f),
                         "source": "piper"
                     })
-        return voices if voices else [{"id": "en_US-lessac-medium", "name": "Lessac (US)", "source": "piper"}]
+        return voices
+    
+    def get_voices(self, refresh: bool = False) -> list:
+        # The model directory is listed once, not on every generate() call
+        if self._voice_cache is None or refresh:
+            self._voice_cache = self._list_voices()
+        return self._voice_cache if self._voice_cache else [{"id": "en_US-lessac-medium", "name": "Lessac (US)", "source": "piper"}]
+    
+    def _model_path(self, voice: str) -> str:
+        """Model for a voice id, else the first downloaded model, else the default file."""
+        voices = [v for v in self.get_voices() if v.get("path")]
+        if not voices:
+            # Nothing was downloaded when the directory was listed - look again
+            voices = [v for v in self.get_voices(refresh=True) if v.get("path")]
+        for v in voices:
+            if v["id"] == voice:
+                return v["path"]
+        if voices:
+            return voices[0]["path"]
+        return os.path.join(self.MODEL_DIR, "en_US-lessac-medium.onnx")
+    
+    def _get_pool(self, model_path: str) -> PiperWorkerPool:
+        with self._pool_lock:
+            pool = self._pools.get(model_path)
+            if pool is None:
+                pool = PiperWorkerPool(model_path, size=self.workers)
+                self._pools[model_path] = pool
+            return pool
     
     def generate(self, text: str, voice: str, language: str, output_path: str) -> bool:
+        model_path = self._model_path(voice)
+        if not os.path.exists(model_path):
+            logger.error(f"Piper model not found: {model_path}")
+            logger.error("Download with: python -c \"from piper import download; download.download_voice('en_US-lessac-medium')\"")
+            return False
+        
+        if not self._pool_disabled:
+            try:
+                response = self._get_pool(model_path).synthesize(text, output_path)
+                if not response.get("ok"):
+                    logger.error(f"Piper error: {response.get('error')}")
+                    return False
+                logger.info(f"Piper: Generated {response['audio_ms'] / 1000:.1f}s of audio in {response['inference_ms'] / 1000:.1f}s")
+                return os.path.exists(output_path)
+            except PiperWorkerStartError as e:
+                # No usable worker (e.g. piper package not installed): use the CLI from now on
+                logger.warning(f"Piper: {e} - falling back to the piper CLI")
+                self._pool_disabled = True
+            except PiperWorkerError as e:
+                logger.warning(f"Piper: {e} - retrying with the piper CLI")
+        
+        return self._generate_cli(text, model_path, output_path)
+    
+    def _generate_cli(self, text: str, model_path: str, output_path: str) -> bool:
+        """One piper process per segment (reloads the model every time)."""
         try:
-            # Find model file
-            model_path = None
-            for v in self.get_voices():
-                if v.get("path"):
-                    model_path = v["path"]
-                    break
-            
-            if not model_path:
-                # Try default
-                model_path = os.path.join(self.MODEL_DIR, "en_US-lessac-medium.onnx")
-            
-            if not os.path.exists(model_path):
-                logger.error(f"Piper model not found: {model_path}")
-                logger.error("Download with: python -c \"from piper import download; download.download_voice('en_US-lessac-medium')\"")
-                return False
-            
             logger.info(f"Piper: Generating with model {model_path}")
             start = time.time()
             
@@ -145,6 +202,16 @@ class PiperEngine(TTSEngine):
             import traceback
             traceback.print_exc()
             return False
+    
+    def pool_stats(self) -> list:
+        return [pool.stats() for pool in self._pools.values()]
+    
+    def close(self):
+        """Stop all worker processes."""
+        with self._pool_lock:
+            for pool in self._pools.values():
+                pool.close()
+            self._pools = {}
 
 
 # =============================================================================
@@ -157,6 +224,7 @@ class XTTSLocalEngine(TTSEngine):
     def __init__(self):
         self._model = None
         self._voice_folder = "AI Stemmer Honora"
+        self._latent_cache = SpeakerLatentCache()
     
     @property
     def name(self) -> str:
@@ -174,48 +242,30 @@ class XTTSLocalEngine(TTSEngine):
             logger.info("XTTS-v2 model loaded!")
         return self._model
     
+    def _voice_registry(self) -> VoiceRegistry:
+        return get_voice_registry(self._voice_folder)
+    
     def get_voices(self) -> list:
-        voices = []
-        if os.path.exists(self._voice_folder):
-            for f in os.listdir(self._voice_folder):
-                if f.endswith(".wav"):
-                    voices.append({
-                        "id": f,
-                        "name": f.replace("AI_Voice_Honora_", "").replace(".wav", ""),
-                        "path": os.path.join(self._voice_folder, f),
-                        "source": "xtts-local"
-                    })
-        return voices
+        return [{**v, "source": "xtts-local"} for v in self._voice_registry().voices()]
+    
+    def preload_voices(self, voices: list) -> dict:
+        return self._voice_registry().preload(voices)
     
     def generate(self, text: str, voice: str, language: str, output_path: str) -> bool:
         try:
             tts = self._load_model()
             
-            # Find voice file
-            voice_path = None
-            for v in self.get_voices():
-                if v["id"] == voice or v["name"].lower() == voice.lower():
-                    voice_path = v["path"]
-                    break
-            
+            # Find voice file (defaults to the first available voice)
+            voice_path = self._voice_registry().resolve(voice)[1]
             if not voice_path:
-                # Default to first available voice
-                voices = self.get_voices()
-                if voices:
-                    voice_path = voices[0]["path"]
-                else:
-                    logger.error("No voice files found")
-                    return False
+                logger.error("No voice files found")
+                return False
             
             logger.info(f"XTTS-Local: Generating with voice {voice_path}")
             start = time.time()
             
-            tts.tts_to_file(
-                text=text,
-                speaker_wav=voice_path,
-                language=language or "en",
-                file_path=output_path
-            )
+            # Speaker latents are computed once per voice file, not per segment
+            synthesize_to_file(tts, text, voice_path, language or "en", output_path, self._latent_cache)
             
             elapsed = time.time() - start
             logger.info(f"XTTS-Local: Generated in {elapsed:.1f}s")
@@ -243,6 +293,7 @@ class XTTSRunPodEngine(TTSEngine):
     - Request correlation via request_id
     - Proper timeouts (connect + read)
     - VERSION verification from worker responses
+    - Transport format per RUNPOD_AUDIO_FORMAT (wav, flac, opus, aac, pcm; see audio_transport.py)
     """
     
     # Retry configuration
@@ -257,15 +308,21 @@ class XTTSRunPodEngine(TTSEngine):
     def __init__(self):
         self.api_key = os.getenv("RUNPOD_API_KEY", "")
         self.endpoint_id = os.getenv("RUNPOD_ENDPOINT_ID", "")
+        # Overridable so tests/dev can point at a local stand-in (see runpod_standin.py)
+        self.api_base = os.getenv("RUNPOD_API_BASE", "https://api.runpod.ai/v2").rstrip("/")
         self._voice_folder = "AI Stemmer Honora"
         
         # Supabase config for voice uploads
         self._supabase_url = os.getenv("SUPABASE_URL", "").rstrip("/")
         self._supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY", "")
-        self._supabase = None
         
         # Track last worker version for debugging
         self.last_worker_version = None
+        
+        # How the worker returns audio; payload sizes and timings per format in self.transport
+        self.audio_format = check_format(os.getenv("RUNPOD_AUDIO_FORMAT", "wav"))
+        self.audio_bitrate = os.getenv("RUNPOD_AUDIO_BITRATE") or None
+        self.transport = TransportStats()
     
     @property
     def name(self) -> str:
@@ -275,77 +332,32 @@ class XTTSRunPodEngine(TTSEngine):
     def description(self) -> str:
         return "High-quality voice cloning on GPU (~$0.20/hr, 10-20x faster)"
     
+    @property
+    def cache_variant(self) -> str:
+        """Audio cache suffix for lossy transport formats ("" for wav/flac/pcm)"""
+        return cache_variant(self.audio_format, self.audio_bitrate)
+    
     def is_configured(self) -> bool:
         return bool(self.api_key and self.endpoint_id)
     
-    def _get_supabase(self):
-        """Lazy-load Supabase client"""
-        if self._supabase is None and self._supabase_url and self._supabase_key:
-            from supabase import create_client
-            self._supabase = create_client(self._supabase_url, self._supabase_key)
-        return self._supabase
+    def _voice_registry(self) -> VoiceRegistry:
+        """Shared per-process voice listing + uploaded voice URLs (see voice_registry.py)"""
+        return get_voice_registry(self._voice_folder, self._supabase_url, self._supabase_key)
     
     def get_voices(self) -> list:
         """Get available voices from local folder"""
-        voices = []
-        if os.path.exists(self._voice_folder):
-            for f in os.listdir(self._voice_folder):
-                if f.endswith(".wav"):
-                    voices.append({
-                        "id": f,
-                        "name": f.replace("AI_Voice_Honora_", "").replace(".wav", ""),
-                        "path": os.path.join(self._voice_folder, f),
-                        "source": "xtts-runpod"
-                    })
-        return voices
+        return [{**v, "source": "xtts-runpod"} for v in self._voice_registry().voices()]
+    
+    def preload_voices(self, voices: list) -> dict:
+        """Resolve (and upload) every voice a job will use before synthesis starts."""
+        return self._voice_registry().preload(voices)
     
     def _get_voice_url(self, voice: str) -> tuple:
         """
-        Get or create a Supabase URL for the voice file.
+        Get or create a Supabase URL for the voice file (cached, uploaded once per file version).
         Returns (voice_url, voice_path) tuple.
         """
-        # Find local voice file
-        voice_path = None
-        for v in self.get_voices():
-            if v["id"] == voice or v["name"].lower() == voice.lower():
-                voice_path = v["path"]
-                break
-        
-        if not voice_path:
-            voices = self.get_voices()
-            if voices:
-                voice_path = voices[0]["path"]
-            else:
-                return None, None
-        
-        voice_filename = os.path.basename(voice_path)
-        
-        # Check if we have Supabase configured
-        supabase = self._get_supabase()
-        if not supabase:
-            logger.warning("Supabase not configured - cannot use voice_url mode")
-            return None, voice_path
-        
-        # Build the public URL (assume voice is already in bucket or upload it)
-        voice_url = f"{self._supabase_url}/storage/v1/object/public/voices/{voice_filename}"
-        
-        # Try to upload if not exists (upsert)
-        try:
-            with open(voice_path, "rb") as f:
-                voice_data = f.read()
-            
-            # Use upsert to upload/update
-            supabase.storage.from_("voices").upload(
-                voice_filename,
-                voice_data,
-                {"content-type": "audio/wav", "x-upsert": "true"}
-            )
-            logger.info(f"Voice uploaded to Supabase: {voice_filename}")
-        except Exception as e:
-            # May already exist, that's OK
-            logger.debug(f"Voice upload note: {e}")
-        
-        return voice_url, voice_path
+        return self._voice_registry().resolve(voice)
     
     def _call_runpod_with_retry(self, payload: dict) -> dict:
         """
@@ -367,7 +379,7 @@ class XTTSRunPodEngine(TTSEngine):
                 logger.info(f"[{request_id}] Attempt {attempt}/{self.MAX_RETRIES}")
                 
                 response = requests.post(
-                    f"https://api.runpod.ai/v2/{self.endpoint_id}/runsync",
+                    f"{self.api_base}/{self.endpoint_id}/runsync",
                     headers={
                         "Authorization": f"Bearer {self.api_key}",
                         "Content-Type": "application/json"
@@ -433,6 +445,38 @@ class XTTSRunPodEngine(TTSEngine):
         
         return result
     
+    def _voice_input(self, voice: str, request_id: str = "voice") -> dict:
+        """
+        Voice fields for a job input: voice_url (preferred) or speaker_wav_b64.
+        Returns an empty dict if no voice file is available.
+        """
+        import base64
+        
+        # Get voice URL (preferred) or fall back to local path
+        voice_url, voice_path = self._get_voice_url(voice)
+        
+        if voice_url:
+            # Preferred: Use URL (worker downloads and caches)
+            logger.info(f"[{request_id}] Using voice_url: {voice_url}")
+            return {"voice_url": voice_url}
+        
+        if voice_path:
+            # Fallback: Base64 encode (deprecated path)
+            logger.warning(f"[{request_id}] Falling back to base64 voice (no Supabase configured)")
+            with open(voice_path, "rb") as f:
+                return {"speaker_wav_b64": base64.b64encode(f.read()).decode()}
+        
+        return {}
+    
+    def _transport_input(self) -> dict:
+        """Job input fields selecting the transport format (ignored by older workers)."""
+        fields = {"audio_format": self.audio_format}
+        if self.audio_bitrate:
+            fields["audio_bitrate"] = self.audio_bitrate
+        if self.audio_format == "pcm":
+            fields["sample_format"] = "s16le"
+        return fields
+    
     def generate(self, text: str, voice: str, language: str, output_path: str) -> bool:
         """Generate audio using RunPod XTTS worker"""
         if not self.is_configured():
@@ -442,12 +486,8 @@ class XTTSRunPodEngine(TTSEngine):
         request_id = str(uuid.uuid4())
         
         try:
-            import base64
-            
-            # Get voice URL (preferred) or fall back to local path
-            voice_url, voice_path = self._get_voice_url(voice)
-            
-            if not voice_url and not voice_path:
+            voice_input = self._voice_input(voice, request_id)
+            if not voice_input:
                 logger.error("No voice files found")
                 return False
             
@@ -457,22 +497,13 @@ class XTTSRunPodEngine(TTSEngine):
                     "text": text,
                     "language": language or "en",
                     "request_id": request_id,
+                    **voice_input,
+                    **self._transport_input(),
                 }
             }
             
-            if voice_url:
-                # Preferred: Use URL (worker downloads and caches)
-                payload["input"]["voice_url"] = voice_url
-                logger.info(f"[{request_id}] Using voice_url: {voice_url}")
-            else:
-                # Fallback: Base64 encode (deprecated path)
-                logger.warning(f"[{request_id}] Falling back to base64 voice (no Supabase configured)")
-                with open(voice_path, "rb") as f:
-                    voice_b64 = base64.b64encode(f.read()).decode()
-                payload["input"]["speaker_wav_b64"] = voice_b64
-            
             logger.info(f"[{request_id}] XTTS-RunPod: Sending to GPU...")
-            start = time.time()
+            start = time.monotonic()
             
             # Call with retry
             result = self._call_runpod_with_retry(payload)
@@ -483,12 +514,12 @@ class XTTSRunPodEngine(TTSEngine):
                 audio_b64 = output.get("audio_b64")
                 
                 if audio_b64:
-                    with open(output_path, "wb") as f:
-                        f.write(base64.b64decode(audio_b64))
+                    transport = timed_write(self.transport, output, output_path, segment_start=start)
                     
-                    elapsed = time.time() - start
+                    elapsed = time.monotonic() - start
                     inference_time = output.get("inference_time", "?")
-                    logger.info(f"[{request_id}] ✅ XTTS-RunPod: Generated in {elapsed:.1f}s (inference: {inference_time}s)")
+                    logger.info(f"[{request_id}] ✅ XTTS-RunPod: Generated in {elapsed:.1f}s (inference: {inference_time}s, "
+                                f"{transport['audio_format']} payload {transport['payload_bytes']} bytes)")
                     return os.path.exists(output_path)
                 else:
                     logger.error(f"[{request_id}] No audio_b64 in response: {output}")
@@ -506,6 +537,326 @@ class XTTSRunPodEngine(TTSEngine):
             return False
 
 
+# =============================================================================
+# XTTS RUNPOD ASYNC ENGINE (many jobs in flight via /run + /status)
+# =============================================================================
+
+class XTTSRunPodAsyncEngine(XTTSRunPodEngine):
+    """
+    XTTS-v2 on RunPod Serverless, asyncio variant for whole chapters/books.
+    
+    Instead of one blocking /runsync call per segment:
+    - Submits segments through /run and polls /status for many jobs at once
+    - Caps in-flight jobs per endpoint (RUNPOD_MAX_IN_FLIGHT)
+    - Packs up to RUNPOD_BATCH_SIZE segments into one segments-mode job
+    - Writes each WAV to disk as soon as its job completes (decoding the
+      RUNPOD_AUDIO_FORMAT transport format, see audio_transport.py)
+    
+    generate() (sync, /runsync) is inherited unchanged for single segments.
+    Point RUNPOD_API_BASE at runpod_standin.py to test without a GPU.
+    """
+    
+    POLL_INTERVAL = 0.5  # seconds, grows to MAX_POLL_INTERVAL while a job is queued
+    MAX_POLL_INTERVAL = 3.0
+    JOB_TIMEOUT = 600  # seconds per job, queue time included
+    TERMINAL_STATUSES = ("COMPLETED", "FAILED", "CANCELLED", "TIMED_OUT")
+    NOT_QUEUED_STATUSES = (429, 503)  # /run rejected the job; safe to submit again
+    MAX_RETRY_AFTER = 60.0  # seconds
+    
+    def __init__(self, max_in_flight: int = None, batch_size: int = None):
+        super().__init__()
+        self.max_in_flight = max_in_flight or int(os.getenv("RUNPOD_MAX_IN_FLIGHT", "8"))
+        self.batch_size = batch_size or int(os.getenv("RUNPOD_BATCH_SIZE", "20"))
+        self.segments_mode = None  # False once the worker answered a batch without "segments"
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "cancelled": 0, "max_in_flight": 0}
+        self._in_flight = 0
+    
+    @property
+    def name(self) -> str:
+        return "XTTS-RunPod-Async"
+    
+    def _headers(self) -> dict:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+    
+    @staticmethod
+    def _retry_after(response) -> float:
+        """Seconds from a Retry-After header (delta-seconds or HTTP date), None if absent."""
+        value = response.headers.get("Retry-After") if response is not None else None
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            from email.utils import parsedate_to_datetime
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+    
+    async def _request_with_retry(self, client, method: str, url: str, request_id: str,
+                                  idempotent: bool = True, **kwargs) -> dict:
+        """
+        HTTP call with the same retry/backoff policy as _call_runpod_with_retry.
+        
+        Non-idempotent calls (POST /run) are only retried when the request cannot have
+        queued anything: connect errors, and 429/503 responses (rate limited or no
+        capacity, the job was rejected). A read timeout or other 5xx may already have
+        queued the job, and a retry would queue and bill it twice. Retry-After is
+        honoured (up to MAX_RETRY_AFTER seconds).
+        """
+        import httpx
+        
+        retryable = (httpx.TransportError, httpx.HTTPStatusError) if idempotent else \
+            (httpx.ConnectError, httpx.ConnectTimeout, httpx.HTTPStatusError)
+        backoff = self.INITIAL_BACKOFF
+        last_error = None
+        
+        for attempt in range(1, self.MAX_RETRIES + 1):
+            wait = backoff
+            try:
+                response = await client.request(method, url, headers=self._headers(), **kwargs)
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise httpx.HTTPStatusError(f"HTTP {response.status_code}", request=response.request, response=response)
+                if response.status_code != 200:
+                    raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+                return response.json()
+            except retryable as e:
+                if isinstance(e, httpx.HTTPStatusError):
+                    if not idempotent and e.response.status_code not in self.NOT_QUEUED_STATUSES:
+                        raise
+                    retry_after = self._retry_after(e.response)
+                    if retry_after is not None:
+                        wait = min(retry_after, self.MAX_RETRY_AFTER)
+                last_error = e
+                logger.warning(f"[{request_id}] {method} attempt {attempt}/{self.MAX_RETRIES} failed: {e}")
+            
+            if attempt < self.MAX_RETRIES:
+                await asyncio.sleep(wait)
+                backoff = min(backoff * 2, self.MAX_BACKOFF)
+        
+        raise RuntimeError(f"{method} {url} failed after {self.MAX_RETRIES} attempts: {last_error}")
+    
+    async def _run_job(self, client, payload: dict) -> dict:
+        """Submit one job via /run and poll /status until it reaches a terminal state."""
+        request_id = payload["input"]["request_id"]
+        base = f"{self.api_base}/{self.endpoint_id}"
+        
+        job = await self._request_with_retry(client, "POST", f"{base}/run", request_id, idempotent=False, json=payload)
+        job_id = job.get("id")
+        if not job_id:
+            return {"status": "FAILED", "error": f"No job id in /run response: {job}"}
+        self.stats["submitted"] += 1
+        
+        deadline = time.monotonic() + self.JOB_TIMEOUT
+        interval = self.POLL_INTERVAL
+        try:
+            while job.get("status") not in self.TERMINAL_STATUSES:
+                if time.monotonic() > deadline:
+                    await self._cancel_job(client, base, job_id, request_id)
+                    return {"status": "TIMED_OUT", "error": f"Job {job_id} not finished after {self.JOB_TIMEOUT}s"}
+                await asyncio.sleep(interval)
+                job = await self._request_with_retry(client, "GET", f"{base}/status/{job_id}", request_id)
+                if job.get("status") == "IN_QUEUE":
+                    interval = min(interval * 1.5, self.MAX_POLL_INTERVAL)
+                else:
+                    interval = self.POLL_INTERVAL
+        except Exception:
+            # Status polling gave up; do not leave the job running (and billing) unattended
+            await self._cancel_job(client, base, job_id, request_id)
+            raise
+        
+        return job
+    
+    async def _cancel_job(self, client, base: str, job_id: str, request_id: str):
+        """Best-effort POST /cancel for a job that is no longer being waited for."""
+        try:
+            await self._request_with_retry(client, "POST", f"{base}/cancel/{job_id}", request_id)
+            self.stats["cancelled"] += 1
+            logger.warning(f"[{request_id}] Cancelled abandoned job {job_id}")
+        except Exception as e:
+            logger.warning(f"[{request_id}] Could not cancel job {job_id}: {e}")
+    
+    def _write_audio(self, output_path: str, output: dict, start: float) -> dict:
+        """
+        Decode one worker output via tmp + rename, so no half-written WAVs are left behind.
+        
+        Returns the transport fields for the segment result ({"audio_format", "payload_bytes"}).
+        """
+        return timed_write(self.transport, output, output_path, segment_start=start)
+    
+    @staticmethod
+    def _segment_outputs(job: dict) -> dict:
+        """
+        Per-segment outputs of a segments-mode job, keyed by segment_id.
+        
+        Accepts both the plain handler response ({"segments": [...]}) and the
+        aggregated list a streaming worker (RUNPOD_STREAM_SEGMENTS=1) returns.
+        """
+        output = job.get("output")
+        if isinstance(output, dict):
+            output = output.get("segments")
+        if not isinstance(output, list):
+            return {}
+        return {str(o.get("segment_id")): o for o in output if isinstance(o, dict)}
+    
+    async def generate_many(self, items: list, voice: str, language: str, on_complete=None) -> dict:
+        """
+        Generate many segments concurrently.
+        
+        With batch_size > 1 (RUNPOD_BATCH_SIZE, default 20) consecutive items are sent
+        as one segments-mode job, so HTTP and queueing overhead is paid once per batch;
+        max_in_flight then caps concurrent batches. A worker on the older handler
+        completes such a job without a "segments" key; its batch is then resubmitted
+        as single-segment jobs and later calls skip batching.
+        
+        Args:
+            items: [{"id": ..., "text": ..., "output_path": ...}, ...]
+            voice: Voice id/name (resolved and uploaded once for all items)
+            language: Language code
+            on_complete: Optional callback(item_id, result) called as each segment finishes
+        
+        Returns:
+            {item_id: {"success": bool, "output_path": str, "seconds": float, "error": str|None}};
+            successful items also carry "audio_format" and "payload_bytes"
+        """
+        import httpx
+        
+        if not self.is_configured():
+            raise RuntimeError("RunPod not configured. Set RUNPOD_API_KEY and RUNPOD_ENDPOINT_ID")
+        
+        voice_input = await asyncio.to_thread(self._voice_input, voice)
+        if not voice_input:
+            raise RuntimeError("No voice files found")
+        
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        results = {}
+        timeout = httpx.Timeout(self.READ_TIMEOUT, connect=self.CONNECT_TIMEOUT)
+        limits = httpx.Limits(max_connections=self.max_in_flight * 2)
+        
+        def finish(item: dict, result: dict, start: float):
+            result["seconds"] = round(time.monotonic() - start, 2)
+            results[item["id"]] = result
+            if on_complete:
+                on_complete(item["id"], result)
+        
+        async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+            
+            async def run_job_limited(payload: dict) -> dict:
+                async with semaphore:
+                    self._in_flight += 1
+                    self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self._in_flight)
+                    try:
+                        return await self._run_job(client, payload)
+                    finally:
+                        self._in_flight -= 1
+            
+            async def run_item(item: dict):
+                request_id = str(uuid.uuid4())
+                payload = {
+                    "input": {
+                        "text": item["text"],
+                        "language": language or "en",
+                        "request_id": request_id,
+                        **voice_input,
+                        **self._transport_input(),
+                    }
+                }
+                
+                start = time.monotonic()
+                try:
+                    job = await run_job_limited(payload)
+                    output = job.get("output") or {}
+                    if job.get("status") != "COMPLETED" or not output.get("audio_b64"):
+                        error = job.get("error") or output.get("error") or f"status {job.get('status')}"
+                        raise RuntimeError(error)
+                    
+                    # Write as soon as the job completes
+                    transport = self._write_audio(item["output_path"], output, start)
+                    
+                    if output.get("version"):
+                        self.last_worker_version = output["version"]
+                    result = {"success": True, "output_path": item["output_path"], "error": None, **transport}
+                    self.stats["completed"] += 1
+                except Exception as e:
+                    logger.error(f"[{request_id}] XTTS-RunPod-Async segment {item['id']} failed: {e}")
+                    result = {"success": False, "output_path": item["output_path"], "error": str(e)}
+                    self.stats["failed"] += 1
+                
+                finish(item, result, start)
+            
+            async def run_batch(batch: list):
+                request_id = str(uuid.uuid4())
+                payload = {
+                    "input": {
+                        "segments": [{"segment_id": str(k), "text": item["text"]} for k, item in enumerate(batch)],
+                        "language": language or "en",
+                        "request_id": request_id,
+                        **voice_input,
+                        **self._transport_input(),
+                    }
+                }
+                
+                start = time.monotonic()
+                job_error = None
+                outputs = {}
+                try:
+                    job = await run_job_limited(payload)
+                    outputs = self._segment_outputs(job)
+                    output = job.get("output")
+                    if job.get("status") == "COMPLETED" and not isinstance(output, list) \
+                            and "segments" not in (output or {}):
+                        self.segments_mode = False
+                        logger.warning(f"[{request_id}] XTTS-RunPod-Async: worker does not support segments "
+                                       f"mode, sending {len(batch)} segments as single jobs")
+                        await asyncio.gather(*(run_item(item) for item in batch))
+                        return
+                    if job.get("status") != "COMPLETED" or not outputs:
+                        output = output if isinstance(output, dict) else {}
+                        job_error = job.get("error") or output.get("error") or f"status {job.get('status')}"
+                    else:
+                        self.segments_mode = True
+                        if isinstance(output, dict) and output.get("version"):
+                            self.last_worker_version = output["version"]
+                except Exception as e:
+                    job_error = str(e)
+                if job_error:
+                    logger.error(f"[{request_id}] XTTS-RunPod-Async batch of {len(batch)} failed: {job_error}")
+                
+                for k, item in enumerate(batch):
+                    output = outputs.get(str(k)) or {}
+                    try:
+                        if job_error:
+                            raise RuntimeError(job_error)
+                        if not output.get("audio_b64"):
+                            raise RuntimeError(output.get("error") or "No audio returned for segment")
+                        transport = self._write_audio(item["output_path"], output, start)
+                        result = {"success": True, "output_path": item["output_path"], "error": None, **transport}
+                        self.stats["completed"] += 1
+                    except Exception as e:
+                        if not job_error:
+                            logger.error(f"[{request_id}] XTTS-RunPod-Async segment {item['id']} failed: {e}")
+                        result = {"success": False, "output_path": item["output_path"], "error": str(e)}
+                        self.stats["failed"] += 1
+                    result["inference_time"] = output.get("inference_time")
+                    finish(item, result, start)
+            
+            start = time.monotonic()
+            if self.batch_size > 1 and self.segments_mode is not False:
+                batches = [items[i:i + self.batch_size] for i in range(0, len(items), self.batch_size)]
+                await asyncio.gather(*(run_batch(batch) for batch in batches))
+            else:
+                await asyncio.gather(*(run_item(item) for item in items))
+        
+        ok = sum(1 for r in results.values() if r["success"])
+        logger.info(f"XTTS-RunPod-Async: {ok}/{len(items)} segments in {time.monotonic() - start:.1f}s "
+                    f"({self.stats['submitted']} jobs, max {self.stats['max_in_flight']} in flight)")
+        return results
+
+
 # =============================================================================
 # XTTS REPLICATE ENGINE (Paid, Fast, High Quality, Simple!)
 # =============================================================================
@@ -538,57 +889,19 @@ class XTTSReplicateEngine(TTSEngine):
     def is_configured(self) -> bool:
         return bool(self.api_token)
     
+    def _voice_registry(self) -> VoiceRegistry:
+        return get_voice_registry(self._voice_folder, self._supabase_url, self._supabase_key)
+    
     def get_voices(self) -> list:
         """Get available voices from local folder"""
-        voices = []
-        if os.path.exists(self._voice_folder):
-            for f in os.listdir(self._voice_folder):
-                if f.endswith(".wav"):
-                    voices.append({
-                        "id": f,
-                        "name": f.replace("AI_Voice_Honora_", "").replace(".wav", ""),
-                        "path": os.path.join(self._voice_folder, f),
-                        "source": "xtts-replicate"
-                    })
-        return voices
+        return [{**v, "source": "xtts-replicate"} for v in self._voice_registry().voices()]
+    
+    def preload_voices(self, voices: list) -> dict:
+        return self._voice_registry().preload(voices)
     
     def _get_voice_url(self, voice: str) -> str:
-        """Get Supabase URL for voice file"""
-        # Find local voice file
-        voice_path = None
-        for v in self.get_voices():
-            if v["id"] == voice or v["name"].lower() == voice.lower():
-                voice_path = v["path"]
-                break
-        
-        if not voice_path:
-            voices = self.get_voices()
-            if voices:
-                voice_path = voices[0]["path"]
-            else:
-                return None
-        
-        voice_filename = os.path.basename(voice_path)
-        
-        # Upload to Supabase if configured
-        if self._supabase_url and self._supabase_key:
-            try:
-                from supabase import create_client
-                supabase = create_client(self._supabase_url, self._supabase_key)
-                
-                with open(voice_path, "rb") as f:
-                    voice_data = f.read()
-                
-                supabase.storage.from_("voices").upload(
-                    voice_filename,
-                    voice_data,
-                    {"content-type": "audio/wav", "x-upsert": "true"}
-                )
-                logger.info(f"Voice uploaded to Supabase: {voice_filename}")
-            except Exception as e:
-                logger.debug(f"Voice upload note: {e}")
-        
-        return f"{self._supabase_url}/storage/v1/object/public/voices/{voice_filename}"
+        """Get Supabase URL for voice file (cached, uploaded once per file version)"""
+        return self._voice_registry().resolve(voice)[0]
     
     def generate(self, text: str, voice: str, language: str, output_path: str) -> bool:
         """Generate audio using Replicate XTTS API"""
@@ -664,6 +977,201 @@ class XTTSReplicateEngine(TTSEngine):
             return False
 
 
+# =============================================================================
+# ROUTING ENGINE (best available engine per segment, with failover)
+# =============================================================================
+
+class RoutingEngine(TTSEngine):
+    """
+    Sends each segment to the best available engine and fails over on errors.
+    
+    - Candidates: configured engines at or above the quality tier (TTS_ROUTER_TIER,
+      default "standard" = XTTS only, so a book never switches to a Piper voice)
+    - Ranked by rolling latency, error rate and cost (see tts_router.py)
+    - Per-engine concurrency limits; a full engine is skipped while another has room
+    - An error, a False result or a timeout (TTS_ROUTER_TIMEOUT, default 180s) moves the
+      segment to the next engine; repeated failures take an engine out for a cooldown
+    """
+    
+    def __init__(self, engines: dict, tier: str = None, profiles: dict = None, timeout: float = None,
+                 seconds_per_dollar: float = None):
+        """
+        Args:
+            engines: {engine_id: TTSEngine}, ids as in TTSEngineManager ("piper", "xtts-runpod", ...)
+            tier: Minimum quality tier ("draft" or "standard")
+            profiles: Engine profiles (default: tts_router.engine_profiles())
+            timeout: Seconds per attempt before failing over
+            seconds_per_dollar: How many seconds of waiting one USD is worth
+        """
+        self.engines = engines
+        self.tier = tier or os.getenv("TTS_ROUTER_TIER", "standard")
+        if self.tier not in TIERS:
+            raise ValueError(f"Unknown quality tier '{self.tier}' (use one of {', '.join(TIERS)})")
+        self.timeout = timeout or float(os.getenv("TTS_ROUTER_TIMEOUT", "180"))
+        self.seconds_per_dollar = seconds_per_dollar or float(os.getenv("TTS_ROUTER_SECONDS_PER_DOLLAR", "3600"))
+        profiles = profiles or engine_profiles(list(engines))
+        self.stats = {engine_id: EngineStats(profiles[engine_id]) for engine_id in engines}
+        self._slot_freed = threading.Condition()
+        self._executor = ThreadPoolExecutor(
+            max_workers=sum(s.profile["max_concurrency"] for s in self.stats.values()) or 1,
+            thread_name_prefix="tts-router",
+        )
+    
+    @property
+    def name(self) -> str:
+        return "Router"
+    
+    @property
+    def description(self) -> str:
+        return f"Best available engine per segment ({self.tier} tier and up), with failover"
+    
+    def _eligible(self, engine_id: str) -> bool:
+        engine = self.engines[engine_id]
+        if TIERS[self.stats[engine_id].profile["tier"]] < TIERS[self.tier]:
+            return False
+        if hasattr(engine, "is_configured") and not engine.is_configured():
+            return False
+        return not self.stats[engine_id].is_open()
+    
+    def ranked(self, exclude: set = ()) -> list:
+        """Eligible engine ids, best score first."""
+        candidates = [e for e in self.engines if e not in exclude and self._eligible(e)]
+        return sorted(candidates, key=lambda e: self.stats[e].score(self.seconds_per_dollar))
+    
+    def get_voices(self) -> list:
+        ranked = self.ranked()
+        return self.engines[ranked[0]].get_voices() if ranked else []
+    
+    def preload_voices(self, voices: list):
+        """Preload on every engine the router may use, so failover does not pay for it."""
+        for engine_id in self.ranked():
+            engine = self.engines[engine_id]
+            if hasattr(engine, "preload_voices"):
+                try:
+                    engine.preload_voices(voices)
+                except Exception as e:
+                    logger.warning(f"Router: could not preload voices on {engine_id}: {e}")
+    
+    def _acquire(self, exclude: set):
+        """Reserve a slot on the best engine with room; waits while all candidates are full."""
+        with self._slot_freed:
+            while True:
+                ranked = self.ranked(exclude)
+                if not ranked:
+                    return None
+                for engine_id in ranked:
+                    stats = self.stats[engine_id]
+                    if stats.has_capacity():
+                        stats.in_flight += 1
+                        return engine_id
+                self._slot_freed.wait(timeout=0.5)
+    
+    def _attempt(self, engine_id: str, text: str, voice: str, language: str, output_path: str) -> bool:
+        """One try on one engine; the slot is released when the engine call really ends."""
+        stats = self.stats[engine_id]
+        root, ext = os.path.splitext(output_path)
+        part_path = f"{root}.{engine_id}.part{ext}"
+        abandoned = threading.Event()
+        start = time.monotonic()
+        
+        def done(_future):
+            stats.add_busy(time.monotonic() - start)
+            if abandoned.is_set() and os.path.exists(part_path):
+                os.remove(part_path)
+            with self._slot_freed:
+                stats.in_flight -= 1
+                self._slot_freed.notify_all()
+        
+        future = self._executor.submit(self.engines[engine_id].generate, text, voice, language, part_path)
+        future.add_done_callback(done)
+        timed_out = False
+        try:
+            ok = bool(future.result(timeout=self.timeout)) and os.path.exists(part_path)
+        except FutureTimeout:
+            ok, timed_out = False, True
+            logger.warning(f"Router: {engine_id} did not finish within {self.timeout:.0f}s, failing over")
+        except Exception as e:
+            ok = False
+            logger.warning(f"Router: {engine_id} failed: {e}")
+        stats.record(ok, time.monotonic() - start, timed_out=timed_out)
+        
+        if ok:
+            os.replace(part_path, output_path)
+        else:
+            abandoned.set()
+            if future.done() and os.path.exists(part_path):
+                os.remove(part_path)
+        return ok
+    
+    def generate_with_engine(self, text: str, voice: str, language: str, output_path: str) -> tuple:
+        """
+        Try engines best-first until one succeeds.
+        
+        Returns:
+            (success, engine_id or None, [engine ids tried])
+        """
+        tried = []
+        while True:
+            engine_id = self._acquire(set(tried))
+            if engine_id is None:
+                logger.error(f"Router: no engine left for segment (tried {', '.join(tried) or 'none'})")
+                return False, None, tried
+            tried.append(engine_id)
+            if self._attempt(engine_id, text, voice, language, output_path):
+                return True, engine_id, tried
+    
+    def generate(self, text: str, voice: str, language: str, output_path: str) -> bool:
+        return self.generate_with_engine(text, voice, language, output_path)[0]
+    
+    async def generate_many(self, items: list, voice: str, language: str, on_complete=None) -> dict:
+        """
+        Route many segments concurrently (up to the sum of the engines' limits).
+        
+        Returns:
+            {item_id: {"success", "output_path", "seconds", "engine", "attempts", "error"}}
+        """
+        loop = asyncio.get_running_loop()
+        capacity = sum(s.profile["max_concurrency"] for s in self.stats.values())
+        semaphore = asyncio.Semaphore(max(1, capacity))
+        results = {}
+        
+        with ThreadPoolExecutor(max_workers=max(1, capacity), thread_name_prefix="tts-route") as dispatch:
+            
+            async def run(item: dict):
+                async with semaphore:
+                    start = time.monotonic()
+                    ok, engine_id, tried = await loop.run_in_executor(
+                        dispatch, self.generate_with_engine, item["text"], voice, language, item["output_path"]
+                    )
+                result = {
+                    "success": ok,
+                    "output_path": item["output_path"],
+                    "seconds": round(time.monotonic() - start, 2),
+                    "engine": engine_id,
+                    "attempts": len(tried),
+                    "error": None if ok else f"All engines failed (tried {', '.join(tried) or 'none'})",
+                }
+                results[item["id"]] = result
+                if on_complete:
+                    on_complete(item["id"], result)
+            
+            await asyncio.gather(*(run(item) for item in items))
+        
+        routed = {}
+        for result in results.values():
+            if result["engine"]:
+                routed[result["engine"]] = routed.get(result["engine"], 0) + 1
+        logger.info(f"Router: {sum(routed.values())}/{len(items)} segments ({routed})")
+        return results
+    
+    def engine_stats(self) -> dict:
+        """Per-engine rolling stats, plus whether the engine is currently eligible."""
+        return {
+            engine_id: {**stats.snapshot(self.seconds_per_dollar), "eligible": self._eligible(engine_id)}
+            for engine_id, stats in self.stats.items()
+        }
+
+
 # =============================================================================
 # ENGINE MANAGER
 # =============================================================================
@@ -676,8 +1184,14 @@ class TTSEngineManager:
             "piper": PiperEngine(),
             "xtts-local": XTTSLocalEngine(),
             "xtts-runpod": XTTSRunPodEngine(),
+            "xtts-runpod-async": XTTSRunPodAsyncEngine(),
             "xtts-replicate": XTTSReplicateEngine(),
         }
+        # The router shares the engine instances, so its stats cover direct use too
+        self.router = RoutingEngine({
+            key: self.engines[key] for key in ("piper", "xtts-local", "xtts-runpod", "xtts-replicate")
+        })
+        self.engines["auto"] = self.router
         self._default = "piper"  # Default to fastest free option
     
     def get_engine(self, name: str = None) -> TTSEngine:
@@ -687,7 +1201,8 @@ class TTSEngineManager:
         return self.engines[self._default]
     
     def list_engines(self) -> list:
-        """List all available engines with status"""
+        """List all available engines with status (+ the router's rolling stats per engine)"""
+        router_stats = self.router.engine_stats()
         result = []
         for key, engine in self.engines.items():
             status = {
@@ -698,7 +1213,7 @@ class TTSEngineManager:
             }
             
             # Check if engines are configured
-            if key == "xtts-runpod":
+            if key in ("xtts-runpod", "xtts-runpod-async"):
                 status["available"] = engine.is_configured()
                 if not status["available"]:
                     status["description"] += " (not configured)"
@@ -706,6 +1221,12 @@ class TTSEngineManager:
                 status["available"] = engine.is_configured()
                 if not status["available"]:
                     status["description"] += " (not configured)"
+            elif key == "auto":
+                status["available"] = bool(engine.ranked())
+                status["tier"] = engine.tier
+            
+            if key in router_stats:
+                status["stats"] = router_stats[key]
             
             result.append(status)
         return result
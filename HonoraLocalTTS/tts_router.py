@@ -0,0 +1,147 @@
+"""
+Bookkeeping for RoutingEngine (tts_engines.py): engine profiles and rolling stats.
+
+Every engine the router can use has a profile:
+
+    tier             "draft" (Piper) or "standard" (every XTTS backend)
+    cost_per_second  USD per second of engine time (RunPod/Replicate bill GPU seconds)
+    max_concurrency  segments in flight on that engine at once
+    prior_seconds    expected seconds per segment until real results exist
+
+DEFAULT_PROFILES can be overridden per engine with TTS_ROUTER_ENGINES,
+"engine=tier:cost:limit,..." (e.g. "xtts-runpod=standard:0.00016:8").
+
+EngineStats keeps the last TTS_ROUTER_WINDOW results per engine and turns them into
+a score: expected seconds per segment, divided by the success rate (a failure costs
+a retry elsewhere), plus the expected cost converted to seconds at
+TTS_ROUTER_SECONDS_PER_DOLLAR. Lower is better.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+from piper_worker import default_pool_size
+
+TIERS = {"draft": 0, "standard": 1}
+
+# engine id -> (tier, cost_per_second, max_concurrency, prior_seconds)
+DEFAULT_PROFILES = {
+    "piper": ("draft", 0.0, default_pool_size() or 1, 1.0),
+    "xtts-local": ("standard", 0.0, 1, 30.0),
+    "xtts-runpod": ("standard", 0.00016, 8, 8.0),
+    "xtts-replicate": ("standard", 0.000725, 3, 20.0),
+}
+FALLBACK_PROFILE = ("standard", 0.0, 1, 30.0)
+
+
+def parse_engine_profiles(spec: str) -> dict:
+    """Parse "engine=tier:cost:limit,..." into {engine: (tier, cost, limit)}; empty fields keep the default."""
+    profiles = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        engine, values = item.split("=", 1)
+        engine = engine.strip()
+        default = DEFAULT_PROFILES.get(engine, FALLBACK_PROFILE)
+        tier, cost, limit = (values.split(":") + ["", ""])[:3]
+        tier = tier.strip() or default[0]
+        if tier not in TIERS:
+            raise ValueError(f"Unknown quality tier '{tier}' for {engine} (use one of {', '.join(TIERS)})")
+        profiles[engine] = (tier, float(cost or default[1]), int(limit or default[2]))
+    return profiles
+
+
+def engine_profiles(engine_ids: list, spec: str = None) -> dict:
+    """Full profile per engine id: defaults, then TTS_ROUTER_ENGINES overrides."""
+    overrides = parse_engine_profiles(os.getenv("TTS_ROUTER_ENGINES", "") if spec is None else spec)
+    profiles = {}
+    for engine_id in engine_ids:
+        tier, cost, limit, prior = DEFAULT_PROFILES.get(engine_id, FALLBACK_PROFILE)
+        if engine_id in overrides:
+            tier, cost, limit = overrides[engine_id]
+        profiles[engine_id] = {
+            "tier": tier,
+            "cost_per_second": cost,
+            "max_concurrency": max(1, limit),
+            "prior_seconds": prior,
+        }
+    return profiles
+
+
+class EngineStats:
+    """Rolling latency/error window, concurrency and circuit state for one engine."""
+
+    def __init__(self, profile: dict, window: int = None, max_failures: int = None, cooldown: float = None):
+        self.profile = profile
+        self.results = deque(maxlen=window or int(os.getenv("TTS_ROUTER_WINDOW", "50")))  # (ok, seconds)
+        self.max_failures = max_failures or int(os.getenv("TTS_ROUTER_MAX_FAILURES", "3"))
+        self.cooldown = cooldown if cooldown is not None else float(os.getenv("TTS_ROUTER_COOLDOWN", "60"))
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.busy_seconds = 0.0
+
+    def record(self, ok: bool, seconds: float, timed_out: bool = False):
+        """Outcome of one attempt as the router saw it."""
+        with self.lock:
+            self.results.append((ok, seconds))
+            self.requests += 1
+            if ok:
+                self.consecutive_failures = 0
+                return
+            self.failures += 1
+            self.timeouts += int(timed_out)
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.max_failures:
+                # Take the engine out for a while; the next attempt after that is a probe
+                self.open_until = time.monotonic() + self.cooldown
+                self.consecutive_failures = 0
+
+    def add_busy(self, seconds: float):
+        """Engine time actually used (timed-out attempts keep running and keep costing)."""
+        with self.lock:
+            self.busy_seconds += seconds
+
+    def is_open(self) -> bool:
+        return time.monotonic() < self.open_until
+
+    def has_capacity(self) -> bool:
+        return self.in_flight < self.profile["max_concurrency"]
+
+    def expected_seconds(self) -> float:
+        durations = [seconds for ok, seconds in self.results if ok]
+        return sum(durations) / len(durations) if durations else self.profile["prior_seconds"]
+
+    def error_rate(self) -> float:
+        return sum(1 for ok, _ in self.results if not ok) / len(self.results) if self.results else 0.0
+
+    def score(self, seconds_per_dollar: float) -> float:
+        """Expected cost of routing one segment here, in seconds; lower is better."""
+        seconds = self.expected_seconds()
+        cost = seconds * self.profile["cost_per_second"]
+        success_rate = max(0.05, 1.0 - self.error_rate())
+        return (seconds + cost * seconds_per_dollar) / success_rate
+
+    def snapshot(self, seconds_per_dollar: float) -> dict:
+        with self.lock:
+            return {
+                "tier": self.profile["tier"],
+                "cost_per_second": self.profile["cost_per_second"],
+                "max_concurrency": self.profile["max_concurrency"],
+                "in_flight": self.in_flight,
+                "requests": self.requests,
+                "failures": self.failures,
+                "timeouts": self.timeouts,
+                "error_rate": round(self.error_rate(), 3),
+                "avg_seconds": round(self.expected_seconds(), 2),
+                "window": len(self.results),
+                "circuit_open": self.is_open(),
+                "cost_usd": round(self.busy_seconds * self.profile["cost_per_second"], 4),
+                "score": round(self.score(seconds_per_dollar), 2),
+            }
@@ -0,0 +1,198 @@
+"""
+Per-process registry of voice reference files and their Supabase URLs.
+
+XTTSRunPodEngine and XTTSReplicateEngine used to list the voice folder, read the WAV
+and upsert it to the "voices" bucket on every generate() call - one Supabase upload
+per segment. VoiceRegistry does that work once:
+
+- The voice folder is listed once and kept for VOICE_REGISTRY_TTL seconds (default 3600)
+- A voice is uploaded once per file version (size + mtime); its resolved URL and
+  local path are cached for the same TTL
+- The URL carries "?v=<content hash>", so RunPod workers, which cache downloads by
+  URL, fetch a re-recorded voice instead of reusing the old one
+- invalidate() drops one voice or everything (e.g. after a new voice was added)
+- preload() resolves every voice a job needs before synthesis starts
+
+get_voice_registry() returns the shared registry for a folder + Supabase project.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+VOICE_PREFIX = "AI_Voice_Honora_"
+BUCKET = "voices"
+
+
+def _already_exists(error: Exception) -> bool:
+    """True for the storage error returned when the object is already in the bucket."""
+    message = str(error).lower()
+    return "already exists" in message or "duplicate" in message or "409" in message
+
+
+class VoiceRegistry:
+    """Voice listing + resolved (voice_url, voice_path) pairs with a TTL."""
+
+    def __init__(self, voice_folder: str, supabase_url: str = "", supabase_key: str = "", ttl: float = None):
+        self.voice_folder = voice_folder
+        self.supabase_url = (supabase_url or "").rstrip("/")
+        self.supabase_key = supabase_key or ""
+        self.ttl = ttl if ttl is not None else float(os.getenv("VOICE_REGISTRY_TTL", "3600"))
+        self._supabase = None
+        self._lock = threading.RLock()
+        self._voices = None  # (loaded_at, [voice dicts])
+        self._resolved = {}  # voice -> (resolved_at, voice_url, voice_path)
+        self._uploaded = {}  # voice_path -> (size, mtime_ns, version)
+        self.hits = 0
+        self.misses = 0
+        self.uploads = 0
+        self.listings = 0
+
+    def _fresh(self, loaded_at: float) -> bool:
+        return time.monotonic() - loaded_at < self.ttl
+
+    def _get_supabase(self):
+        if self._supabase is None and self.supabase_url and self.supabase_key:
+            from supabase import create_client
+            self._supabase = create_client(self.supabase_url, self.supabase_key)
+        return self._supabase
+
+    def voices(self) -> list:
+        """Voice files in the folder: [{"id", "name", "path"}], listed at most once per TTL."""
+        with self._lock:
+            if self._voices is None or not self._fresh(self._voices[0]):
+                voices = []
+                if os.path.exists(self.voice_folder):
+                    for f in sorted(os.listdir(self.voice_folder)):
+                        if f.endswith(".wav"):
+                            voices.append({
+                                "id": f,
+                                "name": f.replace(VOICE_PREFIX, "").replace(".wav", ""),
+                                "path": os.path.join(self.voice_folder, f),
+                            })
+                self._voices = (time.monotonic(), voices)
+                self.listings += 1
+            return [dict(v) for v in self._voices[1]]
+
+    def find_path(self, voice: str):
+        """Local file for a voice id or name, else the first voice; None if there are none."""
+        voices = self.voices()
+        for v in voices:
+            if v["id"] == voice or v["name"].lower() == (voice or "").lower():
+                return v["path"]
+        return voices[0]["path"] if voices else None
+
+    def _upload(self, voice_path: str) -> tuple:
+        """
+        Upsert the file to the voices bucket once per file version.
+
+        Returns (version hash, uploaded). Only a successful upload (or an "already
+        exists" answer) is remembered; any other failure is retried on the next call.
+        """
+        stat = os.stat(voice_path)
+        known = self._uploaded.get(voice_path)
+        if known and known[:2] == (stat.st_size, stat.st_mtime_ns):
+            return known[2], True
+
+        with open(voice_path, "rb") as f:
+            voice_data = f.read()
+        version = hashlib.sha256(voice_data).hexdigest()[:12]
+        try:
+            self._get_supabase().storage.from_(BUCKET).upload(
+                os.path.basename(voice_path),
+                voice_data,
+                {"content-type": "audio/wav", "x-upsert": "true"}
+            )
+            self.uploads += 1
+            logger.info(f"Voice uploaded to Supabase: {os.path.basename(voice_path)}")
+        except Exception as e:
+            if not _already_exists(e):
+                logger.warning(f"Voice upload failed for {os.path.basename(voice_path)}, will retry: {e}")
+                return version, False
+            logger.debug(f"Voice already in bucket: {e}")
+        self._uploaded[voice_path] = (stat.st_size, stat.st_mtime_ns, version)
+        return version, True
+
+    def resolve(self, voice: str) -> tuple:
+        """
+        (voice_url, voice_path) for a voice.
+
+        voice_url is None when Supabase is not configured; both are None when the
+        folder has no voice files.
+        """
+        with self._lock:
+            cached = self._resolved.get(voice)
+            if cached and self._fresh(cached[0]) and os.path.exists(cached[2]):
+                self.hits += 1
+                return cached[1], cached[2]
+            self.misses += 1
+
+            voice_path = self.find_path(voice)
+            if not voice_path:
+                return None, None
+
+            voice_url = None
+            uploaded = True
+            if self._get_supabase():
+                version, uploaded = self._upload(voice_path)
+                voice_url = (f"{self.supabase_url}/storage/v1/object/public/{BUCKET}/"
+                             f"{os.path.basename(voice_path)}?v={version}")
+            else:
+                logger.warning("Supabase not configured - cannot use voice_url mode")
+
+            # A failed upload is not cached: the next call tries again
+            if uploaded:
+                self._resolved[voice] = (time.monotonic(), voice_url, voice_path)
+            return voice_url, voice_path
+
+    def preload(self, voices: list) -> dict:
+        """Resolve every voice up front; returns {voice: (voice_url, voice_path)}."""
+        return {voice: self.resolve(voice) for voice in voices}
+
+    def invalidate(self, voice: str = None):
+        """Forget one voice (or the whole listing and every voice) so it is resolved again."""
+        with self._lock:
+            if voice is None:
+                self._voices = None
+                self._resolved.clear()
+                self._uploaded.clear()
+            else:
+                cached = self._resolved.pop(voice, None)
+                if cached:
+                    self._uploaded.pop(cached[2], None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "voices": len(self._voices[1]) if self._voices else 0,
+                "resolved": len(self._resolved),
+                "hits": self.hits,
+                "misses": self.misses,
+                "uploads": self.uploads,
+                "listings": self.listings,
+            }
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_voice_registry(voice_folder: str, supabase_url: str = "", supabase_key: str = "") -> VoiceRegistry:
+    """The process-wide registry for this voice folder and Supabase project."""
+    key = (os.path.abspath(voice_folder), (supabase_url or "").rstrip("/"), supabase_key or "")
+    with _registries_lock:
+        if key not in _registries:
+            _registries[key] = VoiceRegistry(voice_folder, supabase_url, supabase_key)
+        return _registries[key]
+
+
+def invalidate_all():
+    """Drop cached voices in every registry (e.g. after voices were added or replaced)."""
+    with _registries_lock:
+        registries = list(_registries.values())
+    for registry in registries:
+        registry.invalidate()
@@ -0,0 +1,230 @@
+"""
+Content-addressed on-disk cache for synthesized segment audio.
+
+Entries are keyed by sha256(normalized segment text, voice fingerprint, engine, language,
+model version), so re-running v3_generate_tts_audio after a failed chapter, a voice
+change on one chapter or a single typo fix only synthesizes the segments that changed.
+
+- Each entry stores the engine's encoded audio file plus its measured duration
+- Size-bounded: least recently used entries are evicted above Config.AUDIO_CACHE_MAX_MB
+- Bump Config.AUDIO_CACHE_MODEL_VERSION when the TTS model/worker changes its output
+- Bypass reads with Config.AUDIO_CACHE_BYPASS (env AUDIO_CACHE_BYPASS=true)
+- Hit/miss counters via get_audio_cache_stats()
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+from typing import Any, Dict, Optional
+
+from app.audio_segments import normalize_text
+from app.config import Config
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def make_audio_cache_key(text: str, voice: str, engine: str, language: str, model_version: str) -> str:
+    """Build the content hash for one synthesized segment."""
+    payload = json.dumps({
+        "text": normalize_text(text),
+        "voice": voice,
+        "engine": engine,
+        "language": language,
+        "model_version": model_version,
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def voice_fingerprint(voice: str, voice_path: Optional[str] = None) -> str:
+    """
+    Identify a voice by name plus a hash of its reference file, so replacing the
+    file behind an unchanged voice name does not return stale audio.
+    """
+    if not voice_path or not os.path.exists(voice_path):
+        return voice
+    digest = hashlib.sha256()
+    with open(voice_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return f"{voice}@{digest.hexdigest()[:16]}"
+
+
+class AudioCache:
+    """Size-bounded LRU cache of audio files, one audio file + one metadata file per key."""
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def _audio_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.audio")
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _iter_entries(self):
+        """Yield the audio path of every stored entry."""
+        if not os.path.isdir(self.cache_dir):
+            return
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".audio"):
+                    yield os.path.join(root, name)
+
+    def _entry_size(self, audio_path: str) -> int:
+        size = os.path.getsize(audio_path)
+        meta_path = audio_path[:-len(".audio")] + ".json"
+        if os.path.exists(meta_path):
+            size += os.path.getsize(meta_path)
+        return size
+
+    def _ensure_size_known(self):
+        if self._total_bytes is None:
+            total = 0
+            for p in self._iter_entries():
+                try:
+                    total += self._entry_size(p)
+                except FileNotFoundError:
+                    continue
+            self._total_bytes = total
+
+    def get(self, key: str, output_path: str) -> Optional[int]:
+        """
+        Copy the cached audio for `key` to output_path.
+
+        Returns:
+            Stored duration in milliseconds, or None on a miss
+        """
+        audio_path = self._audio_path(key)
+        try:
+            with open(self._meta_path(key), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            shutil.copyfile(audio_path, output_path)
+        except (FileNotFoundError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # Touch for LRU ordering
+        try:
+            os.utime(audio_path, None)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return meta["duration_ms"]
+
+    def get_many(self, requests: list) -> Dict[int, int]:
+        """
+        Look up many entries at once.
+
+        Args:
+            requests: [(key, output_path), ...]
+
+        Returns:
+            {index in requests: duration_ms} for the hits
+        """
+        found = {}
+        for i, (key, output_path) in enumerate(requests):
+            duration_ms = self.get(key, output_path)
+            if duration_ms is not None:
+                found[i] = duration_ms
+        return found
+
+    def put(self, key: str, source_path: str, duration_ms: int):
+        """Store an audio file with its duration and evict least recently used entries if over budget."""
+        audio_path = self._audio_path(key)
+        meta_path = self._meta_path(key)
+        os.makedirs(os.path.dirname(audio_path), exist_ok=True)
+
+        with self._lock:
+            self._ensure_size_known()
+            old_size = self._entry_size(audio_path) if os.path.exists(audio_path) else 0
+
+            # Audio first, metadata last: get() only sees entries whose audio is complete
+            suffix = f".{threading.get_ident()}.tmp"
+            shutil.copyfile(source_path, audio_path + suffix)
+            os.replace(audio_path + suffix, audio_path)
+            with open(meta_path + suffix, "w", encoding="utf-8") as f:
+                json.dump({"duration_ms": duration_ms, "bytes": os.path.getsize(audio_path)}, f)
+            os.replace(meta_path + suffix, meta_path)
+
+            self._total_bytes += self._entry_size(audio_path) - old_size
+            self.writes += 1
+
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Remove oldest entries until the cache is at 90% of its budget."""
+        target = int(self.max_bytes * 0.9)
+        entries = []
+        for p in self._iter_entries():
+            try:
+                entries.append((os.stat(p).st_mtime, self._entry_size(p), p))
+            except FileNotFoundError:
+                continue
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, p in entries:
+            if total <= target:
+                break
+            try:
+                # Metadata first, so a concurrent get() never finds metadata without audio
+                meta_path = p[:-len(".audio")] + ".json"
+                if os.path.exists(meta_path):
+                    os.remove(meta_path)
+                os.remove(p)
+                total -= size
+                self.evictions += 1
+            except FileNotFoundError:
+                continue
+        self._total_bytes = total
+        logger.info(f"[AudioCache] Evicted down to {total / 1024 / 1024:.1f} MB")
+
+    def clear(self):
+        with self._lock:
+            if os.path.isdir(self.cache_dir):
+                shutil.rmtree(self.cache_dir)
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._ensure_size_known()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "size_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "bypass": Config.AUDIO_CACHE_BYPASS,
+            }
+
+
+# Lazy initialization
+_audio_cache: Optional[AudioCache] = None
+
+
+def get_audio_cache() -> AudioCache:
+    """Get the process-wide segment audio cache."""
+    global _audio_cache
+    if _audio_cache is None:
+        _audio_cache = AudioCache(Config.AUDIO_CACHE_DIR, Config.AUDIO_CACHE_MAX_MB * 1024 * 1024)
+    return _audio_cache
+
+
+def get_audio_cache_stats() -> Dict[str, Any]:
+    return get_audio_cache().stats()
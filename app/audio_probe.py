@@ -0,0 +1,245 @@
+"""
+Native audio duration probing for WAV and M4A/MP4 files.
+
+get_audio_duration_ms() used to launch one ffprobe process per segment and per group
+(thousands per book). This module reads durations straight from the container headers:
+- WAV: RIFF "fmt " byte rate and "data" chunk size
+- M4A/MP4: mvhd (movie header) duration/timescale, or the sound track's mdhd
+
+Only the headers are read (the sample data is skipped with seek()), so probing is
+cheap enough to run over a whole directory at once with probe_many()/probe_directory().
+ffprobe remains the fallback for anything the parsers do not understand.
+"""
+
+import os
+import struct
+import subprocess
+from typing import Dict, Iterable, List, Optional
+
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+AUDIO_EXTENSIONS = (".wav", ".m4a", ".mp4", ".aac")
+
+# Boxes that only contain other boxes on the way to mvhd/mdhd/hdlr
+_MP4_CONTAINERS = {b"moov", b"trak", b"mdia"}
+
+
+class AudioProbeError(ValueError):
+    """Raised when a file's duration cannot be determined."""
+    pass
+
+
+# ============================================
+# WAV (RIFF)
+# ============================================
+
+def wav_duration_ms(path: str) -> int:
+    """
+    Duration of a PCM/extensible WAV file from its RIFF header.
+
+    Streamed WAVs whose header was never finalized (data size 0 or 0xFFFFFFFF)
+    are measured from the file size instead.
+    """
+    file_size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            raise AudioProbeError(f"Not a RIFF/WAVE file: {path}")
+
+        byte_rate = None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                raise AudioProbeError(f"No data chunk in WAV: {path}")
+            chunk_id, chunk_size = struct.unpack("<4sI", chunk)
+
+            if chunk_id == b"fmt ":
+                fmt = f.read(chunk_size)
+                if len(fmt) < 16:
+                    raise AudioProbeError(f"Truncated fmt chunk in WAV: {path}")
+                # audio_format, channels, sample_rate, byte_rate
+                _, _, _, byte_rate = struct.unpack("<HHII", fmt[:12])
+                if chunk_size % 2:
+                    f.seek(1, os.SEEK_CUR)
+                continue
+
+            if chunk_id == b"data":
+                if not byte_rate:
+                    raise AudioProbeError(f"WAV data chunk before a valid fmt chunk: {path}")
+                available = file_size - f.tell()
+                if chunk_size in (0, 0xFFFFFFFF) or chunk_size > available:
+                    chunk_size = available
+                return int(chunk_size * 1000 / byte_rate)
+
+            # LIST, fact, etc. (chunks are word-aligned)
+            f.seek(chunk_size + (chunk_size % 2), os.SEEK_CUR)
+
+
+# ============================================
+# M4A / MP4 (ISO base media)
+# ============================================
+
+def _iter_boxes(f, start: int, end: int):
+    """Yield (type, payload_start, box_end) for the boxes in [start, end)."""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack(">I4s", header)
+        payload = pos + 8
+        if size == 1:
+            large = f.read(8)
+            if len(large) < 8:
+                return
+            size = struct.unpack(">Q", large)[0]
+            payload = pos + 16
+        elif size == 0:
+            size = end - pos
+        if size < payload - pos:
+            raise AudioProbeError(f"Corrupt MP4 box size {size} at offset {pos}")
+        yield box_type, payload, min(pos + size, end)
+        pos += size
+
+
+def _read_time_header(f, payload: int) -> tuple:
+    """(timescale, duration) from an mvhd or mdhd box (versions 0 and 1)."""
+    f.seek(payload)
+    version = f.read(4)[0]
+    if version == 1:
+        # creation(8) modification(8) timescale(4) duration(8)
+        data = f.read(28)
+        timescale, duration = struct.unpack(">IQ", data[16:28])
+    else:
+        # creation(4) modification(4) timescale(4) duration(4)
+        data = f.read(16)
+        timescale, duration = struct.unpack(">II", data[8:16])
+    return timescale, duration
+
+
+def mp4_duration_ms(path: str) -> int:
+    """
+    Duration of an M4A/MP4 file from its moov box.
+
+    Uses mvhd (the whole presentation, like ffprobe's format duration) and falls
+    back to the sound track's mdhd when mvhd carries no duration.
+    """
+    file_size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        f.seek(4)
+        if f.read(4) != b"ftyp":
+            raise AudioProbeError(f"Not an MP4/M4A file: {path}")
+
+        movie = None
+        tracks: List[tuple] = []  # (handler_type, timescale, duration)
+
+        def walk(start: int, end: int, track: Optional[dict]):
+            nonlocal movie
+            for box_type, payload, box_end in _iter_boxes(f, start, end):
+                if box_type == b"mvhd":
+                    movie = _read_time_header(f, payload)
+                elif box_type == b"mdhd" and track is not None:
+                    track["time"] = _read_time_header(f, payload)
+                elif box_type == b"hdlr" and track is not None:
+                    # version/flags(4) pre_defined(4) handler_type(4)
+                    f.seek(payload + 8)
+                    track["handler"] = f.read(4)
+                elif box_type in _MP4_CONTAINERS:
+                    if box_type == b"trak":
+                        info = {}
+                        walk(payload, box_end, info)
+                        if "time" in info:
+                            tracks.append((info.get("handler"), *info["time"]))
+                    else:
+                        walk(payload, box_end, track)
+
+        walk(0, file_size, None)
+
+        if movie and movie[0] and movie[1]:
+            return int(movie[1] * 1000 / movie[0])
+        for handler, timescale, duration in tracks:
+            if handler == b"soun" and timescale and duration:
+                return int(duration * 1000 / timescale)
+        raise AudioProbeError(f"No duration in MP4 headers (fragmented or empty file?): {path}")
+
+
+# ============================================
+# DISPATCH + FFPROBE FALLBACK
+# ============================================
+
+def native_duration_ms(path: str) -> int:
+    """Duration from the file headers, chosen by magic bytes (not the extension)."""
+    with open(path, "rb") as f:
+        head = f.read(12)
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return wav_duration_ms(path)
+    if head[4:8] == b"ftyp":
+        return mp4_duration_ms(path)
+    raise AudioProbeError(f"Unsupported audio container: {path}")
+
+
+def ffprobe_duration_ms(path: str) -> int:
+    """Duration via an ffprobe subprocess (slow path)."""
+    try:
+        result = subprocess.run(
+            [
+                "ffprobe", "-v", "quiet",
+                "-show_entries", "format=duration",
+                "-of", "default=noprint_wrappers=1:nokey=1",
+                path
+            ],
+            capture_output=True,
+            text=True,
+            timeout=10
+        )
+        return int(float(result.stdout.strip()) * 1000)
+    except (OSError, ValueError, subprocess.SubprocessError) as e:
+        raise AudioProbeError(f"ffprobe could not read {path}: {e}") from e
+
+
+def probe_duration_ms(path: str, ffprobe_fallback: bool = True) -> int:
+    """
+    Duration of one audio file in milliseconds.
+
+    Raises:
+        AudioProbeError: if neither the native parser nor ffprobe can read the file
+    """
+    try:
+        return native_duration_ms(path)
+    except (AudioProbeError, OSError, struct.error, IndexError) as e:
+        if not ffprobe_fallback or not os.path.exists(path):
+            raise AudioProbeError(str(e)) from e
+        logger.debug(f"Native probe failed for {path} ({e}), trying ffprobe")
+        return ffprobe_duration_ms(path)
+
+
+def probe_many(paths: Iterable[str], ffprobe_fallback: bool = True) -> Dict[str, Optional[int]]:
+    """
+    Probe many files in one call.
+
+    Returns:
+        {path: duration_ms}, with None for files that could not be read
+    """
+    durations = {}
+    for path in paths:
+        try:
+            durations[path] = probe_duration_ms(path, ffprobe_fallback)
+        except AudioProbeError as e:
+            logger.error(f"Error reading audio duration: {e}")
+            durations[path] = None
+    return durations
+
+
+def probe_directory(directory: str, extensions: tuple = AUDIO_EXTENSIONS, ffprobe_fallback: bool = True) -> Dict[str, Optional[int]]:
+    """
+    Probe every audio file in a directory (not recursive).
+
+    Returns:
+        {file name: duration_ms}, with None for files that could not be read
+    """
+    names = sorted(n for n in os.listdir(directory) if n.lower().endswith(extensions))
+    durations = probe_many((os.path.join(directory, n) for n in names), ffprobe_fallback)
+    return {os.path.basename(path): ms for path, ms in durations.items()}
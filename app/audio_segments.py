@@ -1,6 +1,6 @@
 """
 Audio Segments & Groups Module for V3.1 Pipeline
-Handles: segment merging, TTS generation, duration reading, grouping, concat, upload
+Handles: segment merging, TTS generation, duration reading, grouping, concat, chapter encoding, upload
 """
 
 import os
@@ -9,7 +9,9 @@ import uuid
 import subprocess
 import logging
 import hashlib
+import tempfile
 import unicodedata
+import wave
 from typing import List, Dict, Optional
 from pathlib import Path
 
@@ -23,6 +25,7 @@ MIN_CHARS = 60          # Minimum segment length
 MAX_CHARS = 420         # Maximum segment length (optimal for clone focus)
 MIN_WORDS = 3           # Minimum word count
 TARGET_GROUP_DURATION_MS = 35000  # 35 seconds per group
+GROUP_AUDIO_BITRATE = "128k"
 
 # Storage cleanup: False in prod, True in dev/QA
 KEEP_SEGMENT_AUDIO = os.getenv("KEEP_SEGMENT_AUDIO", "false").lower() == "true"
@@ -53,13 +56,11 @@ def create_chapter_build(chapter_id: str, segments: List[Dict]) -> str:
         build_id: UUID of the created build
     """
     from app.chapters import get_supabase
+    from app.span_alignment import canonical_text as build_canonical_text
     supabase = get_supabase()
     
     # Build canonical_text from normalized segments
-    canonical_text = ' '.join(
-        s.get('text_normalized', normalize_text(s['text'])) 
-        for s in segments
-    )
+    canonical_text = build_canonical_text(segments)
     canonical_hash = hashlib.sha256(canonical_text.encode('utf-8')).hexdigest()
     
     # Call atomic RPC
@@ -190,27 +191,15 @@ def process_segments(raw_sections: List[str]) -> List[Dict]:
 
 def get_audio_duration_ms(audio_path: str) -> int:
     """
-    Read actual audio duration using ffprobe.
+    Read actual audio duration from the WAV/M4A headers (ffprobe only as fallback).
     Returns duration in milliseconds.
+    
+    Raises:
+        AudioProbeError: if the duration cannot be read (no silent guesses that
+        would corrupt group timing)
     """
-    try:
-        result = subprocess.run(
-            [
-                "ffprobe", "-v", "quiet",
-                "-show_entries", "format=duration",
-                "-of", "default=noprint_wrappers=1:nokey=1",
-                audio_path
-            ],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        duration_sec = float(result.stdout.strip())
-        return int(duration_sec * 1000)
-    except Exception as e:
-        logger.error(f"Error reading audio duration: {e}")
-        # Fallback: estimate from file size (rough)
-        return 5000  # Default 5 seconds
+    from app.audio_probe import probe_duration_ms
+    return probe_duration_ms(audio_path)
 
 
 # ============================================
@@ -232,7 +221,7 @@ def group_segments(segments: List[Dict]) -> List[Dict]:
     chapter_time = 0
     
     for seg in segments:
-        seg_duration = seg.get("duration_ms", 5000)  # Use measured duration
+        seg_duration = seg.get("duration_ms", 0)  # Measured duration; failed segments take no time
         
         # Check if adding this segment exceeds target
         if current_group["duration_ms"] + seg_duration > TARGET_GROUP_DURATION_MS and current_group["segments"]:
@@ -267,6 +256,25 @@ def group_segments(segments: List[Dict]) -> List[Dict]:
     return groups
 
 
+def retime_groups(groups: List[Dict]) -> List[Dict]:
+    """
+    Recompute offset_in_group_ms and start_time_ms from measured durations.
+    
+    For groups concatenated one by one (concat_group_audio fallback): segment offsets
+    follow the probed segment durations, chapter start times follow each group's
+    measured duration_ms (0 for a group whose audio could not be built).
+    """
+    chapter_time = 0
+    for group in groups:
+        offset = 0
+        for seg in group["segments"]:
+            seg["offset_in_group_ms"] = offset
+            offset += seg.get("duration_ms", 0)
+        group["start_time_ms"] = chapter_time
+        chapter_time += group.get("duration_ms", 0)
+    return groups
+
+
 # ============================================
 # AUDIO CONCATENATION
 # ============================================
@@ -298,7 +306,7 @@ def concat_group_audio(group: Dict, output_dir: str) -> str:
             [
                 "ffmpeg", "-y", "-f", "concat", "-safe", "0",
                 "-i", list_path,
-                "-c:a", "aac", "-b:a", "128k",
+                "-c:a", "aac", "-b:a", GROUP_AUDIO_BITRATE,
                 "-movflags", "+faststart",
                 output_path
             ],
@@ -325,6 +333,182 @@ def concat_group_audio(group: Dict, output_dir: str) -> str:
     return output_path
 
 
+# ============================================
+# CHAPTER ENCODER (single ffmpeg pass for all groups)
+# ============================================
+
+# ffmpeg raw PCM formats by WAV sample width
+PCM_FORMATS = {1: "u8", 2: "s16le", 3: "s24le", 4: "s32le"}
+
+
+class ChapterEncodeError(Exception):
+    """Raised when a chapter cannot be encoded in one pass (caller falls back to concat_group_audio)."""
+    pass
+
+
+def plan_chapter_encode(groups: List[Dict]) -> Dict:
+    """
+    Read the segment WAV headers and lay the chapter out in samples.
+    
+    Every segment's duration, offset in its group and every group's duration and
+    start time are derived from sample counts, so they match the encoded audio
+    exactly. Segments without audio contribute no samples.
+    
+    Returns:
+        {"params": (channels, sampwidth, rate), "groups": [{"start_sample", "sample_count",
+         "segments": [(audio_path, start_sample_in_group, frames)]}]}
+    
+    Raises:
+        ChapterEncodeError: if a WAV is unreadable, a segment format differs, or a group is empty
+    """
+    params = None
+    planned = []
+    chapter_samples = 0
+    
+    for group in groups:
+        group_samples = 0
+        entries = []
+        for seg in group["segments"]:
+            path = seg.get("audio_path")
+            if not path:
+                continue
+            try:
+                with wave.open(path, "rb") as w:
+                    seg_params = (w.getnchannels(), w.getsampwidth(), w.getframerate())
+                    frames = w.getnframes()
+            except (wave.Error, EOFError, OSError) as e:
+                raise ChapterEncodeError(f"Cannot stream {path}: {e}")
+            if params is None:
+                params = seg_params
+            elif seg_params != params:
+                raise ChapterEncodeError(f"Segment format {seg_params} differs from chapter format {params}: {path}")
+            entries.append((path, group_samples, frames))
+            group_samples += frames
+        
+        if not entries:
+            raise ChapterEncodeError(f"No audio in group {group.get('group_index')}")
+        planned.append({"start_sample": chapter_samples, "sample_count": group_samples, "segments": entries})
+        chapter_samples += group_samples
+    
+    if params is None:
+        raise ChapterEncodeError("No segment audio in chapter")
+    if params[1] not in PCM_FORMATS:
+        raise ChapterEncodeError(f"Unsupported sample width: {params[1]} bytes")
+    return {"params": params, "groups": planned}
+
+
+def build_chapter_encode_command(plan: Dict, output_paths: List[str]) -> List[str]:
+    """
+    ffmpeg command that reads the chapter as raw PCM on stdin and writes one M4A per
+    group, trimmed at exact sample offsets (asplit -> atrim per group).
+    """
+    channels, sampwidth, rate = plan["params"]
+    groups = plan["groups"]
+    
+    labels = "".join(f"[s{i}]" for i in range(len(groups)))
+    filters = [f"[0:a]asplit={len(groups)}{labels}"]
+    for i, g in enumerate(groups):
+        end = g["start_sample"] + g["sample_count"]
+        filters.append(f"[s{i}]atrim=start_sample={g['start_sample']}:end_sample={end},asetpts=PTS-STARTPTS[g{i}]")
+    
+    cmd = [
+        "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+        "-f", PCM_FORMATS[sampwidth], "-ar", str(rate), "-ac", str(channels), "-i", "pipe:0",
+        "-filter_complex", ";".join(filters),
+    ]
+    for i, path in enumerate(output_paths):
+        cmd += ["-map", f"[g{i}]", "-c:a", "aac", "-b:a", GROUP_AUDIO_BITRATE, "-movflags", "+faststart", path]
+    return cmd
+
+
+def encode_chapter_groups(groups: List[Dict], output_dir: str) -> List[Dict]:
+    """
+    Encode all groups of a chapter in one ffmpeg process.
+    
+    Segment PCM is streamed into a single encoder process (no concat list files, one
+    process start-up per chapter instead of per group). Sets on each group:
+    local_audio_path, duration_ms, start_time_ms, sample_count; and on each segment:
+    duration_ms, offset_in_group_ms - all sample-accurate, so no re-probe is needed.
+    
+    Returns:
+        [{"group_index", "path", "duration_ms", "start_time_ms"}] per group
+    
+    Raises:
+        ChapterEncodeError: if the chapter cannot be streamed or ffmpeg fails
+    """
+    plan = plan_chapter_encode(groups)
+    rate = plan["params"][2]
+    output_paths = [os.path.join(output_dir, f"{uuid.uuid4()}.m4a") for _ in groups]
+    cmd = build_chapter_encode_command(plan, output_paths)
+    
+    with tempfile.TemporaryFile() as stderr:
+        try:
+            proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=stderr)
+        except OSError as e:
+            raise ChapterEncodeError(f"Cannot start ffmpeg: {e}")
+        try:
+            for g in plan["groups"]:
+                for path, _, _ in g["segments"]:
+                    with wave.open(path, "rb") as w:
+                        while True:
+                            frames = w.readframes(65536)
+                            if not frames:
+                                break
+                            proc.stdin.write(frames)
+            proc.stdin.close()
+            returncode = proc.wait(timeout=600)
+        except (BrokenPipeError, subprocess.TimeoutExpired):
+            # ffmpeg exited early (its error is in stderr) or hung
+            proc.kill()
+            returncode = proc.wait() or -1
+        
+        if returncode != 0:
+            stderr.seek(0)
+            message = stderr.read().decode(errors="replace")[-2000:]
+            for path in output_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+            raise ChapterEncodeError(f"ffmpeg chapter encode failed ({returncode}): {message}")
+    
+    def to_ms(samples: int) -> int:
+        return int(samples * 1000 / rate)
+    
+    results = []
+    for group, g, path in zip(groups, plan["groups"], output_paths):
+        streamed = iter(g["segments"])
+        position = 0
+        for seg in group["segments"]:
+            if seg.get("audio_path"):
+                _, position, frames = next(streamed)
+                seg["offset_in_group_ms"] = to_ms(position)
+                seg["duration_ms"] = to_ms(frames)
+                position += frames
+            else:
+                # Failed segment: not in the audio, so it takes no time at its position
+                seg["offset_in_group_ms"] = to_ms(position)
+                seg["duration_ms"] = 0
+        group["local_audio_path"] = path
+        group["sample_count"] = g["sample_count"]
+        group["duration_ms"] = to_ms(g["sample_count"])
+        group["start_time_ms"] = to_ms(g["start_sample"])
+        results.append({
+            "group_index": group.get("group_index"),
+            "path": path,
+            "duration_ms": group["duration_ms"],
+            "start_time_ms": group["start_time_ms"],
+        })
+    
+    # Storage cleanup (prod mode)
+    if not KEEP_SEGMENT_AUDIO:
+        for g in plan["groups"]:
+            for path, _, _ in g["segments"]:
+                if os.path.exists(path):
+                    os.remove(path)
+    
+    logger.info(f"Encoded {len(groups)} groups in one pass ({to_ms(sum(g['sample_count'] for g in plan['groups']))} ms)")
+    return results
+
+
 # ============================================
 # SUPABASE UPLOAD
 # ============================================
@@ -363,27 +547,35 @@ def save_groups_to_supabase(
     chapter_id: str,
     build_id: str,  # TTS-First v3.1: Required for linking to chapter_build
     groups: List[Dict],
-    paragraph_id_map: Dict[int, str]
+    paragraph_id_map: Dict[int, str],
+    writer=None
 ) -> List[str]:
     """
     Save audio_groups and tts_segments to Supabase.
     
+    All rows of the chapter are built first and written as chunked array inserts
+    (see app/bulk_writer.py); group ids are generated client-side so the segment
+    rows can reference them without waiting for the group insert.
+    
     Args:
         chapter_id: UUID of chapter
         build_id: UUID of chapter_build (TTS-First v3.1)
         groups: List of group dicts with segments
         paragraph_id_map: Maps segment_index -> paragraph_id
+        writer: BulkWriter to use (one is created when omitted)
     
     Returns: List of created group IDs
     """
-    from app.chapters import get_supabase
-    supabase = get_supabase()
+    from app.bulk_writer import BulkWriter, new_id
+    writer = writer or BulkWriter()
     
-    group_ids = []
+    group_rows = []
+    segment_rows = []
     
     for group in groups:
-        # Insert audio_group with build_id
-        group_result = supabase.table("audio_groups").insert({
+        group_id = new_id()
+        group_rows.append({
+            "id": group_id,
             "chapter_id": chapter_id,
             "build_id": build_id,  # TTS-First v3.1
             "group_index": group["group_index"],
@@ -392,29 +584,27 @@ def save_groups_to_supabase(
             "start_time_ms": group["start_time_ms"],
             "start_segment_index": group["start_segment_index"],
             "end_segment_index": group["end_segment_index"]
-        }).execute()
+        })
         
-        group_id = group_result.data[0]["id"]
-        group_ids.append(group_id)
-        
-        # Insert segments for this group
         for seg in group["segments"]:
-            para_id = paragraph_id_map.get(seg["segment_index"])
-            
-            supabase.table("tts_segments").insert({
+            segment_rows.append({
                 "chapter_id": chapter_id,
                 "build_id": build_id,  # TTS-First v3.1
                 "segment_index": seg["segment_index"],
                 "text": seg["text"],
                 "text_normalized": seg.get("text_normalized"),  # TTS-First v3.1
-                "paragraph_id": para_id,
+                "paragraph_id": paragraph_id_map.get(seg["segment_index"]),
                 "duration_ms": seg.get("duration_ms", 0),
                 "group_id": group_id,
                 "offset_in_group_ms": seg["offset_in_group_ms"]
-            }).execute()
+            })
     
-    logger.info(f"Saved {len(groups)} groups with segments to Supabase (build_id: {build_id})")
-    return group_ids
+    # Groups first: tts_segments.group_id references audio_groups.id
+    writer.insert("audio_groups", group_rows)
+    writer.insert("tts_segments", segment_rows)
+    
+    logger.info(f"Saved {len(groups)} groups with {len(segment_rows)} segments to Supabase (build_id: {build_id})")
+    return [row["id"] for row in group_rows]
 
 
 def update_chapter_audio_version(chapter_id: str, build_id: str = None, version: str = "v2"):
@@ -437,11 +627,27 @@ def update_chapter_audio_version(chapter_id: str, build_id: str = None, version:
     logger.info(f"Updated chapter {chapter_id}: audio_version={version}, build_id={build_id}")
 
 
+def compute_paragraph_spans(paragraphs: List[Dict], segments: List[Dict]) -> List[tuple]:
+    """
+    (start_segment_index, end_segment_index) for every paragraph.
+    
+    Paragraphs are placed on the chapter's canonical text by character offset
+    (see app/span_alignment.py).
+    """
+    from app.span_alignment import align_paragraphs
+    return [
+        (span["start_segment_index"], span["end_segment_index"])
+        for span in align_paragraphs(paragraphs, segments)["spans"]
+    ]
+
+
 def generate_paragraph_spans(
     chapter_id: str,
     build_id: str,
     paragraphs: List[Dict],
-    segments: List[Dict]
+    segments: List[Dict],
+    writer=None,
+    alignment: Optional[Dict] = None
 ) -> List[str]:
     """
     Generate paragraph_spans linking paragraphs to segment ranges.
@@ -454,57 +660,32 @@ def generate_paragraph_spans(
         build_id: UUID of chapter_build
         paragraphs: List of paragraph dicts with 'text' keys
         segments: List of segment dicts with 'text_normalized' keys
+        writer: BulkWriter to use (one is created when omitted)
+        alignment: align_paragraphs() result, if the caller already has one
         
     Returns: List of created span IDs
     """
-    from app.chapters import get_supabase
-    supabase = get_supabase()
+    from app.bulk_writer import BulkWriter, new_id
+    from app.span_alignment import align_paragraphs
     
     if not paragraphs or not segments:
         logger.warning(f"No paragraphs or segments to create spans for chapter {chapter_id}")
         return []
     
-    span_ids = []
-    current_segment = 0
-    
-    for para_idx, para in enumerate(paragraphs):
-        para_text = normalize_text(para.get('text', ''))
-        
-        # Find which segments belong to this paragraph
-        start_segment = current_segment
-        matched_text = ''
-        
-        # Greedily match segments until we've covered this paragraph's text
-        while current_segment < len(segments):
-            seg_text = segments[current_segment].get('text_normalized', '')
-            matched_text = (matched_text + ' ' + seg_text).strip()
-            
-            current_segment += 1
-            
-            # Check if we have enough text (allowing for minor differences)
-            if len(matched_text) >= len(para_text) * 0.8:
-                break
-        
-        end_segment = current_segment - 1
-        
-        # Ensure valid range
-        if end_segment < start_segment:
-            end_segment = start_segment
-        if end_segment >= len(segments):
-            end_segment = len(segments) - 1
-        
-        # Create span record
-        result = supabase.table("paragraph_spans").insert({
+    writer = writer or BulkWriter()
+    alignment = alignment or align_paragraphs(paragraphs, segments)
+    rows = [
+        {
+            "id": new_id(),
             "chapter_id": chapter_id,
             "build_id": build_id,
-            "paragraph_index": para_idx,
-            "start_segment_index": start_segment,
-            "end_segment_index": end_segment
-        }).execute()
-        
-        if result.data:
-            span_ids.append(result.data[0]["id"])
-    
-    logger.info(f"Created {len(span_ids)} paragraph_spans for chapter {chapter_id}")
-    return span_ids
-
+            "paragraph_index": span["paragraph_index"],
+            "start_segment_index": span["start_segment_index"],
+            "end_segment_index": span["end_segment_index"]
+        }
+        for span in alignment["spans"]
+    ]
+    writer.insert("paragraph_spans", rows)
+    
+    logger.info(f"Created {len(rows)} paragraph_spans for chapter {chapter_id}")
+    return [row["id"] for row in rows]
@@ -0,0 +1,421 @@
+"""
+Delta re-upload of a V3 book (v3_sync_to_supabase).
+
+Re-running the pipeline on a corrected manuscript used to mean a full upload: a
+new book with every chapter, paragraph and TTS chunk written again and every
+chapter_build recomputed, even when a handful of paragraphs changed. Every
+content row now carries a content_hash (sha256 hex of its stored text, see
+docs/supabase-content-hash-migration.sql), so a re-upload can diff instead:
+
+- fetch_remote_book() reads only ids, indices and hashes for the book (paged
+  selects, no text)
+- plan_book_sync() matches local rows to remote rows per chapter: same index and
+  hash is left alone, the same hash at another index is an index-only update,
+  new text at an existing index is an update that keeps the row id (so
+  tts_segments.paragraph_id keeps pointing at it), anything else is an insert or
+  a delete. Link rows are rewritten only for chapters whose id order changed
+- A chapter's expected canonical text (what create_chapter_build() would store)
+  is computed from its current sections with process_segments(). Chapters with
+  audio whose expected text differs from their current build's canonical_hash
+  are listed for a rebuild; the rest keep their build, audio groups and spans.
+  A rebuild whose local segments (from the last TTS run) do not match the
+  expected text needs TTS first
+- apply_book_sync() writes the whole delta with the apply_book_sync RPC in one
+  transaction (chunked per-table writes when the RPC is not deployed)
+
+plan_book_sync() is pure, so a dry run reports planned row counts per table
+without writing anything.
+"""
+
+import hashlib
+import json
+from typing import Dict, List, Optional
+
+from app.bulk_writer import BulkWriter, new_id
+from app.chapters import (
+    _is_missing_rpc,
+    chapter_content_hash,
+    chapter_link_rows,
+    chapter_tts_chunks,
+    content_hash,
+    get_supabase,
+)
+from app.audio_segments import process_segments
+from app.logger import get_logger
+from app.span_alignment import canonical_text
+
+logger = get_logger(__name__)
+
+# Rows per paged select, and ids per in_() filter (keeps the URL short)
+FETCH_PAGE_SIZE = 1000
+IN_FILTER_SIZE = 100
+
+# None = not tried yet; False once PostgREST reports the function missing
+_sync_rpc_available = None
+
+
+def canonical_hash(segments: List[Dict]) -> str:
+    """chapter_builds.canonical_hash for a chapter's segments."""
+    return hashlib.sha256(canonical_text(segments).encode('utf-8')).hexdigest()
+
+
+def expected_canonical_hash(chapter: Dict) -> str:
+    """canonical_hash of the segments TTS would produce from the chapter's current sections."""
+    section_texts = [s["text"] for s in chapter.get("sections", []) if s.get("text")]
+    return canonical_hash(process_segments(section_texts))
+
+
+# ============================================
+# REMOTE STATE
+# ============================================
+
+def _select_all(build_query, page_size: Optional[int] = None) -> List[Dict]:
+    """All rows of a select, FETCH_PAGE_SIZE at a time (PostgREST caps a response)."""
+    page_size = page_size or FETCH_PAGE_SIZE
+    rows = []
+    while True:
+        page = build_query().range(len(rows), len(rows) + page_size - 1).execute().data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+
+
+def _select_in(supabase, table: str, columns: str, field: str, values: List[str]) -> List[Dict]:
+    """Rows of `table` whose `field` is in `values`, IN_FILTER_SIZE values per filter."""
+    rows = []
+    for start in range(0, len(values), IN_FILTER_SIZE):
+        batch = values[start:start + IN_FILTER_SIZE]
+        rows.extend(_select_all(lambda: supabase.table(table).select(columns).in_(field, batch)))
+    return rows
+
+
+def fetch_remote_book(book_id: str, supabase=None) -> Dict[int, Dict]:
+    """
+    Ids, indices and content hashes of a book's stored chapters.
+
+    Returns:
+        {chapter_index: {"id", "node_id", "content_hash", "canonical_hash",
+                         "paragraphs": [{"id", "paragraph_index", "content_hash"}],
+                         "tts_chunks": [{"id", "chunk_index", "content_hash"}]}}
+    """
+    supabase = supabase or get_supabase()
+
+    chapters = _select_all(lambda: supabase.table("chapters")
+                           .select("id, chapter_index, node_id, content_hash, current_build_id")
+                           .eq("book_id", book_id))
+    chapter_ids = [ch["id"] for ch in chapters]
+    paragraphs = _select_in(supabase, "paragraphs", "id, chapter_id, paragraph_index, content_hash",
+                            "chapter_id", chapter_ids)
+    tts_chunks = _select_in(supabase, "tts_chunks", "id, chapter_id, chunk_index, content_hash",
+                            "chapter_id", chapter_ids)
+    build_ids = [ch["current_build_id"] for ch in chapters if ch.get("current_build_id")]
+    builds = {b["id"]: b.get("canonical_hash")
+              for b in _select_in(supabase, "chapter_builds", "id, canonical_hash", "id", build_ids)}
+
+    remote = {}
+    by_id = {}
+    for ch in chapters:
+        entry = {
+            "id": ch["id"],
+            "node_id": ch.get("node_id"),
+            "content_hash": ch.get("content_hash"),
+            "canonical_hash": builds.get(ch.get("current_build_id")),
+            "paragraphs": [],
+            "tts_chunks": [],
+        }
+        remote[ch["chapter_index"]] = entry
+        by_id[ch["id"]] = entry
+    for row in paragraphs:
+        by_id[row["chapter_id"]]["paragraphs"].append(row)
+    for row in tts_chunks:
+        by_id[row["chapter_id"]]["tts_chunks"].append(row)
+    return remote
+
+
+# ============================================
+# PLAN
+# ============================================
+
+def diff_rows(local: List[tuple], remote: List[Dict], index_field: str, text_field: str) -> Dict:
+    """
+    Match a chapter's local rows to its stored rows by index and content_hash.
+
+    Args:
+        local: [(index, text)] in order
+        remote: [{"id", index_field, "content_hash"}]
+
+    Returns:
+        {"ids": [row id per local row], "update": [...], "insert": [...],
+         "delete": [ids], "unchanged": n}
+        Update rows hold only the changed columns besides "id".
+    """
+    hashes = [content_hash(text) for _, text in local]
+    remote_by_index = {row[index_field]: row for row in remote}
+    ids = [None] * len(local)
+    used = set()
+    update, insert = [], []
+
+    # Same index, same text
+    for pos, (index, _) in enumerate(local):
+        row = remote_by_index.get(index)
+        if row and row.get("content_hash") == hashes[pos]:
+            ids[pos] = row["id"]
+            used.add(row["id"])
+    unchanged = len(used)
+
+    # Same text at another index (rows shifted by an insert or delete): index-only update
+    by_hash = {}
+    for row in sorted(remote, key=lambda r: r[index_field]):
+        if row["id"] not in used and row.get("content_hash"):
+            by_hash.setdefault(row["content_hash"], []).append(row)
+    for pos, (index, _) in enumerate(local):
+        if ids[pos] is None and by_hash.get(hashes[pos]):
+            row = by_hash[hashes[pos]].pop(0)
+            ids[pos] = row["id"]
+            used.add(row["id"])
+            update.append({"id": row["id"], index_field: index})
+
+    # New text: reuse the row at the same index if it is still free, otherwise insert
+    for pos, (index, text) in enumerate(local):
+        if ids[pos] is not None:
+            continue
+        row = remote_by_index.get(index)
+        if row and row["id"] not in used:
+            ids[pos] = row["id"]
+            used.add(row["id"])
+            update.append({"id": row["id"], index_field: index, text_field: text, "content_hash": hashes[pos]})
+        else:
+            ids[pos] = new_id()
+            insert.append({"id": ids[pos], index_field: index, text_field: text, "content_hash": hashes[pos]})
+
+    return {
+        "ids": ids,
+        "update": update,
+        "insert": insert,
+        "delete": [row["id"] for row in remote if row["id"] not in used],
+        "unchanged": unchanged,
+    }
+
+
+def _counts() -> Dict:
+    return {"insert": 0, "update": 0, "delete": 0, "unchanged": 0}
+
+
+def _add_counts(counts: Dict, diff: Dict):
+    for key in ("insert", "update", "delete"):
+        counts[key] += len(diff[key])
+    counts["unchanged"] += diff["unchanged"]
+
+
+def plan_book_sync(book_id: str, chapters: List[Dict], remote: Dict[int, Dict]) -> Dict:
+    """
+    Diff a job's chapters against fetch_remote_book() output. Writes nothing.
+
+    Args:
+        book_id: The book UUID
+        chapters: V3 chapter dicts that belong in the book (index, title,
+                  raw_content, paragraphs, sections, segments)
+        remote: fetch_remote_book(book_id)
+
+    Returns:
+        {"payload": apply_book_sync RPC payload,
+         "new_chapters": [chapter_index] (no stored row yet, written with ingest_chapter),
+         "chapter_ids": {chapter_index: id}, "paragraph_ids": {chapter_index: [id per paragraph]},
+         "rebuild": [chapter_index] (expected canonical text differs from the current build),
+         "needs_tts": [chapter_index] (rebuilds whose local segments are from older text),
+         "report": planned row counts per table}
+    """
+    payload = {
+        "book_id": book_id,
+        "delete_chapters": [], "delete_nodes": [],
+        "update_chapters": [],
+        "delete_paragraphs": [], "update_paragraphs": [], "insert_paragraphs": [],
+        "delete_tts_chunks": [], "update_tts_chunks": [], "insert_tts_chunks": [],
+        "relink_node_ids": [], "relink_chapter_ids": [],
+        "node_paragraphs": [], "paragraph_tts_chunks": [],
+    }
+    report = {
+        "chapters": _counts(), "paragraphs": _counts(), "tts_chunks": _counts(),
+        "book_nodes": {"insert": 0, "delete": 0},
+        "book_node_paragraphs": {"insert": 0},
+        "paragraph_tts_chunks": {"insert": 0},
+        "relinked_chapters": 0,
+    }
+    new_chapters, rebuild, needs_tts = [], [], []
+    chapter_ids, paragraph_ids = {}, {}
+
+    for ch in chapters:
+        index = ch["index"]
+        paragraphs = [(i, p["text"]) for i, p in enumerate(p for p in ch.get("paragraphs", []) if p.get("text"))]
+        tts_chunks = chapter_tts_chunks(ch)
+        stored = remote.get(index)
+
+        # Only chapters with audio somewhere (a stored build or a local TTS run) get a build
+        stored_build = stored.get("canonical_hash") if stored else None
+        if stored_build or ch.get("segments"):
+            expected = expected_canonical_hash(ch)
+            if stored_build != expected:
+                rebuild.append(index)
+                if not ch.get("segments") or canonical_hash(ch["segments"]) != expected:
+                    needs_tts.append(index)
+
+        if stored is None:
+            new_chapters.append(index)
+            node_links, chunk_links = chapter_link_rows("new", list(range(len(paragraphs))),
+                                                        list(range(len(tts_chunks))))
+            report["chapters"]["insert"] += 1
+            report["paragraphs"]["insert"] += len(paragraphs)
+            report["tts_chunks"]["insert"] += len(tts_chunks)
+            report["book_nodes"]["insert"] += 1
+            report["book_node_paragraphs"]["insert"] += len(node_links)
+            report["paragraph_tts_chunks"]["insert"] += len(chunk_links)
+            continue
+
+        chapter_id = stored["id"]
+        chapter_ids[index] = chapter_id
+        chapter_hash = chapter_content_hash(ch["title"], ch.get("raw_content", ""))
+        paragraph_diff = diff_rows(paragraphs, stored["paragraphs"], "paragraph_index", "text")
+        chunk_diff = diff_rows(tts_chunks, stored["tts_chunks"], "chunk_index", "text_ref")
+        paragraph_ids[index] = paragraph_diff["ids"]
+
+        changed = False
+        if stored.get("content_hash") != chapter_hash:
+            payload["update_chapters"].append({
+                "id": chapter_id, "title": ch["title"],
+                "text": ch.get("raw_content", ""), "content_hash": chapter_hash,
+            })
+            report["chapters"]["update"] += 1
+            changed = True
+
+        for name, diff in (("paragraphs", paragraph_diff), ("tts_chunks", chunk_diff)):
+            payload[f"delete_{name}"].extend(diff["delete"])
+            payload[f"update_{name}"].extend(diff["update"])
+            payload[f"insert_{name}"].extend({**row, "chapter_id": chapter_id} for row in diff["insert"])
+            _add_counts(report[name], diff)
+            changed = changed or bool(diff["delete"] or diff["update"] or diff["insert"])
+
+        # Links follow paragraph / chunk order: rewrite them only when the id order changed
+        stored_paragraph_ids = [r["id"] for r in sorted(stored["paragraphs"], key=lambda r: r["paragraph_index"])]
+        stored_chunk_ids = [r["id"] for r in sorted(stored["tts_chunks"], key=lambda r: r["chunk_index"])]
+        if paragraph_diff["ids"] != stored_paragraph_ids or chunk_diff["ids"] != stored_chunk_ids:
+            node_links, chunk_links = chapter_link_rows(stored.get("node_id"), paragraph_diff["ids"], chunk_diff["ids"])
+            payload["relink_chapter_ids"].append(chapter_id)
+            if stored.get("node_id"):
+                payload["relink_node_ids"].append(stored["node_id"])
+            payload["node_paragraphs"].extend(node_links)
+            payload["paragraph_tts_chunks"].extend(chunk_links)
+            report["book_node_paragraphs"]["insert"] += len(node_links)
+            report["paragraph_tts_chunks"]["insert"] += len(chunk_links)
+            report["relinked_chapters"] += 1
+            changed = True
+
+        if not changed:
+            report["chapters"]["unchanged"] += 1
+
+    local_indices = {ch["index"] for ch in chapters}
+    for index, stored in sorted(remote.items()):
+        if index in local_indices:
+            continue
+        payload["delete_chapters"].append(stored["id"])
+        report["chapters"]["delete"] += 1
+        report["paragraphs"]["delete"] += len(stored["paragraphs"])
+        report["tts_chunks"]["delete"] += len(stored["tts_chunks"])
+        if stored.get("node_id"):
+            payload["delete_nodes"].append(stored["node_id"])
+            report["book_nodes"]["delete"] += 1
+
+    report["rebuild_chapters"] = rebuild
+    report["needs_tts"] = needs_tts
+    report["payload_bytes"] = len(json.dumps(payload))
+    return {
+        "payload": payload,
+        "new_chapters": new_chapters,
+        "chapter_ids": chapter_ids,
+        "paragraph_ids": paragraph_ids,
+        "rebuild": rebuild,
+        "needs_tts": needs_tts,
+        "report": report,
+    }
+
+
+def is_empty(payload: Dict) -> bool:
+    """True when an apply_book_sync payload has nothing to write."""
+    return not any(value for key, value in payload.items() if key != "book_id")
+
+
+# ============================================
+# APPLY
+# ============================================
+
+def _apply_sync_rows(payload: Dict) -> Dict:
+    """Fallback without the RPC: per-table deletes, updates and chunked inserts (not one transaction)."""
+    supabase = get_supabase()
+    writer = BulkWriter(supabase)
+    round_trips = 0
+
+    def delete_in(table: str, field: str, values: List[str]):
+        nonlocal round_trips
+        for start in range(0, len(values), IN_FILTER_SIZE):
+            supabase.table(table).delete().in_(field, values[start:start + IN_FILTER_SIZE]).execute()
+            round_trips += 1
+
+    def update_rows(table: str, rows: List[Dict]):
+        nonlocal round_trips
+        for row in rows:
+            changes = {k: v for k, v in row.items() if k != "id"}
+            supabase.table(table).update(changes).eq("id", row["id"]).execute()
+            round_trips += 1
+
+    # Links of relinked chapters go first; deleting paragraphs / chunks cascades to theirs
+    delete_in("book_node_paragraphs", "node_id", payload["relink_node_ids"])
+    relink_paragraph_ids = [
+        row["id"] for row in _select_in(supabase, "paragraphs", "id", "chapter_id", payload["relink_chapter_ids"])
+    ]
+    delete_in("paragraph_tts_chunks", "paragraph_id", relink_paragraph_ids)
+
+    delete_in("paragraphs", "chapter_id", payload["delete_chapters"])
+    delete_in("tts_chunks", "chapter_id", payload["delete_chapters"])
+    delete_in("chapters", "id", payload["delete_chapters"])
+    delete_in("book_nodes", "id", payload["delete_nodes"])
+    delete_in("paragraphs", "id", payload["delete_paragraphs"])
+    delete_in("tts_chunks", "id", payload["delete_tts_chunks"])
+
+    update_rows("chapters", payload["update_chapters"])
+    update_rows("paragraphs", payload["update_paragraphs"])
+    update_rows("tts_chunks", payload["update_tts_chunks"])
+
+    writer.insert("paragraphs", payload["insert_paragraphs"])
+    writer.insert("tts_chunks", payload["insert_tts_chunks"])
+    writer.insert("book_node_paragraphs", payload["node_paragraphs"])
+    writer.insert("paragraph_tts_chunks", payload["paragraph_tts_chunks"])
+    return {"round_trips": round_trips + writer.stats()["round_trips"]}
+
+
+def apply_book_sync(payload: Dict) -> Dict:
+    """
+    Write a plan_book_sync() payload in one transaction via the apply_book_sync RPC.
+
+    Falls back to per-table writes (with a warning) when the RPC has not been
+    deployed yet.
+
+    Returns:
+        Row counts from the RPC plus round_trips
+    """
+    global _sync_rpc_available
+
+    if is_empty(payload):
+        return {"round_trips": 0}
+
+    if _sync_rpc_available is not False:
+        try:
+            result = get_supabase().rpc("apply_book_sync", {"p_payload": payload}).execute()
+            _sync_rpc_available = True
+            return {**(result.data or {}), "round_trips": 1}
+        except Exception as e:
+            if not _is_missing_rpc(e):
+                raise
+            _sync_rpc_available = False
+            logger.warning("apply_book_sync RPC not found (run docs/supabase-content-hash-migration.sql); "
+                           "falling back to per-table writes")
+
+    return _apply_sync_rows(payload)
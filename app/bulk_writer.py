@@ -0,0 +1,82 @@
+"""
+Chunked array inserts into Supabase (PostgREST).
+
+save_groups_to_supabase() and generate_paragraph_spans() used to call
+insert().execute() once per audio group, per segment and per paragraph, so a book
+with 2,000 segments made thousands of sequential round trips in the upload phase.
+They now build the rows for a whole chapter and hand them to a BulkWriter:
+
+- insert(table, rows) sends the rows as array inserts of at most
+  SUPABASE_INSERT_CHUNK rows (default 500) each, in order
+- Foreign keys are resolved before anything is sent: audio_groups rows get a
+  client-generated UUID (new_id()) that the tts_segments rows reference, so no
+  insert has to wait for another insert's returned ids
+- stats() reports rows, round trips and rows per second (overall and per table);
+  one writer is shared by every chapter in an upload run
+"""
+
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from app.config import Config
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def new_id() -> str:
+    """Client-side primary key for a row that other rows in the same batch reference."""
+    return str(uuid.uuid4())
+
+
+class BulkWriter:
+    """Chunked inserts with round-trip and throughput counters."""
+
+    def __init__(self, supabase=None, chunk_size: Optional[int] = None):
+        self._supabase = supabase
+        self.chunk_size = max(1, chunk_size or Config.SUPABASE_INSERT_CHUNK)
+        self._lock = threading.Lock()
+        self.rows = 0
+        self.round_trips = 0
+        self.seconds = 0.0
+        self.tables: Dict[str, Dict] = {}
+
+    def _get_supabase(self):
+        if self._supabase is None:
+            from app.chapters import get_supabase
+            self._supabase = get_supabase()
+        return self._supabase
+
+    def insert(self, table: str, rows: List[Dict]) -> List[Dict]:
+        """Insert rows in chunks; returns the rows PostgREST sent back, in order."""
+        if not rows:
+            return []
+        supabase = self._get_supabase()
+        returned = []
+        for start in range(0, len(rows), self.chunk_size):
+            chunk = rows[start:start + self.chunk_size]
+            t0 = time.monotonic()
+            result = supabase.table(table).insert(chunk).execute()
+            elapsed = time.monotonic() - t0
+            returned.extend(result.data or [])
+
+            with self._lock:
+                self.rows += len(chunk)
+                self.round_trips += 1
+                self.seconds += elapsed
+                counts = self.tables.setdefault(table, {"rows": 0, "round_trips": 0})
+                counts["rows"] += len(chunk)
+                counts["round_trips"] += 1
+        return returned
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "rows": self.rows,
+                "round_trips": self.round_trips,
+                "seconds": round(self.seconds, 3),
+                "rows_per_second": round(self.rows / self.seconds, 1) if self.seconds else 0.0,
+                "tables": {table: dict(counts) for table, counts in self.tables.items()},
+            }
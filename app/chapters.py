@@ -1,6 +1,7 @@
 import os
 import json
 import re
+import hashlib
 from supabase import create_client
 
 from app.config import Config
@@ -223,6 +224,11 @@ def create_book_in_supabase(metadata: dict) -> str:
 
 import google.generativeai as genai
 
+from app.gemini_scheduler import run_gemini
+from app.llm_cache import cached_generate
+
+GEMINI_MODEL_NAME = "gemini-2.0-flash"
+
 # Lazy initialization - don't configure at import time!
 _gemini_model = None
 _configured = False
@@ -237,7 +243,7 @@ def get_gemini():
         genai.configure(api_key=api_key)
         _configured = True
     if _gemini_model is None:
-        _gemini_model = genai.GenerativeModel("gemini-2.0-flash")
+        _gemini_model = genai.GenerativeModel(GEMINI_MODEL_NAME)
     return _gemini_model
 
 
@@ -279,6 +285,15 @@ For a regular novel, use:
 """
 
 
+def _is_json(text: str) -> bool:
+    """Cache validator: only store responses that parse as JSON."""
+    try:
+        json.loads(text)
+        return True
+    except json.JSONDecodeError:
+        return False
+
+
 @retry_on_failure(max_retries=2, delay=3, exceptions=(Exception,))
 def detect_book_structure(full_text: str) -> dict:
     """
@@ -288,23 +303,27 @@ def detect_book_structure(full_text: str) -> dict:
     # Use first ~15000 chars (roughly first 10-15 pages)
     sample_text = full_text[:15000]
     
-    model = get_gemini()
-    
     logger.info("Detecting book structure with Gemini...")
     
     prompt = f"{STRUCTURE_DETECTION_PROMPT}\n\nAnalyze this book's structure:\n\n{sample_text}"
+    generation_config = {"response_mime_type": "application/json", "max_output_tokens": 4096}
+    
+    def generate() -> str:
+        model = get_gemini()
+        response = run_gemini(
+            GEMINI_MODEL_NAME,
+            lambda: model.generate_content(prompt, generation_config=genai.types.GenerationConfig(**generation_config)),
+            prompt=prompt
+        )
+        return response.text
     
     try:
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                response_mime_type="application/json",
-                max_output_tokens=4096
-            )
+        content = cached_generate(
+            GEMINI_MODEL_NAME, "structure-v1", prompt, generate,
+            generation_config=generation_config,
+            validate=_is_json
         )
         
-        content = response.text
-        
         structure = json.loads(content)
         book_type = structure.get('book_type', 'unknown')
         items = structure.get('structure', [])
@@ -1029,12 +1048,16 @@ Split this text into natural paragraphs:
 
 {chunk}"""
             
-            response = model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    response_mime_type="application/json",
-                    max_output_tokens=8192
-                )
+            response = run_gemini(
+                GEMINI_MODEL_NAME,
+                lambda: model.generate_content(
+                    prompt,
+                    generation_config=genai.types.GenerationConfig(
+                        response_mime_type="application/json",
+                        max_output_tokens=8192
+                    )
+                ),
+                prompt=prompt
             )
             
             content = response.text
@@ -1339,23 +1362,27 @@ def _gemini_group_chunk(sentences: list, offset: int = 0) -> list:
     numbered_text = sentences_to_numbered_text(sentences)
     
     try:
-        model = get_gemini()
-        
         prompt = f"""{PARAGRAPH_GROUPING_PROMPT}
 
 Here are the sentences to group:
 
 {numbered_text}"""
+        generation_config = {"response_mime_type": "application/json", "max_output_tokens": 4096}
         
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                response_mime_type="application/json",
-                max_output_tokens=4096
+        def generate() -> str:
+            model = get_gemini()
+            response = run_gemini(
+                GEMINI_MODEL_NAME,
+                lambda: model.generate_content(prompt, generation_config=genai.types.GenerationConfig(**generation_config)),
+                prompt=prompt
             )
-        )
+            return response.text
         
-        content = response.text
+        content = cached_generate(
+            GEMINI_MODEL_NAME, "paragraph-grouping-v1", prompt, generate,
+            generation_config=generation_config,
+            validate=lambda text: '"paragraphs"' in text
+        )
         
         # Parse JSON from response
         result = None
@@ -1712,6 +1739,112 @@ def create_book_node(
     raise Exception(f"Failed to create book_node: {display_title}")
 
 
+class BookTreeBuilder:
+    """
+    Builds a whole book's book_nodes locally and inserts them in bulk.
+    
+    create_book_node() asks Supabase for the parent's order_key and the siblings'
+    max key for every node (two queries plus the insert). The builder allocates
+    order_keys and UUIDs in memory as nodes are added (parents before children),
+    so parent ids are known up front, and insert() writes the rows level by level
+    (roots first) as chunked array inserts.
+    
+    Meant for a new book: keys start at 0001 under every parent, as
+    generate_order_key() does for a book without nodes.
+    """
+    
+    def __init__(self, book_id: str):
+        self.book_id = book_id
+        self.nodes = []        # row dicts in the order they were added
+        self._keys = {}        # node id -> order_key
+        self._depths = {}      # node id -> depth (0 = root)
+        self._next_num = {}    # parent id (None = root) -> next free number at that level
+    
+    def _allocate_key(self, parent_id: str = None) -> str:
+        prefix = self._keys[parent_id] + "." if parent_id in self._keys else ""
+        num = self._next_num.get(parent_id, 1)
+        self._next_num[parent_id] = num + 1
+        return f"{prefix}{num:04d}"
+    
+    def add(
+        self,
+        node_type: str,
+        display_title: str,
+        parent_id: str = None,
+        source_title: str = None,
+        order_key: str = None,
+        exclude_from_frontend: bool = False,
+        exclude_from_audio: bool = False,
+        has_content: bool = True,
+        confidence: float = 1.0
+    ) -> dict:
+        """
+        Add a node (same arguments as create_book_node). Nothing is written yet.
+        
+        Returns:
+            The node row, including its client-generated id and order_key
+        """
+        import uuid
+        
+        if node_type not in VALID_NODE_TYPES:
+            raise ValueError(f"Invalid node_type: {node_type}. Must be one of {VALID_NODE_TYPES}")
+        
+        if order_key:
+            # Explicit key (e.g. from a mapping): later auto keys at this level go after it
+            last_num = int(order_key.split(".")[-1])
+            self._next_num[parent_id] = max(self._next_num.get(parent_id, 1), last_num + 1)
+        else:
+            order_key = self._allocate_key(parent_id)
+        
+        node = {
+            "id": str(uuid.uuid4()),
+            "book_id": self.book_id,
+            "parent_id": parent_id,
+            "node_type": node_type,
+            "order_key": order_key,
+            "display_title": display_title,
+            "source_title": source_title or display_title,
+            "exclude_from_frontend": exclude_from_frontend,
+            "exclude_from_audio": exclude_from_audio,
+            "has_content": has_content,
+            "confidence": confidence
+        }
+        self.nodes.append(node)
+        self._keys[node["id"]] = order_key
+        self._depths[node["id"]] = self._depths[parent_id] + 1 if parent_id in self._depths else 0
+        return node
+    
+    def levels(self) -> list:
+        """Node rows grouped by depth, roots first."""
+        levels = []
+        for node in self.nodes:
+            depth = self._depths[node["id"]]
+            while len(levels) <= depth:
+                levels.append([])
+            levels[depth].append(node)
+        return levels
+    
+    def insert(self, writer=None) -> dict:
+        """
+        Insert every node, one level at a time so each parent exists before its children.
+        
+        Returns:
+            {"nodes", "levels", "round_trips"}
+        """
+        from app.bulk_writer import BulkWriter
+        
+        writer = writer or BulkWriter(get_supabase())
+        round_trips = writer.round_trips
+        levels = self.levels()
+        for level in levels:
+            writer.insert("book_nodes", level)
+        
+        stats = {"nodes": len(self.nodes), "levels": len(levels), "round_trips": writer.round_trips - round_trips}
+        logger.info(f"[BOOK_NODES] Inserted {stats['nodes']} nodes in {stats['levels']} levels "
+                    f"({stats['round_trips']} round trips)")
+        return stats
+
+
 def link_node_paragraphs(node_id: str, paragraph_ids: list) -> int:
     """
     Link paragraphs to a book_node.
@@ -1759,6 +1892,215 @@ def link_paragraph_tts_chunks(paragraph_id: str, tts_chunk_ids: list) -> int:
     return len(tts_chunk_ids)
 
 
+# ============================================
+# CHAPTER INGEST (one transaction per chapter)
+# ============================================
+
+# None until the first call shows whether the ingest_chapter RPC is deployed
+# (docs/supabase-chapter-ingest-migration.sql)
+_ingest_rpc_available = None
+
+# None until the first fallback insert shows whether the content_hash columns exist
+# (docs/supabase-content-hash-migration.sql)
+_content_hash_columns = None
+
+
+def content_hash(text: str) -> str:
+    """sha256 of a stored text column (paragraphs.text, tts_chunks.text_ref); matches the SQL backfill."""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def chapter_content_hash(title: str, text: str) -> str:
+    """content_hash of a chapters row: title and text."""
+    return content_hash(f"{title}\n{text or ''}")
+
+
+def chapter_tts_chunks(chapter: dict) -> list:
+    """(chunk_index, text_ref) as stored: same cleanup and numbering as write_sections_to_supabase."""
+    section_texts = [s["text"] for s in chapter.get("sections", []) if s.get("text")]
+    chunks = []
+    for index, text in enumerate(section_texts):
+        cleaned_text = clean_section_text(text)
+        if cleaned_text:
+            chunks.append((index, cleaned_text))
+    return chunks
+
+
+def chapter_link_rows(node_id: str, paragraph_ids: list, tts_chunk_ids: list) -> tuple:
+    """
+    (book_node_paragraphs, paragraph_tts_chunks) rows for a chapter's paragraphs and chunks.
+    
+    TTS chunks are spread evenly over the paragraphs; the remainder stays unlinked, as before.
+    """
+    node_paragraphs = []
+    if node_id:
+        node_paragraphs = [
+            {"node_id": node_id, "paragraph_id": para_id, "position_in_node": position}
+            for position, para_id in enumerate(paragraph_ids)
+        ]
+    
+    paragraph_tts_chunks = []
+    if paragraph_ids and tts_chunk_ids:
+        chunks_per_para = max(1, len(tts_chunk_ids) // len(paragraph_ids))
+        for para_pos, para_id in enumerate(paragraph_ids):
+            para_chunks = tts_chunk_ids[para_pos * chunks_per_para:(para_pos + 1) * chunks_per_para]
+            for position, chunk_id in enumerate(para_chunks):
+                paragraph_tts_chunks.append({
+                    "paragraph_id": para_id,
+                    "tts_chunk_id": chunk_id,
+                    "position_in_paragraph": position,
+                })
+    return node_paragraphs, paragraph_tts_chunks
+
+
+def build_chapter_payload(book_id: str, chapter: dict, node_id: str = None) -> dict:
+    """
+    Build the ingest_chapter payload for one chapter: the chapter row, its paragraphs,
+    tts_chunks and link rows, with client-generated ids so the links can reference them.
+    Every content row carries its content_hash (used by the delta sync, app/book_sync.py).
+    
+    Paragraph ids are also stored on the chapter's paragraph dicts as db_paragraph_id
+    (used to link tts_segments to paragraphs after TTS).
+    
+    Args:
+        book_id: The book UUID
+        chapter: V3 chapter dict (index, title, raw_content, paragraphs, sections)
+        node_id: The chapter's book_node UUID
+    
+    Returns:
+        Payload dict (see the migration for its shape)
+    """
+    import uuid
+    
+    text = chapter.get("raw_content", "")
+    payload = {
+        "chapter": {
+            "id": str(uuid.uuid4()),
+            "book_id": book_id,
+            "chapter_index": chapter["index"],
+            "title": chapter["title"],
+            "text": text,
+            "node_id": node_id,
+            "content_hash": chapter_content_hash(chapter["title"], text),
+        },
+        "paragraphs": [],
+        "tts_chunks": [],
+    }
+    
+    paragraphs = [p for p in chapter.get("paragraphs", []) if p.get("text")]
+    for idx, para in enumerate(paragraphs):
+        para["db_paragraph_id"] = str(uuid.uuid4())
+        payload["paragraphs"].append({
+            "id": para["db_paragraph_id"],
+            "paragraph_index": idx,
+            "text": para["text"],
+            "content_hash": content_hash(para["text"]),
+        })
+    
+    for index, text_ref in chapter_tts_chunks(chapter):
+        payload["tts_chunks"].append({
+            "id": str(uuid.uuid4()),
+            "chunk_index": index,
+            "text_ref": text_ref,
+            "content_hash": content_hash(text_ref),
+        })
+    
+    payload["node_paragraphs"], payload["paragraph_tts_chunks"] = chapter_link_rows(
+        node_id, [p["id"] for p in payload["paragraphs"]], [c["id"] for c in payload["tts_chunks"]]
+    )
+    return payload
+
+
+def _is_missing_rpc(error: Exception) -> bool:
+    message = str(error)
+    return "PGRST202" in message or "Could not find the function" in message
+
+
+def _is_missing_column(error: Exception, column: str) -> bool:
+    message = str(error)
+    return column in message and ("PGRST204" in message or "42703" in message or "does not exist" in message)
+
+
+def _without_content_hash(rows: list) -> list:
+    return [{k: v for k, v in row.items() if k != "content_hash"} for row in rows]
+
+
+def _ingest_chapter_rows(payload: dict) -> dict:
+    """
+    Fallback without the RPC: chunked inserts per table (fast, but not one transaction).
+    
+    A database without the RPC may also predate the content_hash columns; rows are
+    then written without them (the delta sync treats those rows as changed).
+    """
+    global _content_hash_columns
+    from app.bulk_writer import BulkWriter
+    
+    writer = BulkWriter(get_supabase())
+    chapter_id = payload["chapter"]["id"]
+    rows = {
+        "chapters": [payload["chapter"]],
+        "paragraphs": [
+            {**p, "chapter_id": chapter_id, "start_ms": None, "end_ms": None} for p in payload["paragraphs"]
+        ],
+        "tts_chunks": [
+            {**c, "chapter_id": chapter_id, "start_ms": None, "end_ms": None} for c in payload["tts_chunks"]
+        ],
+    }
+    if _content_hash_columns is False:
+        rows = {table: _without_content_hash(table_rows) for table, table_rows in rows.items()}
+    try:
+        writer.insert("chapters", rows["chapters"])
+    except Exception as e:
+        if _content_hash_columns is False or not _is_missing_column(e, "content_hash"):
+            raise
+        _content_hash_columns = False
+        logger.warning("[SUPABASE] content_hash columns not found - run docs/supabase-content-hash-migration.sql. "
+                       "Writing rows without content hashes")
+        rows = {table: _without_content_hash(table_rows) for table, table_rows in rows.items()}
+        writer.insert("chapters", rows["chapters"])
+    writer.insert("paragraphs", rows["paragraphs"])
+    writer.insert("tts_chunks", rows["tts_chunks"])
+    writer.insert("book_node_paragraphs", payload["node_paragraphs"])
+    writer.insert("paragraph_tts_chunks", payload["paragraph_tts_chunks"])
+    return {
+        "chapter_id": chapter_id,
+        "existing": False,
+        "paragraphs": len(payload["paragraphs"]),
+        "tts_chunks": len(payload["tts_chunks"]),
+        "node_paragraphs": len(payload["node_paragraphs"]),
+        "paragraph_tts_chunks": len(payload["paragraph_tts_chunks"]),
+        "round_trips": writer.stats()["round_trips"],
+    }
+
+
+def ingest_chapter(payload: dict) -> dict:
+    """
+    Write a chapter and all its rows in one transaction via the ingest_chapter RPC.
+    
+    Falls back to chunked per-table inserts (with a warning) when the RPC has not
+    been deployed yet.
+    
+    Returns:
+        Row counts: chapter_id, existing, paragraphs, tts_chunks, node_paragraphs,
+        paragraph_tts_chunks, round_trips
+    """
+    global _ingest_rpc_available
+    
+    if _ingest_rpc_available is not False:
+        try:
+            result = get_supabase().rpc("ingest_chapter", {"p_payload": payload}).execute()
+            _ingest_rpc_available = True
+            return {**result.data, "round_trips": 1}
+        except Exception as e:
+            if not _is_missing_rpc(e):
+                raise
+            _ingest_rpc_available = False
+            logger.warning("[SUPABASE] ingest_chapter RPC not found - run docs/supabase-chapter-ingest-migration.sql. "
+                           "Falling back to per-table inserts (not transactional)")
+    
+    return _ingest_chapter_rows(payload)
+
+
 def get_book_nodes(book_id: str, include_hidden: bool = False) -> list:
     """
     Fetch all book_nodes for a book in order.
@@ -8,6 +8,11 @@ import re
 from fastapi import HTTPException
 import google.generativeai as genai
 
+from app.gemini_scheduler import run_gemini
+from app.llm_cache import cached_generate
+
+GEMINI_MODEL_NAME = "gemini-2.0-flash"
+
 # Lazy initialization - don't configure at import time!
 _gemini_model = None
 _configured = False
@@ -22,7 +27,7 @@ def get_gemini():
         genai.configure(api_key=api_key)
         _configured = True
     if _gemini_model is None:
-        _gemini_model = genai.GenerativeModel("gemini-2.0-flash")
+        _gemini_model = genai.GenerativeModel(GEMINI_MODEL_NAME)
     return _gemini_model
 
 CLEANER_SYSTEM_PROMPT = """
@@ -136,16 +141,22 @@ CLEAN THIS PAGE TEXT:
 RETURN CLEAN JSON WITH key "cleaned_text".
 """
 
-    model = get_gemini()
-    response = model.generate_content(
-        prompt,
-        generation_config=genai.types.GenerationConfig(
-            response_mime_type="application/json",
-            max_output_tokens=16384
+    generation_config = {"response_mime_type": "application/json", "max_output_tokens": 16384}
+
+    def generate() -> str:
+        model = get_gemini()
+        response = run_gemini(
+            GEMINI_MODEL_NAME,
+            lambda: model.generate_content(prompt, generation_config=genai.types.GenerationConfig(**generation_config)),
+            prompt=prompt
         )
-    )
+        return response.text
 
-    content = response.text
+    content = cached_generate(
+        GEMINI_MODEL_NAME, "cleaner-v1", prompt, generate,
+        generation_config=generation_config,
+        validate=lambda text: extract_json_from_response(text) is not None
+    )
     result = extract_json_from_response(content)
     
     if result is None:
@@ -21,6 +21,7 @@ class Config:
     NANO_BANANA_API_KEY: Optional[str] = None
     SUPABASE_URL: Optional[str] = None
     SUPABASE_SERVICE_ROLE_KEY: Optional[str] = None
+    SUPABASE_INSERT_CHUNK: int = 500  # rows per array insert (see app/bulk_writer.py)
     MARKER_API_KEY: Optional[str] = None
     
     # Application Settings
@@ -36,9 +37,44 @@ class Config:
     MAX_CHARS_PER_SECTION: int = 250
     MAX_PAGES_PER_REQUEST: int = 1000
     
-    # API Rate Limits
+    # V3 Pipeline Concurrency
+    V3_CHAPTER_CONCURRENCY: int = 3
+    V3_CONTEXT_REFRESH_CHAPTERS: int = 5
+    V3_PARAGRAPH_MODE: str = "echo"  # "echo" or "offsets"
+    V3_SECTION_MODE: str = "local"  # "local" or "gemini"
+    V3_LONG_CHAPTER_CHARS: int = 40000  # longer chapters are processed in windows
+    V3_WINDOW_CHARS: int = 15000
+    V3_WINDOW_OVERLAP_SENTENCES: int = 8
+    V3_WINDOW_CONCURRENCY: int = 4
+    V3_TTS_STREAMING: bool = False  # full TTS pipeline: overlap synthesis, encoding and upload
+    V3_STREAM_CHUNK_SEGMENTS: int = 20
+    V3_STREAM_MAX_PENDING_SEGMENTS: int = 60
+    V3_STREAM_QUEUE_GROUPS: int = 2
+    V3_TTS_WORK_DIR: str = "data/v3_tts_work"  # per-job segment/group audio + checkpoints
+    V3_TTS_KEEP_WORK_DIR: bool = False  # keep it after the audio upload is confirmed
+    V3_UPLOAD_CONCURRENCY: int = 4  # chapters written to Supabase at once (ingest_chapter RPC)
+    
+    # Shared Executors (see app/executors.py)
+    EXECUTOR_IO_WORKERS: int = 16
+    EXECUTOR_CPU_WORKERS: int = 2
+    
+    # LLM Response Cache (see app/llm_cache.py)
+    LLM_CACHE_DIR: str = "data/llm_cache"
+    LLM_CACHE_MAX_MB: int = 512
+    LLM_CACHE_BYPASS: bool = False
+    
+    # Segment Audio Cache (see app/audio_cache.py)
+    AUDIO_CACHE_DIR: str = "data/audio_cache"
+    AUDIO_CACHE_MAX_MB: int = 4096
+    AUDIO_CACHE_BYPASS: bool = False
+    AUDIO_CACHE_MODEL_VERSION: str = "xtts_v2"  # bump when the TTS model/worker output changes
+    
+    # API Rate Limits (see app/gemini_scheduler.py)
     GEMINI_MAX_RETRIES: int = 3
     GEMINI_RETRY_DELAY: int = 5
+    GEMINI_RPM: int = 1000
+    GEMINI_TPM: int = 1000000
+    GEMINI_RATE_LIMITS: str = "imagen-4.0-fast-generate-001=10:0"  # per-model "model=rpm:tpm,..."
     
     # Timeouts (in seconds)
     API_TIMEOUT: int = 300
@@ -60,6 +96,7 @@ class Config:
         cls.NANO_BANANA_API_KEY = os.getenv("NANO_BANANA_API_KEY")
         cls.SUPABASE_URL = os.getenv("SUPABASE_URL")
         cls.SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+        cls.SUPABASE_INSERT_CHUNK = int(os.getenv("SUPABASE_INSERT_CHUNK", "500"))
         cls.MARKER_API_KEY = os.getenv("MARKER_API_KEY")
         
         # Application Settings
@@ -80,11 +117,46 @@ class Config:
         cls.MAX_CHARS_PER_SECTION = int(os.getenv("MAX_CHARS_PER_SECTION", "250"))
         cls.MAX_PAGES_PER_REQUEST = int(os.getenv("MAX_PAGES_PER_REQUEST", "1000"))
         
+        # V3 Pipeline Concurrency
+        cls.V3_CHAPTER_CONCURRENCY = int(os.getenv("V3_CHAPTER_CONCURRENCY", "3"))
+        cls.V3_CONTEXT_REFRESH_CHAPTERS = int(os.getenv("V3_CONTEXT_REFRESH_CHAPTERS", "5"))
+        cls.V3_PARAGRAPH_MODE = os.getenv("V3_PARAGRAPH_MODE", "echo").lower()
+        cls.V3_SECTION_MODE = os.getenv("V3_SECTION_MODE", "local").lower()
+        cls.V3_LONG_CHAPTER_CHARS = int(os.getenv("V3_LONG_CHAPTER_CHARS", "40000"))
+        cls.V3_WINDOW_CHARS = int(os.getenv("V3_WINDOW_CHARS", "15000"))
+        cls.V3_WINDOW_OVERLAP_SENTENCES = int(os.getenv("V3_WINDOW_OVERLAP_SENTENCES", "8"))
+        cls.V3_WINDOW_CONCURRENCY = int(os.getenv("V3_WINDOW_CONCURRENCY", "4"))
+        cls.V3_TTS_STREAMING = os.getenv("V3_TTS_STREAMING", "false").lower() == "true"
+        cls.V3_STREAM_CHUNK_SEGMENTS = int(os.getenv("V3_STREAM_CHUNK_SEGMENTS", "20"))
+        cls.V3_STREAM_MAX_PENDING_SEGMENTS = int(os.getenv("V3_STREAM_MAX_PENDING_SEGMENTS", "60"))
+        cls.V3_STREAM_QUEUE_GROUPS = int(os.getenv("V3_STREAM_QUEUE_GROUPS", "2"))
+        cls.V3_TTS_WORK_DIR = os.getenv("V3_TTS_WORK_DIR", "data/v3_tts_work")
+        cls.V3_TTS_KEEP_WORK_DIR = os.getenv("V3_TTS_KEEP_WORK_DIR", "false").lower() == "true"
+        cls.V3_UPLOAD_CONCURRENCY = int(os.getenv("V3_UPLOAD_CONCURRENCY", "4"))
+        
+        # Shared Executors
+        cls.EXECUTOR_IO_WORKERS = int(os.getenv("EXECUTOR_IO_WORKERS", "16"))
+        cls.EXECUTOR_CPU_WORKERS = int(os.getenv("EXECUTOR_CPU_WORKERS", "2"))
+        
+        # LLM Response Cache
+        cls.LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", "data/llm_cache")
+        cls.LLM_CACHE_MAX_MB = int(os.getenv("LLM_CACHE_MAX_MB", "512"))
+        cls.LLM_CACHE_BYPASS = os.getenv("LLM_CACHE_BYPASS", "false").lower() == "true"
+        
+        # Segment Audio Cache
+        cls.AUDIO_CACHE_DIR = os.getenv("AUDIO_CACHE_DIR", "data/audio_cache")
+        cls.AUDIO_CACHE_MAX_MB = int(os.getenv("AUDIO_CACHE_MAX_MB", "4096"))
+        cls.AUDIO_CACHE_BYPASS = os.getenv("AUDIO_CACHE_BYPASS", "false").lower() == "true"
+        cls.AUDIO_CACHE_MODEL_VERSION = os.getenv("AUDIO_CACHE_MODEL_VERSION", "xtts_v2")
+        
         # API Settings
         cls.OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
         cls.OPENAI_RETRY_DELAY = int(os.getenv("OPENAI_RETRY_DELAY", "5"))
         cls.GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
         cls.GEMINI_RETRY_DELAY = int(os.getenv("GEMINI_RETRY_DELAY", "5"))
+        cls.GEMINI_RPM = int(os.getenv("GEMINI_RPM", "1000"))
+        cls.GEMINI_TPM = int(os.getenv("GEMINI_TPM", "1000000"))
+        cls.GEMINI_RATE_LIMITS = os.getenv("GEMINI_RATE_LIMITS", "imagen-4.0-fast-generate-001=10:0")
         
         # Timeouts
         cls.API_TIMEOUT = int(os.getenv("API_TIMEOUT", "300"))
@@ -12,11 +12,14 @@ from google import genai
 from google.genai import types
 
 from app.config import Config
+from app.gemini_scheduler import run_gemini
 from app.logger import get_logger
 from app.utils import retry_on_failure
 
 logger = get_logger(__name__)
 
+COVER_MODEL_NAME = "imagen-4.0-fast-generate-001"
+
 # Lazy initialization
 _supabase_client = None
 _nano_banana_client = None
@@ -209,14 +212,18 @@ def generate_with_nano_banana(metadata: dict, upload: bool = True) -> dict:
         prompt = generate_cover_art_prompt(metadata)
         
         # Generate image with Nano Banana (Imagen 4)
-        response = client.models.generate_images(
-            model="imagen-4.0-fast-generate-001",
-            prompt=prompt,
-            config=types.GenerateImagesConfig(
-                number_of_images=1,
-                aspect_ratio="1:1",  # Square for cover art
-                output_mime_type="image/png"
-            )
+        response = run_gemini(
+            COVER_MODEL_NAME,
+            lambda: client.models.generate_images(
+                model=COVER_MODEL_NAME,
+                prompt=prompt,
+                config=types.GenerateImagesConfig(
+                    number_of_images=1,
+                    aspect_ratio="1:1",  # Square for cover art
+                    output_mime_type="image/png"
+                )
+            ),
+            prompt=prompt
         )
         
         if not response.generated_images:
@@ -0,0 +1,159 @@
+"""
+Shared executor layer for blocking work.
+
+Async endpoints and pipeline phases dispatch blocking calls through this module
+so one book in progress never freezes the event loop (and /v3/status polling):
+- run_io():  thread pool for I/O-bound work (Gemini/Supabase SDK calls,
+             RunPod HTTP requests, ffmpeg/ffprobe subprocesses)
+- run_cpu(): process pool for CPU-bound work (PDF parsing, spaCy sentence splitting)
+
+Pool sizes come from Config.EXECUTOR_IO_WORKERS / Config.EXECUTOR_CPU_WORKERS.
+Functions sent to the CPU pool must be importable top-level functions with
+picklable arguments and results.
+"""
+
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.config import Config
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class PoolMetrics:
+    """Thread-safe counters for one executor pool."""
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.max_queue_depth = 0
+        self.total_latency_s = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        """Tasks submitted but still waiting for a free worker."""
+        return max(0, self.in_flight - self.max_workers)
+
+    def task_submitted(self):
+        with self._lock:
+            self.submitted += 1
+            self.in_flight += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+
+    def task_finished(self, latency_s: float, failed: bool):
+        with self._lock:
+            self.in_flight -= 1
+            self.total_latency_s += latency_s
+            if failed:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            finished = self.completed + self.failed
+            return {
+                "max_workers": self.max_workers,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "in_flight": self.in_flight,
+                "queue_depth": self.queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "avg_latency_ms": round(self.total_latency_s * 1000 / finished, 1) if finished else 0.0,
+            }
+
+
+# Lazy initialization - pools are created on first use
+_io_executor: Optional[ThreadPoolExecutor] = None
+_cpu_executor: Optional[ProcessPoolExecutor] = None
+_metrics: Dict[str, PoolMetrics] = {}
+_init_lock = threading.Lock()
+
+
+def get_io_executor() -> ThreadPoolExecutor:
+    """Get the shared thread pool for I/O-bound work."""
+    global _io_executor
+    with _init_lock:
+        if _io_executor is None:
+            workers = max(1, Config.EXECUTOR_IO_WORKERS)
+            _io_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="honora-io")
+            _metrics["io"] = PoolMetrics("io", workers)
+            logger.info(f"[Executors] I/O thread pool started ({workers} workers)")
+        return _io_executor
+
+
+def get_cpu_executor() -> ProcessPoolExecutor:
+    """Get the shared process pool for CPU-bound work."""
+    global _cpu_executor
+    with _init_lock:
+        if _cpu_executor is None:
+            workers = max(1, Config.EXECUTOR_CPU_WORKERS)
+            # spawn: forking a process that already runs threads (uvicorn, SDK clients) is unsafe
+            _cpu_executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            _metrics["cpu"] = PoolMetrics("cpu", workers)
+            logger.info(f"[Executors] CPU process pool started ({workers} workers)")
+        return _cpu_executor
+
+
+async def _run(pool: str, executor: Executor, func: Callable, *args, **kwargs) -> Any:
+    metrics = _metrics[pool]
+    loop = asyncio.get_running_loop()
+    call = functools.partial(func, *args, **kwargs)
+    if pool == "io":
+        # Threads share the caller's context variables (like asyncio.to_thread)
+        call = functools.partial(contextvars.copy_context().run, call)
+
+    metrics.task_submitted()
+    start = time.monotonic()
+    failed = False
+    try:
+        return await loop.run_in_executor(executor, call)
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        metrics.task_finished(time.monotonic() - start, failed)
+
+
+async def run_io(func: Callable, *args, **kwargs) -> Any:
+    """Run a blocking I/O-bound call in the shared thread pool."""
+    return await _run("io", get_io_executor(), func, *args, **kwargs)
+
+
+async def run_cpu(func: Callable, *args, **kwargs) -> Any:
+    """Run a CPU-bound call in the shared process pool."""
+    return await _run("cpu", get_cpu_executor(), func, *args, **kwargs)
+
+
+def get_executor_stats() -> Dict[str, Dict[str, Any]]:
+    """Queue depth and throughput metrics for every started pool."""
+    return {name: metrics.snapshot() for name, metrics in _metrics.items()}
+
+
+def shutdown_executors(wait: bool = True):
+    """Shut down both pools (called on application shutdown)."""
+    global _io_executor, _cpu_executor
+    with _init_lock:
+        if _io_executor is not None:
+            _io_executor.shutdown(wait=wait)
+            _io_executor = None
+        if _cpu_executor is not None:
+            _cpu_executor.shutdown(wait=wait)
+            _cpu_executor = None
+        _metrics.clear()
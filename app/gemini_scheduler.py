@@ -0,0 +1,307 @@
+"""
+Process-wide request scheduler for Gemini / Imagen calls.
+
+Every module that talks to Google AI (glm_processor, cleaner, chapters, metadata,
+text_rewriter, cover_art and the Chapter Editor endpoints in main.py) sends its
+SDK call through run_gemini(), so concurrent pipeline work shares one quota:
+- Requests-per-minute and tokens-per-minute token buckets per model
+  (Config.GEMINI_RPM / GEMINI_TPM, per-model overrides in Config.GEMINI_RATE_LIMITS)
+- Priority classes: interactive editor calls are admitted ahead of batch pipeline calls
+- 429 / RESOURCE_EXHAUSTED pauses the whole model queue (honouring the server's
+  retry delay when given) and retries, instead of every caller sleeping blindly
+- Queue-wait metrics via get_gemini_scheduler_stats()
+
+Priority follows the caller's context: wrap editor endpoints in
+`with gemini_priority(INTERACTIVE):` (run_io() carries it into worker threads).
+"""
+
+import contextlib
+import contextvars
+import heapq
+import itertools
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from app.config import Config
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+_priority_var = contextvars.ContextVar("gemini_priority", default=BATCH)
+
+
+class RateLimitError(Exception):
+    """Raised when a model keeps answering 429 after all scheduler retries."""
+    pass
+
+
+class TokenBucket:
+    """Classic token bucket: `capacity` tokens, refilled at `capacity` per minute."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` tokens are available (0 if available now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+    def adjust(self, amount: float):
+        """Charge (or refund, if negative) tokens after the fact; may go into debt."""
+        self.tokens = max(-self.capacity, min(self.capacity, self.tokens - amount))
+
+
+def estimate_tokens(prompt: str) -> int:
+    """Rough token estimate for admission (~4 characters per token)."""
+    return max(1, len(prompt or "") // 4)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Detect 429 / quota errors from both google.generativeai and google.genai."""
+    if getattr(error, "code", None) == 429 or getattr(error, "status_code", None) == 429:
+        return True
+    text = f"{type(error).__name__} {error}"
+    return "429" in text or "RESOURCE_EXHAUSTED" in text or "ResourceExhausted" in text
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Server-suggested retry delay in seconds, if the error carries one."""
+    # "Please retry in 27.5s" / "retry_delay { seconds: 27 }"
+    match = re.search(r"retry[^0-9]{0,30}?([0-9]+(?:\.[0-9]+)?)", str(error), re.IGNORECASE)
+    return float(match.group(1)) if match else None
+
+
+class ModelQueue:
+    """Admission queue and buckets for one model."""
+
+    def __init__(self, model: str, rpm: int, tpm: int):
+        self.model = model
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.cooldown_until = 0.0
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._seq = itertools.count()
+        self.stats = {
+            name: {"requests": 0, "tokens": 0, "total_wait_s": 0.0, "max_wait_s": 0.0}
+            for name in PRIORITY_NAMES.values()
+        }
+        self.rate_limited = 0
+
+    def _wait_time(self, tokens: int, now: float) -> float:
+        wait = self.cooldown_until - now
+        if self.requests:
+            wait = max(wait, self.requests.wait_time(1, now))
+        if self.tokens:
+            wait = max(wait, self.tokens.wait_time(tokens, now))
+        return wait
+
+    def acquire(self, tokens: int, priority: int) -> float:
+        """Block until this request may be sent; returns the time spent queued."""
+        ticket = (priority, next(self._seq))
+        start = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            # A new high-priority arrival must be able to overtake a sleeping head
+            self._cond.notify_all()
+            try:
+                while True:
+                    if self._waiting[0] == ticket:
+                        wait = self._wait_time(tokens, time.monotonic())
+                        if wait <= 0:
+                            heapq.heappop(self._waiting)
+                            if self.requests:
+                                self.requests.take(1)
+                            if self.tokens:
+                                self.tokens.take(tokens)
+                            self._cond.notify_all()
+                            break
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+            except BaseException:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self._cond.notify_all()
+                raise
+
+            waited = time.monotonic() - start
+            entry = self.stats[PRIORITY_NAMES.get(priority, "batch")]
+            entry["requests"] += 1
+            entry["tokens"] += tokens
+            entry["total_wait_s"] += waited
+            entry["max_wait_s"] = max(entry["max_wait_s"], waited)
+        return waited
+
+    def settle(self, estimated: int, actual: Optional[int]):
+        """Correct the token bucket once the real token usage is known."""
+        if actual is None or not self.tokens:
+            return
+        with self._cond:
+            self.tokens.adjust(actual - estimated)
+
+    def pause(self, seconds: float):
+        """Hold back every request to this model (after a 429)."""
+        with self._cond:
+            self.rate_limited += 1
+            self.cooldown_until = max(self.cooldown_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            now = time.monotonic()
+            priorities = {}
+            for name, entry in self.stats.items():
+                priorities[name] = {
+                    "requests": entry["requests"],
+                    "tokens": entry["tokens"],
+                    "avg_wait_ms": round(entry["total_wait_s"] * 1000 / entry["requests"], 1) if entry["requests"] else 0.0,
+                    "max_wait_ms": round(entry["max_wait_s"] * 1000, 1),
+                }
+            return {
+                "queued": len(self._waiting),
+                "rate_limited": self.rate_limited,
+                "cooldown_s": round(max(0.0, self.cooldown_until - now), 1),
+                "rpm_available": round(self.requests.tokens, 1) if self.requests else None,
+                "tpm_available": round(self.tokens.tokens) if self.tokens else None,
+                "priorities": priorities,
+            }
+
+
+def parse_rate_limits(spec: str) -> Dict[str, tuple]:
+    """Parse "model=rpm:tpm,model2=rpm:tpm" (0 = unlimited) into {model: (rpm, tpm)}."""
+    limits = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        model, values = item.split("=", 1)
+        rpm, _, tpm = values.partition(":")
+        limits[model.strip()] = (int(rpm or 0), int(tpm or 0))
+    return limits
+
+
+class GeminiScheduler:
+    """Per-model queues sharing one process-wide view of the Gemini quota."""
+
+    def __init__(self, default_rpm: int, default_tpm: int, overrides: Optional[Dict[str, tuple]] = None):
+        self.default_rpm = default_rpm
+        self.default_tpm = default_tpm
+        self.overrides = overrides or {}
+        self._queues: Dict[str, ModelQueue] = {}
+        self._lock = threading.Lock()
+
+    def queue(self, model: str) -> ModelQueue:
+        with self._lock:
+            if model not in self._queues:
+                rpm, tpm = self.overrides.get(model, (self.default_rpm, self.default_tpm))
+                self._queues[model] = ModelQueue(model, rpm, tpm)
+            return self._queues[model]
+
+    def run(
+        self,
+        model: str,
+        call: Callable[[], Any],
+        prompt: str = "",
+        priority: Optional[int] = None,
+        max_retries: Optional[int] = None,
+    ) -> Any:
+        """
+        Admit, execute and (on 429) retry one SDK call.
+
+        Args:
+            model: Model name the call uses (selects the buckets)
+            call: Zero-argument callable performing the SDK request
+            prompt: Prompt text, used to estimate token usage
+            priority: INTERACTIVE or BATCH (defaults to the caller's gemini_priority())
+            max_retries: 429 retries before RateLimitError (default Config.GEMINI_MAX_RETRIES)
+
+        Returns:
+            Whatever `call` returns
+        """
+        queue = self.queue(model)
+        priority = _priority_var.get() if priority is None else priority
+        retries = Config.GEMINI_MAX_RETRIES if max_retries is None else max_retries
+        estimated = estimate_tokens(prompt)
+
+        for attempt in range(retries + 1):
+            waited = queue.acquire(estimated, priority)
+            if waited > 1:
+                logger.info(f"[Scheduler] {model} ({PRIORITY_NAMES.get(priority)}) waited {waited:.1f}s for quota")
+            try:
+                result = call()
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    raise
+                delay = _retry_after(e) or Config.GEMINI_RETRY_DELAY * (2 ** attempt)
+                queue.pause(delay)
+                if attempt == retries:
+                    raise RateLimitError(f"{model} still rate limited after {retries} retries: {e}") from e
+                logger.warning(f"[Scheduler] {model} rate limited (429), pausing queue for {delay:.1f}s")
+                continue
+
+            usage = getattr(result, "usage_metadata", None)
+            actual = getattr(usage, "total_token_count", None)
+            queue.settle(estimated, actual if isinstance(actual, int) else None)
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            queues = dict(self._queues)
+        return {model: q.snapshot() for model, q in queues.items()}
+
+
+# Lazy initialization
+_scheduler: Optional[GeminiScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_gemini_scheduler() -> GeminiScheduler:
+    """Get the process-wide scheduler."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = GeminiScheduler(
+                Config.GEMINI_RPM,
+                Config.GEMINI_TPM,
+                parse_rate_limits(Config.GEMINI_RATE_LIMITS),
+            )
+        return _scheduler
+
+
+def get_gemini_scheduler_stats() -> Dict[str, Any]:
+    return get_gemini_scheduler().stats()
+
+
+def run_gemini(model: str, call: Callable[[], Any], prompt: str = "", priority: Optional[int] = None) -> Any:
+    """Run one Gemini/Imagen SDK call through the shared scheduler."""
+    return get_gemini_scheduler().run(model, call, prompt=prompt, priority=priority)
+
+
+@contextlib.contextmanager
+def gemini_priority(priority: int):
+    """Run Gemini calls made inside this block with the given priority class."""
+    token = _priority_var.set(priority)
+    try:
+        yield
+    finally:
+        _priority_var.reset(token)
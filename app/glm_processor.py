@@ -9,26 +9,38 @@ Uses Google Gemini for text processing:
 
 import os
 import re
+import json
 import logging
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import google.generativeai as genai
 
+from app.config import Config
+from app.gemini_scheduler import run_gemini
+from app.llm_cache import cached_generate
+
 logger = logging.getLogger(__name__)
 
+GEMINI_MODEL_NAME = "gemini-2.0-flash"
+
 # Lazy client initialization
 _gemini_configured = False
 
 
+def configure_gemini():
+    """(Re)configure the Gemini SDK from GEMINI_API_KEY; safe to call at any time."""
+    global _gemini_configured
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY environment variable not set")
+    genai.configure(api_key=api_key)
+    _gemini_configured = True
+
+
 def get_gemini_model():
     """Get configured Gemini model."""
-    global _gemini_configured
     if not _gemini_configured:
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY environment variable not set")
-        genai.configure(api_key=api_key)
-        _gemini_configured = True
-    return genai.GenerativeModel("gemini-2.0-flash")
+        configure_gemini()
+    return genai.GenerativeModel(GEMINI_MODEL_NAME)
 
 
 # ============================================
@@ -133,17 +145,64 @@ Her er teksten der skal forarbejdes:
 {text}"""
 
 
+PARAGRAPH_BOUNDARY_PROMPT = """INSTRUKTION TIL TEKST-EDITOR (PARAGRAF-GRÆNSER):
+
+Du forbereder bøger til en lydbogs-app. Du modtager kapitlets sætninger som en nummereret liste.
+Din opgave er KUN at afgøre hvor nye PARAGRAPHS starter. Du skal IKKE gentage eller omskrive teksten.
+
+REGLER:
+1. Hver paragraph skal typisk have MINIMUM 20-30 ord - saml korte sætninger med naboerne.
+2. Start en ny paragraph ved naturlige skift i emne eller tanke.
+3. Lister (A., B., C. / 1., 2., 3. / i., ii., iii.) holdes i SAMME paragraph (over 10 punkter: del i 2).
+4. Underoverskrifter, citater, verslinjer og kort dialog må godt stå alene.
+5. Marker støj der IKKE er bogindhold under "drop": sidetal ("23 / 47"), filstørrelser ("267Kb"),
+   "Click to enlarge", navigation og gentaget metadata.
+
+OUTPUT: KUN JSON, ingen forklaringer:
+{{"starts": [1, 4, 9], "drop": [7]}}
+- "starts": numrene på de sætninger der STARTER en ny paragraph (første nummer er altid {first})
+- "drop": numrene på støj-sætninger (tom liste hvis ingen)
+
+Her er sætningerne:
+
+{numbered_text}"""
+
+
 # ============================================
 # PROCESSING FUNCTIONS
 # ============================================
 
-def call_gemini(prompt: str) -> str:
-    """Call Gemini API with given prompt."""
-    model = get_gemini_model()
+# Echo responses (text rewritten with markers) shorter than this share of the source
+# words are truncated; they are used once but never cached
+ECHO_MIN_WORD_RATIO = 0.9
+# Sources at least this long are expected to come back with at least one marker
+ECHO_MARKER_MIN_WORDS = 200
+
+
+def echo_response_check(source: str, marker: str):
+    """Cache validator for echo prompts: `marker` present and (nearly) all source words echoed."""
+    source_words = count_words(source)
     
-    try:
-        response = model.generate_content(prompt)
+    def valid(response: str) -> bool:
+        if source_words >= ECHO_MARKER_MIN_WORDS and marker not in response:
+            return False
+        return count_words(response.replace(marker, " ")) >= ECHO_MIN_WORD_RATIO * source_words
+    return valid
+
+
+def call_gemini(prompt: str, prompt_version: str = "glm-v1", validate=None) -> str:
+    """
+    Call Gemini API with given prompt (responses are cached by content hash).
+    
+    Responses failing `validate` are returned but not cached (see cached_generate).
+    """
+    def generate() -> str:
+        model = get_gemini_model()
+        response = run_gemini(GEMINI_MODEL_NAME, lambda: model.generate_content(prompt), prompt=prompt)
         return response.text.strip()
+    
+    try:
+        return cached_generate(GEMINI_MODEL_NAME, prompt_version, prompt, generate, validate=validate)
         
     except Exception as e:
         logger.error(f"Gemini API error: {e}")
@@ -250,13 +309,27 @@ def validate_and_merge_paragraphs(paragraphs: List[Dict], chapter_title: str = N
     return validated
 
 
-def process_chapter_paragraphs(text: str, chapter_title: str = None) -> List[Dict]:
+def parse_paragraph_markers(result: str) -> List[str]:
+    """Split an echo-mode response at [PARAGRAPH] markers (double newlines if none)."""
+    paragraphs = [part.strip() for part in re.split(r'\[PARAGRAPH\]', result) if part.strip()]
+    
+    # If no markers found, split by double newlines
+    if len(paragraphs) <= 1 and result:
+        paragraphs = [part.strip() for part in result.split('\n\n') if part.strip()]
+    
+    return paragraphs
+
+
+def process_chapter_paragraphs(text: str, chapter_title: str = None, mode: str = None) -> List[Dict]:
     """
     Process chapter text to create natural paragraphs.
     
     Args:
         text: Raw chapter text content
         chapter_title: The chapter title (will be used as Paragraph 0 UNCHANGED)
+        mode: "echo" (Gemini rewrites the text with [PARAGRAPH] markers) or
+              "offsets" (Gemini returns sentence boundaries only).
+              Defaults to Config.V3_PARAGRAPH_MODE.
     
     Returns list of paragraph dicts:
     [{"id": "p0", "text": "Chapter Title"}, {"id": "p1", "text": "..."}, ...]
@@ -264,6 +337,13 @@ def process_chapter_paragraphs(text: str, chapter_title: str = None) -> List[Dic
     NOTE: The chapter_title is added EXACTLY as provided from the JSON/mapping.
     Gemini only processes the content, not the title.
     """
+    mode = mode or Config.V3_PARAGRAPH_MODE
+    if mode == "offsets":
+        try:
+            return process_chapter_paragraphs_offsets(text, chapter_title)
+        except Exception as e:
+            logger.warning(f"Offsets paragraph mode failed ({e}), falling back to echo mode")
+    
     # Start with empty list - we'll add title as p0 first
     final_paragraphs = []
     
@@ -276,25 +356,9 @@ def process_chapter_paragraphs(text: str, chapter_title: str = None) -> List[Dic
         return final_paragraphs
     
     prompt = PARAGRAPH_PROMPT.format(text=text)
-    result = call_gemini(prompt)
-    
-    # Parse [PARAGRAPH] markers
-    content_paragraphs = []
-    parts = re.split(r'\[PARAGRAPH\]', result)
-    
-    for part in parts:
-        cleaned = part.strip()
-        if cleaned:
-            content_paragraphs.append({"id": "", "text": cleaned})
-    
-    # If no markers found, split by double newlines
-    if len(content_paragraphs) <= 1 and result:
-        parts = result.split('\n\n')
-        content_paragraphs = []
-        for part in parts:
-            cleaned = part.strip()
-            if cleaned:
-                content_paragraphs.append({"id": "", "text": cleaned})
+    result = call_gemini(prompt, prompt_version="glm-paragraphs-v1",
+                         validate=echo_response_check(text, "[PARAGRAPH]"))
+    content_paragraphs = [{"id": "", "text": p} for p in parse_paragraph_markers(result)]
     
     # POST-PROCESSING: Validate and merge short paragraphs (content only)
     content_paragraphs = validate_and_merge_paragraphs(content_paragraphs)
@@ -308,6 +372,185 @@ def process_chapter_paragraphs(text: str, chapter_title: str = None) -> List[Dic
     return final_paragraphs
 
 
+# ============================================
+# OFFSET-BASED PARAGRAPH SPLITTING
+# ============================================
+
+# Sentences per Gemini call in offsets mode (output is only a list of numbers)
+MAX_SENTENCES_PER_CALL = 400
+
+
+def parse_paragraph_boundaries(content: str, first: int, last: int) -> Tuple[List[int], List[int]]:
+    """
+    Parse a boundary response ({"starts": [...], "drop": [...]}) into clean index lists.
+
+    Indices outside [first, last] are ignored; `first` is always a paragraph start.
+
+    Returns:
+        (sorted paragraph start numbers, sorted dropped sentence numbers)
+    """
+    data = None
+    try:
+        data = json.loads(content)
+    except (json.JSONDecodeError, TypeError):
+        match = re.search(r'\{.*\}', content or "", re.DOTALL)
+        if match:
+            try:
+                data = json.loads(match.group(0))
+            except json.JSONDecodeError:
+                data = None
+    
+    if not isinstance(data, dict):
+        raise ValueError("Paragraph boundary response is not a JSON object")
+    
+    def clean(values) -> List[int]:
+        result = set()
+        for v in values or []:
+            try:
+                v = int(v)
+            except (TypeError, ValueError):
+                continue
+            if first <= v <= last:
+                result.add(v)
+        return sorted(result)
+    
+    starts = clean(data.get("starts"))
+    drop = clean(data.get("drop"))
+    if not starts or starts[0] != first:
+        starts = [first] + starts
+    return starts, drop
+
+
+def rebuild_paragraphs(text: str, spans: List[Tuple[int, int]], starts: List[int], drop: List[int] = None) -> List[str]:
+    """
+    Rebuild paragraph text locally from the source using sentence offsets.
+
+    Args:
+        text: Original chapter text
+        spans: Sentence (start, end) offsets into `text`
+        starts: 0-based sentence indices that start a paragraph
+        drop: 0-based sentence indices to leave out (noise)
+
+    Returns:
+        Paragraph strings built from verbatim source sentences
+    """
+    dropped = set(drop or [])
+    boundaries = sorted(set(starts) | {0})
+    paragraphs = []
+    
+    for n, start in enumerate(boundaries):
+        end = boundaries[n + 1] if n + 1 < len(boundaries) else len(spans)
+        pieces = [text[spans[i][0]:spans[i][1]] for i in range(start, end) if i not in dropped]
+        paragraph = " ".join(" ".join(pieces).split())
+        if paragraph:
+            paragraphs.append(paragraph)
+    
+    return paragraphs
+
+
+def find_paragraph_boundaries(text: str, spans: List[Tuple[int, int]], allow_drop: bool = True) -> Tuple[List[int], List[int]]:
+    """
+    Ask Gemini for paragraph starts over numbered sentences (in chunks).
+
+    Returns:
+        (0-based paragraph start indices, 0-based dropped sentence indices)
+    """
+    from app.sentence_detector import sentences_to_numbered_text
+    
+    all_starts: List[int] = []
+    all_drop: List[int] = []
+    
+    for offset in range(0, len(spans), MAX_SENTENCES_PER_CALL):
+        chunk = spans[offset:offset + MAX_SENTENCES_PER_CALL]
+        sentences = [" ".join(text[s:e].split()) for s, e in chunk]
+        
+        # Number sentences globally so every chunk reports chapter-level indices
+        numbered = sentences_to_numbered_text(sentences, start=offset + 1)
+        
+        first, last = offset + 1, offset + len(chunk)
+        prompt = PARAGRAPH_BOUNDARY_PROMPT.format(numbered_text=numbered, first=first)
+        result = call_gemini(prompt, prompt_version="glm-paragraph-offsets-v1")
+        starts, drop = parse_paragraph_boundaries(result, first, last)
+        
+        all_starts.extend(n - 1 for n in starts)
+        if allow_drop:
+            all_drop.extend(n - 1 for n in drop)
+    
+    return all_starts, all_drop
+
+
+def split_paragraphs_by_offsets(text: str, allow_drop: bool = True) -> List[str]:
+    """
+    Split text into paragraphs without having the model echo it back.
+
+    The model sees numbered sentences and returns only boundary indices;
+    paragraph text is rebuilt locally from the source.
+    """
+    from app.sentence_detector import detect_sentence_spans
+    
+    spans = detect_sentence_spans(text)
+    if not spans:
+        return []
+    
+    starts, drop = find_paragraph_boundaries(text, spans, allow_drop=allow_drop)
+    return rebuild_paragraphs(text, spans, starts, drop)
+
+
+def process_chapter_paragraphs_offsets(text: str, chapter_title: str = None) -> List[Dict]:
+    """
+    Offsets-mode variant of process_chapter_paragraphs (same return format).
+
+    Paragraph text is the verbatim source; number-to-word conversion for TTS
+    happens later in the sections pass.
+    """
+    final_paragraphs = []
+    if chapter_title:
+        final_paragraphs.append({"id": "p0", "text": chapter_title})
+    
+    if not text or not text.strip():
+        return final_paragraphs
+    
+    content_paragraphs = [{"id": "", "text": p} for p in split_paragraphs_by_offsets(text)]
+    content_paragraphs = validate_and_merge_paragraphs(content_paragraphs)
+    
+    for i, para in enumerate(content_paragraphs):
+        para["id"] = f"p{len(final_paragraphs) + i}"
+        final_paragraphs.append(para)
+    
+    logger.info(f"Offsets mode created {len(final_paragraphs)} paragraphs (1 title + {len(content_paragraphs)} content) from {len(text)} chars")
+    return final_paragraphs
+
+
+def process_chapter_paragraphs_windowed(text: str, chapter_title: str = None) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Long-chapter variant of process_chapter_paragraphs (echo mode).
+
+    The chapter is processed as concurrent overlapping windows and stitched
+    (see app/long_chapter.py). Raises TextLossError if any text is lost.
+
+    Returns:
+        (paragraphs in process_chapter_paragraphs format, per-window report)
+    """
+    from app.long_chapter import split_long_chapter_paragraphs
+    
+    final_paragraphs = []
+    if chapter_title:
+        final_paragraphs.append({"id": "p0", "text": chapter_title})
+    
+    if not text or not text.strip():
+        return final_paragraphs, []
+    
+    stitched, windows = split_long_chapter_paragraphs(text)
+    content_paragraphs = validate_and_merge_paragraphs([{"id": "", "text": p} for p in stitched])
+    
+    for i, para in enumerate(content_paragraphs):
+        para["id"] = f"p{len(final_paragraphs) + i}"
+        final_paragraphs.append(para)
+    
+    logger.info(f"Windowed mode created {len(final_paragraphs)} paragraphs from {len(text)} chars in {len(windows)} windows")
+    return final_paragraphs, windows
+
+
 def process_chapter_sections(text: str) -> List[Dict]:
     """
     Process chapter text to create TTS sections (250-300 chars).
@@ -319,7 +562,7 @@ def process_chapter_sections(text: str) -> List[Dict]:
         return []
     
     prompt = SECTION_PROMPT.format(text=text)
-    result = call_gemini(prompt)
+    result = call_gemini(prompt, prompt_version="glm-sections-v1", validate=echo_response_check(text, "[SECTION]"))
     
     # Parse [SECTION] markers
     sections = []
@@ -378,29 +621,106 @@ def split_long_section(text: str, max_chars: int = 300) -> List[str]:
     return sections
 
 
-def process_full_chapter(chapter_title: str, chapter_text: str) -> Dict:
+# ============================================
+# LOCAL SECTIONER
+# ============================================
+
+SECTION_MAX_CHARS = 300
+
+
+def split_paragraph_into_sections(text: str, max_chars: int = SECTION_MAX_CHARS) -> List[str]:
+    """
+    Deterministically split one paragraph into TTS sections.
+    
+    Sentence boundaries first (split_long_section), then clause boundaries
+    and finally words for single sentences that are still too long.
+    """
+    from app.sentence_detector import split_long_sentence
+    
+    text = " ".join(text.split())
+    if not text:
+        return []
+    
+    sections = []
+    for chunk in split_long_section(text, max_chars=max_chars):
+        if len(chunk) > max_chars:
+            sections.extend(split_long_sentence(chunk, max_chars=max_chars))
+        else:
+            sections.append(chunk)
+    
+    return [sec for sec in sections if sec.strip()]
+
+
+def process_chapter_sections_local(paragraphs: List[Dict], max_chars: int = SECTION_MAX_CHARS) -> List[Dict]:
+    """
+    Derive TTS sections locally from already-cleaned paragraphs.
+    
+    Every section lies inside exactly one paragraph and carries its paragraph_id.
+    Same input always gives the same sections (no LLM call).
+    
+    Returns list of section dicts:
+    [{"id": "s0", "text": "...", "paragraph_id": "p1"}, ...]
+    """
+    sections = []
+    for para in paragraphs:
+        for text in split_paragraph_into_sections(para.get("text", ""), max_chars=max_chars):
+            sections.append({
+                "id": f"s{len(sections)}",
+                "text": text,
+                "paragraph_id": para.get("id")
+            })
+    
+    logger.info(f"Local sectioner created {len(sections)} sections from {len(paragraphs)} paragraphs")
+    return sections
+
+
+def process_full_chapter(chapter_title: str, chapter_text: str, section_mode: str = None) -> Dict:
     """
     Process a complete chapter through GLM pipeline.
     
+    Args:
+        chapter_title: Chapter title (Paragraph 0)
+        chapter_text: Raw chapter content
+        section_mode: "local" (deterministic split of the cleaned paragraphs) or
+                      "gemini" (second LLM pass with SECTION_PROMPT).
+                      Defaults to Config.V3_SECTION_MODE.
+    
     Returns:
     {
         "title": "Chapter name",
         "paragraphs": [...],
-        "sections": [...]
+        "sections": [...],
+        "windows": [...]  # only for long chapters processed in windows
     }
     """
     logger.info(f"Processing chapter: {chapter_title}")
     
+    section_mode = section_mode or Config.V3_SECTION_MODE
+    windows = None
+    
     # Get paragraphs first - pass chapter_title to ensure Paragraph 0 is correct
-    paragraphs = process_chapter_paragraphs(chapter_text, chapter_title=chapter_title)
+    if Config.V3_PARAGRAPH_MODE != "offsets" and chapter_text and len(chapter_text) > Config.V3_LONG_CHAPTER_CHARS:
+        paragraphs, windows = process_chapter_paragraphs_windowed(chapter_text, chapter_title=chapter_title)
+    else:
+        paragraphs = process_chapter_paragraphs(chapter_text, chapter_title=chapter_title)
     
     # Use cleaned paragraph text for sections (skip paragraph 0 which is the title)
     content_paragraphs = paragraphs[1:] if len(paragraphs) > 1 else paragraphs
-    cleaned_text = "\n\n".join([p["text"] for p in content_paragraphs])
-    sections = process_chapter_sections(cleaned_text)
     
-    return {
+    # The local sectioner needs paragraphs that are already cleaned for TTS
+    # (numbers to words etc.). Offsets-mode paragraphs are verbatim source text,
+    # so they still need the Gemini section pass.
+    if section_mode == "local" and Config.V3_PARAGRAPH_MODE != "offsets":
+        sections = process_chapter_sections_local(content_paragraphs)
+    else:
+        cleaned_text = "\n\n".join([p["text"] for p in content_paragraphs])
+        sections = process_chapter_sections(cleaned_text)
+    
+    result = {
         "title": chapter_title,
         "paragraphs": paragraphs,
         "sections": sections
     }
+    if windows is not None:
+        result["windows"] = windows
+    return result
@@ -0,0 +1,264 @@
+"""
+Journaled job store for V3 pipeline jobs.
+
+Each job is persisted as two files in the jobs directory:
+- {job_id}.json            Small header (phase, metadata, progress, stats) without chapters
+- {job_id}.chapters.jsonl  Append-only chapter journal, one line per chapter mutation
+
+Journal lines are formatted as "{index}\\t{chapter json}" so readers can skip
+chapters they do not need without parsing them. The last record for an index wins.
+Phase transitions compact the journal down to exactly one record per chapter.
+
+Legacy job files that embed the full "chapters" list in {job_id}.json are read
+transparently and converted to the journaled layout on their next save.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+HEADER_SUFFIX = ".json"
+JOURNAL_SUFFIX = ".chapters.jsonl"
+
+
+def _chapter_line(index: int, chapter: Dict) -> str:
+    """Serialize one chapter record as a journal line."""
+    return f"{index}\t{json.dumps(chapter, ensure_ascii=False)}\n"
+
+
+def _line_digest(line: str) -> str:
+    return hashlib.sha1(line.encode("utf-8")).hexdigest()
+
+
+def _write_atomic(path: str, content: str):
+    """Write a file via temp file + rename so readers never see a torn write."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+class JobStore:
+    """
+    File-based job store with a header record and a per-chapter journal.
+
+    Writes are serialized with a lock so chapter workers running in threads
+    can append concurrently.
+    """
+
+    def __init__(self, jobs_dir: str):
+        self.jobs_dir = jobs_dir
+        self._lock = threading.RLock()
+        # job_id -> {chapter_index: digest of last persisted line}
+        self._digests: Dict[str, Dict[int, str]] = {}
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    # ============================================
+    # PATHS
+    # ============================================
+
+    def header_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}{HEADER_SUFFIX}")
+
+    def journal_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}{JOURNAL_SUFFIX}")
+
+    # ============================================
+    # READING
+    # ============================================
+
+    def _read_header(self, job_id: str) -> Optional[Dict]:
+        path = self.header_path(job_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _iter_journal(self, job_id: str, wanted: Optional[set] = None):
+        """Yield (index, raw_line) for journal records, optionally filtered by index."""
+        path = self.journal_path(job_id)
+        if not os.path.exists(path):
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                idx_str, sep, _ = line.partition("\t")
+                if not sep or not line.endswith("\n"):
+                    # Torn trailing write (crash mid-append) - ignore it
+                    logger.warning(f"[JobStore] Skipping incomplete journal record for job {job_id[:8]}")
+                    continue
+                try:
+                    index = int(idx_str)
+                except ValueError:
+                    continue
+                if wanted is not None and index not in wanted:
+                    continue
+                yield index, line
+
+    def load(self, job_id: str, include_chapters: bool = True) -> Optional[Dict]:
+        """
+        Load a job state.
+
+        Args:
+            job_id: Job UUID
+            include_chapters: If False, only the header is read and the returned
+                state has no "chapters" key (cheap for status polling).
+
+        Returns:
+            State dict, or None if the job does not exist
+        """
+        header = self._read_header(job_id)
+        if header is None:
+            return None
+
+        if "chapters" in header:
+            # Legacy single-file job
+            if not include_chapters:
+                header["chapter_count"] = len(header.pop("chapters"))
+            return header
+
+        if include_chapters:
+            chapters = self.load_chapters(job_id)
+            count = max(header.get("chapter_count", 0), max(chapters, default=-1) + 1)
+            header["chapters"] = [chapters.get(i, {}) for i in range(count)]
+        return header
+
+    def load_chapters(self, job_id: str, indices: Optional[Iterable[int]] = None) -> Dict[int, Dict]:
+        """
+        Load chapter records by position without materializing the rest of the job.
+
+        Args:
+            job_id: Job UUID
+            indices: Chapter positions to load (None = all)
+
+        Returns:
+            Dict of chapter position -> chapter dict
+        """
+        wanted = set(indices) if indices is not None else None
+
+        header = self._read_header(job_id)
+        if header is not None and "chapters" in header:
+            return {
+                i: ch for i, ch in enumerate(header["chapters"])
+                if wanted is None or i in wanted
+            }
+
+        latest: Dict[int, str] = {}
+        for index, line in self._iter_journal(job_id, wanted):
+            latest[index] = line
+
+        chapters = {}
+        for index, line in latest.items():
+            try:
+                chapters[index] = json.loads(line.partition("\t")[2])
+            except json.JSONDecodeError:
+                logger.warning(f"[JobStore] Corrupt journal record {index} for job {job_id[:8]}")
+        return chapters
+
+    # ============================================
+    # WRITING
+    # ============================================
+
+    def _write_header(self, job_id: str, state: Dict, chapter_count: int):
+        header = {k: v for k, v in state.items() if k != "chapters"}
+        header["chapter_count"] = chapter_count
+        _write_atomic(self.header_path(job_id), json.dumps(header, indent=2, ensure_ascii=False))
+
+    def _known_digests(self, job_id: str) -> Dict[int, str]:
+        """Digests of the latest persisted line per chapter (rebuilt from disk on first use)."""
+        if job_id not in self._digests:
+            self._digests[job_id] = {
+                index: _line_digest(line) for index, line in self._iter_journal(job_id)
+            }
+        return self._digests[job_id]
+
+    def compact(self, job_id: str, chapters: List[Dict]):
+        """Rewrite the journal so it holds exactly one record per chapter."""
+        with self._lock:
+            lines = [_chapter_line(i, ch) for i, ch in enumerate(chapters)]
+            _write_atomic(self.journal_path(job_id), "".join(lines))
+            self._digests[job_id] = {i: _line_digest(line) for i, line in enumerate(lines)}
+
+    def append_chapters(self, job_id: str, chapters: Dict[int, Dict]):
+        """Append journal records for the given chapter positions."""
+        if not chapters:
+            return
+        with self._lock:
+            digests = self._known_digests(job_id)
+            with open(self.journal_path(job_id), "a", encoding="utf-8") as f:
+                for index in sorted(chapters):
+                    line = _chapter_line(index, chapters[index])
+                    f.write(line)
+                    digests[index] = _line_digest(line)
+
+    def save(self, job_id: str, state: Dict, chapters: Optional[Iterable[int]] = None,
+             header_fields: Optional[Iterable[str]] = None):
+        """
+        Persist a job state.
+
+        - Phase transitions (or a changed chapter count) compact the journal.
+        - With `chapters` given, only those chapter positions are appended.
+        - Otherwise only chapters whose content changed since the last write are appended.
+        - A state without a "chapters" key updates the header only.
+        - With `header_fields` given, only those header keys are taken from `state`;
+          the rest of the header on disk is kept (tasks running side by side each
+          write the fields they own).
+
+        Args:
+            job_id: Job UUID
+            state: Full or header-only job state
+            chapters: Optional chapter positions known to have changed
+            header_fields: Optional header keys owned by the caller
+        """
+        with self._lock:
+            previous = self._read_header(job_id)
+
+            if header_fields is not None and previous is not None:
+                merged = {k: v for k, v in previous.items() if k not in ("chapters", "chapter_count")}
+                merged.update({k: state[k] for k in header_fields if k in state})
+                if "chapters" in state:
+                    merged["chapters"] = state["chapters"]
+                state = merged
+
+            if "chapters" not in state:
+                count = previous.get("chapter_count", 0) if previous else 0
+                if previous and "chapters" in previous:
+                    # Header-only save on a legacy job: migrate its chapters first
+                    self.compact(job_id, previous["chapters"])
+                    count = len(previous["chapters"])
+                self._write_header(job_id, state, count)
+                return
+
+            all_chapters = state["chapters"]
+            needs_compaction = (
+                previous is None
+                or "chapters" in previous
+                or previous.get("phase") != state.get("phase")
+                or previous.get("chapter_count") != len(all_chapters)
+                or not os.path.exists(self.journal_path(job_id))
+            )
+
+            if needs_compaction:
+                self.compact(job_id, all_chapters)
+            elif chapters is not None:
+                self.append_chapters(job_id, {
+                    i: all_chapters[i] for i in chapters if 0 <= i < len(all_chapters)
+                })
+            else:
+                digests = self._known_digests(job_id)
+                changed = {}
+                for i, ch in enumerate(all_chapters):
+                    if digests.get(i) != _line_digest(_chapter_line(i, ch)):
+                        changed[i] = ch
+                self.append_chapters(job_id, changed)
+
+            self._write_header(job_id, state, len(all_chapters))
+
+    def save_chapter(self, job_id: str, index: int, chapter: Dict):
+        """Append a single chapter record without touching the header."""
+        self.append_chapters(job_id, {index: chapter})
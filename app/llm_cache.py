@@ -0,0 +1,226 @@
+"""
+Content-addressed on-disk cache for Gemini responses.
+
+Entries are keyed by sha256(model, prompt template version, prompt text, generation config),
+so re-running a job, resegmenting a chapter or re-optimizing unchanged text returns
+the stored response instead of paying for another LLM pass.
+
+- Size-bounded: least recently used entries are evicted above Config.LLM_CACHE_MAX_MB
+- Bypass: Config.LLM_CACHE_BYPASS (env LLM_CACHE_BYPASS=true), the `bypass=` argument,
+  or the llm_cache_bypass() context manager for a single request
+- Hit/miss counters via get_llm_cache_stats()
+"""
+
+import contextlib
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from app.config import Config
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+_bypass_var = contextvars.ContextVar("llm_cache_bypass", default=False)
+
+
+def make_cache_key(model: str, prompt_version: str, prompt: str, generation_config: Optional[Dict] = None) -> str:
+    """Build the content hash for one LLM call."""
+    payload = json.dumps({
+        "model": model,
+        "prompt_version": prompt_version,
+        "prompt": prompt,
+        "generation_config": generation_config or {},
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """Size-bounded LRU cache of raw response text stored as one file per key."""
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.txt")
+
+    def _iter_entries(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".txt"):
+                    yield os.path.join(root, name)
+
+    def _ensure_size_known(self):
+        if self._total_bytes is None:
+            self._total_bytes = sum(os.path.getsize(p) for p in self._iter_entries())
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for `key`, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # Touch for LRU ordering
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put(self, key: str, value: str):
+        """Store a response and evict least recently used entries if over budget."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with self._lock:
+            self._ensure_size_known()
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+
+            self._total_bytes += os.path.getsize(path) - old_size
+            self.writes += 1
+
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Remove oldest entries until the cache is at 90% of its budget."""
+        target = int(self.max_bytes * 0.9)
+        entries = []
+        for p in self._iter_entries():
+            try:
+                st = os.stat(p)
+                entries.append((st.st_mtime, st.st_size, p))
+            except FileNotFoundError:
+                continue
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, p in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(p)
+                total -= size
+                self.evictions += 1
+            except FileNotFoundError:
+                continue
+        self._total_bytes = total
+        logger.info(f"[LLMCache] Evicted down to {total / 1024 / 1024:.1f} MB")
+
+    def clear(self):
+        with self._lock:
+            for p in list(self._iter_entries()):
+                os.remove(p)
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._ensure_size_known()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "size_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "bypass": Config.LLM_CACHE_BYPASS,
+            }
+
+
+# Lazy initialization
+_llm_cache: Optional[LLMCache] = None
+
+
+def get_llm_cache() -> LLMCache:
+    """Get the process-wide LLM cache."""
+    global _llm_cache
+    if _llm_cache is None:
+        _llm_cache = LLMCache(Config.LLM_CACHE_DIR, Config.LLM_CACHE_MAX_MB * 1024 * 1024)
+    return _llm_cache
+
+
+def get_llm_cache_stats() -> Dict[str, Any]:
+    return get_llm_cache().stats()
+
+
+@contextlib.contextmanager
+def llm_cache_bypass():
+    """Skip cache reads (but still refresh entries) for calls made inside this block."""
+    token = _bypass_var.set(True)
+    try:
+        yield
+    finally:
+        _bypass_var.reset(token)
+
+
+def cached_generate(
+    model: str,
+    prompt_version: str,
+    prompt: str,
+    generate: Callable[[], str],
+    generation_config: Optional[Dict] = None,
+    validate: Optional[Callable[[str], bool]] = None,
+    bypass: bool = False,
+) -> str:
+    """
+    Return a cached LLM response or call `generate()` and store its result.
+
+    Args:
+        model: Model name (part of the key)
+        prompt_version: Version tag of the prompt template/parser (bump to invalidate)
+        prompt: Full prompt text sent to the model
+        generate: Zero-argument callable that performs the real LLM call
+        generation_config: Generation settings that affect output (part of the key)
+        validate: Optional check; responses failing it are returned but not cached
+        bypass: Skip the cache read for this call
+
+    Returns:
+        Raw response text
+    """
+    cache = get_llm_cache()
+    key = make_cache_key(model, prompt_version, prompt, generation_config)
+    skip_read = bypass or Config.LLM_CACHE_BYPASS or _bypass_var.get()
+
+    if not skip_read:
+        cached = cache.get(key)
+        if cached is not None:
+            logger.debug(f"[LLMCache] Hit {prompt_version} ({key[:12]})")
+            return cached
+
+    start = time.monotonic()
+    value = generate()
+    logger.debug(f"[LLMCache] Miss {prompt_version} ({key[:12]}) - generated in {time.monotonic() - start:.1f}s")
+
+    if value and (validate is None or validate(value)):
+        try:
+            cache.put(key, value)
+        except OSError as e:
+            logger.warning(f"[LLMCache] Could not store entry: {e}")
+    return value
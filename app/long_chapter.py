@@ -0,0 +1,310 @@
+"""
+Windowed processing of very long chapters for the V3 pipeline.
+
+A single PARAGRAPH_PROMPT call over a whole long chapter is slow, can silently
+truncate its output and stalls the rest of the book. Long chapters are instead:
+1. Split at sentence boundaries into overlapping windows (~Config.V3_WINDOW_CHARS)
+2. Sent to Gemini concurrently (Config.V3_WINDOW_CONCURRENCY windows at a time)
+3. Aligned back to the source sentences word by word
+4. Stitched at one cut per overlap, preferring a paragraph break both windows agree on
+5. Checked for lost text - TextLossError names the window and sentence range
+
+Per-window timings are returned alongside the paragraphs.
+"""
+
+import contextvars
+import difflib
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from app.config import Config
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Consecutive source words a window may leave out before we call it lost text.
+# Echo mode legitimately drops noise (page numbers, "Click to enlarge") and
+# rewrites numbers as words, but never a whole sentence of book content.
+MAX_UNMATCHED_WORDS = 12
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class TextLossError(ValueError):
+    """Raised when the stitched chapter is missing source text."""
+
+
+def build_windows(spans: List[Tuple[int, int]], window_chars: int, overlap: int) -> List[Tuple[int, int]]:
+    """
+    Group sentences into overlapping windows.
+
+    Args:
+        spans: Sentence (start, end) offsets into the chapter text
+        window_chars: Target characters per window
+        overlap: Sentences shared by neighbouring windows
+
+    Returns:
+        List of (first_sentence, end_sentence) ranges, end exclusive
+    """
+    windows = []
+    start = 0
+    while start < len(spans):
+        end = start + 1
+        while end < len(spans) and spans[end][1] - spans[start][0] <= window_chars:
+            end += 1
+        windows.append((start, end))
+        if end >= len(spans):
+            break
+        # Keep the overlap below a third of the window so every window owns some text
+        start = max(end - min(overlap, (end - start) // 3), start + 1)
+    return windows
+
+
+def align_window(text: str, spans: List[Tuple[int, int]], window: Tuple[int, int], paragraphs: List[str]) -> Dict:
+    """
+    Map every word of a window's output paragraphs back to a source sentence.
+
+    Args:
+        text: Chapter text
+        spans: Sentence offsets for the whole chapter
+        window: (first_sentence, end_sentence) of this window
+        paragraphs: Paragraph texts returned for the window
+
+    Returns:
+        {"tokens": [(paragraph, sentence, start, end), ...],
+         "matched": {sentence: matched_word_count},
+         "starts": sorted sentence indices where a paragraph starts}
+    """
+    first, end = window
+    src_words, src_sentence = [], []
+    for i in range(first, end):
+        for m in _WORD_RE.finditer(text, spans[i][0], spans[i][1]):
+            src_words.append(m.group(0).lower())
+            src_sentence.append(i)
+
+    out_words, out_pos = [], []
+    for p, para in enumerate(paragraphs):
+        for m in _WORD_RE.finditer(para):
+            out_words.append(m.group(0).lower())
+            out_pos.append((p, m.start(), m.end()))
+
+    aligned: List[Optional[int]] = [None] * len(out_words)
+    matched: Dict[int, int] = {}
+    matcher = difflib.SequenceMatcher(None, src_words, out_words, autojunk=False)
+    for a, b, size in matcher.get_matching_blocks():
+        for k in range(size):
+            sentence = src_sentence[a + k]
+            aligned[b + k] = sentence
+            matched[sentence] = matched.get(sentence, 0) + 1
+
+    # Unmatched output words (numbers written out, OCR fixes) follow their neighbours
+    fill = next((s for s in aligned if s is not None), first)
+    for k, sentence in enumerate(aligned):
+        if sentence is None:
+            aligned[k] = fill
+        else:
+            fill = sentence
+
+    tokens = [(p, aligned[k], s, e) for k, (p, s, e) in enumerate(out_pos)]
+    starts = set()
+    seen = set()
+    for p, sentence, _, _ in tokens:
+        if p not in seen:
+            seen.add(p)
+            starts.add(sentence)
+
+    return {"tokens": tokens, "matched": matched, "starts": sorted(starts)}
+
+
+def choose_cut(left: Dict, right: Dict, overlap: Tuple[int, int]) -> int:
+    """
+    Pick the sentence where the right window takes over from the left one.
+
+    Preference: a paragraph start both windows agree on, then one chosen by
+    either window, then the overlap midpoint (splits a paragraph).
+
+    Args:
+        left: align_window() result for the earlier window
+        right: align_window() result for the later window
+        overlap: (first shared sentence, end of the left window)
+    """
+    lo, hi = overlap
+    mid = (lo + hi) // 2
+    # Window edges always open/close a paragraph, so they only count as the
+    # other window's judgement: the left window's break at `lo`, or the right
+    # window's break at `hi` where the left window simply ran out of text.
+    left_starts = {s for s in left["starts"] if lo <= s < hi}
+    right_starts = {s for s in right["starts"] if lo < s <= hi}
+
+    candidates = (left_starts & right_starts) or (left_starts | right_starts)
+    if not candidates:
+        return mid
+    return min(candidates, key=lambda s: (abs(s - mid), s))
+
+
+def _slice_paragraphs(paragraphs: List[str], tokens: List[Tuple[int, int, int, int]], lo: int, hi: int) -> List[str]:
+    """Keep the parts of a window's paragraphs whose words map to sentences [lo, hi)."""
+    result = []
+    by_para: Dict[int, List[int]] = {}
+    for k, (p, _, _, _) in enumerate(tokens):
+        by_para.setdefault(p, []).append(k)
+
+    for p, para in enumerate(paragraphs):
+        idx = by_para.get(p, [])
+        keep = [k for k in idx if lo <= tokens[k][1] < hi]
+        if not keep:
+            continue
+        if len(keep) == len(idx):
+            piece = para
+        else:
+            start = tokens[keep[0]][2]
+            # Walk back over opening quotes/brackets glued to the first kept word
+            floor = tokens[keep[0] - 1][3] if keep[0] != idx[0] else 0
+            while start > floor and not para[start - 1].isspace():
+                start -= 1
+            # Run up to the next dropped word so closing punctuation stays attached
+            stop = tokens[keep[-1] + 1][2] if keep[-1] != idx[-1] else len(para)
+            piece = para[start:stop]
+        piece = piece.strip()
+        if piece:
+            result.append(piece)
+    return result
+
+
+def stitch_windows(
+    text: str,
+    spans: List[Tuple[int, int]],
+    windows: List[Tuple[int, int]],
+    outputs: List[List[str]],
+) -> Tuple[List[str], List[Tuple[int, int]]]:
+    """
+    Reconcile overlapping window outputs into one list of paragraphs.
+
+    Args:
+        text: Chapter text
+        spans: Sentence offsets for the whole chapter
+        windows: Sentence ranges from build_windows()
+        outputs: Paragraph texts returned for each window
+
+    Returns:
+        (paragraphs, owned sentence range per window)
+
+    Raises:
+        TextLossError: If a window's output skips a run of source words
+    """
+    alignments = [align_window(text, spans, w, out) for w, out in zip(windows, outputs)]
+
+    cuts = [0]
+    for k in range(1, len(windows)):
+        overlap = (windows[k][0], windows[k - 1][1])
+        cut = choose_cut(alignments[k - 1], alignments[k], overlap)
+        cuts.append(max(cut, cuts[-1] + 1))
+    cuts.append(len(spans))
+    owned = [(cuts[k], cuts[k + 1]) for k in range(len(windows))]
+
+    paragraphs = []
+    for k, (lo, hi) in enumerate(owned):
+        check_text_loss(text, spans, owned[k], alignments[k]["matched"], window_index=k)
+        paragraphs.extend(_slice_paragraphs(outputs[k], alignments[k]["tokens"], lo, hi))
+
+    return paragraphs, owned
+
+
+def check_text_loss(
+    text: str,
+    spans: List[Tuple[int, int]],
+    owned: Tuple[int, int],
+    matched: Dict[int, int],
+    window_index: int = 0,
+):
+    """
+    Raise TextLossError if a run of unmatched source sentences is too long.
+
+    Args:
+        text: Chapter text
+        spans: Sentence offsets for the whole chapter
+        owned: Sentence range this window is responsible for
+        matched: Matched word count per sentence (from align_window)
+        window_index: Window number for the error message
+    """
+    run_start, run_words = None, 0
+    for i in list(range(*owned)) + [None]:
+        if i is not None and not matched.get(i):
+            if run_start is None:
+                run_start = i
+            run_words += len(_WORD_RE.findall(text, spans[i][0], spans[i][1]))
+            continue
+        if run_start is not None and run_words > MAX_UNMATCHED_WORDS:
+            last = (i if i is not None else owned[1]) - 1
+            excerpt = " ".join(text[spans[run_start][0]:spans[last][1]].split())[:120]
+            raise TextLossError(
+                f"Window {window_index + 1}: sentences {run_start + 1}-{last + 1} "
+                f"({run_words} words) missing from output: \"{excerpt}...\""
+            )
+        run_start, run_words = None, 0
+
+
+def _process_window(text: str, spans: List[Tuple[int, int]], window: Tuple[int, int]) -> Tuple[List[str], float]:
+    """Send one window through PARAGRAPH_PROMPT and return (paragraphs, seconds)."""
+    from app.glm_processor import PARAGRAPH_PROMPT, call_gemini, echo_response_check, parse_paragraph_markers
+
+    start = time.monotonic()
+    window_text = text[spans[window[0]][0]:spans[window[1] - 1][1]]
+    result = call_gemini(PARAGRAPH_PROMPT.format(text=window_text), prompt_version="glm-paragraphs-v1",
+                         validate=echo_response_check(window_text, "[PARAGRAPH]"))
+    return parse_paragraph_markers(result), time.monotonic() - start
+
+
+def split_long_chapter_paragraphs(text: str) -> Tuple[List[str], List[Dict]]:
+    """
+    Split a long chapter into paragraphs through concurrent overlapping windows.
+
+    Args:
+        text: Raw chapter content (without title)
+
+    Returns:
+        (paragraph texts, per-window report)
+        Report entries: {"window", "sentences", "owned", "chars", "paragraphs", "seconds"}
+
+    Raises:
+        TextLossError: If any window's output is missing source text
+    """
+    from app.sentence_detector import detect_sentence_spans
+
+    spans = detect_sentence_spans(text)
+    if not spans:
+        return [], []
+
+    windows = build_windows(spans, Config.V3_WINDOW_CHARS, Config.V3_WINDOW_OVERLAP_SENTENCES)
+    workers = max(1, min(Config.V3_WINDOW_CONCURRENCY, len(windows)))
+    logger.info(f"[V3] Long chapter ({len(text)} chars): {len(windows)} windows, {workers} concurrent")
+
+    # Own short-lived pool: window calls are made from a thread of the shared
+    # I/O pool, so submitting them back to that pool could deadlock it.
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="honora-window") as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, _process_window, text, spans, w)
+            for w in windows
+        ]
+        results = [f.result() for f in futures]
+
+    outputs = [paragraphs for paragraphs, _ in results]
+    paragraphs, owned = stitch_windows(text, spans, windows, outputs)
+
+    report = []
+    for k, (window, (out, seconds)) in enumerate(zip(windows, results)):
+        report.append({
+            "window": k + 1,
+            "sentences": [window[0], window[1]],
+            "owned": list(owned[k]),
+            "chars": spans[window[1] - 1][1] - spans[window[0]][0],
+            "paragraphs": len(out),
+            "seconds": round(seconds, 2),
+        })
+        logger.info(f"[V3] Window {k + 1}/{len(windows)}: {report[-1]['chars']} chars, {len(out)} paragraphs in {seconds:.1f}s")
+
+    logger.info(f"[V3] Long chapter stitched into {len(paragraphs)} paragraphs in {time.monotonic() - started:.1f}s")
+    return paragraphs, report
@@ -47,11 +47,45 @@ Transform PDFs into structured audiobook content.
 )
 
 from app.config import Config
+from app.executors import run_io, run_cpu, get_executor_stats, shutdown_executors
+from app.gemini_scheduler import INTERACTIVE, gemini_priority, run_gemini
 
 @app.on_event("startup")
 async def startup_event():
     Config.load()
 
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    shutdown_executors(wait=False)
+
+
+@app.get("/metrics/executors", tags=["Monitoring"])
+async def executor_metrics():
+    """Queue depth and throughput of the shared I/O and CPU executor pools."""
+    return get_executor_stats()
+
+
+@app.get("/metrics/llm-cache", tags=["Monitoring"])
+async def llm_cache_metrics():
+    """Hit/miss counters and size of the on-disk LLM response cache."""
+    from app.llm_cache import get_llm_cache_stats
+    return get_llm_cache_stats()
+
+
+@app.get("/metrics/audio-cache", tags=["Monitoring"])
+async def audio_cache_metrics():
+    """Hit/miss counters and size of the on-disk segment audio cache."""
+    from app.audio_cache import get_audio_cache_stats
+    return get_audio_cache_stats()
+
+
+@app.get("/metrics/gemini", tags=["Monitoring"])
+async def gemini_scheduler_metrics():
+    """Per-model quota, queue wait and 429 counters of the shared Gemini scheduler."""
+    from app.gemini_scheduler import get_gemini_scheduler_stats
+    return get_gemini_scheduler_stats()
+
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 
@@ -299,7 +333,7 @@ async def extract_pdf(file: UploadFile = File(...)):
     with open(pdf_path, "wb") as f:
         f.write(await file.read())
 
-    pages = extract_raw_pages(pdf_path)
+    pages = await run_cpu(extract_raw_pages, pdf_path)
 
     with open(json_path, "w", encoding="utf-8") as f:
         json.dump(pages, f, ensure_ascii=False, indent=2)
@@ -334,7 +368,7 @@ async def clean_page(payload: dict):
     if "items" not in payload:
         return JSONResponse({"error": "Missing 'items' in request body"}, status_code=400)
 
-    cleaned = clean_page_text(payload["items"])
+    cleaned = await run_io(clean_page_text, payload["items"])
     return cleaned
 
 # -----------------------------------------------------------
@@ -412,7 +446,7 @@ async def clean_book(payload: dict):
         if end_page is not None and page_num > end_page:
             continue
 
-        result = clean_page_text(items)
+        result = await run_io(clean_page_text, items)
 
         cleaned_text = result.get("cleaned_text", "")
         removed = result.get("removed", [])
@@ -751,7 +785,7 @@ async def process_book_preview(file: UploadFile = File(...)):
     with open(pdf_path, "wb") as f:
         f.write(await file.read())
 
-    pages = extract_raw_pages(pdf_path)
+    pages = await run_cpu(extract_raw_pages, pdf_path)
     with open(json_path, "w", encoding="utf-8") as f:
         json.dump(pages, f, ensure_ascii=False, indent=2)
 
@@ -942,7 +976,7 @@ async def process_book(file: UploadFile = File(...)):
         with open(pdf_path, "wb") as f:
             f.write(await file.read())
         
-        pages = extract_raw_pages(pdf_path)
+        pages = await run_cpu(extract_raw_pages, pdf_path)
         
         with open(json_path, "w", encoding="utf-8") as f:
             json.dump(pages, f, ensure_ascii=False, indent=2)
@@ -958,10 +992,10 @@ async def process_book(file: UploadFile = File(...)):
             page_text = " ".join([item["text"] for item in items])
             first_pages_text += page_text + "\n\n"
         
-        metadata = extract_book_metadata(first_pages_text)
+        metadata = await run_io(extract_book_metadata, first_pages_text)
         
         from app.chapters import create_book_in_supabase
-        book_id = create_book_in_supabase(metadata)
+        book_id = await run_io(create_book_in_supabase, metadata)
         
         result["steps_completed"].append("create_book")
         result["book_id"] = book_id
@@ -977,8 +1011,8 @@ async def process_book(file: UploadFile = File(...)):
         try:
             from app.cover_art import generate_cover_image, update_book_cover_url
             metadata["book_id"] = book_id
-            cover_urls = generate_cover_image(metadata)
-            update_book_cover_url(book_id, cover_urls)
+            cover_urls = await run_io(generate_cover_image, metadata)
+            await run_io(update_book_cover_url, book_id, cover_urls)
             result["cover_art_url"] = cover_urls.get("cover_art_url")
             result["cover_art_url_2x3"] = cover_urls.get("cover_art_url_2x3")
             result["steps_completed"].append("generate_cover")
@@ -1000,7 +1034,7 @@ async def process_book(file: UploadFile = File(...)):
             if items:
                 print(f"[PIPELINE] Cleaning page {i+1}/{total_pages}...")
                 try:
-                    cleaned = clean_page_text(items)
+                    cleaned = await run_io(clean_page_text, items)
                     cleaned_pages.append({
                         "page": page_obj.get("page"),
                         "cleaned_text": cleaned.get("cleaned_text", "")
@@ -1032,17 +1066,17 @@ async def process_book(file: UploadFile = File(...)):
         print(f"[PIPELINE] Step 4: Detecting book structure and chapters with GPT...")
         from app.chapters import extract_chapters_smart, write_stories_to_supabase, write_chapters_to_supabase
         
-        stories, chapters = extract_chapters_smart(full_text)
+        stories, chapters = await run_io(extract_chapters_smart, full_text)
         
         # Write stories first (for anthologies)
         story_id_map = {}
         if stories:
             print(f"[PIPELINE] Book is an anthology with {len(stories)} stories")
-            story_id_map = write_stories_to_supabase(book_id, stories)
+            story_id_map = await run_io(write_stories_to_supabase, book_id, stories)
             result["stories"] = len(stories)
         
         # Write chapters (linked to stories if applicable)
-        db_chapters = write_chapters_to_supabase(book_id, chapters, story_id_map)
+        db_chapters = await run_io(write_chapters_to_supabase, book_id, chapters, story_id_map)
         print(f"[PIPELINE] Step 4 complete: {len(stories)} stories, {len(db_chapters)} chapters created")
         
         result["steps_completed"].append("extract_chapters")
@@ -1059,8 +1093,8 @@ async def process_book(file: UploadFile = File(...)):
             chapter_text = chapter.get("text", "")
             if chapter_text:
                 # Use GPT semantic splitting - Section 0 = title, Section 1+ = paragraphs
-                sections = split_into_paragraphs_gpt(chapter_text)
-                write_sections_to_supabase(chapter["id"], sections)
+                sections = await run_io(split_into_paragraphs_gpt, chapter_text)
+                await run_io(write_sections_to_supabase, chapter["id"], sections)
                 total_sections += len(sections)
             else:
                 print(f"[PIPELINE] ⚠️ Warning: Chapter {chapter.get('chapter_index')} has no text!")
@@ -1080,8 +1114,8 @@ async def process_book(file: UploadFile = File(...)):
             chapter_text = chapter.get("text", "")
             if chapter_text:
                 print(f"[PIPELINE] Creating paragraphs for chapter {i+1}/{len(db_chapters)} (ID: {chapter['id']})...")
-                paragraphs = split_into_paragraphs_gpt(chapter_text)
-                write_paragraphs_to_supabase(chapter["id"], paragraphs)
+                paragraphs = await run_io(split_into_paragraphs_gpt, chapter_text)
+                await run_io(write_paragraphs_to_supabase, chapter["id"], paragraphs)
                 total_paragraphs += len(paragraphs)
             else:
                 print(f"[PIPELINE] ⚠️ Warning: Chapter {i+1} has no text, skipping paragraphs!")
@@ -1365,7 +1399,8 @@ async def v2_rewrite_text(job_id: str, payload: dict):
         if not text:
             return JSONResponse({"error": "'text' is required"}, status_code=400)
         
-        rewritten = rewrite_text_gemini(text)
+        with gemini_priority(INTERACTIVE):
+            rewritten = await run_io(rewrite_text_gemini, text)
         
         return {
             "original": text,
@@ -1401,7 +1436,8 @@ async def v2_optimize_paragraphs(job_id: str, payload: dict):
         
         chapter_title = payload.get("chapter_title", "")
         
-        result = optimize_paragraphs_gemini(paragraphs, chapter_title)
+        with gemini_priority(INTERACTIVE):
+            result = await run_io(optimize_paragraphs_gemini, paragraphs, chapter_title)
         
         return result
     except Exception as e:
@@ -1635,18 +1671,27 @@ async def update_chapter_text(job_id: str, chapter_index: int, request: Request)
 
 
 @app.post("/v2/job/{job_id}/chapter/{chapter_index}/resegment", tags=["Chapter Editor"])
-async def resegment_chapter(job_id: str, chapter_index: int):
+async def resegment_chapter(job_id: str, chapter_index: int, bypass_cache: bool = False):
     """
     Regenerate sections and paragraphs from chapter text.
     Useful after editing the document view.
+    
+    Unchanged text is served from the LLM cache; pass bypass_cache=true to force fresh Gemini calls.
     """
+    from app.llm_cache import llm_cache_bypass
+    
     state = get_job_state(job_id)
     if not state:
         return JSONResponse({"error": "Job not found"}, status_code=404)
     
     # Re-run chapter processing
     try:
-        result = await phase_process_chapter(job_id, chapter_index)
+        with gemini_priority(INTERACTIVE):
+            if bypass_cache:
+                with llm_cache_bypass():
+                    result = await phase_process_chapter(job_id, chapter_index)
+            else:
+                result = await phase_process_chapter(job_id, chapter_index)
         return {
             "status": "resegmented",
             **result
@@ -1678,7 +1723,8 @@ async def optimize_chapter_text(job_id: str, chapter_index: int):
         # clean_page_text expects a list of dicts with "text" key
         from app.cleaner import clean_page_text
         page_items = [{"text": text}]
-        result = clean_page_text(page_items)
+        with gemini_priority(INTERACTIVE):
+            result = await run_io(clean_page_text, page_items)
         optimized = result.get("cleaned_text", text)
         
         # Update chapter
@@ -1731,7 +1777,10 @@ Return a JSON object with:
 Return ONLY valid JSON, no markdown code blocks. Example: {{"author": "John Doe", "publishing_year": "1900", "publisher": "ABC", "category": "Philosophy"}}
 If unknown, use empty string."""
         
-        response = model.generate_content(prompt)
+        response = await run_io(
+            run_gemini, "gemini-2.0-flash", lambda: model.generate_content(prompt),
+            prompt=prompt, priority=INTERACTIVE
+        )
         text = response.text.strip()
         logging.info(f"AI Metadata response: {text[:200]}")
         
@@ -1806,7 +1855,10 @@ Include:
 Keep it concise - maximum 4-5 sentences total. Write in present tense, third person.
 Do not include the title or author in your response, just the description."""
         
-        response = model.generate_content(prompt)
+        response = await run_io(
+            run_gemini, "gemini-2.0-flash", lambda: model.generate_content(prompt),
+            prompt=prompt, priority=INTERACTIVE
+        )
         synopsis = response.text.strip()
         logging.info(f"AI Synopsis generated: {synopsis[:100]}...")
         
@@ -1845,7 +1897,8 @@ async def regenerate_cover(job_id: str, request: Request):
     
     try:
         # Generate and upload cover art
-        cover_urls = generate_cover_image(metadata, upload=True)
+        with gemini_priority(INTERACTIVE):
+            cover_urls = await run_io(generate_cover_image, metadata, upload=True)
         
         # Update job state with new cover URL
         if state and cover_urls.get("cover_art_url"):
@@ -1867,12 +1920,19 @@ async def ai_split_paragraphs(job_id: str, request: Request):
     """
     Use Gemini to intelligently split continuous text into natural paragraphs.
     Preserves exact wording - only adds paragraph breaks.
+    
+    Body:
+    - text: Text to split
+    - mode: "offsets" (default) - Gemini sees numbered sentences and returns only
+            boundary indices; paragraphs are rebuilt locally from the source text.
+            "echo" - Gemini returns the whole text with blank lines inserted.
     """
     import google.generativeai as genai
     import logging
     
     body = await request.json()
     text = body.get("text", "")
+    mode = body.get("mode", "offsets")
     
     if not text:
         return JSONResponse({"error": "Text required"}, status_code=400)
@@ -1881,6 +1941,16 @@ async def ai_split_paragraphs(job_id: str, request: Request):
     if not api_key:
         return JSONResponse({"error": "GEMINI_API_KEY not configured"}, status_code=500)
     
+    if mode == "offsets":
+        try:
+            from app.glm_processor import split_paragraphs_by_offsets
+            with gemini_priority(INTERACTIVE):
+                paragraphs = await run_io(split_paragraphs_by_offsets, text, allow_drop=False)
+            logging.info(f"AI split paragraphs (offsets): {len(text)} chars -> {len(paragraphs)} paragraphs")
+            return {"text": "\n\n".join(paragraphs), "mode": "offsets"}
+        except Exception as e:
+            logging.warning(f"Offsets paragraph split failed ({e}), falling back to echo mode")
+    
     try:
         genai.configure(api_key=api_key)
         model = genai.GenerativeModel("gemini-2.0-flash")
@@ -1899,12 +1969,15 @@ TEXT TO SPLIT:
 
 SPLIT TEXT:"""
         
-        response = model.generate_content(prompt)
+        response = await run_io(
+            run_gemini, "gemini-2.0-flash", lambda: model.generate_content(prompt),
+            prompt=prompt, priority=INTERACTIVE
+        )
         result = response.text.strip()
         
         logging.info(f"AI split paragraphs: {len(text)} chars -> {result.count(chr(10))+1} paragraphs")
         
-        return {"text": result}
+        return {"text": result, "mode": "echo"}
         
     except Exception as e:
         logging.error(f"AI paragraph split error: {e}")
@@ -1981,7 +2054,7 @@ async def v3_get_status(job_id: str):
     """Get the current status of a V3 pipeline job."""
     from app.pipeline_v3 import get_v3_job_state
     
-    state = get_v3_job_state(job_id)
+    state = get_v3_job_state(job_id, include_chapters=False)
     if not state:
         return JSONResponse({"error": "Job not found"}, status_code=404)
     
@@ -1990,7 +2063,7 @@ async def v3_get_status(job_id: str):
         "phase": state.get("phase"),
         "progress": state.get("progress"),
         "metadata": state.get("metadata"),
-        "chapters_count": len(state.get("chapters", [])),
+        "chapters_count": state.get("chapter_count", 0),
         "cover_urls": state.get("cover_urls", {})
     }
 
@@ -2026,6 +2099,27 @@ async def v3_upload_to_supabase_endpoint(job_id: str):
         return JSONResponse({"error": str(e)}, status_code=500)
 
 
+@app.post("/v3/sync-supabase/{job_id}", tags=["V3 Pipeline"])
+async def v3_sync_to_supabase_endpoint(job_id: str, dry_run: bool = False):
+    """
+    Re-upload an already uploaded V3 job as a delta: only changed chapters,
+    paragraphs and TTS chunks are written, and only changed chapters get a new build.
+    
+    Pass dry_run=true to get the planned row counts per table without writing.
+    """
+    from app.pipeline_v3 import v3_sync_to_supabase
+    
+    try:
+        result = await v3_sync_to_supabase(job_id, dry_run=dry_run)
+        return result
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except Exception as e:
+        import logging
+        logging.error(f"V3 Supabase sync error: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
 @app.post("/v3/update-metadata/{job_id}", tags=["V3 Pipeline"])
 async def v3_update_metadata_endpoint(job_id: str, request: Request):
     """
@@ -2063,7 +2157,7 @@ async def v3_generate_tts_endpoint(job_id: str, request: Request):
     
     payload (optional):
     {
-        "engine": "runpod" | "local" | "piper",  (default: "runpod")
+        "engine": "runpod" | "local" | "piper" | "auto",  (default: "runpod")
         "voice": "default",                       (voice name/path)
         "language": "en"                          (language code)
     }
@@ -2094,6 +2188,29 @@ async def v3_generate_tts_endpoint(job_id: str, request: Request):
         return JSONResponse({"error": str(e)}, status_code=500)
 
 
+@app.post("/v3/resume-tts/{job_id}", tags=["V3 TTS"])
+async def v3_resume_tts_endpoint(job_id: str):
+    """
+    Resume TTS generation after a crash or redeploy.
+    
+    Uses the engine/voice/language of the interrupted run. Chapters that were
+    finished and segments that were already synthesized are not generated again.
+    
+    Note: Job must be in 'generating_tts' or 'tts_generated' phase.
+    """
+    from app.pipeline_v3 import v3_resume_tts_audio
+    
+    try:
+        result = await v3_resume_tts_audio(job_id)
+        return result
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except Exception as e:
+        import logging
+        logging.error(f"V3 TTS resume error: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
 @app.post("/v3/upload-audio/{job_id}", tags=["V3 TTS"])
 async def v3_upload_audio_endpoint(job_id: str):
     """
@@ -2151,7 +2268,7 @@ async def v3_list_voices(engine: str = "runpod"):
     List available TTS voices for the specified engine.
     
     Query params:
-    - engine: "runpod" | "local" | "piper"
+    - engine: "runpod" | "local" | "piper" | "auto"
     """
     import sys
     tts_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "HonoraLocalTTS")
@@ -2159,7 +2276,8 @@ async def v3_list_voices(engine: str = "runpod"):
         sys.path.insert(0, tts_path)
     
     try:
-        if engine == "runpod":
+        if engine in ("runpod", "auto"):
+            # The router's default tier only uses XTTS engines, which share these voices
             from tts_engines import XTTSRunPodEngine
             tts_engine = XTTSRunPodEngine()
         elif engine == "local":
@@ -2187,16 +2305,20 @@ async def v3_full_tts_pipeline(job_id: str, request: Request):
     
     payload (optional):
     {
-        "engine": "runpod" | "local" | "piper",
+        "engine": "runpod" | "local" | "piper" | "auto",
         "voice": "default",
-        "language": "en"
+        "language": "en",
+        "streaming": false      (default: V3_TTS_STREAMING)
     }
     
     This is a convenience endpoint that runs both:
     1. v3/generate-tts
     2. v3/upload-audio
+    
+    With "streaming": true each ~35 s group is encoded and uploaded while later
+    segments are still being synthesized (one overlapping pass per chapter).
     """
-    from app.pipeline_v3 import v3_generate_tts_audio, v3_upload_audio_to_supabase
+    from app.pipeline_v3 import v3_generate_tts_audio, v3_stream_tts_audio, v3_upload_audio_to_supabase
     
     try:
         body = await request.json() if request.headers.get("content-type") == "application/json" else {}
@@ -2206,8 +2328,23 @@ async def v3_full_tts_pipeline(job_id: str, request: Request):
     engine = body.get("engine", "runpod")
     voice = body.get("voice", "default")
     language = body.get("language", "en")
+    streaming = body.get("streaming", Config.V3_TTS_STREAMING)
     
     try:
+        if streaming:
+            result = await v3_stream_tts_audio(job_id, engine=engine, voice=voice, language=language)
+            if not result.get("success"):
+                return JSONResponse({
+                    "error": "Streaming TTS failed",
+                    "details": result
+                }, status_code=500)
+            return {
+                "success": True,
+                "streaming": True,
+                "tts_generation": result,
+                "audio_upload": {k: result[k] for k in ("groups_uploaded", "segments_saved", "spans_created")}
+            }
+        
         # Step 1: Generate TTS
         tts_result = await v3_generate_tts_audio(job_id, engine=engine, voice=voice, language=language)
         
@@ -7,6 +7,11 @@ import os
 import re
 import google.generativeai as genai
 
+from app.gemini_scheduler import run_gemini
+from app.llm_cache import cached_generate
+
+GEMINI_MODEL_NAME = "gemini-2.0-flash"
+
 # Lazy initialization - don't configure at import time!
 _gemini_model = None
 _configured = False
@@ -21,7 +26,7 @@ def get_gemini():
         genai.configure(api_key=api_key)
         _configured = True
     if _gemini_model is None:
-        _gemini_model = genai.GenerativeModel("gemini-2.0-flash")
+        _gemini_model = genai.GenerativeModel(GEMINI_MODEL_NAME)
     return _gemini_model
 
 METADATA_SYSTEM_PROMPT = """
@@ -104,12 +109,16 @@ Return JSON with all metadata fields.
 """
 
     model = get_gemini()
-    response = model.generate_content(
-        prompt,
-        generation_config=genai.types.GenerationConfig(
-            response_mime_type="application/json",
-            max_output_tokens=4096
-        )
+    response = run_gemini(
+        GEMINI_MODEL_NAME,
+        lambda: model.generate_content(
+            prompt,
+            generation_config=genai.types.GenerationConfig(
+                response_mime_type="application/json",
+                max_output_tokens=4096
+            )
+        ),
+        prompt=prompt
     )
 
     content = response.text
@@ -329,16 +338,22 @@ Return ONLY valid JSON with synopsis, category, subcategory, and a real quote fr
     try:
         print(f"[METADATA] Calling Gemini for synopsis generation...")
         
-        model = get_gemini()
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                response_mime_type="application/json",
-                max_output_tokens=4096
+        generation_config = {"response_mime_type": "application/json", "max_output_tokens": 4096}
+        
+        def generate() -> str:
+            model = get_gemini()
+            response = run_gemini(
+                GEMINI_MODEL_NAME,
+                lambda: model.generate_content(prompt, generation_config=genai.types.GenerationConfig(**generation_config)),
+                prompt=prompt
             )
-        )
+            return response.text
         
-        content = response.text
+        content = cached_generate(
+            GEMINI_MODEL_NAME, "synopsis-v1", prompt, generate,
+            generation_config=generation_config,
+            validate=lambda text: extract_json_from_text(text) is not None
+        )
         
         print(f"[METADATA] Gemini response received: {len(content)} chars")
         
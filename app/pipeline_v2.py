@@ -33,6 +33,7 @@ from app.chapters import (
     clean_section_text
 )
 from app.cleaner import clean_page_text
+from app.executors import run_io, run_cpu
 
 # Temporary storage directory
 TEMP_DIR = "/tmp/honora_v2"
@@ -476,7 +477,8 @@ async def phase_process_chapter(job_id: str, chapter_index: int) -> dict:
         # Uses spaCy for sentence-aware splitting (never mid-sentence)
         # =====================================================
         print(f"[PIPELINE_V2] Creating TTS sections with spaCy (max 250 chars)...")
-        sections = split_into_sections_perfect(cleaned_text, chapter_title, max_chars=250)
+        # spaCy sentence splitting is CPU-bound -> process pool
+        sections = await run_cpu(split_into_sections_perfect, cleaned_text, chapter_title, max_chars=250)
         
         # Apply final TTS cleanup to each section (except title at index 0)
         sections = [sections[0]] + [clean_section_text(s) for s in sections[1:] if s.strip()]
@@ -487,7 +489,7 @@ async def phase_process_chapter(job_id: str, chapter_index: int) -> dict:
         # Guarantees: no mid-sentence splits, no single-char paragraphs
         # =====================================================
         print(f"[PIPELINE_V2] Creating paragraphs with spaCy + Gemini...")
-        paragraphs = split_into_paragraphs_perfect(cleaned_text, chapter_title)
+        paragraphs = await run_io(split_into_paragraphs_perfect, cleaned_text, chapter_title)
         
         # Note: ensure_paragraph_0_is_title is now done inside split_into_paragraphs_perfect
         # paragraphs = ensure_paragraph_0_is_title(paragraphs, chapter_title)
@@ -12,8 +12,17 @@ from typing import Dict, List, Optional
 from datetime import datetime
 import uuid
 
+from app.config import Config
+from app.executors import run_io
 from app.logger import get_logger
-from app.glm_processor import process_full_chapter
+from app.job_store import JobStore
+from app.audio_cache import get_audio_cache, make_audio_cache_key, voice_fingerprint
+from app.audio_probe import AudioProbeError, probe_duration_ms, probe_many
+from app.bulk_writer import BulkWriter
+from app.span_alignment import align_paragraphs
+from app.tts_checkpoint import TTSWorkDir, chapter_is_complete
+from app.tts_stream import stream_chapter
+from app.glm_processor import configure_gemini, process_full_chapter
 from app.cover_art import generate_cover_image
 from app.metadata import extract_metadata_with_gemini
 from app.audio_segments import (
@@ -21,6 +30,9 @@ from app.audio_segments import (
     group_segments,
     get_audio_duration_ms,
     concat_group_audio,
+    retime_groups,
+    encode_chapter_groups,
+    ChapterEncodeError,
     upload_group_audio,
     save_groups_to_supabase,
     update_chapter_audio_version,
@@ -183,21 +195,43 @@ def apply_mapping_to_chapters(chapters: List[Dict], mapping: Dict) -> List[Dict]
 V3_JOBS_DIR = "data/v3_jobs"
 os.makedirs(V3_JOBS_DIR, exist_ok=True)
 
+# Header + append-only chapter journal (see app/job_store.py)
+_job_store = JobStore(V3_JOBS_DIR)
 
-def get_v3_job_state(job_id: str) -> Optional[Dict]:
-    """Get V3 job state from disk."""
-    path = os.path.join(V3_JOBS_DIR, f"{job_id}.json")
-    if os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return None
+
+def get_v3_job_state(job_id: str, include_chapters: bool = True) -> Optional[Dict]:
+    """
+    Get V3 job state from disk.
+    
+    Args:
+        job_id: The job UUID
+        include_chapters: If False, only the small header is loaded (no "chapters" key,
+            use "chapter_count" instead). Use get_v3_chapters() to load specific chapters.
+    """
+    return _job_store.load(job_id, include_chapters=include_chapters)
+
+
+def get_v3_chapters(job_id: str, indices: Optional[List[int]] = None) -> Dict[int, Dict]:
+    """Lazily load only the chapters a caller needs (position -> chapter)."""
+    return _job_store.load_chapters(job_id, indices)
+
+
+def save_v3_job_state(job_id: str, state: Dict, chapters: Optional[List[int]] = None,
+                      header_fields: Optional[List[str]] = None):
+    """
+    Save V3 job state to disk.
+    
+    Phase transitions compact the chapter journal. Within a phase, pass `chapters`
+    with the positions that changed (or [] for a progress-only tick) to avoid
+    re-serializing the whole job. Phases that run concurrently pass `header_fields`
+    with the header keys they own, so they never overwrite each other's fields.
+    """
+    _job_store.save(job_id, state, chapters=chapters, header_fields=header_fields)
 
 
-def save_v3_job_state(job_id: str, state: Dict):
-    """Save V3 job state to disk."""
-    path = os.path.join(V3_JOBS_DIR, f"{job_id}.json")
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(state, f, indent=2, ensure_ascii=False)
+def save_v3_chapter(job_id: str, index: int, chapter: Dict):
+    """Append a single chapter record to the job journal."""
+    _job_store.save_chapter(job_id, index, chapter)
 
 
 def create_v3_job(file_path: str, file_type: str) -> str:
@@ -434,17 +468,28 @@ async def v3_extract_chapters(job_id: str) -> Dict:
 # GLM PROCESSING PHASE
 # ============================================
 
-# Batch size for context refresh - prevents model degradation on large books
-BATCH_SIZE = 5
+# Batch size for context refresh - prevents model degradation on large books.
+# Applied per worker: each worker refreshes after this many chapters.
+BATCH_SIZE = Config.V3_CONTEXT_REFRESH_CHAPTERS
 
+# Header fields v3_process_chapters owns; metadata/cover art are written concurrently
+PROCESSING_FIELDS = ["phase", "progress"]
 
-async def v3_process_chapters(job_id: str) -> Dict:
+
+async def v3_process_chapters(job_id: str, concurrency: Optional[int] = None) -> Dict:
     """
     Process all chapters through Gemini.
     Creates paragraphs and sections for each chapter.
     
-    BATCH PROCESSING: Every 5 chapters, we "refresh" the model context
-    by re-initializing the Gemini client. This prevents quality degradation
+    CONCURRENCY: Up to `concurrency` chapters (default Config.V3_CHAPTER_CONCURRENCY)
+    are processed at once by a fixed pool of workers. Workers pick chapters in book
+    order, results are written back to their original chapter position, and each
+    completed chapter is saved to the job journal immediately. concurrency=1 gives
+    the old strictly sequential behaviour.
+    
+    BATCH PROCESSING: Every BATCH_SIZE chapters a worker "refreshes" the model
+    context by re-configuring the Gemini client itself, without touching the
+    state other workers are using mid-call. This prevents quality degradation
     on large books (35+ chapters) where the model might start producing
     poor paragraph splits after many consecutive calls.
     """
@@ -453,59 +498,86 @@ async def v3_process_chapters(job_id: str) -> Dict:
         raise ValueError(f"Job not found: {job_id}")
     
     state["phase"] = "processing"
-    save_v3_job_state(job_id, state)
+    save_v3_job_state(job_id, state, header_fields=PROCESSING_FIELDS)
     
-    total = len(state["chapters"])
-    processed = 0
+    chapters = state["chapters"]
+    total = len(chapters)
+    concurrency = max(1, concurrency or Config.V3_CHAPTER_CONCURRENCY)
     
-    # Import for context refresh
-    from app.glm_processor import _gemini_configured
-    import app.glm_processor as glm_module
+    pending = asyncio.Queue()
+    for i, chapter in enumerate(chapters):
+        if not chapter.get("processed"):
+            pending.put_nowait(i)
     
-    for i, chapter in enumerate(state["chapters"]):
-        if chapter.get("processed"):
-            processed += 1
-            continue
-        
-        # BATCH CONTEXT REFRESH every 5 chapters
-        if i > 0 and i % BATCH_SIZE == 0:
-            logger.info(f"[V3] 🔄 Refreshing Gemini context at chapter {i+1} (batch boundary)")
-            # Reset the configured flag to force re-initialization
-            glm_module._gemini_configured = False
-        
-        state["progress"]["current_chapter"] = chapter["title"]
-        state["progress"]["batch_info"] = f"Batch {(i // BATCH_SIZE) + 1} of {(total // BATCH_SIZE) + 1}"
-        save_v3_job_state(job_id, state)
-        
-        logger.info(f"[V3] Processing chapter {i+1}/{total}: {chapter['title']}")
+    counters = {"processed": total - pending.qsize()}
+    active = {}
+    
+    state["progress"]["concurrency"] = concurrency
+    logger.info(f"[V3] Processing {pending.qsize()}/{total} chapters with {concurrency} workers")
+    
+    async def worker(worker_id: int):
+        chapters_done = 0
         
-        try:
-            # Call GLM to process chapter
-            result = process_full_chapter(
-                chapter_title=chapter["title"],
-                chapter_text=chapter["raw_content"]
-            )
+        while True:
+            try:
+                i = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
             
-            chapter["paragraphs"] = result["paragraphs"]
-            chapter["sections"] = result["sections"]
-            chapter["processed"] = True
-            processed += 1
+            chapter = chapters[i]
             
-            # Log paragraph stats for monitoring
-            para_count = len(result["paragraphs"])
-            avg_words = sum(len(p["text"].split()) for p in result["paragraphs"]) / max(para_count, 1)
-            logger.info(f"[V3] Chapter {i+1}: {para_count} paragraphs, avg {avg_words:.1f} words per paragraph")
+            # BATCH CONTEXT REFRESH every BATCH_SIZE chapters of this worker
+            if chapters_done > 0 and chapters_done % BATCH_SIZE == 0:
+                logger.info(f"[V3] 🔄 Worker {worker_id}: refreshing Gemini context at chapter {i+1} (batch boundary)")
+                try:
+                    await run_io(configure_gemini)
+                except ValueError as e:
+                    logger.warning(f"[V3] Worker {worker_id}: Gemini refresh failed: {e}")
             
-            state["progress"]["processed_chapters"] = processed
-            save_v3_job_state(job_id, state)
+            active[i] = chapter["title"]
+            state["progress"]["current_chapter"] = chapter["title"]
+            state["progress"]["active_chapters"] = [active[k] for k in sorted(active)]
+            state["progress"]["batch_info"] = f"Worker {worker_id}: batch {(chapters_done // BATCH_SIZE) + 1}"
+            save_v3_job_state(job_id, state, chapters=[], header_fields=PROCESSING_FIELDS)
             
-        except Exception as e:
-            logger.error(f"[V3] Error processing chapter {chapter['title']}: {e}")
-            chapter["error"] = str(e)
-            save_v3_job_state(job_id, state)
+            logger.info(f"[V3] Worker {worker_id} processing chapter {i+1}/{total}: {chapter['title']}")
+            
+            try:
+                # Call Gemini to process chapter (blocking SDK call, run off the event loop)
+                result = await run_io(
+                    process_full_chapter,
+                    chapter_title=chapter["title"],
+                    chapter_text=chapter["raw_content"]
+                )
+                
+                chapter["paragraphs"] = result["paragraphs"]
+                chapter["sections"] = result["sections"]
+                if "windows" in result:
+                    chapter["windows"] = result["windows"]
+                chapter["processed"] = True
+                chapter.pop("error", None)
+                counters["processed"] += 1
+                
+                # Log paragraph stats for monitoring
+                para_count = len(result["paragraphs"])
+                avg_words = sum(len(p["text"].split()) for p in result["paragraphs"]) / max(para_count, 1)
+                logger.info(f"[V3] Chapter {i+1}: {para_count} paragraphs, avg {avg_words:.1f} words per paragraph")
+                
+            except Exception as e:
+                logger.error(f"[V3] Error processing chapter {chapter['title']}: {e}")
+                chapter["error"] = str(e)
+            
+            chapters_done += 1
+            active.pop(i, None)
+            state["progress"]["processed_chapters"] = counters["processed"]
+            state["progress"]["active_chapters"] = [active[k] for k in sorted(active)]
+            save_v3_job_state(job_id, state, chapters=[i], header_fields=PROCESSING_FIELDS)
+    
+    await asyncio.gather(*(worker(w + 1) for w in range(concurrency)))
     
+    processed = counters["processed"]
     state["phase"] = "chapters_processed"
-    save_v3_job_state(job_id, state)
+    save_v3_job_state(job_id, state, header_fields=PROCESSING_FIELDS)
     
     logger.info(f"[V3] Processed {processed}/{total} chapters")
     return {"success": True, "processed": processed, "total": total}
@@ -521,11 +593,12 @@ async def v3_generate_metadata_and_cover(job_id: str) -> Dict:
     Generate cover art and enrich metadata using Gemini.
     Can run in parallel with chapter processing.
     """
-    state = get_v3_job_state(job_id)
+    state = get_v3_job_state(job_id, include_chapters=False)
     if not state:
         raise ValueError(f"Job not found: {job_id}")
     
     metadata = state.get("metadata", {})
+    cover_urls = None
     
     # Run cover art and metadata lookup in parallel
     results = {}
@@ -533,10 +606,9 @@ async def v3_generate_metadata_and_cover(job_id: str) -> Dict:
     try:
         # Generate cover art
         logger.info(f"[V3] Generating cover art for: {metadata.get('title')}")
-        cover_urls = generate_cover_image(metadata, upload=True)
+        cover_urls = await run_io(generate_cover_image, metadata, upload=True)
         
         if cover_urls:
-            state["cover_urls"] = cover_urls
             metadata["cover_art_url"] = cover_urls.get("cover_art_url")
             metadata["cover_art_url_16x9"] = cover_urls.get("cover_art_url_16x9")
             results["cover_art"] = True
@@ -549,7 +621,7 @@ async def v3_generate_metadata_and_cover(job_id: str) -> Dict:
         # Enrich metadata with AI
         if metadata.get("title"):
             logger.info(f"[V3] Looking up metadata for: {metadata.get('title')}")
-            ai_metadata = extract_metadata_with_gemini(metadata.get("title"))
+            ai_metadata = await run_io(extract_metadata_with_gemini, metadata.get("title"))
             
             if ai_metadata:
                 # Copy all AI-extracted fields (only fill in missing ones)
@@ -570,13 +642,13 @@ async def v3_generate_metadata_and_cover(job_id: str) -> Dict:
     try:
         from app.metadata import generate_synopsis_and_category
         
-        # Get first chapter content for synopsis
-        chapters = state.get("chapters", [])
-        if chapters and chapters[0].get("raw_content"):
-            sample_text = chapters[0]["raw_content"][:5000]  # First 5000 chars
+        # Get first chapter content for synopsis (only chapter 0 is loaded)
+        first_chapter = (await run_io(get_v3_chapters, job_id, [0])).get(0, {})
+        if first_chapter.get("raw_content"):
+            sample_text = first_chapter["raw_content"][:5000]  # First 5000 chars
             
             logger.info(f"[V3] Generating synopsis for: {metadata.get('title')}")
-            synopsis_data = generate_synopsis_and_category(sample_text)
+            synopsis_data = await run_io(generate_synopsis_and_category, sample_text)
             
             if synopsis_data:
                 metadata["synopsis"] = synopsis_data.get("synopsis", "")
@@ -589,8 +661,11 @@ async def v3_generate_metadata_and_cover(job_id: str) -> Dict:
     except Exception as e:
         logger.error(f"[V3] Synopsis generation error: {e}")
     
+    # Only the fields this task owns; chapter processing writes progress meanwhile
     state["metadata"] = metadata
-    save_v3_job_state(job_id, state)
+    if cover_urls:
+        state["cover_urls"] = cover_urls
+    save_v3_job_state(job_id, state, header_fields=["metadata", "cover_urls"])
     
     return results
 
@@ -599,11 +674,113 @@ async def v3_generate_metadata_and_cover(job_id: str) -> Dict:
 # TTS AUDIO GENERATION (v3.1 Architecture)
 # ============================================
 
+def _create_tts_engine(engine: str):
+    """Instantiate a TTS engine from HonoraLocalTTS by pipeline engine name."""
+    import sys
+    
+    # Add HonoraLocalTTS to path for TTS engines
+    tts_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "HonoraLocalTTS")
+    if tts_path not in sys.path:
+        sys.path.insert(0, tts_path)
+    
+    from tts_engines import (
+        XTTSRunPodAsyncEngine, XTTSRunPodEngine, XTTSLocalEngine, XTTSReplicateEngine, PiperEngine, RoutingEngine
+    )
+    
+    if engine == "runpod":
+        # /run + /status, RUNPOD_BATCH_SIZE segments per job, RUNPOD_MAX_IN_FLIGHT jobs at once
+        return XTTSRunPodAsyncEngine()
+    elif engine == "local":
+        return XTTSLocalEngine()
+    elif engine == "piper":
+        return PiperEngine()
+    elif engine == "auto":
+        # Per segment: best engine by latency/errors/cost within TTS_ROUTER_TIER, with failover
+        return RoutingEngine({
+            "piper": PiperEngine(),
+            "xtts-local": XTTSLocalEngine(),
+            "xtts-runpod": XTTSRunPodEngine(),
+            "xtts-replicate": XTTSReplicateEngine(),
+        })
+    raise ValueError(f"Unknown TTS engine: {engine}")
+
+
+def _preload_voices(tts_engine, voices: list):
+    """Resolve (and upload) the job's voices once before synthesis, for engines with a voice registry."""
+    if not hasattr(tts_engine, "preload_voices"):
+        return
+    try:
+        tts_engine.preload_voices(voices)
+    except Exception as e:
+        logger.warning(f"[V3.1] Could not preload voices {voices}: {e}")
+
+
+def _voice_cache_id(tts_engine, voice: str) -> str:
+    """Voice fingerprint for the audio cache (resolved like the XTTS engines do)."""
+    try:
+        voices = [v for v in tts_engine.get_voices() if v.get("path")]
+    except Exception:
+        voices = []
+    for v in voices:
+        if v["id"] == voice or v.get("name", "").lower() == (voice or "").lower():
+            return voice_fingerprint(voice, v["path"])
+    # XTTS engines fall back to the first voice file
+    return voice_fingerprint(voice, voices[0]["path"] if voices else None)
+
+
+def _cache_engine_id(engine_obj, name: str) -> str:
+    """Engine name in audio cache keys; lossy RunPod transports (opus/aac) get their own keys."""
+    variant = getattr(engine_obj, "cache_variant", "")
+    return f"{name}:{variant}" if variant else name
+
+
+def _cache_engine_names(tts_engine, engine: str) -> List[str]:
+    """
+    Engine names a segment's cached audio may be stored under, best first.
+    
+    The router ("auto") caches audio under the engine that actually produced it, so
+    draft-tier Piper audio is never served to a run that expects XTTS; lookups try the
+    engines the router may currently use.
+    """
+    if hasattr(tts_engine, "ranked"):
+        return [_cache_engine_id(tts_engine.engines[name], name) for name in tts_engine.ranked()]
+    return [_cache_engine_id(tts_engine, engine)]
+
+
+def _produced_cache_key(tts_engine, engine: str, text: str, voice_id: str, language: str,
+                        produced_by: Optional[str] = None) -> Optional[str]:
+    """Cache key for freshly synthesized audio; None when the producing engine is unknown."""
+    if hasattr(tts_engine, "ranked"):
+        if not produced_by:
+            return None
+        engine = _cache_engine_id(tts_engine.engines[produced_by], produced_by)
+    else:
+        engine = _cache_engine_id(tts_engine, engine)
+    return make_audio_cache_key(text, voice_id, engine, language, Config.AUDIO_CACHE_MODEL_VERSION)
+
+
+async def _cache_lookup(audio_cache, tts_engine, engine: str, texts: Dict[int, str], audio_paths: List[str],
+                        voice_id: str, language: str) -> Dict[int, int]:
+    """Copy cached audio for {segment index: text} to audio_paths; returns {segment index: duration_ms}."""
+    hits = {}
+    for name in _cache_engine_names(tts_engine, engine):
+        remaining = [i for i in texts if i not in hits]
+        if not remaining:
+            break
+        found = await run_io(audio_cache.get_many, [
+            (make_audio_cache_key(texts[i], voice_id, name, language, Config.AUDIO_CACHE_MODEL_VERSION), audio_paths[i])
+            for i in remaining
+        ])
+        hits.update({remaining[n]: duration_ms for n, duration_ms in found.items()})
+    return hits
+
+
 async def v3_generate_tts_audio(
     job_id: str,
-    engine: str = "runpod",  # "runpod", "local", "piper"
+    engine: str = "runpod",  # "runpod", "local", "piper", "auto"
     voice: str = "default",
-    language: str = "en"
+    language: str = "en",
+    resume: bool = False
 ) -> Dict:
     """
     Generate TTS audio for all chapters using the v3.1 segment/group architecture.
@@ -611,53 +788,58 @@ async def v3_generate_tts_audio(
     This phase:
     1. Takes sections from GLM processing
     2. Merges short segments (<60 chars) and clamps long ones (>420 chars)
-    3. Generates TTS audio for each segment
+    3. Generates TTS audio for each segment (reusing cached audio for unchanged segments)
     4. Measures actual audio duration
     5. Groups segments into ~35 second audio_groups
-    6. Concatenates group audio files
+    6. Encodes the chapter's group audio files in one ffmpeg pass
     7. Uploads to Supabase (tts_segments, audio_groups tables)
     
+    Audio is written to a durable per-job work directory (Config.V3_TTS_WORK_DIR).
+    Each synthesized segment is checkpointed and each finished chapter is saved to
+    the job journal, so a rerun skips finished chapters and segments.
+    
     Args:
         job_id: Pipeline job ID
-        engine: TTS engine to use ("runpod", "local", "piper")
+        engine: TTS engine to use ("runpod", "local", "piper", "auto")
         voice: Voice to use for TTS
         language: Language code (e.g., "en", "da")
+        resume: Also accept a job interrupted during TTS generation
+            (see v3_resume_tts_audio)
     
     Returns:
         Dict with success status and stats
     """
-    import tempfile
-    import sys
-    
-    # Add HonoraLocalTTS to path for TTS engines
-    tts_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "HonoraLocalTTS")
-    if tts_path not in sys.path:
-        sys.path.insert(0, tts_path)
-    
-    from tts_engines import XTTSRunPodEngine, XTTSLocalEngine, PiperEngine
-    
     state = get_v3_job_state(job_id)
     if not state:
         raise ValueError(f"Job not found: {job_id}")
     
-    if state["phase"] not in ["chapters_processed", "complete", "uploaded"]:
+    allowed_phases = ["chapters_processed", "complete", "uploaded"]
+    if resume:
+        allowed_phases += ["generating_tts", "tts_generated"]
+    if state["phase"] not in allowed_phases:
         raise ValueError(f"Chapters not processed yet. Current phase: {state['phase']}")
     
     state["phase"] = "generating_tts"
+    state["tts_settings"] = {"engine": engine, "voice": voice, "language": language}
     save_v3_job_state(job_id, state)
     
     # Initialize TTS engine
-    if engine == "runpod":
-        tts_engine = XTTSRunPodEngine()
-    elif engine == "local":
-        tts_engine = XTTSLocalEngine()
-    elif engine == "piper":
-        tts_engine = PiperEngine()
-    else:
-        raise ValueError(f"Unknown TTS engine: {engine}")
+    tts_engine = _create_tts_engine(engine)
     
     logger.info(f"[V3.1] Starting TTS generation with {engine} engine")
     
+    # Segment audio cache: unchanged segments are reused instead of re-synthesized
+    audio_cache = get_audio_cache()
+    await run_io(_preload_voices, tts_engine, [voice])
+    voice_id = await run_io(_voice_cache_id, tts_engine, voice)
+    cache_hits = 0
+    cache_misses = 0
+    
+    # Durable audio + checkpoints; removed after the audio upload is confirmed
+    work_dir = TTSWorkDir(job_id)
+    chapters_resumed = 0
+    segments_resumed = 0
+    
     # Stats
     total_segments = 0
     total_groups = 0
@@ -666,108 +848,266 @@ async def v3_generate_tts_audio(
     
     chapters = state.get("chapters", [])
     
-    # Create temp directory for audio files
-    with tempfile.TemporaryDirectory() as temp_dir:
-        for ch_idx, chapter in enumerate(chapters):
-            chapter_title = chapter.get("title", f"Chapter {ch_idx + 1}")
+    for ch_idx, chapter in enumerate(chapters):
+        chapter_title = chapter.get("title", f"Chapter {ch_idx + 1}")
+        
+        # Skip if no sections
+        sections = chapter.get("sections", [])
+        if not sections:
+            logger.warning(f"[V3.1] No sections for chapter: {chapter_title}")
+            continue
+        
+        # Skip if excluded from audio
+        if chapter.get("exclude_from_audio"):
+            logger.info(f"[V3.1] Skipping excluded chapter: {chapter_title}")
+            continue
+        
+        logger.info(f"[V3.1] Processing chapter {ch_idx + 1}/{len(chapters)}: {chapter_title}")
+        
+        try:
+            # Step 1: Process sections into segments (merge short, clamp long)
+            section_texts = [s.get("text", "") for s in sections if s.get("text")]
+            segments = process_segments(section_texts)
             
-            # Skip if no sections
-            sections = chapter.get("sections", [])
-            if not sections:
-                logger.warning(f"[V3.1] No sections for chapter: {chapter_title}")
-                continue
+            logger.info(f"[V3.1] {len(section_texts)} sections -> {len(segments)} segments")
             
-            # Skip if excluded from audio
-            if chapter.get("exclude_from_audio"):
-                logger.info(f"[V3.1] Skipping excluded chapter: {chapter_title}")
+            # Step 2: Reuse checkpointed/cached audio, generate TTS for the remaining segments
+            chapter_dir = work_dir.chapter_dir(ch_idx)
+            audio_paths = [os.path.join(chapter_dir, f"seg_{seg_idx}.wav") for seg_idx in range(len(segments))]
+            cache_keys = [
+                make_audio_cache_key(seg["text"], voice_id, engine, language, Config.AUDIO_CACHE_MODEL_VERSION)
+                for seg in segments
+            ]
+            
+            if chapter_is_complete(chapter, cache_keys):
+                # Finished by an earlier (interrupted) run; its group files are still on disk
+                logger.info(f"[V3.1] Chapter already generated, skipping: {chapter_title}")
+                chapters_resumed += 1
+                total_segments += len(chapter["segments"])
+                total_groups += len(chapter["audio_groups"])
+                total_chapters_processed += 1
                 continue
             
-            logger.info(f"[V3.1] Processing chapter {ch_idx + 1}/{len(chapters)}: {chapter_title}")
+            # Segments synthesized before an interrupted run stopped
+            successes = {i: True for i in await run_io(work_dir.finished_segments, ch_idx, cache_keys, audio_paths)}
+            segments_resumed += len(successes)
+            if successes:
+                logger.info(f"[V3.1] Resuming: {len(successes)}/{len(segments)} segments already synthesized")
             
-            try:
-                # Step 1: Process sections into segments (merge short, clamp long)
-                section_texts = [s.get("text", "") for s in sections if s.get("text")]
-                segments = process_segments(section_texts)
-                
-                logger.info(f"[V3.1] {len(section_texts)} sections -> {len(segments)} segments")
-                
-                # Step 2: Generate TTS for each segment
-                for seg_idx, segment in enumerate(segments):
-                    seg_text = segment["text"]
-                    audio_path = os.path.join(temp_dir, f"seg_{ch_idx}_{seg_idx}.wav")
-                    
-                    # Generate TTS
-                    success = tts_engine.generate(
-                        text=seg_text,
+            cached = {}
+            if not Config.AUDIO_CACHE_BYPASS:
+                to_lookup = {i: segments[i]["text"] for i in range(len(segments)) if i not in successes}
+                cached = await _cache_lookup(audio_cache, tts_engine, engine, to_lookup, audio_paths, voice_id, language)
+            pending = [i for i in range(len(segments)) if i not in cached and i not in successes]
+            cache_hits += len(cached)
+            cache_misses += len(pending)
+            if cached:
+                logger.info(f"[V3.1] Audio cache: {len(cached)}/{len(segments)} segments reused")
+            
+            produced_by = {}  # segment index -> engine the router picked
+            checkpoints = []  # pending record_segment writes (open/write/fsync, off the event loop)
+            
+            def checkpoint(seg_idx, result, ch_idx=ch_idx, cache_keys=cache_keys):
+                if result["success"]:
+                    checkpoints.append(asyncio.ensure_future(
+                        run_io(work_dir.record_segment, ch_idx, seg_idx, cache_keys[seg_idx])
+                    ))
+            
+            if pending and hasattr(tts_engine, "generate_many"):
+                # Whole chapter submitted at once; WAVs land on disk as jobs complete
+                results = await tts_engine.generate_many(
+                    [{"id": i, "text": segments[i]["text"], "output_path": audio_paths[i]} for i in pending],
+                    voice=voice,
+                    language=language,
+                    on_complete=checkpoint
+                )
+                successes.update({i: r["success"] for i, r in results.items()})
+                produced_by.update({i: r.get("engine") for i, r in results.items()})
+            
+            # Engines without generate_many: one segment at a time
+            for seg_idx in pending:
+                if seg_idx not in successes:
+                    # Generate TTS (blocking HTTP/subprocess call, run off the event loop)
+                    successes[seg_idx] = await run_io(
+                        tts_engine.generate,
+                        text=segments[seg_idx]["text"],
                         voice=voice,
                         language=language,
-                        output_path=audio_path
+                        output_path=audio_paths[seg_idx]
                     )
-                    
-                    if success and os.path.exists(audio_path):
-                        # Measure actual duration
-                        duration_ms = get_audio_duration_ms(audio_path)
-                        segment["audio_path"] = audio_path
-                        segment["duration_ms"] = duration_ms
-                        logger.debug(f"[V3.1] Segment {seg_idx}: {duration_ms}ms")
-                    else:
-                        logger.error(f"[V3.1] TTS failed for segment {seg_idx}")
-                        segment["duration_ms"] = 5000  # Fallback estimate
-                
-                # Step 3: Group segments by duration (~35 sec per group)
-                groups = group_segments(segments)
-                
-                logger.info(f"[V3.1] Created {len(groups)} audio groups")
+                    checkpoint(seg_idx, {"success": successes[seg_idx]})
+            await asyncio.gather(*checkpoints)
+            
+            # Measure actual durations from the file headers, whole chapter in one call
+            generated = [audio_paths[i] for i in successes if successes[i] and os.path.exists(audio_paths[i])]
+            durations = await run_io(probe_many, generated) if generated else {}
+            
+            for seg_idx, segment in enumerate(segments):
+                audio_path = audio_paths[seg_idx]
                 
-                # Step 4: Concatenate each group's audio
-                chapter_id = chapter.get("db_chapter_id")  # Will be set during upload
+                if seg_idx in cached:
+                    segment["audio_path"] = audio_path
+                    segment["duration_ms"] = cached[seg_idx]
+                    continue
                 
+                duration_ms = durations.get(audio_path)
+                if duration_ms is not None:
+                    segment["audio_path"] = audio_path
+                    segment["duration_ms"] = duration_ms
+                    logger.debug(f"[V3.1] Segment {seg_idx}: {duration_ms}ms")
+                    cache_key = _produced_cache_key(tts_engine, engine, segment["text"], voice_id, language,
+                                                    produced_by.get(seg_idx))
+                    try:
+                        if cache_key:
+                            await run_io(audio_cache.put, cache_key, audio_path, duration_ms)
+                    except OSError as e:
+                        logger.warning(f"[V3.1] Could not cache segment {seg_idx} audio: {e}")
+                else:
+                    if successes.get(seg_idx):
+                        logger.error(f"[V3.1] Unreadable audio for segment {seg_idx}, treating as failed")
+                    else:
+                        logger.error(f"[V3.1] TTS failed for segment {seg_idx}")
+                    # No audio: takes no time, like the chapter encoder and GroupAssembler treat it
+                    segment.pop("audio_path", None)
+                    segment["duration_ms"] = 0
+            
+            # Step 3: Group segments by duration (~35 sec per group)
+            groups = group_segments(segments)
+            
+            logger.info(f"[V3.1] Created {len(groups)} audio groups")
+            
+            # Step 4: Concatenate each group's audio
+            try:
+                # One ffmpeg process for the whole chapter; durations come from sample counts
+                await run_io(encode_chapter_groups, groups, chapter_dir)
+            except ChapterEncodeError as e:
+                logger.warning(f"[V3.1] Single-pass encode not possible ({e}), concatenating per group")
                 for group in groups:
                     try:
-                        group_audio_path = concat_group_audio(group, temp_dir)
+                        group_audio_path = await run_io(concat_group_audio, group, chapter_dir)
                         group["local_audio_path"] = group_audio_path
                         
                         # Measure final group duration
-                        group["duration_ms"] = get_audio_duration_ms(group_audio_path)
+                        group["duration_ms"] = await run_io(get_audio_duration_ms, group_audio_path)
                     except Exception as e:
                         logger.error(f"[V3.1] Failed to concat group {group['group_index']}: {e}")
-                
-                # Store groups in chapter for later upload
-                chapter["audio_groups"] = groups
-                chapter["segments"] = segments
-                total_segments += len(segments)
-                total_groups += len(groups)
-                total_chapters_processed += 1
-                
-            except Exception as e:
-                logger.error(f"[V3.1] Error processing chapter {chapter_title}: {e}")
-                errors.append({"chapter": chapter_title, "error": str(e)})
-        
-        # Save state with TTS data
-        state["chapters"] = chapters
-        state["phase"] = "tts_generated"
-        state["tts_stats"] = {
-            "engine": engine,
-            "voice": voice,
-            "language": language,
-            "total_segments": total_segments,
-            "total_groups": total_groups,
-            "chapters_processed": total_chapters_processed,
-            "errors": errors
-        }
-        save_v3_job_state(job_id, state)
+                        group["local_audio_path"] = None
+                        group["duration_ms"] = 0
+                # group_segments() timed the groups before encoding; use the measured durations
+                retime_groups(groups)
+            
+            # Store groups in chapter for later upload; checkpoint the finished chapter
+            chapter["audio_groups"] = groups
+            chapter["segments"] = segments
+            chapter["tts_segment_keys"] = cache_keys
+            save_v3_job_state(job_id, state, chapters=[ch_idx])
+            total_segments += len(segments)
+            total_groups += len(groups)
+            total_chapters_processed += 1
+            
+        except Exception as e:
+            logger.error(f"[V3.1] Error processing chapter {chapter_title}: {e}")
+            errors.append({"chapter": chapter_title, "error": str(e)})
+    
+    # Save state with TTS data
+    lookups = cache_hits + cache_misses
+    cache_stats = {
+        "hits": cache_hits,
+        "misses": cache_misses,
+        "hit_rate": round(cache_hits / lookups, 3) if lookups else 0.0,
+    }
+    state["chapters"] = chapters
+    state["phase"] = "tts_generated"
+    state["tts_stats"] = {
+        "engine": engine,
+        "voice": voice,
+        "language": language,
+        "total_segments": total_segments,
+        "total_groups": total_groups,
+        "chapters_processed": total_chapters_processed,
+        "chapters_resumed": chapters_resumed,
+        "segments_resumed": segments_resumed,
+        "audio_cache": cache_stats,
+        # RunPod payload bytes/segment times per transport format (RUNPOD_AUDIO_FORMAT)
+        "transport": tts_engine.transport.summary() if hasattr(tts_engine, "transport") else None,
+        "engines": tts_engine.engine_stats() if hasattr(tts_engine, "engine_stats") else None,
+        "errors": errors
+    }
+    save_v3_job_state(job_id, state)
     
-    logger.info(f"[V3.1] TTS generation complete: {total_segments} segments, {total_groups} groups")
+    logger.info(f"[V3.1] TTS generation complete: {total_segments} segments, {total_groups} groups, "
+                f"audio cache hit rate {cache_stats['hit_rate']:.0%}")
     
     return {
         "success": len(errors) == 0,
         "total_segments": total_segments,
         "total_groups": total_groups,
         "chapters_processed": total_chapters_processed,
+        "chapters_resumed": chapters_resumed,
+        "segments_resumed": segments_resumed,
+        "audio_cache": cache_stats,
         "errors": errors
     }
 
 
+async def v3_resume_tts_audio(job_id: str) -> Dict:
+    """
+    Resume TTS generation for a job that was interrupted (crash, redeploy) with the
+    engine, voice and language of the original run. Finished chapters and
+    checkpointed segments are not synthesized again.
+    """
+    state = get_v3_job_state(job_id, include_chapters=False)
+    if not state:
+        raise ValueError(f"Job not found: {job_id}")
+    
+    settings = state.get("tts_settings")
+    if not settings or state["phase"] not in ["generating_tts", "tts_generated"]:
+        raise ValueError(f"No TTS generation to resume. Current phase: {state['phase']}")
+    
+    logger.info(f"[V3.1] Resuming TTS generation for job {job_id[:8]}")
+    return await v3_generate_tts_audio(job_id, resume=True, **settings)
+
+
+def _save_chapter_audio_records(chapter: Dict, chapter_id: str, groups: List[Dict],
+                                writer: Optional[BulkWriter] = None) -> tuple:
+    """
+    Write the database side of a chapter's audio (group files must already be uploaded):
+    chapter_build, audio_groups + tts_segments, paragraph_spans, chapter audio_version.
+    
+    The rows go out as chunked array inserts through `writer` (shared across the
+    chapters of a run, so its stats cover the whole upload).
+    
+    Returns:
+        (segments_saved, spans_created)
+    """
+    # TTS-First v3.1: Create chapter_build for atomic versioning
+    segments = chapter.get("segments", [])
+    build_id = create_chapter_build(chapter_id, segments)
+    
+    # Build paragraph_id_map (segment_index -> paragraph_id) from the character-offset alignment
+    paragraphs = chapter.get("paragraphs", [])
+    alignment = align_paragraphs(paragraphs, segments)
+    paragraph_id_map = {}
+    for seg_idx, para_idx in enumerate(alignment["segment_paragraphs"]):
+        if paragraphs[para_idx].get("db_paragraph_id"):
+            paragraph_id_map[seg_idx] = paragraphs[para_idx]["db_paragraph_id"]
+    if paragraphs and segments and alignment["anchored"] < len(paragraphs) - 1:  # paragraph 0 (title) is not spoken
+        logger.info(f"[V3.1] Span alignment for {chapter.get('title')}: {alignment['anchored']}/{len(paragraphs)} "
+                    f"paragraphs matched verbatim, the rest placed by length")
+    
+    # Save to Supabase tables (with build_id)
+    writer = writer or BulkWriter()
+    save_groups_to_supabase(chapter_id, build_id, groups, paragraph_id_map, writer=writer)
+    segments_saved = sum(len(g.get("segments", [])) for g in groups)
+    
+    # TTS-First v3.1: Generate paragraph_spans
+    span_ids = generate_paragraph_spans(chapter_id, build_id, paragraphs, segments, writer=writer, alignment=alignment)
+    
+    # Update chapter audio_version (with build_id link)
+    update_chapter_audio_version(chapter_id, build_id, "v2")
+    return segments_saved, len(span_ids)
+
+
 async def v3_upload_audio_to_supabase(job_id: str) -> Dict:
     """
     Upload generated TTS audio groups to Supabase.
@@ -798,6 +1138,8 @@ async def v3_upload_audio_to_supabase(job_id: str) -> Dict:
     total_groups_uploaded = 0
     total_segments_saved = 0
     total_spans_created = 0
+    all_uploaded = True
+    writer = BulkWriter()
     
     for chapter in chapters:
         groups = chapter.get("audio_groups", [])
@@ -807,6 +1149,7 @@ async def v3_upload_audio_to_supabase(job_id: str) -> Dict:
         chapter_id = chapter.get("db_chapter_id")
         if not chapter_id:
             logger.warning(f"[V3.1] No chapter_id for {chapter.get('title')}, skipping audio upload")
+            all_uploaded = False
             continue
         
         logger.info(f"[V3.1] Uploading audio for: {chapter.get('title')}")
@@ -818,54 +1161,283 @@ async def v3_upload_audio_to_supabase(job_id: str) -> Dict:
                 audio_url = upload_group_audio(local_path, chapter_id, group["group_index"])
                 group["audio_url"] = audio_url
                 total_groups_uploaded += 1
+            elif not group.get("audio_url"):
+                all_uploaded = False
         
-        # TTS-First v3.1: Create chapter_build for atomic versioning
-        segments = chapter.get("segments", [])
-        build_id = create_chapter_build(chapter_id, segments)
-        
-        # Build paragraph_id_map (segment_index -> paragraph_id)
-        paragraphs = chapter.get("paragraphs", [])
-        paragraph_id_map = {}
-        
-        # Simple 1:1 mapping if same count, otherwise proportional
-        if len(paragraphs) == len(segments):
-            for i, p in enumerate(paragraphs):
-                if p.get("db_paragraph_id"):
-                    paragraph_id_map[i] = p["db_paragraph_id"]
-        else:
-            # Proportional mapping
-            if paragraphs and segments:
-                for seg_idx in range(len(segments)):
-                    para_idx = int(seg_idx * len(paragraphs) / len(segments))
-                    if para_idx < len(paragraphs) and paragraphs[para_idx].get("db_paragraph_id"):
-                        paragraph_id_map[seg_idx] = paragraphs[para_idx]["db_paragraph_id"]
-        
-        # Save to Supabase tables (with build_id)
-        group_ids = save_groups_to_supabase(chapter_id, build_id, groups, paragraph_id_map)
-        total_segments_saved += sum(len(g.get("segments", [])) for g in groups)
-        
-        # TTS-First v3.1: Generate paragraph_spans
-        span_ids = generate_paragraph_spans(chapter_id, build_id, paragraphs, segments)
-        total_spans_created += len(span_ids)
-        
-        # Update chapter audio_version (with build_id link)
-        update_chapter_audio_version(chapter_id, build_id, "v2")
+        segments_saved, spans_created = _save_chapter_audio_records(chapter, chapter_id, groups, writer)
+        total_segments_saved += segments_saved
+        total_spans_created += spans_created
     
+    db_writes = writer.stats()
     state["phase"] = "audio_uploaded"
     state["audio_upload_stats"] = {
         "groups_uploaded": total_groups_uploaded,
         "segments_saved": total_segments_saved,
-        "spans_created": total_spans_created
+        "spans_created": total_spans_created,
+        "db_writes": db_writes
     }
     save_v3_job_state(job_id, state)
     
+    # Upload confirmed: the work directory (segment audio + checkpoints) is no longer needed.
+    # Kept when some chapter could not be uploaded, so it can be retried without new synthesis.
+    if all_uploaded and not Config.V3_TTS_KEEP_WORK_DIR:
+        await run_io(TTSWorkDir(job_id).cleanup)
+    
     logger.info(f"[V3.1] Audio upload complete: {total_groups_uploaded} groups, {total_segments_saved} segments, {total_spans_created} spans")
+    logger.info(f"[V3.1] Database writes: {db_writes['rows']} rows in {db_writes['round_trips']} round trips "
+                f"({db_writes['rows_per_second']} rows/s)")
     
     return {
         "success": True,
         "groups_uploaded": total_groups_uploaded,
         "segments_saved": total_segments_saved,
-        "spans_created": total_spans_created
+        "spans_created": total_spans_created,
+        "db_writes": db_writes
+    }
+
+
+async def v3_stream_tts_audio(
+    job_id: str,
+    engine: str = "runpod",
+    voice: str = "default",
+    language: str = "en"
+) -> Dict:
+    """
+    Generate and upload TTS audio with overlapping stages (streaming mode).
+    
+    Same result as v3_generate_tts_audio followed by v3_upload_audio_to_supabase, but
+    per chapter each ~35 s group is encoded and uploaded as soon as its segments are
+    synthesized, while synthesis continues on later segments (see app/tts_stream.py).
+    Bounded queues keep only a few groups on local disk at a time.
+    
+    Chapters must already have db_chapter_id (book uploaded to Supabase).
+    
+    Args:
+        job_id: Pipeline job ID
+        engine: TTS engine to use ("runpod", "local", "piper", "auto")
+        voice: Voice to use for TTS
+        language: Language code (e.g., "en", "da")
+    
+    Returns:
+        Dict with TTS, upload and streaming stats
+    """
+    import tempfile
+    
+    state = get_v3_job_state(job_id)
+    if not state:
+        raise ValueError(f"Job not found: {job_id}")
+    
+    if state["phase"] not in ["chapters_processed", "complete", "uploaded"]:
+        raise ValueError(f"Chapters not processed yet. Current phase: {state['phase']}")
+    
+    previous_phase = state["phase"]
+    state["phase"] = "generating_tts"
+    save_v3_job_state(job_id, state)
+    
+    tts_engine = _create_tts_engine(engine)
+    audio_cache = get_audio_cache()
+    await run_io(_preload_voices, tts_engine, [voice])
+    voice_id = await run_io(_voice_cache_id, tts_engine, voice)
+    
+    logger.info(f"[V3.1] Starting streaming TTS with {engine} engine")
+    
+    totals = {
+        "segments": 0, "groups": 0, "chapters": 0, "groups_uploaded": 0,
+        "segments_saved": 0, "spans_created": 0, "cache_hits": 0, "cache_misses": 0,
+        "peak_pending_segments": 0, "peak_queued_groups": 0,
+    }
+    errors = []
+    chapters = state.get("chapters", [])
+    writer = BulkWriter()
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for ch_idx, chapter in enumerate(chapters):
+            chapter_title = chapter.get("title", f"Chapter {ch_idx + 1}")
+            
+            sections = chapter.get("sections", [])
+            if not sections:
+                logger.warning(f"[V3.1] No sections for chapter: {chapter_title}")
+                continue
+            if chapter.get("exclude_from_audio"):
+                logger.info(f"[V3.1] Skipping excluded chapter: {chapter_title}")
+                continue
+            
+            chapter_id = chapter.get("db_chapter_id")
+            if not chapter_id:
+                logger.warning(f"[V3.1] No chapter_id for {chapter_title}, skipping streaming TTS")
+                errors.append({"chapter": chapter_title, "error": "No db_chapter_id - upload the book first"})
+                continue
+            
+            logger.info(f"[V3.1] Streaming chapter {ch_idx + 1}/{len(chapters)}: {chapter_title}")
+            
+            try:
+                section_texts = [s.get("text", "") for s in sections if s.get("text")]
+                segments = process_segments(section_texts)
+                audio_paths = [os.path.join(temp_dir, f"seg_{ch_idx}_{i}.wav") for i in range(len(segments))]
+                
+                async def finish_segment(i: int, success: bool, on_ready, produced_by: Optional[str] = None):
+                    # Measure and cache before the segment is handed on (the encoder deletes it)
+                    duration_ms = None
+                    if success and os.path.exists(audio_paths[i]):
+                        try:
+                            duration_ms = await run_io(probe_duration_ms, audio_paths[i])
+                        except AudioProbeError as e:
+                            logger.error(f"[V3.1] Unreadable audio for segment {i}: {e}")
+                    if duration_ms is not None:
+                        cache_key = _produced_cache_key(tts_engine, engine, segments[i]["text"], voice_id, language,
+                                                        produced_by)
+                        try:
+                            if cache_key:
+                                await run_io(audio_cache.put, cache_key, audio_paths[i], duration_ms)
+                        except OSError as e:
+                            logger.warning(f"[V3.1] Could not cache segment {i} audio: {e}")
+                        segments[i]["audio_path"] = audio_paths[i]
+                    else:
+                        logger.error(f"[V3.1] TTS failed for segment {i}")
+                    on_ready(i, duration_ms)
+                
+                async def synthesize(indices: List[int], on_ready):
+                    cached = {}
+                    if not Config.AUDIO_CACHE_BYPASS:
+                        cached = await _cache_lookup(audio_cache, tts_engine, engine,
+                                                     {i: segments[i]["text"] for i in indices},
+                                                     audio_paths, voice_id, language)
+                    for i, duration_ms in cached.items():
+                        segments[i]["audio_path"] = audio_paths[i]
+                        on_ready(i, duration_ms)
+                    misses = [i for i in indices if i not in cached]
+                    totals["cache_hits"] += len(cached)
+                    totals["cache_misses"] += len(misses)
+                    if not misses:
+                        return
+                    
+                    if hasattr(tts_engine, "generate_many"):
+                        finishing = []
+                        await tts_engine.generate_many(
+                            [{"id": i, "text": segments[i]["text"], "output_path": audio_paths[i]} for i in misses],
+                            voice=voice,
+                            language=language,
+                            on_complete=lambda i, r: finishing.append(
+                                asyncio.ensure_future(finish_segment(i, r["success"], on_ready, r.get("engine")))
+                            )
+                        )
+                        await asyncio.gather(*finishing)
+                    else:
+                        for i in misses:
+                            success = await run_io(
+                                tts_engine.generate,
+                                text=segments[i]["text"],
+                                voice=voice,
+                                language=language,
+                                output_path=audio_paths[i]
+                            )
+                            await finish_segment(i, success, on_ready)
+                
+                async def encode_group(group: Dict):
+                    try:
+                        await run_io(encode_chapter_groups, [group], temp_dir)
+                        return
+                    except ChapterEncodeError as e:
+                        logger.warning(f"[V3.1] Group {group['group_index']}: {e}, falling back to concat")
+                    try:
+                        group["local_audio_path"] = await run_io(concat_group_audio, group, temp_dir)
+                        group["duration_ms"] = await run_io(get_audio_duration_ms, group["local_audio_path"])
+                    except Exception as e:
+                        # Every segment in the group failed, or ffmpeg did
+                        logger.error(f"[V3.1] Failed to encode group {group['group_index']}: {e}")
+                        group["local_audio_path"] = None
+                        group["duration_ms"] = 0
+                
+                async def upload_group(group: Dict):
+                    group["audio_url"] = None
+                    if group.get("local_audio_path"):
+                        group["audio_url"] = await run_io(
+                            upload_group_audio, group["local_audio_path"], chapter_id, group["group_index"]
+                        )
+                        totals["groups_uploaded"] += 1
+                
+                groups, stream_stats = await stream_chapter(segments, synthesize, encode_group, upload_group)
+                
+                chapter["audio_groups"] = groups
+                chapter["segments"] = segments
+                segments_saved, spans_created = await run_io(_save_chapter_audio_records, chapter, chapter_id, groups, writer)
+                
+                missing = sum(1 for seg in segments if not seg.get("audio_path"))
+                failed_groups = sum(1 for g in groups if not g.get("local_audio_path"))
+                if missing or failed_groups:
+                    errors.append({"chapter": chapter_title,
+                                   "error": f"{missing} of {len(segments)} segments and {failed_groups} of "
+                                            f"{len(groups)} groups have no audio"})
+                
+                totals["segments"] += len(segments)
+                totals["groups"] += len(groups)
+                totals["chapters"] += 1
+                totals["segments_saved"] += segments_saved
+                totals["spans_created"] += spans_created
+                for key in ("peak_pending_segments", "peak_queued_groups"):
+                    totals[key] = max(totals[key], stream_stats[key])
+                
+            except Exception as e:
+                logger.error(f"[V3.1] Error streaming chapter {chapter_title}: {e}")
+                errors.append({"chapter": chapter_title, "error": str(e)})
+    
+    lookups = totals["cache_hits"] + totals["cache_misses"]
+    cache_stats = {
+        "hits": totals["cache_hits"],
+        "misses": totals["cache_misses"],
+        "hit_rate": round(totals["cache_hits"] / lookups, 3) if lookups else 0.0,
+    }
+    stream_stats = {
+        "peak_pending_segments": totals["peak_pending_segments"],
+        "peak_queued_groups": totals["peak_queued_groups"],
+    }
+    
+    state["chapters"] = chapters
+    if errors:
+        # A partially voiced book must stay rerunnable, not look finished
+        logger.warning(f"[V3.1] {len(errors)} chapter(s) incomplete, keeping phase {previous_phase}")
+        state["phase"] = previous_phase
+    else:
+        state["phase"] = "audio_uploaded"
+    state["tts_stats"] = {
+        "engine": engine,
+        "voice": voice,
+        "language": language,
+        "streaming": True,
+        "total_segments": totals["segments"],
+        "total_groups": totals["groups"],
+        "chapters_processed": totals["chapters"],
+        "audio_cache": cache_stats,
+        "stream": stream_stats,
+        "transport": tts_engine.transport.summary() if hasattr(tts_engine, "transport") else None,
+        "engines": tts_engine.engine_stats() if hasattr(tts_engine, "engine_stats") else None,
+        "errors": errors
+    }
+    db_writes = writer.stats()
+    state["audio_upload_stats"] = {
+        "groups_uploaded": totals["groups_uploaded"],
+        "segments_saved": totals["segments_saved"],
+        "spans_created": totals["spans_created"],
+        "db_writes": db_writes
+    }
+    save_v3_job_state(job_id, state)
+    
+    logger.info(f"[V3.1] Streaming TTS complete: {totals['segments']} segments, "
+                f"{totals['groups_uploaded']} groups uploaded, {db_writes['rows']} rows in "
+                f"{db_writes['round_trips']} round trips ({db_writes['rows_per_second']} rows/s)")
+    
+    return {
+        "success": len(errors) == 0,
+        "total_segments": totals["segments"],
+        "total_groups": totals["groups"],
+        "chapters_processed": totals["chapters"],
+        "groups_uploaded": totals["groups_uploaded"],
+        "segments_saved": totals["segments_saved"],
+        "spans_created": totals["spans_created"],
+        "db_writes": db_writes,
+        "audio_cache": cache_stats,
+        "stream": stream_stats,
+        "errors": errors
     }
 
 
@@ -953,54 +1525,127 @@ def create_nodes_from_mapping(book_id: str, mapping_nodes: List[Dict]) -> Dict[s
     Returns:
         Dict mapping order_key -> node_id for chapter content linking
     """
-    from app.chapters import create_book_node
+    from app.chapters import BookTreeBuilder
     
-    # Sort by order_key to ensure parents are created before children
+    # Sort by order_key to ensure parents are added before children
     sorted_nodes = sorted(mapping_nodes, key=lambda n: n.get('order_key', '9999'))
     
     # Map order_key -> node_id for parent lookups
     order_key_to_id = {}
+    tree = BookTreeBuilder(book_id)
     
     for node in sorted_nodes:
         order_key = node.get('order_key')
         parent_order_key = node.get('parent_order_key')
         
-        # Resolve parent_id from parent_order_key
+        # Resolve parent_id from parent_order_key (ids are generated locally, so no lookup)
         parent_id = order_key_to_id.get(parent_order_key) if parent_order_key else None
         
-        # Get node properties with defaults
         node_type = node.get('node_type', 'chapter')
         display_title = node.get('display_title', 'Untitled')
-        source_title = node.get('source_title', display_title)
-        has_content = node.get('has_content', True)
-        exclude_from_frontend = node.get('exclude_from_frontend', False)
-        exclude_from_audio = node.get('exclude_from_audio', False)
         
-        # Create the node
-        created_node = create_book_node(
-            book_id=book_id,
+        created_node = tree.add(
             node_type=node_type,
             display_title=display_title,
-            source_title=source_title,
+            source_title=node.get('source_title', display_title),
             parent_id=parent_id,
             order_key=order_key,  # Use the order_key from mapping!
-            has_content=has_content,
-            exclude_from_frontend=exclude_from_frontend,
-            exclude_from_audio=exclude_from_audio
+            has_content=node.get('has_content', True),
+            exclude_from_frontend=node.get('exclude_from_frontend', False),
+            exclude_from_audio=node.get('exclude_from_audio', False)
         )
-        
-        # Store mapping
         order_key_to_id[order_key] = created_node['id']
-        
-        logger.info(f"[V3] Created node: {node_type} '{display_title}' (order: {order_key}, parent: {parent_order_key or 'root'})")
+    
+    # One bulk insert per tree level
+    tree.insert()
+    logger.info(f"[V3] Created {len(order_key_to_id)} nodes from mapping")
     
     return order_key_to_id
 
 
+# Retries per chapter for errors that did not reach the database (same payload and ids,
+# so a chapter that was in fact written comes back as "existing")
+INGEST_RETRIES = 2
+INGEST_RETRY_DELAY = 1.0  # seconds, doubled per retry
+_TRANSIENT_INGEST_ERRORS = ("timed out", "timeout", "connection", "temporarily unavailable", "502", "503", "504")
+
+
+class ChapterIngestError(Exception):
+    """Some chapters could not be ingested; the others are committed."""
+    
+    def __init__(self, message: str, ingested_chapter_ids: List[str], failed_chapter_ids: List[str]):
+        super().__init__(message)
+        self.ingested_chapter_ids = ingested_chapter_ids
+        self.failed_chapter_ids = failed_chapter_ids
+
+
+def _is_transient_ingest_error(error: Exception) -> bool:
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in _TRANSIENT_INGEST_ERRORS)
+
+
+async def _ingest_chapters(payloads: List[Dict]) -> Dict:
+    """
+    Write chapter payloads with ingest_chapter, Config.V3_UPLOAD_CONCURRENCY at a time.
+    
+    Transient errors (timeouts, dropped connections, 502-504) are retried with the
+    same payload. Every chapter is attempted; if any still fails, ChapterIngestError
+    is raised after all have finished, naming the chapters that were written.
+    """
+    from app.chapters import ingest_chapter
+    
+    semaphore = asyncio.Semaphore(max(1, Config.V3_UPLOAD_CONCURRENCY))
+    
+    async def ingest(payload: Dict) -> Dict:
+        delay = INGEST_RETRY_DELAY
+        for attempt in range(INGEST_RETRIES + 1):
+            try:
+                async with semaphore:
+                    return await run_io(ingest_chapter, payload)
+            except Exception as e:
+                if attempt == INGEST_RETRIES or not _is_transient_ingest_error(e):
+                    raise
+                logger.warning(f"[V3] Ingest of chapter {payload['chapter']['chapter_index']} failed ({e}), "
+                               f"retrying in {delay}s")
+            await asyncio.sleep(delay)
+            delay *= 2
+    
+    start = datetime.now()
+    results = await asyncio.gather(*(ingest(p) for p in payloads), return_exceptions=True)
+    seconds = (datetime.now() - start).total_seconds()
+    
+    errors = [r for r in results if isinstance(r, Exception)]
+    if errors:
+        logger.error(f"[V3] {len(errors)}/{len(payloads)} chapters failed to ingest")
+        raise ChapterIngestError(
+            str(errors[0]),
+            ingested_chapter_ids=[p["chapter"]["id"] for p, r in zip(payloads, results) if not isinstance(r, Exception)],
+            failed_chapter_ids=[p["chapter"]["id"] for p, r in zip(payloads, results) if isinstance(r, Exception)],
+        ) from errors[0]
+    
+    stats = {
+        "chapters": len(results),
+        "paragraphs": sum(r.get("paragraphs", 0) for r in results),
+        "tts_chunks": sum(r.get("tts_chunks", 0) for r in results),
+        "round_trips": sum(r.get("round_trips", 0) for r in results),
+        "existing": sum(1 for r in results if r.get("existing")),
+        "seconds": round(seconds, 2),
+    }
+    logger.info(f"[V3] Ingested {stats['chapters']} chapters ({stats['paragraphs']} paragraphs, "
+                f"{stats['tts_chunks']} TTS chunks) in {stats['round_trips']} round trips, {stats['seconds']}s")
+    return stats
+
+
 async def v3_upload_to_supabase(job_id: str) -> Dict:
     """
     Upload processed V3 book data to Supabase using book_nodes tree structure.
     
+    Each chapter's content (chapter row, paragraphs, TTS chunks and their links) is
+    written by the ingest_chapter RPC in one transaction, V3_UPLOAD_CONCURRENCY
+    chapters at a time (see docs/supabase-chapter-ingest-migration.sql).
+    
     Creates:
     - Book record (with metadata, cover art URLs)
     - book_nodes (tree structure: parts → chapters)
@@ -1012,12 +1657,8 @@ async def v3_upload_to_supabase(job_id: str) -> Dict:
     """
     from app.chapters import (
         create_book_in_supabase,
-        write_chapters_to_supabase,
-        write_sections_to_supabase,  # Now uses tts_chunks table
-        write_paragraphs_to_supabase,
-        create_book_node,
-        link_node_paragraphs,
-        link_paragraph_tts_chunks,
+        build_chapter_payload,
+        BookTreeBuilder,
         map_content_type_to_node_type
     )
     from app.cover_art import update_book_cover_url
@@ -1042,6 +1683,7 @@ async def v3_upload_to_supabase(job_id: str) -> Dict:
         
         # Step 1: Create book record
         book_id = create_book_in_supabase(metadata)
+        state["book_id"] = book_id  # kept on failure, the book row is committed
         logger.info(f"[V3] Created book: {book_id}")
         
         # Step 2: Update cover art URLs
@@ -1049,10 +1691,9 @@ async def v3_upload_to_supabase(job_id: str) -> Dict:
             update_book_cover_url(book_id, cover_urls)
             logger.info(f"[V3] Updated cover art URLs")
         
-        # Step 3 & 4: Create book_nodes and link content
-        total_tts_chunks = 0
-        total_paragraphs = 0
+        # Step 3 & 4: Create book_nodes and build each chapter's content payload
         total_nodes_created = 0
+        chapter_payloads = []
         
         # Build a lookup: chapter_index -> chapter data (for content linking)
         chapter_by_index = {ch.get('index'): ch for ch in chapters}
@@ -1064,7 +1705,7 @@ async def v3_upload_to_supabase(job_id: str) -> Dict:
             logger.info(f"[V3] Using manual mapping with {len(mapping_nodes)} nodes")
             
             # Create all nodes from mapping (including containers)
-            order_key_to_node_id = create_nodes_from_mapping(book_id, mapping_nodes)
+            order_key_to_node_id = await run_io(create_nodes_from_mapping, book_id, mapping_nodes)
             total_nodes_created = len(order_key_to_node_id)
             
             # Now link chapter content to nodes
@@ -1091,66 +1732,10 @@ async def v3_upload_to_supabase(job_id: str) -> Dict:
                 
                 logger.info(f"[V3] Linking content for: {map_node.get('display_title')} (chapter_index={chapter_index})")
                 
-                # Create legacy chapter record (for backwards compatibility)
-                chapter_data = [{
-                    "chapter_index": ch["index"],
-                    "title": ch["title"],
-                    "text": ch.get("raw_content", ""),
-                    "node_id": node_id  # Link to book_node
-                }]
-                
-                db_chapters = write_chapters_to_supabase(book_id, chapter_data)
-                
-                if db_chapters:
-                    chapter_id = db_chapters[0]["id"]
-                    
-                    # Store chapter_id for TTS audio upload
-                    ch["db_chapter_id"] = chapter_id
-                    
-                    # Get paragraph and section data
-                    paragraphs = ch.get("paragraphs", [])
-                    sections = ch.get("sections", [])
-                    
-                    # Write paragraphs to Supabase
-                    paragraph_ids = []
-                    if paragraphs:
-                        paragraph_texts = [p["text"] for p in paragraphs if p.get("text")]
-                        from app.chapters import get_supabase
-                        supabase = get_supabase()
-                        
-                        for idx, text in enumerate(paragraph_texts):
-                            result = supabase.table("paragraphs").insert({
-                                "chapter_id": chapter_id,
-                                "paragraph_index": idx,
-                                "text": text,
-                                "start_ms": None,
-                                "end_ms": None
-                            }).execute()
-                            if result.data:
-                                paragraph_ids.append(result.data[0]["id"])
-                        
-                        total_paragraphs += len(paragraph_ids)
-                        logger.info(f"[V3] Wrote {len(paragraph_ids)} paragraphs")
-                        
-                        # Link paragraphs to book_node
-                        link_node_paragraphs(node_id, paragraph_ids)
-                    
-                    # Write TTS chunks and link to paragraphs
-                    if sections:
-                        section_texts = [s["text"] for s in sections if s.get("text")]
-                        tts_chunk_ids = write_sections_to_supabase(chapter_id, section_texts)
-                        total_tts_chunks += len(tts_chunk_ids)
-                        logger.info(f"[V3] Wrote {len(tts_chunk_ids)} TTS chunks")
-                        
-                        # Link TTS chunks to paragraphs
-                        if paragraph_ids and tts_chunk_ids:
-                            chunks_per_para = max(1, len(tts_chunk_ids) // len(paragraph_ids))
-                            chunk_idx = 0
-                            for para_id in paragraph_ids:
-                                para_chunks = tts_chunk_ids[chunk_idx:chunk_idx + chunks_per_para]
-                                if para_chunks:
-                                    link_paragraph_tts_chunks(para_id, para_chunks)
-                                chunk_idx += chunks_per_para
+                # Legacy chapter record + paragraphs + TTS chunks + links, written in one RPC below
+                payload = build_chapter_payload(book_id, ch, node_id)
+                ch["db_chapter_id"] = payload["chapter"]["id"]  # for TTS audio upload
+                chapter_payloads.append(payload)
         
         else:
             # ============================================
@@ -1162,10 +1747,12 @@ async def v3_upload_to_supabase(job_id: str) -> Dict:
             part_node_map = {}
             treatise_node_map = {}
             
-            # Create Part nodes (root level, no content themselves)
+            # The whole tree is built locally (order_keys + ids) and inserted in bulk below
+            tree = BookTreeBuilder(book_id)
+            
+            # Part nodes (root level, no content themselves)
             for part in parts:
-                node = create_book_node(
-                    book_id=book_id,
+                node = tree.add(
                     node_type="part",
                     display_title=part.get("title", f"Part {part.get('part_index', 0)}"),
                     source_title=part.get("title"),
@@ -1173,15 +1760,13 @@ async def v3_upload_to_supabase(job_id: str) -> Dict:
                 )
                 part_node_map[part.get("title")] = node["id"]
                 total_nodes_created += 1
-                logger.info(f"[V3] Created part node: {part.get('title')}")
             
-            # Create Treatise nodes (can be root or under parts)
+            # Treatise nodes (can be root or under parts)
             for treatise in treatises:
                 parent_part = treatise.get("parent_part")
                 parent_id = part_node_map.get(parent_part) if parent_part else None
                 
-                node = create_book_node(
-                    book_id=book_id,
+                node = tree.add(
                     node_type="treatise",
                     display_title=treatise.get("title", f"Treatise {treatise.get('treatise_index', 0)}"),
                     source_title=treatise.get("title"),
@@ -1190,7 +1775,6 @@ async def v3_upload_to_supabase(job_id: str) -> Dict:
                 )
                 treatise_node_map[treatise.get("title")] = node["id"]
                 total_nodes_created += 1
-                logger.info(f"[V3] Created treatise node: {treatise.get('title')}")
             
             # Create chapter nodes and content
             for ch in chapters:
@@ -1221,9 +1805,8 @@ async def v3_upload_to_supabase(job_id: str) -> Dict:
                 
                 has_content = ch.get("has_content", True)
                 
-                # Create book_node for this chapter
-                chapter_node = create_book_node(
-                    book_id=book_id,
+                # book_node for this chapter
+                chapter_node = tree.add(
                     node_type=node_type,
                     display_title=display_title,
                     source_title=raw_title,
@@ -1235,61 +1818,20 @@ async def v3_upload_to_supabase(job_id: str) -> Dict:
                 chapter_node_id = chapter_node["id"]
                 total_nodes_created += 1
                 
-                # Create legacy chapter record
-                chapter_data = [{
-                    "chapter_index": ch["index"],
-                    "title": ch["title"],
-                    "text": ch.get("raw_content", ""),
-                    "node_id": chapter_node_id
-                }]
-                
-                db_chapters = write_chapters_to_supabase(book_id, chapter_data)
-                
-                if db_chapters:
-                    chapter_id = db_chapters[0]["id"]
-                    
-                    # Store chapter_id for TTS audio upload
-                    ch["db_chapter_id"] = chapter_id
-                    
-                    paragraphs = ch.get("paragraphs", [])
-                    sections = ch.get("sections", [])
-                    
-                    paragraph_ids = []
-                    if paragraphs:
-                        paragraph_texts = [p["text"] for p in paragraphs if p.get("text")]
-                        from app.chapters import get_supabase
-                        supabase = get_supabase()
-                        
-                        for idx, text in enumerate(paragraph_texts):
-                            result = supabase.table("paragraphs").insert({
-                                "chapter_id": chapter_id,
-                                "paragraph_index": idx,
-                                "text": text,
-                                "start_ms": None,
-                                "end_ms": None
-                            }).execute()
-                            if result.data:
-                                paragraph_ids.append(result.data[0]["id"])
-                        
-                        total_paragraphs += len(paragraph_ids)
-                        logger.info(f"[V3] Wrote {len(paragraph_ids)} paragraphs")
-                        
-                        link_node_paragraphs(chapter_node_id, paragraph_ids)
-                    
-                    if sections:
-                        section_texts = [s["text"] for s in sections if s.get("text")]
-                        tts_chunk_ids = write_sections_to_supabase(chapter_id, section_texts)
-                        total_tts_chunks += len(tts_chunk_ids)
-                        logger.info(f"[V3] Wrote {len(tts_chunk_ids)} TTS chunks")
-                        
-                        if paragraph_ids and tts_chunk_ids:
-                            chunks_per_para = max(1, len(tts_chunk_ids) // len(paragraph_ids))
-                            chunk_idx = 0
-                            for para_id in paragraph_ids:
-                                para_chunks = tts_chunk_ids[chunk_idx:chunk_idx + chunks_per_para]
-                                if para_chunks:
-                                    link_paragraph_tts_chunks(para_id, para_chunks)
-                                chunk_idx += chunks_per_para
+                # Legacy chapter record + paragraphs + TTS chunks + links, written in one RPC below
+                payload = build_chapter_payload(book_id, ch, chapter_node_id)
+                ch["db_chapter_id"] = payload["chapter"]["id"]  # for TTS audio upload
+                chapter_payloads.append(payload)
+            
+            # Parents before children: one bulk insert per tree level
+            await run_io(tree.insert)
+            logger.info(f"[V3] Created {len(parts)} part nodes, {len(treatises)} treatise nodes, "
+                        f"{total_nodes_created - len(parts) - len(treatises)} chapter nodes")
+        
+        # Step 5: One ingest_chapter transaction per chapter, several chapters at a time
+        ingest_stats = await _ingest_chapters(chapter_payloads)
+        total_paragraphs = ingest_stats["paragraphs"]
+        total_tts_chunks = ingest_stats["tts_chunks"]
         
         # Update job state
         state["phase"] = "uploaded"
@@ -1302,6 +1844,7 @@ async def v3_upload_to_supabase(job_id: str) -> Dict:
             "chapters": len(chapters),
             "tts_chunks": total_tts_chunks,
             "paragraphs": total_paragraphs,
+            "chapter_ingest": ingest_stats,
             "used_manual_mapping": has_manual_mapping
         }
         save_v3_job_state(job_id, state)
@@ -1324,6 +1867,12 @@ async def v3_upload_to_supabase(job_id: str) -> Dict:
         
     except Exception as e:
         logger.error(f"[V3] Supabase upload error: {e}")
+        # Keep db_chapter_id only for chapters whose rows were committed
+        ingested = set(e.ingested_chapter_ids) if isinstance(e, ChapterIngestError) else set()
+        for ch in chapters:
+            if ch.get("db_chapter_id") and ch["db_chapter_id"] not in ingested:
+                del ch["db_chapter_id"]
+        state["chapters"] = chapters
         state["phase"] = "upload_error"
         state["error"] = str(e)
         save_v3_job_state(job_id, state)
@@ -1331,3 +1880,133 @@ async def v3_upload_to_supabase(job_id: str) -> Dict:
 
 
 
+
+
+def _book_chapters(state: Dict) -> List[Dict]:
+    """The job's chapters that v3_upload_to_supabase writes content for."""
+    chapters = state.get("chapters", [])
+    if state.get("has_manual_mapping") and state.get("mapping_nodes"):
+        mapped = {
+            node.get("chapter_index") for node in state["mapping_nodes"]
+            if node.get("chapter_index") is not None
+            and not (node.get("exclude_from_frontend") and node.get("exclude_from_audio"))
+        }
+        return [ch for ch in chapters if ch.get("index") in mapped]
+    return [ch for ch in chapters if not (ch.get("exclude_from_frontend") and ch.get("exclude_from_audio"))]
+
+
+async def v3_sync_to_supabase(job_id: str, dry_run: bool = False) -> Dict:
+    """
+    Re-upload an already uploaded V3 book as a delta (see app/book_sync.py).
+    
+    The job's chapters, paragraphs and TTS chunks are diffed against the stored
+    content hashes; only inserts, updates and deletes are sent, in one
+    apply_book_sync transaction. Chapters whose canonical text changed get a new
+    chapter_build (plus audio groups and spans) when their local audio matches
+    the new text; the other builds are left alone.
+    
+    Chapters that are new since the upload are added as root-level nodes; run a
+    full upload when the book's structure has changed.
+    
+    Args:
+        job_id: The job UUID (must have been uploaded: state["book_id"])
+        dry_run: Only report the planned row counts per table
+    """
+    from app.book_sync import apply_book_sync, fetch_remote_book, plan_book_sync
+    from app.chapters import build_chapter_payload, create_book_node, map_content_type_to_node_type
+    
+    state = get_v3_job_state(job_id)
+    if not state:
+        raise ValueError(f"Job not found: {job_id}")
+    
+    book_id = state.get("book_id")
+    if not book_id:
+        raise ValueError("Book not uploaded yet - use /v3/upload-supabase first")
+    
+    if state["phase"] in ["processing", "generating_tts", "uploading_audio"]:
+        raise ValueError(f"Job is busy. Current phase: {state['phase']}")
+    
+    chapters = _book_chapters(state)
+    remote = await run_io(fetch_remote_book, book_id)
+    plan = plan_book_sync(book_id, chapters, remote)
+    report = plan["report"]
+    logger.info(f"[V3] Sync plan for {book_id}: chapters {report['chapters']}, paragraphs {report['paragraphs']}, "
+                f"TTS chunks {report['tts_chunks']}, {len(plan['rebuild'])} builds to redo, "
+                f"{report['payload_bytes']} payload bytes")
+    
+    if dry_run:
+        return {"success": True, "dry_run": True, "book_id": book_id, "report": report}
+    
+    start = datetime.now()
+    try:
+        # Step 1: Delta for stored chapters, one transaction
+        db_result = await run_io(apply_book_sync, plan["payload"])
+        for ch in chapters:
+            if ch["index"] not in plan["chapter_ids"]:
+                continue
+            ch["db_chapter_id"] = plan["chapter_ids"][ch["index"]]
+            paragraphs = [p for p in ch.get("paragraphs", []) if p.get("text")]
+            for para, para_id in zip(paragraphs, plan["paragraph_ids"][ch["index"]]):
+                para["db_paragraph_id"] = para_id
+        
+        # Step 2: Chapters that were not uploaded before
+        ingest_stats = None
+        new_chapters = [ch for ch in chapters if ch["index"] in set(plan["new_chapters"])]
+        if new_chapters:
+            payloads = []
+            for ch in new_chapters:
+                node_type = map_content_type_to_node_type(ch.get("content_type", "chapter"))
+                node = await run_io(
+                    create_book_node, book_id, node_type,
+                    ch.get("display_title") or clean_display_title(ch["title"], node_type),
+                    source_title=ch["title"],
+                    exclude_from_frontend=ch.get("exclude_from_frontend", False),
+                    exclude_from_audio=ch.get("exclude_from_audio", False),
+                )
+                payload = build_chapter_payload(book_id, ch, node["id"])
+                ch["db_chapter_id"] = payload["chapter"]["id"]
+                payloads.append(payload)
+            ingest_stats = await _ingest_chapters(payloads)
+        
+        # Step 3: New builds for chapters whose canonical text changed and whose audio is current
+        rebuilt, needs_tts = [], plan["needs_tts"]
+        writer = BulkWriter()
+        for ch in chapters:
+            groups = ch.get("audio_groups", [])
+            if ch["index"] not in plan["rebuild"] or ch["index"] in needs_tts or not groups:
+                continue
+            
+            for group in groups:
+                local_path = group.get("local_audio_path")
+                if local_path and os.path.exists(local_path):
+                    group["audio_url"] = await run_io(upload_group_audio, local_path, ch["db_chapter_id"],
+                                                      group["group_index"])
+            await run_io(_save_chapter_audio_records, ch, ch["db_chapter_id"], groups, writer)
+            rebuilt.append(ch["index"])
+        
+        if needs_tts:
+            logger.warning(f"[V3] Sync: {len(needs_tts)} chapters changed since their audio was generated, "
+                           f"run TTS for them again: {needs_tts}")
+        
+        sync_stats = {
+            "report": report,
+            "applied": db_result,
+            "new_chapters": ingest_stats,
+            "rebuilt_chapters": rebuilt,
+            "needs_tts": needs_tts,
+            "db_writes": writer.stats(),
+            "seconds": round((datetime.now() - start).total_seconds(), 2),
+        }
+        state["sync_stats"] = sync_stats
+        save_v3_job_state(job_id, state)
+        
+        logger.info(f"[V3] ✅ Sync complete: {db_result.get('round_trips', 0)} delta round trips, "
+                    f"{len(new_chapters)} new chapters, {len(rebuilt)} builds redone")
+        return {"success": True, "dry_run": False, "book_id": book_id, **sync_stats}
+    
+    except Exception as e:
+        # The phase stays: the delta is one transaction, and a later sync plans only what is still missing
+        logger.error(f"[V3] Supabase sync error: {e}")
+        state["error"] = str(e)
+        save_v3_job_state(job_id, state)
+        raise
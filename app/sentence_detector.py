@@ -113,7 +113,40 @@ def detect_sentences_with_indices(text: str) -> List[Tuple[int, str]]:
     return [(i + 1, s) for i, s in enumerate(sentences)]
 
 
-def sentences_to_numbered_text(sentences: List[str]) -> str:
+def detect_sentence_spans(text: str) -> List[Tuple[int, int]]:
+    """
+    Split text into sentences as (start, end) character offsets into `text`.
+
+    Unlike detect_sentences(), the offsets point back into the source, so
+    callers can rebuild paragraphs from the original text verbatim.
+
+    Args:
+        text: Raw chapter text
+
+    Returns:
+        List of (start_char, end_char) tuples, in order, whitespace trimmed
+    """
+    if not text or not text.strip():
+        return []
+
+    nlp = get_spacy()
+    doc = nlp(text)
+
+    spans = []
+    for sent in doc.sents:
+        start, end = sent.start_char, sent.end_char
+        # Trim surrounding whitespace but keep offsets into the source
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start < end:
+            spans.append((start, end))
+
+    return spans
+
+
+def sentences_to_numbered_text(sentences: List[str], start: int = 1) -> str:
     """
     Convert sentences to numbered text for LLM prompt.
     
@@ -124,12 +157,13 @@ def sentences_to_numbered_text(sentences: List[str]) -> str:
     
     Args:
         sentences: List of sentence strings
+        start: Number of the first sentence (for chunked prompts)
         
     Returns:
         Numbered text string
     """
     lines = []
-    for i, sent in enumerate(sentences, 1):
+    for i, sent in enumerate(sentences, start):
         lines.append(f"{i}. {sent}")
     return "\n".join(lines)
 
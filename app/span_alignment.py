@@ -0,0 +1,154 @@
+"""
+Paragraph-to-segment alignment over character offsets.
+
+generate_paragraph_spans() used to match segments to paragraphs greedily ("the
+concatenated segment text covers 80% of the paragraph's length"), and the upload
+mapped segments to paragraph ids proportionally by count. Both drift on long
+chapters. This module aligns both sides on the canonical text that
+create_chapter_build() stores (normalized segment texts joined by single spaces):
+
+- Segment start offsets are prefix sums of the segment lengths
+- Each paragraph's normalized text is located in the canonical text with a
+  windowed search from where the previous paragraph ended, so a paragraph that
+  was not spoken (paragraph 0 is the title) or was rewritten for TTS does not
+  stop the next ones from anchoring. Paragraphs that cannot be found get offsets
+  interpolated by length between their anchored neighbours
+- Paragraph start/end offsets are placed on segments with bisect, and segments on
+  paragraphs the same way
+
+Cost is O(chars + (paragraphs + segments) log segments); the search window is
+bounded, so unmatched paragraphs cost at most O(MAX_SEARCH_SLACK) each. Spans are monotonic and
+inclusive; a segment that straddles a paragraph boundary belongs to both spans.
+"""
+
+from bisect import bisect_right
+from typing import Dict, List, Optional
+
+from app.audio_segments import normalize_text
+
+# Characters searched on either side of a paragraph's expected position. The window
+# widens with the length of a run of unmatched paragraphs (their rewritten text may
+# be longer or shorter than what was spoken), up to MAX_SEARCH_SLACK.
+SEARCH_SLACK = 512
+MAX_SEARCH_SLACK = 32768
+
+
+def segment_text(segment: Dict) -> str:
+    """text_normalized, normalizing only segments that do not have it yet."""
+    text = segment.get('text_normalized')
+    return text if text is not None else normalize_text(segment.get('text', ''))
+
+
+def canonical_text(segments: List[Dict]) -> str:
+    """Normalized segment texts joined by single spaces (chapter_builds.canonical_text)."""
+    return ' '.join(segment_text(s) for s in segments)
+
+
+def prefix_offsets(texts: List[str]) -> List[int]:
+    """Start offset of every text in ' '.join(texts)."""
+    offsets = []
+    position = 0
+    for text in texts:
+        offsets.append(position)
+        position += len(text) + 1
+    return offsets
+
+
+def _locate_paragraphs(paragraph_texts: List[str], canonical: str) -> List[Optional[tuple]]:
+    """(start_char, end_char) of every paragraph found verbatim in canonical, else None."""
+    located = []
+    cursor = 0     # end of the last anchored paragraph
+    expected = 0   # where the next paragraph should start if the misses kept their length
+    for text in paragraph_texts:
+        position = -1
+        if text:
+            slack = min(SEARCH_SLACK + (expected - cursor) // 2, MAX_SEARCH_SLACK)
+            position = canonical.find(text, max(cursor, expected - slack), expected + len(text) + slack)
+        if position >= 0:
+            located.append((position, position + len(text)))
+            cursor = expected = position + len(text) + 1
+        else:
+            located.append(None)
+            expected += len(text) + 1 if text else 0
+    return located
+
+
+def _interpolate(located: List[Optional[tuple]], lengths: List[int], total: int) -> List[tuple]:
+    """Fill unanchored paragraphs by sharing the gap between their anchored neighbours by length."""
+    offsets = list(located)
+    i = 0
+    while i < len(offsets):
+        if offsets[i] is not None:
+            i += 1
+            continue
+        j = i
+        while j < len(offsets) and offsets[j] is None:
+            j += 1
+        gap_start = offsets[i - 1][1] if i > 0 else 0
+        gap_end = offsets[j][0] if j < len(offsets) else total
+        gap_end = max(gap_start, gap_end)
+        run_length = sum(lengths[i:j]) or 1
+        position = float(gap_start)
+        for k in range(i, j):
+            share = (gap_end - gap_start) * lengths[k] / run_length
+            offsets[k] = (int(round(position)), int(round(position + share)))
+            position += share
+        i = j
+    return offsets
+
+
+def _segment_at(segment_starts: List[int], char: int) -> int:
+    return max(0, bisect_right(segment_starts, char) - 1)
+
+
+def align_paragraphs(paragraphs: List[Dict], segments: List[Dict]) -> Dict:
+    """
+    Align paragraphs with segments.
+
+    Returns:
+        {
+            "spans": [{"paragraph_index", "start_segment_index", "end_segment_index",
+                       "start_char", "end_char"}, ...]  (one per paragraph, chars in canonical text),
+            "segment_paragraphs": [paragraph index of every segment],
+            "anchored": paragraphs found verbatim,
+            "exact": True when every non-empty paragraph was found verbatim,
+        }
+    """
+    if not paragraphs or not segments:
+        return {"spans": [], "segment_paragraphs": [], "anchored": 0, "exact": False}
+
+    segment_texts = [segment_text(s) for s in segments]
+    canonical = ' '.join(segment_texts)
+    segment_starts = prefix_offsets(segment_texts)
+
+    paragraph_texts = [normalize_text(p.get('text', '')) for p in paragraphs]
+    located = _locate_paragraphs(paragraph_texts, canonical)
+    offsets = _interpolate(located, [len(t) for t in paragraph_texts], len(canonical))
+
+    spans = []
+    for para_idx, (start_char, end_char) in enumerate(offsets):
+        start_segment = _segment_at(segment_starts, start_char)
+        end_segment = _segment_at(segment_starts, max(start_char, end_char - 1))
+        spans.append({
+            "paragraph_index": para_idx,
+            "start_segment_index": start_segment,
+            "end_segment_index": end_segment,
+            "start_char": start_char,
+            "end_char": end_char,
+        })
+
+    # A segment belongs to the last paragraph with text that starts at or before it
+    # (offsets are monotonic, so the starts are sorted)
+    with_text = [i for i, (start, end) in enumerate(offsets) if end > start] or [0]
+    text_starts = [offsets[i][0] for i in with_text]
+    segment_paragraphs = [
+        with_text[max(0, bisect_right(text_starts, seg_start) - 1)] for seg_start in segment_starts
+    ]
+
+    anchored = sum(1 for loc in located if loc is not None)
+    return {
+        "spans": spans,
+        "segment_paragraphs": segment_paragraphs,
+        "anchored": anchored,
+        "exact": anchored == sum(1 for t in paragraph_texts if t),
+    }
@@ -3,12 +3,15 @@ Text rewriting module using Gemini to clean special characters for TTS.
 Removes symbols like ♄ ✶ △ ♂ that TTS cannot read properly.
 """
 from app.config import Config
+from app.gemini_scheduler import run_gemini
 from app.logger import get_logger
 from app.utils import retry_on_failure
 from google import genai
 
 logger = get_logger(__name__)
 
+REWRITE_MODEL_NAME = "gemini-2.0-flash-exp"
+
 # Lazy initialization
 _gemini_client = None
 
@@ -99,9 +102,10 @@ TEXT TO REWRITE:
 
 REWRITTEN TEXT:"""
         
-        response = client.models.generate_content(
-            model="gemini-2.0-flash-exp",
-            contents=[prompt]
+        response = run_gemini(
+            REWRITE_MODEL_NAME,
+            lambda: client.models.generate_content(model=REWRITE_MODEL_NAME, contents=[prompt]),
+            prompt=prompt
         )
         
         # Extract text from response
@@ -180,9 +184,10 @@ Return JSON in this EXACT format:
 IMPORTANT: Include ALL text from the original paragraphs, just reorganized.
 """
         
-        response = client.models.generate_content(
-            model="gemini-2.0-flash-exp",
-            contents=[prompt]
+        response = run_gemini(
+            REWRITE_MODEL_NAME,
+            lambda: client.models.generate_content(model=REWRITE_MODEL_NAME, contents=[prompt]),
+            prompt=prompt
         )
         
         # Extract text from response
@@ -0,0 +1,111 @@
+"""
+Durable per-job work directory for V3 TTS generation.
+
+v3_generate_tts_audio used to synthesize into a TemporaryDirectory and save the job
+state only after the last chapter, so a crash or redeploy lost every synthesized
+segment. Audio now lives under Config.V3_TTS_WORK_DIR/{job_id}/ch_{n}/ and progress
+is checkpointed as it happens:
+
+- segments.jsonl (per chapter): one line per segment whose audio is on disk, with its
+  audio cache key, so a resumed run only trusts files produced for the same text,
+  voice, engine, language and model version
+- Finished chapters are saved to the job journal with the keys they were built
+  from (see chapter_is_complete())
+
+The directory is removed by cleanup() once the audio upload has been confirmed.
+"""
+
+import json
+import os
+import shutil
+import threading
+from typing import Dict, List, Optional
+
+from app.config import Config
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+SEGMENT_LOG = "segments.jsonl"
+
+
+class TTSWorkDir:
+    """Work directory + segment checkpoints for one job."""
+
+    def __init__(self, job_id: str, base_dir: Optional[str] = None):
+        self.job_id = job_id
+        self.path = os.path.join(base_dir or Config.V3_TTS_WORK_DIR, job_id)
+        self._lock = threading.Lock()
+
+    def chapter_dir(self, ch_idx: int) -> str:
+        """Directory for one chapter's segment and group audio (created on demand)."""
+        path = os.path.join(self.path, f"ch_{ch_idx}")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _log_path(self, ch_idx: int) -> str:
+        return os.path.join(self.chapter_dir(ch_idx), SEGMENT_LOG)
+
+    def record_segment(self, ch_idx: int, seg_idx: int, key: str):
+        """Checkpoint a segment whose audio file has been fully written."""
+        line = json.dumps({"segment": seg_idx, "key": key}) + "\n"
+        with self._lock:
+            with open(self._log_path(ch_idx), "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def finished_segments(self, ch_idx: int, keys: List[str], audio_paths: List[str]) -> List[int]:
+        """
+        Segments of a chapter that a previous run already synthesized.
+
+        Args:
+            ch_idx: Chapter position
+            keys: Audio cache key per segment for the current run
+            audio_paths: Expected audio file per segment
+
+        Returns:
+            Segment indices whose checkpointed key matches and whose file still exists
+        """
+        log_path = os.path.join(self.path, f"ch_{ch_idx}", SEGMENT_LOG)
+        if not os.path.exists(log_path):
+            return []
+
+        recorded: Dict[int, str] = {}
+        with open(log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    # Torn trailing write (crash mid-append) - ignore it
+                    continue
+                try:
+                    entry = json.loads(line)
+                    recorded[int(entry["segment"])] = entry["key"]
+                except (ValueError, KeyError, TypeError):
+                    continue
+
+        return [
+            i for i, key in enumerate(keys)
+            if recorded.get(i) == key and os.path.exists(audio_paths[i])
+        ]
+
+    def cleanup(self):
+        """Remove the whole work directory."""
+        if os.path.isdir(self.path):
+            shutil.rmtree(self.path, ignore_errors=True)
+            logger.info(f"[V3.1] Removed TTS work directory for job {self.job_id[:8]}")
+
+
+def chapter_is_complete(chapter: Dict, keys: List[str]) -> bool:
+    """
+    True if a chapter's saved audio groups were built from exactly these segment keys,
+    every segment got audio and every group file is still on disk, waiting for upload.
+    A chapter with failed segments is not complete: resuming regenerates it, reusing
+    the checkpointed segments and synthesizing only the missing ones.
+    """
+    groups = chapter.get("audio_groups")
+    if not groups or chapter.get("tts_segment_keys") != keys:
+        return False
+    segments = chapter.get("segments") or []
+    if len(segments) != len(keys) or not all(seg.get("audio_path") for seg in segments):
+        return False
+    return all(g.get("local_audio_path") and os.path.exists(g["local_audio_path"]) for g in groups)
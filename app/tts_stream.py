@@ -0,0 +1,203 @@
+"""
+Streaming TTS -> group -> encode -> upload for one chapter.
+
+The batch path (v3_generate_tts_audio, then v3_upload_audio_to_supabase) synthesizes
+a whole chapter before grouping and encoding it, and uploads in a later phase. Here
+the stages overlap:
+
+    synthesis chunks --> GroupAssembler --[encode queue]--> encoder --[upload queue]--> uploader
+
+- A group (~35 s) is closed as soon as the contiguous segments that fill it are ready,
+  and is encoded/uploaded while synthesis continues on later segments
+- Synthesis holds one permit per segment until its group is closed
+  (Config.V3_STREAM_MAX_PENDING_SEGMENTS); the queues hold at most
+  Config.V3_STREAM_QUEUE_GROUPS groups each, so disk use stays at a few groups
+- The stage functions are passed in, so the pipeline decides which engine,
+  encoder and storage are used
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.audio_segments import TARGET_GROUP_DURATION_MS
+from app.config import Config
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+# synthesize(indices, on_ready) calls on_ready(segment_index, duration_ms or None) per segment
+SynthesizeFn = Callable[[List[int], Callable[[int, Optional[int]], None]], Awaitable[None]]
+GroupFn = Callable[[Dict], Awaitable[None]]
+
+
+class GroupAssembler:
+    """
+    Incremental version of audio_segments.group_segments().
+
+    Segments may become ready in any order; groups are closed in chapter order with
+    the same greedy rule (close when the next segment would exceed the target).
+    Segments without audio (duration None) take no time. `max_segments` caps the
+    segments per group so a streaming run can never wait on its own permits.
+    """
+
+    def __init__(self, segments: List[Dict], target_ms: int = TARGET_GROUP_DURATION_MS, max_segments: int = 0):
+        self.segments = segments
+        self.target_ms = target_ms
+        self.max_segments = max_segments
+        self.durations: Dict[int, Optional[int]] = {}
+        self.next_index = 0
+        self.chapter_time = 0
+        self.groups: List[Dict] = []
+        self._current = self._new_group()
+
+    def _new_group(self) -> Dict:
+        return {
+            "group_index": len(self.groups),
+            "segments": [],
+            "duration_ms": 0,
+            "start_time_ms": self.chapter_time,
+        }
+
+    def _close(self) -> Dict:
+        group = self._current
+        segs = group["segments"]
+        group["start_segment_index"] = segs[0]["segment_index"]
+        group["end_segment_index"] = segs[-1]["segment_index"]
+        self.groups.append(group)
+        self.chapter_time += group["duration_ms"]
+        self._current = self._new_group()
+        return group
+
+    def mark_ready(self, index: int, duration_ms: Optional[int]) -> List[Dict]:
+        """Record a finished segment; returns the groups this completes (maybe none)."""
+        self.durations[index] = duration_ms
+        closed = []
+        while self.next_index in self.durations:
+            seg = self.segments[self.next_index]
+            duration = self.durations[self.next_index] or 0
+            group = self._current
+            full = group["duration_ms"] + duration > self.target_ms
+            if group["segments"] and (full or len(group["segments"]) == self.max_segments):
+                closed.append(self._close())
+                group = self._current
+            seg["offset_in_group_ms"] = group["duration_ms"]
+            seg["duration_ms"] = duration
+            group["segments"].append(seg)
+            group["duration_ms"] += duration
+            self.next_index += 1
+        return closed
+
+    def finish(self) -> List[Dict]:
+        """Close the last group once every segment is ready."""
+        if self.next_index != len(self.segments):
+            raise RuntimeError(f"Segment {self.next_index} never finished")
+        return [self._close()] if self._current["segments"] else []
+
+
+async def stream_chapter(
+    segments: List[Dict],
+    synthesize: SynthesizeFn,
+    encode_group: GroupFn,
+    upload_group: GroupFn,
+    chunk_size: Optional[int] = None,
+    max_pending: Optional[int] = None,
+    queue_groups: Optional[int] = None,
+) -> tuple:
+    """
+    Run synthesis, encoding and upload of one chapter as overlapping stages.
+
+    Args:
+        segments: Segment dicts from process_segments() (annotated in place)
+        synthesize: async fn(indices, on_ready) producing audio for those segments
+        encode_group: async fn(group) setting local_audio_path and duration_ms
+        upload_group: async fn(group) setting audio_url
+        chunk_size: Segments per synthesize() call (default Config.V3_STREAM_CHUNK_SEGMENTS)
+        max_pending: Segments synthesized or in flight but not yet grouped
+            (default Config.V3_STREAM_MAX_PENDING_SEGMENTS)
+        queue_groups: Capacity of the encode and upload queues (default Config.V3_STREAM_QUEUE_GROUPS)
+
+    Returns:
+        (groups, stats) - groups in chapter order with sample-accurate start_time_ms
+    """
+    chunk_size = chunk_size or Config.V3_STREAM_CHUNK_SEGMENTS
+    max_pending = max(max_pending or Config.V3_STREAM_MAX_PENDING_SEGMENTS, chunk_size + 1)
+    queue_groups = queue_groups or Config.V3_STREAM_QUEUE_GROUPS
+
+    # The open group never holds more than max_pending - chunk_size permits,
+    # so the next chunk can always be submitted and close it
+    assembler = GroupAssembler(segments, max_segments=max_pending - chunk_size)
+    permits = asyncio.Semaphore(max_pending)
+    ready: asyncio.Queue = asyncio.Queue()  # (index, duration); bounded by the permits
+    encode_q: asyncio.Queue = asyncio.Queue(maxsize=queue_groups)
+    upload_q: asyncio.Queue = asyncio.Queue(maxsize=queue_groups)
+    stats = {"chunks": 0, "peak_pending_segments": 0, "peak_queued_groups": 0}
+    in_use = [0]
+
+    def on_ready(index: int, duration_ms: Optional[int]):
+        ready.put_nowait((index, duration_ms))
+
+    def note_queues():
+        stats["peak_queued_groups"] = max(stats["peak_queued_groups"], encode_q.qsize() + upload_q.qsize())
+
+    async def produce():
+        chunk_tasks = []
+        for start in range(0, len(segments), chunk_size):
+            indices = list(range(start, min(start + chunk_size, len(segments))))
+            for _ in indices:
+                await permits.acquire()
+            in_use[0] += len(indices)
+            stats["peak_pending_segments"] = max(stats["peak_pending_segments"], in_use[0])
+            stats["chunks"] += 1
+            chunk_tasks.append(asyncio.create_task(synthesize(indices, on_ready)))
+        await asyncio.gather(*chunk_tasks)
+
+    async def assemble():
+        done = 0
+        while done < len(segments):
+            index, duration = await ready.get()
+            done += 1
+            for group in assembler.mark_ready(index, duration):
+                await release_and_queue(group)
+        for group in assembler.finish():
+            await release_and_queue(group)
+        await encode_q.put(None)
+
+    async def release_and_queue(group: Dict):
+        for _ in group["segments"]:
+            permits.release()
+        in_use[0] -= len(group["segments"])
+        await encode_q.put(group)
+        note_queues()
+
+    async def encode():
+        chapter_time = 0
+        while True:
+            group = await encode_q.get()
+            if group is None:
+                await upload_q.put(None)
+                return
+            await encode_group(group)
+            group["start_time_ms"] = chapter_time
+            chapter_time += group["duration_ms"]
+            await upload_q.put(group)
+            note_queues()
+
+    async def upload():
+        while True:
+            group = await upload_q.get()
+            if group is None:
+                return
+            await upload_group(group)
+
+    tasks = [asyncio.create_task(stage()) for stage in (produce, assemble, encode, upload)]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    logger.info(f"[Stream] {len(segments)} segments -> {len(assembler.groups)} groups "
+                f"(peak {stats['peak_pending_segments']} segments, {stats['peak_queued_groups']} queued groups)")
+    return assembler.groups, stats
@@ -9,6 +9,7 @@ from pathlib import Path
 import shutil
 
 from app.config import Config
+from app.gemini_scheduler import RateLimitError
 from app.logger import get_logger
 
 logger = get_logger(__name__)
@@ -46,6 +47,9 @@ def retry_on_failure(
             for attempt in range(retries + 1):
                 try:
                     return func(*args, **kwargs)
+                except RateLimitError:
+                    # The Gemini scheduler already waited out the 429s - don't sleep again
+                    raise
                 except exceptions as e:
                     if attempt == retries:
                         logger.error(
@@ -0,0 +1,98 @@
+"""
+Benchmark: native header parsing vs ffprobe subprocesses for audio durations.
+
+Writes N short WAV segments (and, when ffmpeg is installed, M4A group files
+encoded the way concat_group_audio does) to a temp directory, then times
+probe_directory() against one ffprobe process per file and checks both agree.
+
+Usage:
+    python benchmarks/bench_audio_duration.py [--files 500] [--groups 20]
+
+Without ffprobe on PATH only the native path is timed.
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.audio_probe import ffprobe_duration_ms, probe_directory  # noqa: E402
+
+
+def write_segments(directory: str, count: int) -> list:
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"seg_{i:05d}.wav")
+        seconds = 2 + (i % 13) * 0.7  # 2 - 10.4s, like XTTS segments
+        with wave.open(path, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(24000)
+            w.writeframes(b"\x00\x00" * int(seconds * 24000))
+        paths.append(path)
+    return paths
+
+
+def write_groups(directory: str, segments: list, count: int) -> list:
+    paths = []
+    per_group = max(1, len(segments) // max(count, 1))
+    for g in range(count):
+        chunk = segments[g * per_group:(g + 1) * per_group]
+        if not chunk:
+            break
+        list_path = os.path.join(directory, f"group_{g}.txt")
+        with open(list_path, "w") as f:
+            f.writelines(f"file '{p}'\n" for p in chunk)
+        out = os.path.join(directory, f"group_{g:03d}.m4a")
+        subprocess.run(
+            ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", list_path,
+             "-c:a", "aac", "-b:a", "128k", "-movflags", "+faststart", out],
+            capture_output=True, check=True,
+        )
+        os.remove(list_path)
+        paths.append(out)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=500, help="Number of WAV segments")
+    parser.add_argument("--groups", type=int, default=20, help="Number of M4A groups (needs ffmpeg)")
+    args = parser.parse_args()
+
+    have_ffmpeg = shutil.which("ffmpeg") is not None
+    have_ffprobe = shutil.which("ffprobe") is not None
+
+    with tempfile.TemporaryDirectory() as directory:
+        segments = write_segments(directory, args.files)
+        groups = write_groups(directory, segments, args.groups) if have_ffmpeg and args.groups else []
+        files = segments + groups
+        print(f"{len(segments)} WAV segments, {len(groups)} M4A groups")
+
+        start = time.perf_counter()
+        native = probe_directory(directory, ffprobe_fallback=False)
+        native_s = time.perf_counter() - start
+        print(f"native   {native_s * 1000:>9.1f} ms total  {native_s * 1e6 / len(files):>9.1f} us/file")
+
+        if not have_ffprobe:
+            print("ffprobe not found - skipping subprocess comparison")
+            return
+
+        start = time.perf_counter()
+        ffprobe = {os.path.basename(p): ffprobe_duration_ms(p) for p in files}
+        ffprobe_s = time.perf_counter() - start
+        print(f"ffprobe  {ffprobe_s * 1000:>9.1f} ms total  {ffprobe_s * 1e6 / len(files):>9.1f} us/file")
+        print(f"speedup  {ffprobe_s / native_s:.0f}x")
+
+        worst = max(abs(native[name] - ms) for name, ms in ffprobe.items())
+        print(f"max difference vs ffprobe: {worst} ms")
+
+
+if __name__ == "__main__":
+    main()
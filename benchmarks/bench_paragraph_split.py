@@ -0,0 +1,117 @@
+"""
+Benchmark: echo-back vs offset-based paragraph splitting.
+
+Compares prompt/output tokens and latency of PARAGRAPH_PROMPT (Gemini rewrites
+the whole chapter) against PARAGRAPH_BOUNDARY_PROMPT (Gemini returns sentence
+numbers only) on chapters from a scraper JSON file.
+
+Usage:
+    python benchmarks/bench_paragraph_split.py book.json [--chapters 3] [--estimate]
+
+--estimate skips the API and estimates tokens as chars / 4.
+Requires GEMINI_API_KEY unless --estimate is given. The LLM cache is bypassed.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.glm_processor import (  # noqa: E402
+    PARAGRAPH_PROMPT,
+    PARAGRAPH_BOUNDARY_PROMPT,
+    MAX_SENTENCES_PER_CALL,
+    get_gemini_model,
+    parse_paragraph_boundaries,
+    rebuild_paragraphs,
+)
+from app.sentence_detector import detect_sentence_spans, sentences_to_numbered_text  # noqa: E402
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def run_prompt(prompt: str, estimate: bool, expected_output: str = ""):
+    """Returns (response_text, prompt_tokens, output_tokens, seconds)."""
+    if estimate:
+        return expected_output, estimate_tokens(prompt), estimate_tokens(expected_output), 0.0
+
+    model = get_gemini_model()
+    start = time.monotonic()
+    response = model.generate_content(prompt)
+    elapsed = time.monotonic() - start
+    usage = response.usage_metadata
+    return response.text, usage.prompt_token_count, usage.candidates_token_count, elapsed
+
+
+def bench_echo(text: str, estimate: bool) -> dict:
+    prompt = PARAGRAPH_PROMPT.format(text=text)
+    _, prompt_tokens, output_tokens, seconds = run_prompt(prompt, estimate, expected_output=text)
+    return {"prompt_tokens": prompt_tokens, "output_tokens": output_tokens, "seconds": seconds, "calls": 1}
+
+
+def bench_offsets(text: str, estimate: bool) -> dict:
+    spans = detect_sentence_spans(text)
+    totals = {"prompt_tokens": 0, "output_tokens": 0, "seconds": 0.0, "calls": 0}
+    starts = []
+
+    for offset in range(0, len(spans), MAX_SENTENCES_PER_CALL):
+        chunk = spans[offset:offset + MAX_SENTENCES_PER_CALL]
+        sentences = [" ".join(text[s:e].split()) for s, e in chunk]
+        prompt = PARAGRAPH_BOUNDARY_PROMPT.format(
+            numbered_text=sentences_to_numbered_text(sentences, start=offset + 1),
+            first=offset + 1
+        )
+        # Rough guess for --estimate: one paragraph every 4 sentences
+        guess = json.dumps({"starts": list(range(offset + 1, offset + len(chunk) + 1, 4)), "drop": []})
+        content, p_tok, o_tok, seconds = run_prompt(prompt, estimate, expected_output=guess)
+        chunk_starts, _ = parse_paragraph_boundaries(content, offset + 1, offset + len(chunk))
+        starts.extend(n - 1 for n in chunk_starts)
+
+        totals["prompt_tokens"] += p_tok
+        totals["output_tokens"] += o_tok
+        totals["seconds"] += seconds
+        totals["calls"] += 1
+
+    totals["paragraphs"] = len(rebuild_paragraphs(text, spans, starts))
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("book_json", help="Scraper JSON with a 'chapters' list")
+    parser.add_argument("--chapters", type=int, default=3, help="Number of chapters to benchmark")
+    parser.add_argument("--estimate", action="store_true", help="Estimate tokens offline (no API calls)")
+    args = parser.parse_args()
+
+    with open(args.book_json, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    chapters = [ch for ch in data.get("chapters", []) if (ch.get("content") or ch.get("text"))][:args.chapters]
+    totals = {"echo": {}, "offsets": {}}
+
+    print(f"{'chapter':<40} {'mode':<8} {'in_tok':>8} {'out_tok':>8} {'sec':>7} {'calls':>5}")
+    for ch in chapters:
+        text = ch.get("content") or ch.get("text")
+        title = (ch.get("title") or "")[:38]
+        for mode, fn in (("echo", bench_echo), ("offsets", bench_offsets)):
+            r = fn(text, args.estimate)
+            print(f"{title:<40} {mode:<8} {r['prompt_tokens']:>8} {r['output_tokens']:>8} {r['seconds']:>7.1f} {r['calls']:>5}")
+            for key in ("prompt_tokens", "output_tokens", "seconds", "calls"):
+                totals[mode][key] = totals[mode].get(key, 0) + r[key]
+
+    print("\nTOTAL")
+    for mode, r in totals.items():
+        if r:
+            print(f"  {mode:<8} in={r['prompt_tokens']} out={r['output_tokens']} time={r['seconds']:.1f}s calls={r['calls']}")
+    if totals["echo"].get("output_tokens"):
+        ratio = totals["offsets"]["output_tokens"] / totals["echo"]["output_tokens"]
+        print(f"  offsets output tokens = {ratio:.1%} of echo")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark: one piper CLI process per segment vs the persistent Piper worker pool.
+
+Synthesizes the same N segments (~300 chars, like process_segments() output) with
+PiperEngine(workers=0) - the CLI path that reloads the model for every segment -
+and with PiperEngine(workers=W), driven by W threads. Reports segments/sec and
+the real-time factor (wall time / audio duration; lower is better).
+
+Usage:
+    python benchmarks/bench_piper.py --model HonoraLocalTTS/piper_models/en_US-lessac-medium.onnx
+        [--segments 40] [--workers 4] [--skip-cli]
+
+Needs the piper-tts package (workers) and the `piper` CLI on PATH (baseline).
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.append(os.path.join(ROOT, "HonoraLocalTTS"))
+
+from app.audio_probe import wav_duration_ms  # noqa: E402
+from piper_worker import default_pool_size  # noqa: E402
+from tts_engines import PiperEngine  # noqa: E402
+
+SENTENCE = (
+    "The river bent slowly past the old mill, and for a long while nobody on the "
+    "bank said anything at all. "
+)
+
+
+def make_texts(count: int) -> list:
+    texts = []
+    for i in range(count):
+        text = f"Segment {i + 1}. " + SENTENCE * 3
+        texts.append(text[:300])
+    return texts
+
+
+def run(engine: PiperEngine, voice: str, texts: list, directory: str, threads: int) -> tuple:
+    paths = [os.path.join(directory, f"seg_{i}.wav") for i in range(len(texts))]
+
+    def one(i):
+        return engine.generate(texts[i], voice, "en", paths[i])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        ok = list(pool.map(one, range(len(texts))))
+    elapsed = time.perf_counter() - start
+
+    if not all(ok):
+        raise SystemExit(f"{ok.count(False)} segments failed")
+    audio_s = sum(wav_duration_ms(p) for p in paths) / 1000
+    return elapsed, audio_s
+
+
+def report(label: str, elapsed: float, audio_s: float, count: int):
+    print(f"{label:<14} {elapsed:>8.1f} s  {count / elapsed:>7.2f} seg/s  "
+          f"RTF {elapsed / audio_s:.3f}  ({audio_s:.0f} s of audio)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", required=True, help="Path to a Piper .onnx voice model")
+    parser.add_argument("--segments", type=int, default=40, help="Number of ~300 char segments")
+    parser.add_argument("--workers", type=int, default=default_pool_size(), help="Worker processes for the pool")
+    parser.add_argument("--skip-cli", action="store_true", help="Only time the worker pool")
+    args = parser.parse_args()
+
+    PiperEngine.MODEL_DIR = os.path.dirname(os.path.abspath(args.model))
+    voice = os.path.basename(args.model).replace(".onnx", "")
+    texts = make_texts(args.segments)
+    print(f"{len(texts)} segments, model {voice}, {args.workers} workers")
+
+    if not args.skip_cli:
+        with tempfile.TemporaryDirectory() as directory:
+            elapsed, audio_s = run(PiperEngine(workers=0), voice, texts, directory, threads=1)
+        report("cli/segment", elapsed, audio_s, len(texts))
+        cli_elapsed = elapsed
+
+    engine = PiperEngine(workers=args.workers)
+    try:
+        # Start the workers outside the timed run (model load happens once per worker)
+        with tempfile.TemporaryDirectory() as directory:
+            run(engine, voice, texts[:args.workers], directory, threads=args.workers)
+        if engine._pool_disabled:
+            raise SystemExit("Piper workers could not start (is piper-tts installed?)")
+        with tempfile.TemporaryDirectory() as directory:
+            elapsed, audio_s = run(engine, voice, texts, directory, threads=args.workers)
+        report(f"pool x{args.workers}", elapsed, audio_s, len(texts))
+        if not args.skip_cli:
+            print(f"speedup        {cli_elapsed / elapsed:.1f}x")
+    finally:
+        engine.close()
+
+
+if __name__ == "__main__":
+    main()
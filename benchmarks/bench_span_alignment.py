@@ -0,0 +1,114 @@
+"""
+Benchmark: greedy 80%-length span matching vs character-offset alignment.
+
+Builds synthetic chapters of N segments (title + paragraphs of 1-12 sentences,
+sections of 1-4 sentences run through process_segments(), like the pipeline),
+then times the old greedy matcher against align_paragraphs() and counts how many
+paragraph spans each gets wrong compared to the known paragraph boundaries.
+
+Usage:
+    python benchmarks/bench_span_alignment.py [--segments 10000] [--chapters 3] [--seed 1]
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+from bisect import bisect_left, bisect_right
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.audio_segments import normalize_text, process_segments  # noqa: E402
+from app.span_alignment import align_paragraphs  # noqa: E402
+
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "hund", "kat", "æble", "Ørsted", "far-mor", "og", "i"]
+
+
+def synthetic_chapter(rng: random.Random, segment_count: int):
+    """(paragraphs, segments, expected spans) with at least segment_count segments."""
+    paragraphs = [{"text": "Kapitel 1"}]
+    sections = []
+    while len(sections) < segment_count:
+        sentences = [
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(12, 30))).capitalize() + "."
+            for _ in range(rng.randint(1, 12))
+        ]
+        paragraphs.append({"text": " ".join(sentences)})
+        while sentences:
+            take = rng.randint(1, 4)
+            sections.append(" ".join(sentences[:take]))
+            sentences = sentences[take:]
+    segments = process_segments(sections)
+
+    # Ground truth: walk the paragraph texts over the canonical text
+    canonical = " ".join(s["text_normalized"] for s in segments)
+    starts, position = [], 0
+    for seg in segments:
+        starts.append(position)
+        position += len(seg["text_normalized"]) + 1
+    expected, cursor = [(0, 0)], 0
+    for para in paragraphs[1:]:
+        text = normalize_text(para["text"])
+        begin = canonical.index(text, cursor)
+        cursor = begin + len(text)
+        first = bisect_right(starts, begin) - 1
+        last = bisect_left(starts, cursor) - 1
+        expected.append((first, last))
+    return paragraphs, segments, expected
+
+
+def greedy_spans(paragraphs, segments):
+    """The matcher generate_paragraph_spans() used before span_alignment."""
+    spans = []
+    current_segment = 0
+    for para in paragraphs:
+        para_text = normalize_text(para.get("text", ""))
+        start_segment = current_segment
+        matched_text = ""
+        while current_segment < len(segments):
+            matched_text = (matched_text + " " + segments[current_segment].get("text_normalized", "")).strip()
+            current_segment += 1
+            if len(matched_text) >= len(para_text) * 0.8:
+                break
+        end_segment = max(start_segment, current_segment - 1)
+        spans.append((start_segment, min(end_segment, len(segments) - 1)))
+    return spans
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--segments", type=int, default=10000, help="Segments per chapter")
+    parser.add_argument("--chapters", type=int, default=3, help="Number of synthetic chapters")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.getLogger("app.audio_segments").setLevel(logging.WARNING)
+
+    rng = random.Random(args.seed)
+    for ch in range(args.chapters):
+        paragraphs, segments, expected = synthetic_chapter(rng, args.segments)
+        print(f"chapter {ch + 1}: {len(paragraphs)} paragraphs, {len(segments)} segments")
+
+        start = time.perf_counter()
+        greedy = greedy_spans(paragraphs, segments)
+        greedy_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = align_paragraphs(paragraphs, segments)
+        aligned_s = time.perf_counter() - start
+        aligned = [(s["start_segment_index"], s["end_segment_index"]) for s in result["spans"]]
+
+        greedy_wrong = sum(1 for a, b in zip(greedy[1:], expected[1:]) if a != b)
+        # Even with the (unspoken) title paragraph left out, the 80% rule drifts
+        untitled_wrong = sum(1 for a, b in zip(greedy_spans(paragraphs[1:], segments), expected[1:]) if a != b)
+        aligned_wrong = sum(1 for a, b in zip(aligned[1:], expected[1:]) if a != b)
+        print(f"  greedy   {greedy_s * 1000:>8.1f} ms  {greedy_wrong:>6} wrong spans  "
+              f"({untitled_wrong} without the title paragraph)")
+        print(f"  aligned  {aligned_s * 1000:>8.1f} ms  {aligned_wrong:>6} wrong spans  "
+              f"({result['anchored']}/{len(paragraphs)} anchored)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+-- =====================================================
+-- HONORA CHAPTER INGEST RPC
+-- One transaction per chapter for v3_upload_to_supabase
+--
+-- The uploader used to write a chapter with one HTTP call per paragraph,
+-- per tts_chunk and per link row (hundreds per chapter), and a failure
+-- half-way left the chapter half-written. ingest_chapter() takes the whole
+-- chapter as one JSON payload and writes it in a single transaction.
+--
+-- Run this in Supabase SQL Editor. Safe to run again (CREATE OR REPLACE).
+-- =====================================================
+
+-- content_hash (sha256 hex of the stored text) is what v3_sync_to_supabase
+-- diffs against; see supabase-content-hash-migration.sql for the backfill.
+ALTER TABLE chapters ADD COLUMN IF NOT EXISTS content_hash TEXT;
+ALTER TABLE paragraphs ADD COLUMN IF NOT EXISTS content_hash TEXT;
+ALTER TABLE tts_chunks ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+-- Payload (all ids are generated by the client, so link rows can reference them):
+-- {
+--   "chapter":    {"id", "book_id", "chapter_index", "title", "text", "node_id", "content_hash"},
+--   "paragraphs": [{"id", "paragraph_index", "text", "content_hash"}],
+--   "tts_chunks": [{"id", "chunk_index", "text_ref", "content_hash"}],
+--   "node_paragraphs":      [{"node_id", "paragraph_id", "position_in_node"}],
+--   "paragraph_tts_chunks": [{"paragraph_id", "tts_chunk_id", "position_in_paragraph"}]
+-- }
+--
+-- Returns row counts. Calling it again with the same chapter id (a retry after a
+-- timeout that did commit) writes nothing and returns "existing": true.
+
+CREATE OR REPLACE FUNCTION ingest_chapter(p_payload JSONB)
+RETURNS JSONB AS $$
+DECLARE
+    v_chapter JSONB := p_payload->'chapter';
+    v_chapter_id UUID := (v_chapter->>'id')::UUID;
+    v_paragraphs INT;
+    v_tts_chunks INT;
+    v_node_paragraphs INT;
+    v_paragraph_tts_chunks INT;
+BEGIN
+    IF v_chapter_id IS NULL THEN
+        RAISE EXCEPTION 'ingest_chapter: payload.chapter.id is required';
+    END IF;
+
+    IF EXISTS (SELECT 1 FROM chapters WHERE id = v_chapter_id) THEN
+        RETURN jsonb_build_object('chapter_id', v_chapter_id, 'existing', true);
+    END IF;
+
+    INSERT INTO chapters (id, book_id, chapter_index, title, text, node_id, content_hash)
+    VALUES (
+        v_chapter_id,
+        (v_chapter->>'book_id')::UUID,
+        (v_chapter->>'chapter_index')::INT,
+        v_chapter->>'title',
+        COALESCE(v_chapter->>'text', ''),
+        (v_chapter->>'node_id')::UUID,
+        v_chapter->>'content_hash'
+    );
+
+    INSERT INTO paragraphs (id, chapter_id, paragraph_index, text, content_hash, start_ms, end_ms)
+    SELECT p.id, v_chapter_id, p.paragraph_index, p.text, p.content_hash, NULL, NULL
+    FROM jsonb_to_recordset(COALESCE(p_payload->'paragraphs', '[]'::JSONB))
+        AS p(id UUID, paragraph_index INT, text TEXT, content_hash TEXT);
+    GET DIAGNOSTICS v_paragraphs = ROW_COUNT;
+
+    INSERT INTO tts_chunks (id, chapter_id, chunk_index, text_ref, content_hash, start_ms, end_ms)
+    SELECT c.id, v_chapter_id, c.chunk_index, c.text_ref, c.content_hash, NULL, NULL
+    FROM jsonb_to_recordset(COALESCE(p_payload->'tts_chunks', '[]'::JSONB))
+        AS c(id UUID, chunk_index INT, text_ref TEXT, content_hash TEXT);
+    GET DIAGNOSTICS v_tts_chunks = ROW_COUNT;
+
+    INSERT INTO book_node_paragraphs (node_id, paragraph_id, position_in_node)
+    SELECT l.node_id, l.paragraph_id, l.position_in_node
+    FROM jsonb_to_recordset(COALESCE(p_payload->'node_paragraphs', '[]'::JSONB))
+        AS l(node_id UUID, paragraph_id UUID, position_in_node INT);
+    GET DIAGNOSTICS v_node_paragraphs = ROW_COUNT;
+
+    INSERT INTO paragraph_tts_chunks (paragraph_id, tts_chunk_id, position_in_paragraph)
+    SELECT l.paragraph_id, l.tts_chunk_id, l.position_in_paragraph
+    FROM jsonb_to_recordset(COALESCE(p_payload->'paragraph_tts_chunks', '[]'::JSONB))
+        AS l(paragraph_id UUID, tts_chunk_id UUID, position_in_paragraph INT);
+    GET DIAGNOSTICS v_paragraph_tts_chunks = ROW_COUNT;
+
+    RETURN jsonb_build_object(
+        'chapter_id', v_chapter_id,
+        'existing', false,
+        'paragraphs', v_paragraphs,
+        'tts_chunks', v_tts_chunks,
+        'node_paragraphs', v_node_paragraphs,
+        'paragraph_tts_chunks', v_paragraph_tts_chunks
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- The service role calls this through PostgREST (supabase.rpc("ingest_chapter", ...))
+GRANT EXECUTE ON FUNCTION ingest_chapter(JSONB) TO service_role;
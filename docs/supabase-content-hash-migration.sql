@@ -0,0 +1,181 @@
+-- =====================================================
+-- HONORA CONTENT HASHES + BOOK SYNC RPC
+-- Delta re-upload for v3_sync_to_supabase
+--
+-- Re-uploading a corrected book used to rewrite every chapter, paragraph and
+-- TTS chunk. Each content row now stores content_hash = sha256 hex of its
+-- stored text, so the uploader (app/book_sync.py) can diff a job against the
+-- database and send only the rows that changed. apply_book_sync() writes that
+-- delta in a single transaction.
+--
+-- Run after supabase-chapter-ingest-migration.sql, in Supabase SQL Editor.
+-- Safe to run again (IF NOT EXISTS, CREATE OR REPLACE, backfill skips set rows).
+-- =====================================================
+
+-- =====================================================
+-- STEP 1: Columns + backfill
+-- =====================================================
+
+ALTER TABLE chapters ADD COLUMN IF NOT EXISTS content_hash TEXT;
+ALTER TABLE paragraphs ADD COLUMN IF NOT EXISTS content_hash TEXT;
+ALTER TABLE tts_chunks ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+-- Same definitions as app/chapters.py content_hash() / chapter_content_hash()
+UPDATE chapters
+SET content_hash = encode(sha256(convert_to(COALESCE(title, '') || E'\n' || COALESCE(text, ''), 'UTF8')), 'hex')
+WHERE content_hash IS NULL;
+
+UPDATE paragraphs
+SET content_hash = encode(sha256(convert_to(COALESCE(text, ''), 'UTF8')), 'hex')
+WHERE content_hash IS NULL;
+
+UPDATE tts_chunks
+SET content_hash = encode(sha256(convert_to(COALESCE(text_ref, ''), 'UTF8')), 'hex')
+WHERE content_hash IS NULL;
+
+-- =====================================================
+-- STEP 2: apply_book_sync RPC
+-- =====================================================
+
+-- Payload (built by plan_book_sync(); new row ids are generated by the client):
+-- {
+--   "book_id",
+--   "delete_chapters": [id], "delete_nodes": [id],
+--   "delete_paragraphs": [id], "delete_tts_chunks": [id],
+--   "update_chapters":   [{"id", "title", "text", "content_hash"}],
+--   "update_paragraphs": [{"id", "paragraph_index", "text"?, "content_hash"?}],
+--   "update_tts_chunks": [{"id", "chunk_index", "text_ref"?, "content_hash"?}],
+--   "insert_paragraphs": [{"id", "chapter_id", "paragraph_index", "text", "content_hash"}],
+--   "insert_tts_chunks": [{"id", "chapter_id", "chunk_index", "text_ref", "content_hash"}],
+--   "relink_node_ids": [id], "relink_chapter_ids": [id],
+--   "node_paragraphs":      [{"node_id", "paragraph_id", "position_in_node"}],
+--   "paragraph_tts_chunks": [{"paragraph_id", "tts_chunk_id", "position_in_paragraph"}]
+-- }
+--
+-- Update rows without text (index-only moves) keep the stored text. Link rows of
+-- the relinked nodes / chapters are replaced; links of deleted paragraphs and
+-- chunks go with them (ON DELETE CASCADE). Returns row counts.
+
+CREATE OR REPLACE FUNCTION apply_book_sync(p_payload JSONB)
+RETURNS JSONB AS $$
+DECLARE
+    v_book_id UUID := (p_payload->>'book_id')::UUID;
+    v_result JSONB := '{}'::JSONB;
+    v_gone_chapters UUID[];
+    v_count INT;
+BEGIN
+    IF v_book_id IS NULL THEN
+        RAISE EXCEPTION 'apply_book_sync: payload.book_id is required';
+    END IF;
+
+    -- Links of relinked chapters (rewritten below)
+    DELETE FROM book_node_paragraphs
+    WHERE node_id IN (SELECT jsonb_array_elements_text(COALESCE(p_payload->'relink_node_ids', '[]'::JSONB))::UUID);
+
+    DELETE FROM paragraph_tts_chunks
+    WHERE paragraph_id IN (
+        SELECT p.id FROM paragraphs p
+        WHERE p.chapter_id IN (SELECT jsonb_array_elements_text(COALESCE(p_payload->'relink_chapter_ids', '[]'::JSONB))::UUID)
+    );
+
+    -- Deleted chapters (only this book's) with their content and nodes
+    SELECT COALESCE(array_agg(id), '{}') INTO v_gone_chapters
+    FROM chapters
+    WHERE book_id = v_book_id
+      AND id IN (SELECT jsonb_array_elements_text(COALESCE(p_payload->'delete_chapters', '[]'::JSONB))::UUID);
+
+    -- Segments of older builds may still point at paragraphs that go away
+    UPDATE tts_segments SET paragraph_id = NULL
+    WHERE paragraph_id IN (
+        SELECT jsonb_array_elements_text(COALESCE(p_payload->'delete_paragraphs', '[]'::JSONB))::UUID
+        UNION ALL
+        SELECT id FROM paragraphs WHERE chapter_id = ANY(v_gone_chapters)
+    );
+
+    DELETE FROM paragraphs WHERE chapter_id = ANY(v_gone_chapters);
+    DELETE FROM tts_chunks WHERE chapter_id = ANY(v_gone_chapters);
+    DELETE FROM chapters WHERE id = ANY(v_gone_chapters);
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    v_result := v_result || jsonb_build_object('chapters_deleted', v_count);
+
+    DELETE FROM book_nodes
+    WHERE book_id = v_book_id
+      AND id IN (SELECT jsonb_array_elements_text(COALESCE(p_payload->'delete_nodes', '[]'::JSONB))::UUID);
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    v_result := v_result || jsonb_build_object('book_nodes_deleted', v_count);
+
+    DELETE FROM paragraphs
+    WHERE id IN (SELECT jsonb_array_elements_text(COALESCE(p_payload->'delete_paragraphs', '[]'::JSONB))::UUID);
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    v_result := v_result || jsonb_build_object('paragraphs_deleted', v_count);
+
+    DELETE FROM tts_chunks
+    WHERE id IN (SELECT jsonb_array_elements_text(COALESCE(p_payload->'delete_tts_chunks', '[]'::JSONB))::UUID);
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    v_result := v_result || jsonb_build_object('tts_chunks_deleted', v_count);
+
+    -- Updates
+    UPDATE chapters c
+    SET title = u.title, text = COALESCE(u.text, ''), content_hash = u.content_hash
+    FROM jsonb_to_recordset(COALESCE(p_payload->'update_chapters', '[]'::JSONB))
+        AS u(id UUID, title TEXT, text TEXT, content_hash TEXT)
+    WHERE c.id = u.id AND c.book_id = v_book_id;
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    v_result := v_result || jsonb_build_object('chapters_updated', v_count);
+
+    UPDATE paragraphs p
+    SET paragraph_index = COALESCE(u.paragraph_index, p.paragraph_index),
+        text = COALESCE(u.text, p.text),
+        content_hash = COALESCE(u.content_hash, p.content_hash)
+    FROM jsonb_to_recordset(COALESCE(p_payload->'update_paragraphs', '[]'::JSONB))
+        AS u(id UUID, paragraph_index INT, text TEXT, content_hash TEXT)
+    WHERE p.id = u.id;
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    v_result := v_result || jsonb_build_object('paragraphs_updated', v_count);
+
+    UPDATE tts_chunks t
+    SET chunk_index = COALESCE(u.chunk_index, t.chunk_index),
+        text_ref = COALESCE(u.text_ref, t.text_ref),
+        content_hash = COALESCE(u.content_hash, t.content_hash)
+    FROM jsonb_to_recordset(COALESCE(p_payload->'update_tts_chunks', '[]'::JSONB))
+        AS u(id UUID, chunk_index INT, text_ref TEXT, content_hash TEXT)
+    WHERE t.id = u.id;
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    v_result := v_result || jsonb_build_object('tts_chunks_updated', v_count);
+
+    -- Inserts
+    INSERT INTO paragraphs (id, chapter_id, paragraph_index, text, content_hash, start_ms, end_ms)
+    SELECT p.id, p.chapter_id, p.paragraph_index, p.text, p.content_hash, NULL, NULL
+    FROM jsonb_to_recordset(COALESCE(p_payload->'insert_paragraphs', '[]'::JSONB))
+        AS p(id UUID, chapter_id UUID, paragraph_index INT, text TEXT, content_hash TEXT);
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    v_result := v_result || jsonb_build_object('paragraphs_inserted', v_count);
+
+    INSERT INTO tts_chunks (id, chapter_id, chunk_index, text_ref, content_hash, start_ms, end_ms)
+    SELECT c.id, c.chapter_id, c.chunk_index, c.text_ref, c.content_hash, NULL, NULL
+    FROM jsonb_to_recordset(COALESCE(p_payload->'insert_tts_chunks', '[]'::JSONB))
+        AS c(id UUID, chapter_id UUID, chunk_index INT, text_ref TEXT, content_hash TEXT);
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    v_result := v_result || jsonb_build_object('tts_chunks_inserted', v_count);
+
+    -- Links of relinked chapters
+    INSERT INTO book_node_paragraphs (node_id, paragraph_id, position_in_node)
+    SELECT l.node_id, l.paragraph_id, l.position_in_node
+    FROM jsonb_to_recordset(COALESCE(p_payload->'node_paragraphs', '[]'::JSONB))
+        AS l(node_id UUID, paragraph_id UUID, position_in_node INT);
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    v_result := v_result || jsonb_build_object('node_paragraphs', v_count);
+
+    INSERT INTO paragraph_tts_chunks (paragraph_id, tts_chunk_id, position_in_paragraph)
+    SELECT l.paragraph_id, l.tts_chunk_id, l.position_in_paragraph
+    FROM jsonb_to_recordset(COALESCE(p_payload->'paragraph_tts_chunks', '[]'::JSONB))
+        AS l(paragraph_id UUID, tts_chunk_id UUID, position_in_paragraph INT);
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    v_result := v_result || jsonb_build_object('paragraph_tts_chunks', v_count);
+
+    RETURN v_result;
+END;
+$$ LANGUAGE plpgsql;
+
+-- The service role calls this through PostgREST (supabase.rpc("apply_book_sync", ...))
+GRANT EXECUTE ON FUNCTION apply_book_sync(JSONB) TO service_role;
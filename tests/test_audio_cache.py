@@ -0,0 +1,104 @@
+"""
+Unit tests for audio_cache module
+Tests: content-addressed keys, voice fingerprints, hits/misses, LRU eviction
+"""
+
+import os
+import time
+
+import pytest
+from app import audio_cache
+from app.audio_cache import AudioCache, make_audio_cache_key, voice_fingerprint
+from app.config import Config
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "AUDIO_CACHE_DIR", str(tmp_path / "audio_cache"))
+    monkeypatch.setattr(audio_cache, "_audio_cache", None)
+    yield
+
+
+def write_audio(path, size=1000):
+    with open(path, "wb") as f:
+        f.write(os.urandom(size))
+    return str(path)
+
+
+class TestKeys:
+    """Tests for cache key construction."""
+
+    def test_whitespace_and_unicode_normalized(self):
+        a = make_audio_cache_key("Hello  world.\n", "Billy", "runpod", "en", "xtts_v2")
+        b = make_audio_cache_key("Hello world.", "Billy", "runpod", "en", "xtts_v2")
+        assert a == b
+
+    @pytest.mark.parametrize("field", range(5))
+    def test_every_field_is_part_of_key(self, field):
+        base = ["Hello world.", "Billy", "runpod", "en", "xtts_v2"]
+        changed = list(base)
+        changed[field] = changed[field] + "x"
+        assert make_audio_cache_key(*base) != make_audio_cache_key(*changed)
+
+    def test_voice_fingerprint_tracks_file_content(self, tmp_path):
+        path = tmp_path / "voice.wav"
+        path.write_bytes(b"one")
+        first = voice_fingerprint("Billy", str(path))
+        path.write_bytes(b"two")
+        assert voice_fingerprint("Billy", str(path)) != first
+        assert first.startswith("Billy@")
+        assert voice_fingerprint("Billy", None) == "Billy"
+
+
+class TestAudioCache:
+    """Tests for storing, reading and evicting entries."""
+
+    def test_miss_then_hit(self, tmp_path):
+        cache = audio_cache.get_audio_cache()
+        source = write_audio(tmp_path / "seg.wav")
+        out = str(tmp_path / "out.wav")
+
+        assert cache.get("k" * 64, out) is None
+        cache.put("k" * 64, source, 4321)
+
+        assert cache.get("k" * 64, out) == 4321
+        with open(source, "rb") as a, open(out, "rb") as b:
+            assert a.read() == b.read()
+        stats = cache.stats()
+        assert stats["hits"] == 1 and stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    def test_get_many_returns_hits_by_index(self, tmp_path):
+        cache = audio_cache.get_audio_cache()
+        cache.put("a" * 64, write_audio(tmp_path / "a.wav"), 100)
+        cache.put("c" * 64, write_audio(tmp_path / "c.wav"), 300)
+
+        found = cache.get_many([(k * 64, str(tmp_path / f"out_{k}.wav")) for k in "abc"])
+
+        assert found == {0: 100, 2: 300}
+        assert not os.path.exists(tmp_path / "out_b.wav")
+
+    def test_lru_eviction_keeps_recent_entries(self, tmp_path):
+        cache = AudioCache(str(tmp_path / "small"), max_bytes=3500)
+        for i, key in enumerate(["a", "b", "c"]):
+            cache.put(key * 64, write_audio(tmp_path / f"{key}.wav"), 1000)
+            os.utime(cache._audio_path(key * 64), (time.time() - 100 + i, time.time() - 100 + i))
+        # Reading "a" makes it the most recently used entry
+        assert cache.get("a" * 64, str(tmp_path / "out.wav")) == 1000
+
+        cache.put("d" * 64, write_audio(tmp_path / "d.wav"), 1000)
+
+        assert cache.evictions >= 1
+        assert cache.get("b" * 64, str(tmp_path / "out.wav")) is None
+        assert cache.get("a" * 64, str(tmp_path / "out.wav")) == 1000
+        assert cache.get("d" * 64, str(tmp_path / "out.wav")) == 1000
+        assert cache.stats()["size_bytes"] <= 3500
+
+    def test_size_survives_restart(self, tmp_path):
+        cache = AudioCache(str(tmp_path / "persist"), max_bytes=10**6)
+        cache.put("a" * 64, write_audio(tmp_path / "a.wav", 2000), 100)
+
+        reopened = AudioCache(str(tmp_path / "persist"), max_bytes=10**6)
+
+        assert reopened.stats()["size_bytes"] == cache.stats()["size_bytes"] > 2000
+        assert reopened.get("a" * 64, str(tmp_path / "out.wav")) == 100
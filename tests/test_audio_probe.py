@@ -0,0 +1,172 @@
+"""
+Unit tests for audio_probe module
+Tests: WAV RIFF parsing, M4A mvhd/mdhd parsing, ffprobe fallback, batch probing
+"""
+
+import struct
+import wave
+
+import pytest
+from app import audio_probe
+from app.audio_probe import (
+    AudioProbeError,
+    mp4_duration_ms,
+    probe_directory,
+    probe_duration_ms,
+    probe_many,
+    wav_duration_ms,
+)
+from app.audio_segments import get_audio_duration_ms
+
+
+def write_wav(path, seconds, rate=24000, channels=1, sampwidth=2):
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(sampwidth)
+        w.setframerate(rate)
+        w.writeframes(b"\x00" * int(seconds * rate) * channels * sampwidth)
+    return str(path)
+
+
+def box(box_type, payload=b""):
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def time_header(box_type, timescale, duration, version=0):
+    if version == 1:
+        body = struct.pack(">B3xQQIQ", 1, 0, 0, timescale, duration)
+    else:
+        body = struct.pack(">B3xIIII", 0, 0, 0, timescale, duration)
+    return box(box_type, body + b"\x00" * 20)
+
+
+def sound_track(timescale, duration, version=0):
+    hdlr = box(b"hdlr", b"\x00" * 4 + b"\x00" * 4 + b"soun" + b"\x00" * 13)
+    return box(b"trak", box(b"mdia", time_header(b"mdhd", timescale, duration, version) + hdlr))
+
+
+def write_m4a(path, movie=None, track=None, moov_last=False, version=0):
+    """Minimal ISO BMFF file: ftyp + moov(mvhd, trak) + mdat."""
+    moov_children = b""
+    if movie:
+        moov_children += time_header(b"mvhd", *movie, version=version)
+    if track:
+        moov_children += sound_track(*track, version=version)
+    moov = box(b"moov", moov_children)
+    mdat = box(b"mdat", b"\x00" * 4096)
+    ftyp = box(b"ftyp", b"M4A \x00\x00\x02\x00isomiso2")
+    with open(path, "wb") as f:
+        f.write(ftyp + (mdat + moov if moov_last else moov + mdat))
+    return str(path)
+
+
+class TestWav:
+    """Tests for RIFF header parsing."""
+
+    @pytest.mark.parametrize("rate,channels,sampwidth", [(24000, 1, 2), (44100, 2, 2), (22050, 1, 1), (48000, 2, 3)])
+    def test_formats(self, tmp_path, rate, channels, sampwidth):
+        path = write_wav(tmp_path / "a.wav", 1.5, rate, channels, sampwidth)
+        assert wav_duration_ms(path) == 1500
+
+    def test_skips_extra_chunks(self, tmp_path):
+        path = write_wav(tmp_path / "a.wav", 2.0)
+        data = open(path, "rb").read()
+        # Insert an odd-sized LIST chunk (padded to even) between fmt and data
+        list_chunk = b"LIST" + struct.pack("<I", 5) + b"INFOx" + b"\x00"
+        data_pos = data.index(b"data")
+        patched = data[:data_pos] + list_chunk + data[data_pos:]
+        patched = patched[:4] + struct.pack("<I", len(patched) - 8) + patched[8:]
+        with open(path, "wb") as f:
+            f.write(patched)
+        assert wav_duration_ms(path) == 2000
+
+    def test_unfinalized_header_uses_file_size(self, tmp_path):
+        path = write_wav(tmp_path / "a.wav", 1.0)
+        data = bytearray(open(path, "rb").read())
+        pos = data.index(b"data")
+        data[pos + 4:pos + 8] = struct.pack("<I", 0xFFFFFFFF)
+        with open(path, "wb") as f:
+            f.write(data)
+        assert wav_duration_ms(path) == 1000
+
+    def test_not_a_wav(self, tmp_path):
+        path = tmp_path / "a.wav"
+        path.write_bytes(b"garbage" * 10)
+        with pytest.raises(AudioProbeError):
+            wav_duration_ms(str(path))
+
+
+class TestMp4:
+    """Tests for moov/mvhd/mdhd parsing."""
+
+    def test_mvhd_v0(self, tmp_path):
+        path = write_m4a(tmp_path / "a.m4a", movie=(1000, 35250), track=(44100, 44100 * 36))
+        assert mp4_duration_ms(path) == 35250
+
+    def test_mvhd_v1(self, tmp_path):
+        path = write_m4a(tmp_path / "a.m4a", movie=(600, 600 * 12), track=(24000, 24000 * 12), version=1)
+        assert mp4_duration_ms(path) == 12000
+
+    def test_moov_after_mdat(self, tmp_path):
+        path = write_m4a(tmp_path / "a.m4a", movie=(1000, 4200), moov_last=True)
+        assert mp4_duration_ms(path) == 4200
+
+    def test_falls_back_to_sound_track_mdhd(self, tmp_path):
+        path = write_m4a(tmp_path / "a.m4a", movie=(1000, 0), track=(44100, 44100 * 3))
+        assert mp4_duration_ms(path) == 3000
+
+    def test_no_duration_raises(self, tmp_path):
+        path = write_m4a(tmp_path / "a.m4a", movie=(1000, 0))
+        with pytest.raises(AudioProbeError):
+            mp4_duration_ms(path)
+
+
+class TestProbe:
+    """Tests for dispatch, ffprobe fallback and batch probing."""
+
+    def test_dispatch_by_content_not_extension(self, tmp_path):
+        path = write_m4a(tmp_path / "really_m4a.wav", movie=(1000, 2500))
+        assert probe_duration_ms(path) == 2500
+
+    def test_ffprobe_only_as_fallback(self, tmp_path, monkeypatch):
+        calls = []
+
+        def fake_ffprobe(path):
+            calls.append(path)
+            return 777
+
+        monkeypatch.setattr(audio_probe, "ffprobe_duration_ms", fake_ffprobe)
+        wav = write_wav(tmp_path / "a.wav", 1.0)
+        other = tmp_path / "a.ogg"
+        other.write_bytes(b"OggS" + b"\x00" * 100)
+
+        assert probe_duration_ms(wav) == 1000
+        assert probe_duration_ms(str(other)) == 777
+        assert calls == [str(other)]
+
+    def test_failure_raises_instead_of_guessing(self, tmp_path, monkeypatch):
+        def failing_ffprobe(path):
+            raise AudioProbeError("ffprobe missing")
+
+        monkeypatch.setattr(audio_probe, "ffprobe_duration_ms", failing_ffprobe)
+        path = tmp_path / "broken.wav"
+        path.write_bytes(b"RIFF")
+
+        with pytest.raises(AudioProbeError):
+            get_audio_duration_ms(str(path))
+
+    def test_probe_many_and_directory(self, tmp_path, monkeypatch):
+        def failing_ffprobe(path):
+            raise AudioProbeError("ffprobe missing")
+
+        monkeypatch.setattr(audio_probe, "ffprobe_duration_ms", failing_ffprobe)
+        write_wav(tmp_path / "seg_0.wav", 0.5)
+        write_wav(tmp_path / "seg_1.wav", 1.25)
+        write_m4a(tmp_path / "group_0.m4a", movie=(1000, 1750))
+        (tmp_path / "broken.wav").write_bytes(b"nope")
+        (tmp_path / "notes.txt").write_text("ignored")
+
+        durations = probe_directory(str(tmp_path))
+
+        assert durations == {"broken.wav": None, "group_0.m4a": 1750, "seg_0.wav": 500, "seg_1.wav": 1250}
+        assert probe_many([str(tmp_path / "seg_1.wav")]) == {str(tmp_path / "seg_1.wav"): 1250}
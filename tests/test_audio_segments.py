@@ -1,6 +1,6 @@
 """
 Unit tests for audio_segments module
-Tests: merge, clamp, grouping, duration reading
+Tests: merge, clamp, grouping, duration reading, retiming after per-group concat
 """
 
 import pytest
@@ -10,6 +10,7 @@ from app.audio_segments import (
     split_at_sentences,
     process_segments,
     group_segments,
+    retime_groups,
     MIN_CHARS,
     MAX_CHARS
 )
@@ -189,6 +190,51 @@ class TestGroupSegments:
         assert len(groups) == 1
         assert groups[0]["duration_ms"] == 50000
 
+    
+    def test_failed_segment_takes_no_time(self):
+        """A segment without audio (duration 0) does not shift the segments after it."""
+        segments = [
+            {"segment_index": 0, "text": "A", "audio_path": "a.wav", "duration_ms": 4000},
+            {"segment_index": 1, "text": "B", "duration_ms": 0},
+            {"segment_index": 2, "text": "C", "audio_path": "c.wav", "duration_ms": 3000},
+        ]
+        groups = group_segments(segments)
+        
+        assert [s["offset_in_group_ms"] for s in groups[0]["segments"]] == [0, 4000, 4000]
+        assert groups[0]["duration_ms"] == 7000
+
+
+class TestRetimeGroups:
+    """Tests for retime_groups function."""
+    
+    def test_uses_measured_durations(self):
+        """Offsets and start times follow the durations measured after concat, not the estimates."""
+        segments = [
+            {"segment_index": i, "text": f"Seg {i}", "duration_ms": 15000}
+            for i in range(4)
+        ]
+        groups = group_segments(segments)
+        segments[0]["duration_ms"] = 0  # failed
+        groups[0]["duration_ms"] = 15040  # probed from the concatenated file
+        
+        retime_groups(groups)
+        
+        assert [s["offset_in_group_ms"] for s in groups[0]["segments"]] == [0, 0]
+        assert [g["start_time_ms"] for g in groups] == [0, 15040]
+    
+    def test_group_without_audio_takes_no_time(self):
+        segments = [
+            {"segment_index": i, "text": f"Seg {i}", "duration_ms": 20000}
+            for i in range(4)
+        ]
+        groups = group_segments(segments)
+        groups[1]["local_audio_path"] = None
+        groups[1]["duration_ms"] = 0
+        
+        retime_groups(groups)
+        
+        assert groups[2]["start_time_ms"] == groups[0]["duration_ms"]
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
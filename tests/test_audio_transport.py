@@ -0,0 +1,210 @@
+"""
+Unit tests for the RunPod audio transport formats
+Tests: PCM/WAV round trip, pass-through vs decode, format validation, handler fields,
+engine stats against the stand-in, FLAC/Opus via ffmpeg (when installed),
+audio cache keys per lossy transport
+"""
+
+import asyncio
+import base64
+import os
+import shutil
+import sys
+import wave
+
+import pytest
+
+TTS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "HonoraLocalTTS")
+if TTS_PATH not in sys.path:
+    # Appended, not prepended: HonoraLocalTTS/app.py must not shadow the app package
+    sys.path.append(TTS_PATH)
+
+import runpod_handler
+from audio_transport import TransportStats, cache_variant, check_format, encode_audio, timed_write, write_audio
+from runpod_standin import SAMPLE_RATE, silent_wav, start_standin
+
+needs_ffmpeg = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not installed")
+
+
+def tone_wav(path, seconds=0.5):
+    """Mono 16-bit WAV with non-silent, deterministic samples."""
+    frames = bytes((i * 37) % 256 for i in range(int(seconds * SAMPLE_RATE) * 2))
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(SAMPLE_RATE)
+        w.writeframes(frames)
+    return frames
+
+
+def read_frames(path):
+    with wave.open(str(path), "rb") as w:
+        return w.getframerate(), w.readframes(w.getnframes())
+
+
+class TestFormats:
+    """Tests for encode_audio() / write_audio()."""
+
+    def test_pcm_round_trip(self, tmp_path):
+        frames = tone_wav(tmp_path / "in.wav")
+
+        data, meta = encode_audio(str(tmp_path / "in.wav"), "pcm")
+        write_audio(data, str(tmp_path / "out.wav"), "pcm", meta)
+
+        assert data == frames
+        assert meta == {"audio_format": "pcm", "wav_size": os.path.getsize(tmp_path / "in.wav"),
+                        "sample_rate": SAMPLE_RATE, "channels": 1, "sample_format": "s16le"}
+        assert read_frames(tmp_path / "out.wav") == (SAMPLE_RATE, frames)
+        assert not os.path.exists(tmp_path / "out.wav.part")
+
+    def test_wav_is_written_unchanged(self, tmp_path):
+        tone_wav(tmp_path / "in.wav")
+        data, meta = encode_audio(str(tmp_path / "in.wav"))
+
+        write_audio(data, str(tmp_path / "out.wav"), "wav", meta)
+
+        assert (tmp_path / "out.wav").read_bytes() == (tmp_path / "in.wav").read_bytes()
+
+    def test_compressed_passes_through_with_matching_extension(self, tmp_path):
+        write_audio(b"fLaC-not-decoded", str(tmp_path / "seg.flac"), "flac", {"sample_rate": SAMPLE_RATE})
+        assert (tmp_path / "seg.flac").read_bytes() == b"fLaC-not-decoded"
+
+    def test_unknown_formats_rejected(self):
+        assert check_format(None) == "wav"
+        assert check_format("FLAC") == "flac"
+        with pytest.raises(ValueError, match="audio_format"):
+            check_format("mp3")
+        with pytest.raises(ValueError, match="sample_format"):
+            check_format("pcm", "f64be")
+
+    @needs_ffmpeg
+    def test_flac_is_lossless(self, tmp_path):
+        frames = tone_wav(tmp_path / "in.wav")
+
+        data, meta = encode_audio(str(tmp_path / "in.wav"), "flac")
+        write_audio(data, str(tmp_path / "out.wav"), "flac", meta)
+
+        assert data[:4] == b"fLaC" and len(data) < meta["wav_size"]
+        assert read_frames(tmp_path / "out.wav") == (SAMPLE_RATE, frames)
+
+    @needs_ffmpeg
+    def test_opus_keeps_sample_rate(self, tmp_path):
+        tone_wav(tmp_path / "in.wav", seconds=1.0)
+
+        data, meta = encode_audio(str(tmp_path / "in.wav"), "opus", "24k")
+        write_audio(data, str(tmp_path / "out.wav"), "opus", meta)
+
+        rate, frames = read_frames(tmp_path / "out.wav")
+        assert rate == SAMPLE_RATE
+        assert abs(len(frames) // 2 - SAMPLE_RATE) < SAMPLE_RATE * 0.05
+
+
+class TestStats:
+    """Tests for TransportStats / timed_write()."""
+
+    def test_payload_sizes_per_format(self, tmp_path):
+        stats = TransportStats()
+        wav = silent_wav(0.5)
+        pcm = wav[44:]
+        timed_write(stats, {"audio_b64": base64.b64encode(wav).decode()}, str(tmp_path / "a.wav"), segment_start=0)
+        timed_write(stats, {"audio_b64": base64.b64encode(pcm).decode(), "audio_format": "pcm",
+                            "sample_rate": SAMPLE_RATE, "channels": 1, "wav_size": len(wav)},
+                    str(tmp_path / "b.wav"))
+
+        summary = stats.summary()
+
+        assert summary["wav"]["payload_bytes"] == len(base64.b64encode(wav))
+        assert summary["wav"]["payload_ratio"] == pytest.approx(4 / 3, abs=0.01)
+        assert summary["pcm"]["audio_bytes"] == len(pcm)
+        assert summary["pcm"]["wav_bytes"] == len(wav)
+        assert summary["wav"]["avg_segment_seconds"] > 0
+
+
+class TestHandler:
+    """Transport fields in the RunPod handler."""
+
+    @pytest.fixture
+    def model(self, monkeypatch):
+        class FakeModel:
+            def tts_to_file(self, text, speaker_wav, language, file_path):
+                with open(file_path, "wb") as f:
+                    f.write(silent_wav(0.05))
+
+        monkeypatch.setattr(runpod_handler, "tts_model", FakeModel())
+
+    def job(self, **extra):
+        return {"input": {
+            "segments": [{"segment_id": "s0", "text": "One."}, {"segment_id": "s1", "text": "Two."}],
+            "speaker_wav_b64": base64.b64encode(silent_wav(0.1)).decode(),
+            **extra,
+        }}
+
+    def test_pcm_segments(self, model):
+        result = runpod_handler.handler(self.job(audio_format="pcm", sample_format="s16le"))
+
+        segment = result["segments"][0]
+        assert segment["audio_format"] == "pcm" and segment["sample_format"] == "s16le"
+        assert segment["sample_rate"] == SAMPLE_RATE
+        assert segment["audio_size"] == len(base64.b64decode(segment["audio_b64"])) == segment["wav_size"] - 44
+
+    def test_default_stays_wav(self, model):
+        segment = runpod_handler.handler(self.job())["segments"][1]
+        assert segment["audio_format"] == "wav"
+        assert base64.b64decode(segment["audio_b64"])[:4] == b"RIFF"
+
+    def test_unknown_format_is_an_error(self, model):
+        result = runpod_handler.handler(self.job(audio_format="mp3"))
+        assert result["status"] == "error" and "mp3" in result["error"]
+
+
+@pytest.mark.parametrize("audio_format", ["wav", "pcm"])
+def test_engine_decodes_and_records(audio_format, tmp_path, monkeypatch):
+    from tts_engines import XTTSRunPodAsyncEngine
+
+    server, standin, api_base = start_standin(workers=2, latency=0.05)
+    try:
+        monkeypatch.setenv("RUNPOD_API_KEY", "test-key")
+        monkeypatch.setenv("RUNPOD_ENDPOINT_ID", "local")
+        monkeypatch.setenv("RUNPOD_API_BASE", api_base)
+        monkeypatch.setenv("SUPABASE_URL", "")
+        monkeypatch.setenv("RUNPOD_AUDIO_FORMAT", audio_format)
+        engine = XTTSRunPodAsyncEngine(max_in_flight=2, batch_size=2)
+        engine.POLL_INTERVAL = 0.02
+        voices = tmp_path / "voices"
+        voices.mkdir()
+        (voices / "AI_Voice_Honora_Test.wav").write_bytes(silent_wav(0.1))
+        engine._voice_folder = str(voices)
+        items = [{"id": i, "text": f"Segment {i}.", "output_path": str(tmp_path / f"seg_{i}.wav")} for i in range(3)]
+
+        results = asyncio.run(engine.generate_many(items, "Test", "en"))
+    finally:
+        server.shutdown()
+        standin.shutdown()
+
+    assert all(r["success"] and r["audio_format"] == audio_format for r in results.values())
+    for item in items:
+        with wave.open(item["output_path"], "rb") as w:
+            assert w.getframerate() == SAMPLE_RATE
+            assert w.getnframes() == int(len(item["text"]) * 0.06 * SAMPLE_RATE)
+    summary = engine.transport.summary()[audio_format]
+    assert summary["segments"] == 3
+    assert summary["payload_bytes"] == sum(r["payload_bytes"] for r in results.values())
+
+
+def test_lossy_transports_get_their_own_cache_keys(monkeypatch):
+    from tts_engines import XTTSRunPodEngine
+    from app.pipeline_v3 import _cache_engine_names, _produced_cache_key
+
+    assert cache_variant("wav") == cache_variant("flac") == cache_variant("pcm") == ""
+    assert cache_variant("opus") == "opus-32k" and cache_variant("aac", "96k") == "aac-96k"
+
+    keys = {}
+    for audio_format, bitrate in [("wav", ""), ("flac", ""), ("opus", ""), ("opus", "48k")]:
+        monkeypatch.setenv("RUNPOD_AUDIO_FORMAT", audio_format)
+        monkeypatch.setenv("RUNPOD_AUDIO_BITRATE", bitrate)
+        engine = XTTSRunPodEngine()
+        keys[audio_format, bitrate] = _produced_cache_key(engine, "runpod", "Hello.", "v", "en")
+        assert _cache_engine_names(engine, "runpod") == [f"runpod:{engine.cache_variant}".rstrip(":")]
+
+    assert keys["wav", ""] == keys["flac", ""]
+    assert len({keys["wav", ""], keys["opus", ""], keys["opus", "48k"]}) == 3
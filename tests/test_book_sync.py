@@ -0,0 +1,265 @@
+"""
+Unit tests for the delta re-upload
+Tests: row matching by index + content_hash, per-chapter plans (edit, insert, new and
+deleted chapters), rebuilds only for changed canonical text, paged remote fetch,
+one RPC call per sync with a fallback when it is not deployed
+"""
+
+import copy
+
+import pytest
+
+import app.book_sync as book_sync
+from app.audio_segments import process_segments
+from app.book_sync import canonical_hash, diff_rows, fetch_remote_book, is_empty, plan_book_sync
+from app.chapters import build_chapter_payload, content_hash
+
+
+def make_chapter(index, paragraphs=4):
+    texts = [f"Kapitel {index + 1}"] + [f"Paragraph {index}.{i} has enough words to be a section." for i in range(paragraphs - 1)]
+    return {
+        "index": index,
+        "title": f"Kapitel {index + 1}",
+        "raw_content": "\n\n".join(texts),
+        "paragraphs": [{"text": t} for t in texts],
+        "sections": [{"text": t} for t in texts[1:]],
+        "segments": process_segments(texts[1:]),
+    }
+
+
+def stored(payload, segments=None):
+    """fetch_remote_book() entry for a chapter written with ingest_chapter."""
+    return {
+        "id": payload["chapter"]["id"],
+        "node_id": payload["chapter"]["node_id"],
+        "content_hash": payload["chapter"]["content_hash"],
+        "canonical_hash": canonical_hash(segments) if segments else None,
+        "paragraphs": [{k: p[k] for k in ("id", "paragraph_index", "content_hash")} for p in payload["paragraphs"]],
+        "tts_chunks": [{k: c[k] for k in ("id", "chunk_index", "content_hash")} for c in payload["tts_chunks"]],
+    }
+
+
+@pytest.fixture
+def uploaded():
+    """Three chapters as uploaded, and the remote state they left behind."""
+    book = [make_chapter(i) for i in range(3)]
+    remote = {}
+    for ch in book:
+        payload = build_chapter_payload("book-1", ch, f"node-{ch['index']}")
+        remote[ch["index"]] = stored(payload, ch["segments"])
+    return copy.deepcopy(book), remote
+
+
+class TestDiffRows:
+    """Tests for diff_rows()."""
+
+    def remote(self, texts):
+        return [{"id": f"r{i}", "paragraph_index": i, "content_hash": content_hash(t)} for i, t in enumerate(texts)]
+
+    def test_unchanged(self):
+        diff = diff_rows([(0, "a"), (1, "b")], self.remote(["a", "b"]), "paragraph_index", "text")
+
+        assert diff["ids"] == ["r0", "r1"] and diff["unchanged"] == 2
+        assert diff["update"] == diff["insert"] == diff["delete"] == []
+
+    def test_edit_keeps_the_row_id(self):
+        diff = diff_rows([(0, "a"), (1, "B")], self.remote(["a", "b"]), "paragraph_index", "text")
+
+        assert diff["ids"] == ["r0", "r1"]
+        assert diff["update"] == [{"id": "r1", "paragraph_index": 1, "text": "B", "content_hash": content_hash("B")}]
+
+    def test_insert_shifts_later_rows_by_index_only(self):
+        diff = diff_rows([(0, "a"), (1, "new"), (2, "b"), (3, "c")], self.remote(["a", "b", "c"]),
+                         "paragraph_index", "text")
+
+        assert diff["ids"][0] == "r0" and diff["ids"][2:] == ["r1", "r2"]
+        assert diff["update"] == [{"id": "r1", "paragraph_index": 2}, {"id": "r2", "paragraph_index": 3}]
+        assert [row["text"] for row in diff["insert"]] == ["new"] and diff["delete"] == []
+
+    def test_delete(self):
+        diff = diff_rows([(0, "a"), (1, "c")], self.remote(["a", "b", "c"]), "paragraph_index", "text")
+
+        assert diff["ids"] == ["r0", "r2"] and diff["delete"] == ["r1"]
+        assert diff["update"] == [{"id": "r2", "paragraph_index": 1}] and diff["insert"] == []
+
+
+class TestPlan:
+    """Tests for plan_book_sync()."""
+
+    def test_unchanged_book_plans_nothing(self, uploaded):
+        book, remote = uploaded
+
+        plan = plan_book_sync("book-1", book, remote)
+
+        assert is_empty(plan["payload"]) and plan["new_chapters"] == [] and plan["rebuild"] == []
+        assert plan["report"]["chapters"]["unchanged"] == 3
+        assert plan["paragraph_ids"][1] == [p["id"] for p in remote[1]["paragraphs"]]
+
+    def test_one_edited_paragraph(self, uploaded):
+        book, remote = uploaded
+        book[1]["paragraphs"][2]["text"] = "A corrected paragraph."
+        book[1]["raw_content"] += " (corrected)"
+
+        payload = plan_book_sync("book-1", book, remote)["payload"]
+
+        assert [u["id"] for u in payload["update_paragraphs"]] == [remote[1]["paragraphs"][2]["id"]]
+        assert [u["id"] for u in payload["update_chapters"]] == [remote[1]["id"]]
+        assert payload["insert_paragraphs"] == payload["delete_paragraphs"] == []
+        assert payload["relink_chapter_ids"] == [] and payload["node_paragraphs"] == []
+
+    def test_inserted_paragraph_relinks_only_its_chapter(self, uploaded):
+        book, remote = uploaded
+        book[2]["paragraphs"].insert(1, {"text": "A new paragraph."})
+
+        plan = plan_book_sync("book-1", book, remote)
+        payload, report = plan["payload"], plan["report"]
+
+        assert [p["chapter_id"] for p in payload["insert_paragraphs"]] == [remote[2]["id"]]
+        assert report["paragraphs"] == {"insert": 1, "update": 3, "delete": 0, "unchanged": 1 + 4 + 4}
+        assert payload["relink_chapter_ids"] == [remote[2]["id"]] and payload["relink_node_ids"] == ["node-2"]
+        assert [l["paragraph_id"] for l in payload["node_paragraphs"]] == plan["paragraph_ids"][2]
+        assert report["chapters"]["unchanged"] == 2
+
+    def test_new_and_deleted_chapters(self, uploaded):
+        book, remote = uploaded
+        del book[0]
+        book.append(make_chapter(3))
+
+        plan = plan_book_sync("book-1", book, remote)
+
+        assert plan["new_chapters"] == [3] and plan["rebuild"] == [3] and plan["needs_tts"] == []
+        assert plan["payload"]["delete_chapters"] == [remote[0]["id"]]
+        assert plan["payload"]["delete_nodes"] == ["node-0"]
+        assert plan["report"]["paragraphs"]["insert"] == 4 and plan["report"]["paragraphs"]["delete"] == 4
+
+    def test_edited_section_needs_tts_before_a_rebuild(self, uploaded):
+        book, remote = uploaded
+        # Reprocessing a corrected chapter changes its sections; segments are from the last TTS run
+        book[0]["sections"][1]["text"] = "Spoken differently now, after the correction."
+        book[2]["title"] = "Renamed"  # row update, same audio
+
+        plan = plan_book_sync("book-1", book, remote)
+
+        assert plan["rebuild"] == [0] and plan["needs_tts"] == [0]
+        assert plan["report"]["rebuild_chapters"] == [0] and plan["report"]["needs_tts"] == [0]
+        assert plan["report"]["payload_bytes"] > 0
+
+    def test_rebuild_after_tts_matches_the_new_text(self, uploaded):
+        book, remote = uploaded
+        book[1]["sections"][0]["text"] = "Spoken differently now, after the correction."
+        book[1]["segments"] = process_segments([s["text"] for s in book[1]["sections"]])
+
+        plan = plan_book_sync("book-1", book, remote)
+
+        assert plan["rebuild"] == [1] and plan["needs_tts"] == []
+
+    def test_chapter_without_audio_is_not_rebuilt(self, uploaded):
+        book, remote = uploaded
+        remote[2]["canonical_hash"] = None
+        del book[2]["segments"]
+        book[2]["sections"][0]["text"] = "Changed before any audio was made."
+
+        assert plan_book_sync("book-1", book, remote)["rebuild"] == []
+
+
+class FakeQuery:
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.filters = []
+
+    def select(self, columns):
+        return self
+
+    def eq(self, field, value):
+        self.filters.append(lambda row: row.get(field) == value)
+        return self
+
+    def in_(self, field, values):
+        self.filters.append(lambda row: row.get(field) in values)
+        return self
+
+    def range(self, start, end):
+        self.window = (start, end)
+        return self
+
+    def execute(self):
+        self.db.requests += 1
+        rows = [r for r in self.db.tables.get(self.table, []) if all(f(r) for f in self.filters)]
+        start, end = self.window
+        return type("Result", (), {"data": rows[start:end + 1]})()
+
+
+class FakeSupabase:
+    def __init__(self, tables, missing_rpc=False):
+        self.tables = tables
+        self.requests = 0
+        self.missing_rpc = missing_rpc
+        self.rpc_calls = []
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params):
+        def run():
+            if self.missing_rpc:
+                raise Exception("{'code': 'PGRST202', 'message': 'Could not find the function public.apply_book_sync'}")
+            self.rpc_calls.append((name, params))
+            return type("Result", (), {"data": {"paragraphs_updated": 1}})()
+        return type("Query", (), {"execute": staticmethod(run)})()
+
+
+def test_fetch_remote_book_pages(monkeypatch):
+    monkeypatch.setattr(book_sync, "FETCH_PAGE_SIZE", 10)
+    supabase = FakeSupabase({
+        "chapters": [{"id": "c1", "book_id": "book-1", "chapter_index": 0, "node_id": "n1",
+                      "content_hash": "h", "current_build_id": "b1"}],
+        "paragraphs": [{"id": f"p{i}", "chapter_id": "c1", "paragraph_index": i, "content_hash": str(i)}
+                       for i in range(25)],
+        "tts_chunks": [],
+        "chapter_builds": [{"id": "b1", "canonical_hash": "canon"}],
+    })
+
+    remote = fetch_remote_book("book-1", supabase)
+
+    assert list(remote) == [0] and remote[0]["canonical_hash"] == "canon"
+    assert [p["id"] for p in remote[0]["paragraphs"]] == [f"p{i}" for i in range(25)]
+    assert supabase.requests == 1 + 3 + 1 + 1  # chapters, 3 paragraph pages, chunks, builds
+
+
+class TestApply:
+    """Tests for apply_book_sync()."""
+
+    def test_one_rpc_call(self, uploaded, monkeypatch):
+        book, remote = uploaded
+        book[0]["paragraphs"][1]["text"] = "Edited."
+        supabase = FakeSupabase({})
+        monkeypatch.setattr(book_sync, "get_supabase", lambda: supabase)
+        monkeypatch.setattr(book_sync, "_sync_rpc_available", None)
+        payload = plan_book_sync("book-1", book, remote)["payload"]
+
+        result = book_sync.apply_book_sync(payload)
+
+        assert supabase.rpc_calls == [("apply_book_sync", {"p_payload": payload})]
+        assert result == {"paragraphs_updated": 1, "round_trips": 1}
+
+    def test_empty_payload_is_free(self, uploaded, monkeypatch):
+        book, remote = uploaded
+        supabase = FakeSupabase({})
+        monkeypatch.setattr(book_sync, "get_supabase", lambda: supabase)
+
+        assert book_sync.apply_book_sync(plan_book_sync("book-1", book, remote)["payload"]) == {"round_trips": 0}
+        assert supabase.rpc_calls == [] and supabase.requests == 0
+
+    def test_falls_back_without_rpc(self, uploaded, monkeypatch):
+        book, remote = uploaded
+        book[0]["paragraphs"][1]["text"] = "Edited."
+        supabase = FakeSupabase({}, missing_rpc=True)
+        calls = []
+        monkeypatch.setattr(book_sync, "get_supabase", lambda: supabase)
+        monkeypatch.setattr(book_sync, "_sync_rpc_available", None)
+        monkeypatch.setattr(book_sync, "_apply_sync_rows", lambda payload: calls.append(payload) or {"round_trips": 2})
+        payload = plan_book_sync("book-1", book, remote)["payload"]
+
+        assert book_sync.apply_book_sync(payload) == {"round_trips": 2}
+        assert calls == [payload] and book_sync._sync_rpc_available is False
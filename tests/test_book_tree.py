@@ -0,0 +1,114 @@
+"""
+Unit tests for bulk book_node creation
+Tests: local order_key allocation, explicit mapping keys, level-by-level inserts,
+parent ids resolved before insert, create_nodes_from_mapping round trips
+"""
+
+import pytest
+
+import app.chapters as chapters
+from app.bulk_writer import BulkWriter
+from app.chapters import BookTreeBuilder
+
+
+class FakeSupabase:
+    """Records every insert().execute() as one round trip; only table inserts are supported."""
+
+    def __init__(self):
+        self.calls = []
+
+    def table(self, name):
+        calls = self.calls
+
+        class Query:
+            def insert(self, rows):
+                self.rows = rows
+                return self
+
+            def execute(self):
+                calls.append((name, list(self.rows)))
+                return type("Result", (), {"data": self.rows})()
+        return Query()
+
+
+def inserted(supabase):
+    return [row for _, rows in supabase.calls for row in rows]
+
+
+class TestOrderKeys:
+    """Tests for BookTreeBuilder.add()."""
+
+    def test_keys_match_generate_order_key_for_a_new_book(self):
+        tree = BookTreeBuilder("book-1")
+        part1 = tree.add("part", "Part I", has_content=False)
+        part2 = tree.add("part", "Part II", has_content=False)
+        treatise = tree.add("treatise", "Treatise", parent_id=part1["id"], has_content=False)
+        ch1 = tree.add("chapter", "One", parent_id=treatise["id"])
+        ch2 = tree.add("chapter", "Two", parent_id=treatise["id"])
+        ch3 = tree.add("chapter", "Three", parent_id=part2["id"])
+        preface = tree.add("preface", "Preface")
+
+        assert [n["order_key"] for n in (part1, part2, treatise, ch1, ch2, ch3, preface)] == [
+            "0001", "0002", "0001.0001", "0001.0001.0001", "0001.0001.0002", "0002.0001", "0003",
+        ]
+        assert ch1["parent_id"] == treatise["id"] and ch1["source_title"] == "One"
+
+    def test_explicit_keys_push_later_auto_keys(self):
+        tree = BookTreeBuilder("book-1")
+        tree.add("chapter", "Mapped", order_key="0005")
+
+        assert tree.add("chapter", "Auto")["order_key"] == "0006"
+
+    def test_invalid_node_type(self):
+        with pytest.raises(ValueError, match="Invalid node_type"):
+            BookTreeBuilder("book-1").add("scroll", "Nope")
+
+
+class TestInsert:
+    """Tests for BookTreeBuilder.insert()."""
+
+    def test_one_insert_per_level(self):
+        supabase = FakeSupabase()
+        tree = BookTreeBuilder("book-1")
+        for p in range(3):
+            part = tree.add("part", f"Part {p}", has_content=False)
+            for c in range(40):
+                tree.add("chapter", f"Chapter {p}.{c}", parent_id=part["id"])
+
+        stats = tree.insert(BulkWriter(supabase, chunk_size=500))
+
+        assert stats == {"nodes": 123, "levels": 2, "round_trips": 2}
+        assert [len(rows) for _, rows in supabase.calls] == [3, 120]
+        seen = set()
+        for row in inserted(supabase):
+            assert row["parent_id"] is None or row["parent_id"] in seen
+            seen.add(row["id"])
+
+    def test_large_levels_are_chunked(self):
+        supabase = FakeSupabase()
+        tree = BookTreeBuilder("book-1")
+        for c in range(250):
+            tree.add("chapter", f"Chapter {c}")
+
+        assert tree.insert(BulkWriter(supabase, chunk_size=100))["round_trips"] == 3
+
+
+def test_create_nodes_from_mapping(monkeypatch):
+    from app.pipeline_v3 import create_nodes_from_mapping
+
+    supabase = FakeSupabase()
+    monkeypatch.setattr(chapters, "get_supabase", lambda: supabase)
+    mapping_nodes = [
+        {"order_key": "0002.0001", "parent_order_key": "0002", "node_type": "chapter", "display_title": "Kapitel 1"},
+        {"order_key": "0001", "node_type": "preface", "display_title": "Forord"},
+        {"order_key": "0002", "node_type": "part", "display_title": "Del I", "has_content": False},
+        {"order_key": "0002.0002", "parent_order_key": "0002", "node_type": "chapter", "display_title": "Kapitel 2"},
+    ]
+
+    order_key_to_id = create_nodes_from_mapping("book-1", mapping_nodes)
+
+    assert [[row["order_key"] for row in rows] for _, rows in supabase.calls] == [["0001", "0002"], ["0002.0001", "0002.0002"]]
+    rows = {row["order_key"]: row for row in inserted(supabase)}
+    assert set(order_key_to_id) == set(rows)
+    assert rows["0002.0001"]["parent_id"] == order_key_to_id["0002"] == rows["0002"]["id"]
+    assert rows["0002"]["has_content"] is False and rows["0001"]["parent_id"] is None
@@ -0,0 +1,137 @@
+"""
+Unit tests for bulk Supabase inserts
+Tests: chunking + round-trip counts, stats, group_id foreign keys for a 2,000-segment
+chapter, paragraph spans, one writer shared across chapters
+"""
+
+import pytest
+
+from app.audio_segments import compute_paragraph_spans, generate_paragraph_spans, save_groups_to_supabase
+from app.bulk_writer import BulkWriter
+
+
+class FakeResult:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeTable:
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+        self.rows = None
+
+    def insert(self, rows):
+        self.rows = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def execute(self):
+        self.db.calls.append((self.name, len(self.rows)))
+        self.db.tables.setdefault(self.name, []).extend(self.rows)
+        return FakeResult([dict(row) for row in self.rows])
+
+
+class FakeSupabase:
+    """Records every insert().execute() as one round trip."""
+
+    def __init__(self):
+        self.calls = []
+        self.tables = {}
+
+    def table(self, name):
+        return FakeTable(self, name)
+
+
+def make_groups(segment_count, per_group=10):
+    groups = []
+    for start in range(0, segment_count, per_group):
+        segments = [
+            {"segment_index": i, "text": f"Segment {i}.", "text_normalized": f"Segment {i}.",
+             "duration_ms": 1000, "offset_in_group_ms": (i - start) * 1000}
+            for i in range(start, min(start + per_group, segment_count))
+        ]
+        groups.append({
+            "group_index": len(groups), "audio_url": f"https://cdn/g{len(groups)}.m4a",
+            "duration_ms": len(segments) * 1000, "start_time_ms": start * 1000,
+            "start_segment_index": start, "end_segment_index": segments[-1]["segment_index"],
+            "segments": segments,
+        })
+    return groups
+
+
+class TestBulkWriter:
+    """Tests for BulkWriter.insert() / stats()."""
+
+    def test_chunks_and_counts(self):
+        db = FakeSupabase()
+        writer = BulkWriter(db, chunk_size=100)
+
+        returned = writer.insert("tts_segments", [{"n": i} for i in range(250)])
+
+        assert [n for _, n in db.calls] == [100, 100, 50]
+        assert [row["n"] for row in returned] == list(range(250))
+        stats = writer.stats()
+        assert stats["rows"] == 250 and stats["round_trips"] == 3
+        assert stats["tables"] == {"tts_segments": {"rows": 250, "round_trips": 3}}
+
+    def test_empty_insert_is_free(self):
+        db = FakeSupabase()
+        writer = BulkWriter(db)
+
+        assert writer.insert("audio_groups", []) == []
+        assert db.calls == [] and writer.stats()["rows_per_second"] == 0.0
+
+
+class TestChapterRows:
+    """save_groups_to_supabase() / generate_paragraph_spans() through a writer."""
+
+    def test_2000_segments_in_few_round_trips(self):
+        db = FakeSupabase()
+        writer = BulkWriter(db, chunk_size=500)
+        groups = make_groups(2000)
+        paragraph_id_map = {i: f"para-{i // 4}" for i in range(2000)}
+
+        group_ids = save_groups_to_supabase("ch-1", "build-1", groups, paragraph_id_map, writer=writer)
+
+        assert db.calls == [("audio_groups", 200)] + [("tts_segments", 500)] * 4
+        assert len(set(group_ids)) == 200
+        groups_by_id = {row["id"]: row for row in db.tables["audio_groups"]}
+        for seg in db.tables["tts_segments"]:
+            group = groups_by_id[seg["group_id"]]
+            assert group["start_segment_index"] <= seg["segment_index"] <= group["end_segment_index"]
+            assert seg["paragraph_id"] == f"para-{seg['segment_index'] // 4}"
+            assert seg["build_id"] == "build-1"
+
+    def test_paragraph_spans_in_one_insert(self):
+        db = FakeSupabase()
+        segments = [{"text_normalized": t} for t in ["One two.", "Three four.", "Five six.", "Seven."]]
+        paragraphs = [{"text": "One two. Three four."}, {"text": "Five six."}, {"text": "Seven."}]
+
+        span_ids = generate_paragraph_spans("ch-1", "build-1", paragraphs, segments, writer=BulkWriter(db))
+
+        assert db.calls == [("paragraph_spans", 3)]
+        assert [(r["paragraph_index"], r["start_segment_index"], r["end_segment_index"])
+                for r in db.tables["paragraph_spans"]] == [(0, 0, 1), (1, 2, 2), (2, 3, 3)]
+        assert span_ids == [r["id"] for r in db.tables["paragraph_spans"]]
+
+    def test_spans_stay_in_range_when_segments_run_out(self):
+        segments = [{"text_normalized": "Only one segment here."}]
+        paragraphs = [{"text": "Only one segment here."}, {"text": "A paragraph without audio."}]
+
+        spans = compute_paragraph_spans(paragraphs, segments)
+
+        assert len(spans) == len(paragraphs)
+        assert all(0 <= start <= end < len(segments) for start, end in spans)
+        assert compute_paragraph_spans([], segments) == []
+
+    def test_writer_shared_across_chapters(self):
+        db = FakeSupabase()
+        writer = BulkWriter(db, chunk_size=500)
+
+        for ch in range(3):
+            save_groups_to_supabase(f"ch-{ch}", f"build-{ch}", make_groups(30), {}, writer=writer)
+
+        stats = writer.stats()
+        assert stats["round_trips"] == 6
+        assert stats["tables"]["audio_groups"] == {"rows": 9, "round_trips": 3}
+        assert stats["tables"]["tts_segments"] == {"rows": 90, "round_trips": 3}
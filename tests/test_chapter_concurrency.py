@@ -0,0 +1,157 @@
+"""
+Unit tests for concurrent chapter processing in v3_process_chapters
+Tests: results land at their chapter position, per-chapter journal saves, error
+isolation, per-worker Gemini refresh, already processed chapters are skipped,
+metadata/cover art written while chapters are processed is kept, metadata/cover art
+SDK calls run off the event loop
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+import app.glm_processor as glm_module
+import app.metadata as metadata_module
+import app.pipeline_v3 as pipeline
+from app.job_store import JobStore
+
+
+@pytest.fixture
+def job(monkeypatch):
+    state = {
+        "phase": "metadata_extracted",
+        "progress": {},
+        "chapters": [{"title": f"Kapitel {i + 1}", "raw_content": f"Text {i}"} for i in range(8)],
+    }
+    state["chapters"][1].update(processed=True, paragraphs=[{"text": "done"}], sections=[{"text": "done"}])
+    saves = []
+    refreshes = []
+    lock = threading.Lock()
+
+    def process_full_chapter(chapter_title, chapter_text):
+        index = int(chapter_text.split()[1])
+        time.sleep(0.01 * (8 - index))  # later chapters finish first
+        if index == 5:
+            raise RuntimeError("Gemini refused")
+        return {"paragraphs": [{"text": chapter_text}], "sections": [{"text": chapter_title}]}
+
+    def save(job_id, state, chapters=None, header_fields=None):
+        with lock:
+            saves.append(list(chapters) if chapters is not None else None)
+
+    monkeypatch.setattr(pipeline, "BATCH_SIZE", 2)
+    monkeypatch.setattr(pipeline, "get_v3_job_state", lambda job_id, include_chapters=True: state)
+    monkeypatch.setattr(pipeline, "save_v3_job_state", save)
+    monkeypatch.setattr(pipeline, "process_full_chapter", process_full_chapter)
+    monkeypatch.setattr(pipeline, "configure_gemini", lambda: refreshes.append(threading.current_thread()))
+    monkeypatch.setattr(glm_module, "_gemini_configured", True)
+    return state, saves, refreshes
+
+
+def test_results_land_at_their_chapter(job):
+    state, saves, refreshes = job
+
+    result = asyncio.run(pipeline.v3_process_chapters("job-1", concurrency=3))
+
+    chapters = state["chapters"]
+    assert result == {"success": True, "processed": 7, "total": 8}
+    assert state["phase"] == "chapters_processed"
+    for i, chapter in enumerate(chapters):
+        if i == 1:
+            assert chapter["paragraphs"] == [{"text": "done"}]
+        elif i != 5:
+            assert chapter["processed"] and chapter["paragraphs"] == [{"text": f"Text {i}"}]
+            assert chapter["sections"] == [{"text": f"Kapitel {i + 1}"}]
+
+
+def test_each_chapter_is_journaled_once(job):
+    state, saves, refreshes = job
+
+    asyncio.run(pipeline.v3_process_chapters("job-1", concurrency=3))
+
+    chapter_saves = sorted(c[0] for c in saves if c)
+    assert chapter_saves == [0, 2, 3, 4, 5, 6, 7]
+
+
+def test_failed_chapter_does_not_stop_the_others(job):
+    state, saves, refreshes = job
+
+    asyncio.run(pipeline.v3_process_chapters("job-1", concurrency=3))
+
+    failed = state["chapters"][5]
+    assert failed["error"] == "Gemini refused" and not failed.get("processed")
+    assert all(ch.get("processed") for i, ch in enumerate(state["chapters"]) if i != 5)
+
+
+def test_refresh_is_per_worker(job):
+    state, saves, refreshes = job
+
+    asyncio.run(pipeline.v3_process_chapters("job-1", concurrency=1))
+
+    # One worker, 7 chapters, refresh before its 3rd, 5th and 7th chapter
+    assert len(refreshes) == 3
+    assert threading.main_thread() not in refreshes
+    assert glm_module._gemini_configured is True
+
+
+def test_metadata_written_during_processing_is_kept(tmp_path, monkeypatch):
+    store = JobStore(str(tmp_path))
+    store.save("job-1", {
+        "job_id": "job-1",
+        "phase": "extracted",
+        "metadata": {"title": "T"},
+        "cover_urls": {},
+        "progress": {},
+        "chapters": [{"title": f"Kapitel {i + 1}", "raw_content": f"Text {i}"} for i in range(6)],
+    })
+
+    def process_full_chapter(chapter_title, chapter_text):
+        time.sleep(0.05)
+        return {"paragraphs": [{"text": chapter_text}], "sections": [{"text": chapter_text}]}
+
+    def cover(metadata, upload=True):
+        time.sleep(0.08)  # finishes while chapters are still being processed
+        return {"cover_art_url": "https://cover", "cover_art_url_16x9": "https://cover-wide"}
+
+    monkeypatch.setattr(pipeline, "_job_store", store)
+    monkeypatch.setattr(pipeline, "process_full_chapter", process_full_chapter)
+    monkeypatch.setattr(pipeline, "generate_cover_image", cover)
+    monkeypatch.setattr(pipeline, "extract_metadata_with_gemini", lambda title: {"author": "A. Author"})
+    monkeypatch.setattr(metadata_module, "generate_synopsis_and_category",
+                        lambda text: {"synopsis": "S", "book_of_the_day_quote": "Q"})
+    monkeypatch.setattr(pipeline.Config, "V3_CHAPTER_CONCURRENCY", 2)
+
+    result = asyncio.run(pipeline.run_v3_pipeline("job-1"))
+
+    state = store.load("job-1")
+    assert state["phase"] == "complete" and all(ch["processed"] for ch in state["chapters"])
+    assert state["metadata"] == {"title": "T", "author": "A. Author", "synopsis": "S", "book_of_the_day_quote": "Q",
+                                 "cover_art_url": "https://cover", "cover_art_url_16x9": "https://cover-wide"}
+    assert state["cover_urls"]["cover_art_url"] == "https://cover"
+    assert state["progress"]["processed_chapters"] == 6
+    assert result["metadata"] == state["metadata"]
+
+
+def test_metadata_and_cover_calls_run_off_the_event_loop(tmp_path, monkeypatch):
+    store = JobStore(str(tmp_path))
+    store.save("job-1", {"job_id": "job-1", "phase": "extracted", "metadata": {"title": "T"}, "cover_urls": {},
+                         "progress": {}, "chapters": [{"title": "Kapitel 1", "raw_content": "Text 0"}]})
+    threads = {}
+
+    def record(name, result):
+        def call(*args, **kwargs):
+            threads[name] = threading.current_thread()
+            return result
+        return call
+
+    monkeypatch.setattr(pipeline, "_job_store", store)
+    monkeypatch.setattr(pipeline, "generate_cover_image", record("cover", None))
+    monkeypatch.setattr(pipeline, "extract_metadata_with_gemini", record("metadata", {}))
+    monkeypatch.setattr(metadata_module, "generate_synopsis_and_category", record("synopsis", {}))
+
+    asyncio.run(pipeline.v3_generate_metadata_and_cover("job-1"))
+
+    assert set(threads) == {"cover", "metadata", "synopsis"}
+    assert threading.main_thread() not in threads.values()
@@ -0,0 +1,184 @@
+"""
+Unit tests for the single-pass chapter encoder in audio_segments
+Tests: sample layout, ffmpeg command, exact group cuts, fallback errors
+"""
+
+import json
+import os
+import stat
+import sys
+import wave
+
+import pytest
+from app import audio_segments
+from app.audio_segments import (
+    ChapterEncodeError,
+    build_chapter_encode_command,
+    encode_chapter_groups,
+    plan_chapter_encode,
+)
+
+RATE = 24000
+
+# Stand-in for ffmpeg: reads raw PCM from stdin and writes each output as a WAV
+# holding exactly the samples its atrim filter selects.
+FAKE_FFMPEG = r'''#!{python}
+import json, re, sys, wave
+args = sys.argv[1:]
+pcm = sys.stdin.buffer.read()
+rate, channels = int(args[args.index("-ar") + 1]), int(args[args.index("-ac") + 1])
+trims = re.findall(r"atrim=start_sample=(\d+):end_sample=(\d+)", args[args.index("-filter_complex") + 1])
+outputs = [args[i + 1] for i, a in enumerate(args) if a == "+faststart"]
+with open({log!r}, "a") as f:
+    f.write(json.dumps({{"args": args, "stdin_bytes": len(pcm)}}) + "\n")
+if {fail}:
+    sys.stderr.write("Encoder exploded")
+    sys.exit(1)
+frame = 2 * channels
+for (start, end), path in zip(trims, outputs):
+    with wave.open(path, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(pcm[int(start) * frame:int(end) * frame])
+'''
+
+
+def write_wav(path, frames, value=0, rate=RATE, channels=1):
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(value.to_bytes(2, "little", signed=True) * frames * channels)
+    return str(path)
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path, monkeypatch):
+    def install(fail=False):
+        bin_dir = tmp_path / "bin"
+        bin_dir.mkdir(exist_ok=True)
+        log = tmp_path / "ffmpeg_calls.jsonl"
+        script = bin_dir / "ffmpeg"
+        script.write_text(FAKE_FFMPEG.format(python=sys.executable, log=str(log), fail=fail))
+        script.chmod(script.stat().st_mode | stat.S_IEXEC)
+        monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+        return log
+    return install
+
+
+@pytest.fixture
+def chapter(tmp_path):
+    """Two groups; segment lengths chosen so ms rounding would drift."""
+    frames = [[24001, 36000, 12011], [48007, 1]]
+    groups, value = [], 1
+    for g, lengths in enumerate(frames):
+        segments = []
+        for length in lengths:
+            path = write_wav(tmp_path / f"seg_{value}.wav", length, value=value)
+            segments.append({"segment_index": value - 1, "audio_path": path, "duration_ms": 5000})
+            value += 1
+        groups.append({"group_index": g, "segments": segments})
+    return groups, frames
+
+
+class TestPlan:
+    """Tests for the sample layout."""
+
+    def test_offsets_in_samples(self, chapter):
+        groups, frames = chapter
+        plan = plan_chapter_encode(groups)
+
+        assert plan["params"] == (1, 2, RATE)
+        assert [g["sample_count"] for g in plan["groups"]] == [sum(f) for f in frames]
+        assert plan["groups"][1]["start_sample"] == sum(frames[0])
+        assert [start for _, start, _ in plan["groups"][0]["segments"]] == [0, 24001, 60001]
+
+    def test_mismatched_format_is_rejected(self, chapter, tmp_path):
+        groups, _ = chapter
+        groups[1]["segments"][0]["audio_path"] = write_wav(tmp_path / "stereo.wav", 100, channels=2)
+        with pytest.raises(ChapterEncodeError, match="differs"):
+            plan_chapter_encode(groups)
+
+    def test_non_wav_is_rejected(self, chapter, tmp_path):
+        groups, _ = chapter
+        bogus = tmp_path / "seg.m4a"
+        bogus.write_bytes(b"\x00\x00\x00\x18ftypM4A ")
+        groups[0]["segments"][1]["audio_path"] = str(bogus)
+        with pytest.raises(ChapterEncodeError):
+            plan_chapter_encode(groups)
+
+    def test_command_is_one_process_with_one_output_per_group(self, chapter):
+        groups, frames = chapter
+        cmd = build_chapter_encode_command(plan_chapter_encode(groups), ["a.m4a", "b.m4a"])
+
+        assert cmd.count("-i") == 1 and "pipe:0" in cmd
+        graph = cmd[cmd.index("-filter_complex") + 1]
+        assert "asplit=2" in graph
+        end = sum(frames[0])
+        assert f"atrim=start_sample=0:end_sample={end}" in graph
+        assert f"atrim=start_sample={end}:end_sample={end + sum(frames[1])}" in graph
+        assert cmd[-1] == "b.m4a"
+
+
+class TestEncode:
+    """Tests for the encoder process (against a fake ffmpeg)."""
+
+    def test_groups_cut_at_exact_samples(self, chapter, fake_ffmpeg, tmp_path, monkeypatch):
+        monkeypatch.setattr(audio_segments, "KEEP_SEGMENT_AUDIO", True)
+        log = fake_ffmpeg()
+        groups, frames = chapter
+
+        results = encode_chapter_groups(groups, str(tmp_path))
+
+        calls = [json.loads(line) for line in open(log)]
+        assert len(calls) == 1
+        assert calls[0]["stdin_bytes"] == 2 * sum(map(sum, frames))
+
+        value = 1
+        for group, lengths in zip(groups, frames):
+            with wave.open(group["local_audio_path"]) as w:
+                assert w.getnframes() == sum(lengths)
+                pcm = w.readframes(w.getnframes())
+            # Every sample belongs to the right segment: no drift at the cuts
+            expected = b"".join(
+                (value + k).to_bytes(2, "little", signed=True) * n for k, n in enumerate(lengths)
+            )
+            assert pcm == expected
+            value += len(lengths)
+
+        assert [r["duration_ms"] for r in results] == [int(sum(f) * 1000 / RATE) for f in frames]
+        assert groups[1]["start_time_ms"] == int(sum(frames[0]) * 1000 / RATE)
+        assert [s["offset_in_group_ms"] for s in groups[0]["segments"]] == [0, 1000, 2500]
+        assert groups[0]["segments"][0]["duration_ms"] == 1000
+
+    def test_segment_audio_deleted_after_encode(self, chapter, fake_ffmpeg, tmp_path, monkeypatch):
+        monkeypatch.setattr(audio_segments, "KEEP_SEGMENT_AUDIO", False)
+        fake_ffmpeg()
+        groups, _ = chapter
+
+        encode_chapter_groups(groups, str(tmp_path))
+
+        assert not any(os.path.exists(s["audio_path"]) for g in groups for s in g["segments"])
+
+    def test_failed_segment_takes_no_time(self, chapter, fake_ffmpeg, tmp_path):
+        fake_ffmpeg()
+        groups, frames = chapter
+        groups[0]["segments"].insert(1, {"segment_index": 99, "duration_ms": 5000})
+
+        encode_chapter_groups(groups, str(tmp_path))
+
+        failed = groups[0]["segments"][1]
+        assert failed["duration_ms"] == 0
+        assert failed["offset_in_group_ms"] == groups[0]["segments"][2]["offset_in_group_ms"]
+
+    def test_ffmpeg_failure_keeps_segments_for_fallback(self, chapter, fake_ffmpeg, tmp_path, monkeypatch):
+        monkeypatch.setattr(audio_segments, "KEEP_SEGMENT_AUDIO", False)
+        fake_ffmpeg(fail=True)
+        groups, _ = chapter
+
+        with pytest.raises(ChapterEncodeError, match="Encoder exploded"):
+            encode_chapter_groups(groups, str(tmp_path))
+
+        assert all(os.path.exists(s["audio_path"]) for g in groups for s in g["segments"])
+        assert not [n for n in os.listdir(tmp_path) if n.endswith(".m4a")]
@@ -0,0 +1,249 @@
+"""
+Unit tests for the one-transaction chapter upload
+Tests: payload ids and link rows, one RPC call per chapter, fallback when the RPC
+is not deployed (with and without content_hash columns), bounded concurrency across chapters,
+transient-error retries, committed ids kept when an upload fails
+"""
+
+import asyncio
+import copy
+import threading
+import time
+
+import pytest
+
+import app.chapters as chapters
+from app.config import Config
+
+
+class FakeQuery:
+    def __init__(self, run):
+        self.run = run
+
+    def execute(self):
+        return self.run()
+
+
+class FakeSupabase:
+    """Counts rpc() calls and table inserts; `missing_rpc` makes the RPC fail like PostgREST does."""
+
+    def __init__(self, missing_rpc=False, missing_columns=(), delay=0.0, timeouts=0):
+        self.missing_rpc = missing_rpc
+        self.timeouts = timeouts
+        self.missing_columns = missing_columns
+        self.delay = delay
+        self.rpc_calls = []
+        self.inserts = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def rpc(self, name, params):
+        def run():
+            if self.missing_rpc:
+                raise Exception("{'code': 'PGRST202', 'message': 'Could not find the function public.ingest_chapter'}")
+            with self._lock:
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            time.sleep(self.delay)
+            with self._lock:
+                self.in_flight -= 1
+                self.rpc_calls.append((name, params))
+                timed_out = self.timeouts > 0
+                self.timeouts -= 1
+            if timed_out:
+                raise Exception("The read operation timed out")
+            payload = params["p_payload"]
+            if payload["chapter"]["title"] == "Broken":
+                raise Exception("violates foreign key constraint")
+            return type("Result", (), {"data": {
+                "chapter_id": payload["chapter"]["id"], "existing": False,
+                "paragraphs": len(payload["paragraphs"]), "tts_chunks": len(payload["tts_chunks"]),
+            }})()
+        return FakeQuery(run)
+
+    def table(self, name):
+        supabase = self
+
+        class Table:
+            def insert(self, rows):
+                def run():
+                    for column in supabase.missing_columns:
+                        if any(column in row for row in rows):
+                            raise Exception(f"{{'code': 'PGRST204', 'message': \"Could not find the '{column}' "
+                                            f"column of '{name}' in the schema cache\"}}")
+                    supabase.inserts.append((name, list(rows)))
+                    return type("Result", (), {"data": rows})()
+                return FakeQuery(run)
+        return Table()
+
+
+@pytest.fixture
+def fake_supabase(monkeypatch):
+    def install(**kwargs):
+        supabase = FakeSupabase(**kwargs)
+        monkeypatch.setattr(chapters, "get_supabase", lambda: supabase)
+        monkeypatch.setattr(chapters, "_ingest_rpc_available", None)
+        monkeypatch.setattr(chapters, "_content_hash_columns", None)
+        return supabase
+    return install
+
+
+def make_chapter(index=0, title="Kapitel 1", paragraphs=3, sections=7):
+    return {
+        "index": index,
+        "title": title,
+        "raw_content": "Raw text.",
+        "paragraphs": [{"text": title}] + [{"text": f"Paragraph {i}."} for i in range(paragraphs - 1)] + [{"text": ""}],
+        "sections": [{"text": f"Section number {i} has enough words."} for i in range(sections)],
+    }
+
+
+class TestPayload:
+    """Tests for build_chapter_payload()."""
+
+    def test_rows_reference_client_ids(self):
+        chapter = make_chapter()
+
+        payload = chapters.build_chapter_payload("book-1", chapter, "node-1")
+
+        paragraph_ids = [p["id"] for p in payload["paragraphs"]]
+        chunk_ids = {c["id"] for c in payload["tts_chunks"]}
+        assert payload["chapter"]["node_id"] == "node-1" and payload["chapter"]["book_id"] == "book-1"
+        assert [p["paragraph_index"] for p in payload["paragraphs"]] == [0, 1, 2]
+        assert [l["paragraph_id"] for l in payload["node_paragraphs"]] == paragraph_ids
+        assert [p.get("db_paragraph_id") for p in chapter["paragraphs"]] == paragraph_ids + [None]
+        assert {l["tts_chunk_id"] for l in payload["paragraph_tts_chunks"]} <= chunk_ids
+        assert {l["paragraph_id"] for l in payload["paragraph_tts_chunks"]} <= set(paragraph_ids)
+
+    def test_chunks_spread_like_the_old_loop(self):
+        payload = chapters.build_chapter_payload("book-1", make_chapter(paragraphs=3, sections=7), "node-1")
+
+        per_paragraph = {}
+        for link in payload["paragraph_tts_chunks"]:
+            per_paragraph.setdefault(link["paragraph_id"], []).append(link["position_in_paragraph"])
+        assert list(per_paragraph.values()) == [[0, 1], [0, 1], [0, 1]]  # 7 // 3 each, remainder unlinked
+
+
+class TestIngest:
+    """Tests for ingest_chapter()."""
+
+    def test_one_rpc_call_per_chapter(self, fake_supabase):
+        supabase = fake_supabase()
+        payload = chapters.build_chapter_payload("book-1", make_chapter(), "node-1")
+
+        result = chapters.ingest_chapter(payload)
+
+        assert len(supabase.rpc_calls) == 1 and supabase.inserts == []
+        assert supabase.rpc_calls[0] == ("ingest_chapter", {"p_payload": payload})
+        assert result["paragraphs"] == 3 and result["tts_chunks"] == 7 and result["round_trips"] == 1
+
+    def test_falls_back_to_bulk_inserts_without_rpc(self, fake_supabase):
+        supabase = fake_supabase(missing_rpc=True)
+        payload = chapters.build_chapter_payload("book-1", make_chapter(), "node-1")
+
+        result = chapters.ingest_chapter(payload)
+        chapters.ingest_chapter(chapters.build_chapter_payload("book-1", make_chapter(1), "node-2"))
+
+        tables = [name for name, _ in supabase.inserts]
+        assert tables[:5] == ["chapters", "paragraphs", "tts_chunks", "book_node_paragraphs", "paragraph_tts_chunks"]
+        assert all(row["chapter_id"] == payload["chapter"]["id"] for row in supabase.inserts[1][1])
+        assert result["round_trips"] == 5 and result["paragraphs"] == 3
+        assert chapters._ingest_rpc_available is False
+
+    def test_fallback_without_content_hash_columns(self, fake_supabase):
+        supabase = fake_supabase(missing_rpc=True, missing_columns=("content_hash",))
+
+        first = chapters.ingest_chapter(chapters.build_chapter_payload("book-1", make_chapter(), "node-1"))
+        chapters.ingest_chapter(chapters.build_chapter_payload("book-1", make_chapter(1), "node-2"))
+
+        tables = [name for name, _ in supabase.inserts]
+        assert tables == ["chapters", "paragraphs", "tts_chunks", "book_node_paragraphs", "paragraph_tts_chunks"] * 2
+        assert not any("content_hash" in row for _, rows in supabase.inserts for row in rows)
+        assert first["paragraphs"] == 3 and chapters._content_hash_columns is False
+
+    def test_fallback_keeps_content_hash_when_columns_exist(self, fake_supabase):
+        supabase = fake_supabase(missing_rpc=True)
+
+        chapters.ingest_chapter(chapters.build_chapter_payload("book-1", make_chapter(), "node-1"))
+
+        assert all("content_hash" in row for name, rows in supabase.inserts[:3] for row in rows)
+
+    def test_other_errors_are_raised(self, fake_supabase):
+        fake_supabase()
+        with pytest.raises(Exception, match="foreign key"):
+            chapters.ingest_chapter(chapters.build_chapter_payload("book-1", make_chapter(title="Broken"), "n"))
+
+
+class TestConcurrency:
+    """_ingest_chapters() across chapters."""
+
+    def test_bounded_concurrency_and_totals(self, fake_supabase, monkeypatch):
+        from app.pipeline_v3 import _ingest_chapters
+
+        supabase = fake_supabase(delay=0.05)
+        monkeypatch.setattr(Config, "V3_UPLOAD_CONCURRENCY", 3)
+        payloads = [chapters.build_chapter_payload("book-1", make_chapter(i), f"node-{i}") for i in range(8)]
+
+        stats = asyncio.run(_ingest_chapters(payloads))
+
+        assert supabase.max_in_flight <= 3 and len(supabase.rpc_calls) == 8
+        assert stats["chapters"] == 8 and stats["round_trips"] == 8
+        assert stats["paragraphs"] == 24 and stats["tts_chunks"] == 56
+
+    def test_every_chapter_attempted_before_raising(self, fake_supabase, monkeypatch):
+        from app.pipeline_v3 import _ingest_chapters
+
+        supabase = fake_supabase()
+        monkeypatch.setattr(Config, "V3_UPLOAD_CONCURRENCY", 2)
+        payloads = [chapters.build_chapter_payload("book-1", make_chapter(i, title=t), f"node-{i}")
+                    for i, t in enumerate(["A", "Broken", "C", "D"])]
+
+        with pytest.raises(Exception, match="foreign key"):
+            asyncio.run(_ingest_chapters(payloads))
+        assert len(supabase.rpc_calls) == 4
+
+    def test_transient_errors_are_retried_with_the_same_payload(self, fake_supabase, monkeypatch):
+        import app.pipeline_v3 as pipeline
+
+        supabase = fake_supabase(timeouts=2)
+        monkeypatch.setattr(pipeline, "INGEST_RETRY_DELAY", 0)
+        payload = chapters.build_chapter_payload("book-1", make_chapter(), "node-1")
+
+        stats = asyncio.run(pipeline._ingest_chapters([payload]))
+
+        assert stats["chapters"] == 1 and len(supabase.rpc_calls) == 3
+        assert all(params["p_payload"] is payload for _, params in supabase.rpc_calls)
+
+    def test_error_names_committed_chapters(self, fake_supabase, monkeypatch):
+        import app.pipeline_v3 as pipeline
+
+        fake_supabase()
+        payloads = [chapters.build_chapter_payload("book-1", make_chapter(i, title=t), f"node-{i}")
+                    for i, t in enumerate(["A", "Broken", "C"])]
+
+        with pytest.raises(pipeline.ChapterIngestError) as error:
+            asyncio.run(pipeline._ingest_chapters(payloads))
+
+        assert error.value.ingested_chapter_ids == [payloads[0]["chapter"]["id"], payloads[2]["chapter"]["id"]]
+        assert error.value.failed_chapter_ids == [payloads[1]["chapter"]["id"]]
+
+
+def test_failed_upload_keeps_book_and_committed_chapter_ids(fake_supabase, monkeypatch):
+    import app.pipeline_v3 as pipeline
+
+    fake_supabase()
+    state = {"phase": "complete", "metadata": {"title": "T"},
+             "chapters": [make_chapter(i, title=t) for i, t in enumerate(["A", "Broken", "C"])]}
+    saved = []
+    monkeypatch.setattr(pipeline, "get_v3_job_state", lambda job_id, include_chapters=True: state)
+    monkeypatch.setattr(pipeline, "save_v3_job_state", lambda job_id, s, **kwargs: saved.append(copy.deepcopy(s)))
+    monkeypatch.setattr(chapters, "create_book_in_supabase", lambda metadata: "book-1")
+    monkeypatch.setattr(chapters.BookTreeBuilder, "insert", lambda self: None)
+
+    with pytest.raises(Exception, match="foreign key"):
+        asyncio.run(pipeline.v3_upload_to_supabase("job-1"))
+
+    final = saved[-1]
+    assert final["phase"] == "upload_error" and final["book_id"] == "book-1"
+    assert [bool(ch.get("db_chapter_id")) for ch in final["chapters"]] == [True, False, True]
@@ -0,0 +1,71 @@
+"""
+Unit tests for executors module
+Tests: thread/process dispatch, queue-depth metrics, failure accounting
+"""
+
+import asyncio
+import math
+import threading
+import time
+
+import pytest
+from app import executors
+from app.config import Config
+
+
+@pytest.fixture(autouse=True)
+def fresh_pools(monkeypatch):
+    monkeypatch.setattr(Config, "EXECUTOR_IO_WORKERS", 2)
+    monkeypatch.setattr(Config, "EXECUTOR_CPU_WORKERS", 1)
+    executors.shutdown_executors()
+    yield
+    executors.shutdown_executors()
+
+
+class TestRunIO:
+    """Tests for the shared thread pool."""
+
+    def test_runs_off_event_loop_thread(self):
+        async def main():
+            loop_thread = threading.get_ident()
+            worker_thread = await executors.run_io(threading.get_ident)
+            return loop_thread, worker_thread
+
+        loop_thread, worker_thread = asyncio.run(main())
+        assert loop_thread != worker_thread
+
+    def test_passes_kwargs(self):
+        async def main():
+            return await executors.run_io(sorted, [3, 1, 2], reverse=True)
+
+        assert asyncio.run(main()) == [3, 2, 1]
+
+    def test_queue_depth_metrics(self):
+        async def main():
+            await asyncio.gather(*(executors.run_io(time.sleep, 0.05) for _ in range(5)))
+
+        asyncio.run(main())
+        stats = executors.get_executor_stats()["io"]
+        assert stats["submitted"] == 5
+        assert stats["completed"] == 5
+        assert stats["in_flight"] == 0
+        assert stats["max_queue_depth"] == 3
+
+    def test_failures_are_counted_and_raised(self):
+        async def main():
+            await executors.run_io(int, "not a number")
+
+        with pytest.raises(ValueError):
+            asyncio.run(main())
+        assert executors.get_executor_stats()["io"]["failed"] == 1
+
+
+class TestRunCPU:
+    """Tests for the shared process pool."""
+
+    def test_runs_in_process_pool(self):
+        async def main():
+            return await executors.run_cpu(math.factorial, 20)
+
+        assert asyncio.run(main()) == math.factorial(20)
+        assert executors.get_executor_stats()["cpu"]["completed"] == 1
@@ -0,0 +1,147 @@
+"""
+Unit tests for gemini_scheduler module
+Tests: token buckets, priority admission, 429 handling, queue-wait metrics
+"""
+
+import threading
+import time
+
+import pytest
+from app.config import Config
+from app.gemini_scheduler import (
+    BATCH,
+    INTERACTIVE,
+    GeminiScheduler,
+    RateLimitError,
+    TokenBucket,
+    gemini_priority,
+    is_rate_limit_error,
+    parse_rate_limits,
+)
+
+
+class QuotaError(Exception):
+    code = 429
+
+
+class TestTokenBucket:
+    """Tests for the bucket arithmetic."""
+
+    def test_full_bucket_admits_immediately(self):
+        bucket = TokenBucket(60)
+        assert bucket.wait_time(10, time.monotonic()) == 0.0
+
+    def test_wait_time_after_draining(self):
+        bucket = TokenBucket(60)  # 1 token per second
+        now = time.monotonic()
+        bucket.wait_time(0, now)
+        bucket.take(60)
+        assert bucket.wait_time(2, now) == pytest.approx(2.0)
+
+    def test_oversized_request_waits_for_full_bucket_only(self):
+        bucket = TokenBucket(60)
+        assert bucket.wait_time(10_000, time.monotonic()) == 0.0
+
+
+class TestScheduler:
+    """Tests for admission, priorities and rate-limit retries."""
+
+    def test_requests_per_minute_limit(self):
+        scheduler = GeminiScheduler(default_rpm=600, default_tpm=0)  # 10 requests/s
+        scheduler.queue("m").requests.tokens = 0
+
+        start = time.monotonic()
+        for _ in range(3):
+            scheduler.run("m", lambda: None)
+        assert time.monotonic() - start >= 0.25
+
+    def test_tokens_per_minute_limit(self):
+        scheduler = GeminiScheduler(default_rpm=0, default_tpm=60_000)  # 1000 tokens/s
+        scheduler.queue("m").tokens.tokens = 0
+
+        start = time.monotonic()
+        scheduler.run("m", lambda: None, prompt="x" * 800)  # ~200 tokens
+        assert time.monotonic() - start >= 0.15
+
+    def test_interactive_overtakes_queued_batch(self):
+        scheduler = GeminiScheduler(default_rpm=600, default_tpm=0)
+        queue = scheduler.queue("m")
+        queue.requests.tokens = -1  # nothing admitted for ~0.2s
+        order = []
+
+        def submit(name, priority):
+            scheduler.run("m", lambda: order.append(name), priority=priority)
+
+        threads = [threading.Thread(target=submit, args=(f"batch{i}", BATCH)) for i in range(3)]
+        for t in threads:
+            t.start()
+        time.sleep(0.05)
+        interactive = threading.Thread(target=submit, args=("interactive", INTERACTIVE))
+        interactive.start()
+        for t in threads + [interactive]:
+            t.join()
+
+        assert order[0] == "interactive"
+        stats = scheduler.stats()["m"]["priorities"]
+        assert stats["batch"]["requests"] == 3
+        assert stats["interactive"]["requests"] == 1
+        assert stats["batch"]["max_wait_ms"] > stats["interactive"]["avg_wait_ms"] > 0
+
+    def test_priority_context(self):
+        scheduler = GeminiScheduler(default_rpm=0, default_tpm=0)
+        with gemini_priority(INTERACTIVE):
+            scheduler.run("m", lambda: None)
+        scheduler.run("m", lambda: None)
+        stats = scheduler.stats()["m"]["priorities"]
+        assert stats["interactive"]["requests"] == 1
+        assert stats["batch"]["requests"] == 1
+
+    def test_rate_limit_pauses_and_retries(self):
+        scheduler = GeminiScheduler(default_rpm=0, default_tpm=0)
+        calls = []
+
+        def call():
+            calls.append(time.monotonic())
+            if len(calls) == 1:
+                raise QuotaError("429 Resource has been exhausted. Please retry in 0.2s")
+            return "ok"
+
+        assert scheduler.run("m", call) == "ok"
+        assert calls[1] - calls[0] >= 0.19
+        assert scheduler.stats()["m"]["rate_limited"] == 1
+
+    def test_rate_limit_gives_up(self, monkeypatch):
+        monkeypatch.setattr(Config, "GEMINI_RETRY_DELAY", 0)
+        scheduler = GeminiScheduler(default_rpm=0, default_tpm=0)
+
+        def call():
+            raise QuotaError("quota")
+
+        with pytest.raises(RateLimitError):
+            scheduler.run("m", call, max_retries=2)
+        assert scheduler.stats()["m"]["rate_limited"] == 3
+
+    def test_other_errors_are_not_retried(self):
+        scheduler = GeminiScheduler(default_rpm=0, default_tpm=0)
+        calls = []
+
+        def call():
+            calls.append(1)
+            raise ValueError("bad prompt")
+
+        with pytest.raises(ValueError):
+            scheduler.run("m", call)
+        assert len(calls) == 1
+
+    def test_per_model_overrides(self):
+        scheduler = GeminiScheduler(1000, 1_000_000, parse_rate_limits("imagen=10:0, other=5:100"))
+        assert scheduler.queue("imagen").requests.capacity == 10
+        assert scheduler.queue("imagen").tokens is None
+        assert scheduler.queue("other").tokens.capacity == 100
+        assert scheduler.queue("gemini").requests.capacity == 1000
+
+
+def test_is_rate_limit_error():
+    assert is_rate_limit_error(QuotaError("x"))
+    assert is_rate_limit_error(Exception("429 RESOURCE_EXHAUSTED"))
+    assert not is_rate_limit_error(ValueError("invalid argument"))
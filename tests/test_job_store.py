@@ -0,0 +1,173 @@
+"""
+Unit tests for job_store module
+Tests: journaled saves, compaction, lazy chapter loading, legacy job files,
+saves that only own some header fields
+"""
+
+import json
+import os
+
+import pytest
+from app.job_store import JobStore
+
+
+def make_state(phase="extracted", chapters=3):
+    return {
+        "job_id": "job-1",
+        "phase": phase,
+        "metadata": {"title": "Test Book"},
+        "progress": {"processed_chapters": 0},
+        "chapters": [
+            {"title": f"Chapter {i}", "raw_content": f"Text {i}", "processed": False}
+            for i in range(chapters)
+        ],
+    }
+
+
+def journal_lines(store, job_id="job-1"):
+    with open(store.journal_path(job_id), encoding="utf-8") as f:
+        return f.readlines()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path))
+
+
+class TestJournaledSaves:
+    """Tests for header + journal persistence."""
+
+    def test_roundtrip(self, store):
+        state = make_state()
+        store.save("job-1", state)
+        loaded = store.load("job-1")
+        assert loaded["chapters"] == state["chapters"]
+        assert loaded["metadata"] == state["metadata"]
+        assert loaded["chapter_count"] == 3
+
+    def test_header_has_no_chapters(self, store):
+        store.save("job-1", make_state())
+        with open(store.header_path("job-1"), encoding="utf-8") as f:
+            header = json.load(f)
+        assert "chapters" not in header
+
+    def test_explicit_chapter_save_appends_one_record(self, store):
+        state = make_state()
+        store.save("job-1", state)
+        state["chapters"][1]["processed"] = True
+        store.save("job-1", state, chapters=[1])
+        assert len(journal_lines(store)) == 4
+        assert store.load("job-1")["chapters"][1]["processed"] is True
+
+    def test_progress_tick_appends_nothing(self, store):
+        state = make_state()
+        store.save("job-1", state)
+        state["progress"]["processed_chapters"] = 2
+        store.save("job-1", state, chapters=[])
+        assert len(journal_lines(store)) == 3
+        assert store.load("job-1", include_chapters=False)["progress"]["processed_chapters"] == 2
+
+    def test_implicit_save_appends_only_changed(self, store):
+        state = make_state()
+        store.save("job-1", state)
+        state["chapters"][2]["paragraphs"] = [{"id": "p0", "text": "Chapter 2"}]
+        store.save("job-1", state)
+        lines = journal_lines(store)
+        assert len(lines) == 4
+        assert lines[-1].startswith("2\t")
+
+    def test_phase_transition_compacts(self, store):
+        state = make_state()
+        store.save("job-1", state)
+        for i in range(3):
+            state["chapters"][i]["processed"] = True
+            store.save("job-1", state, chapters=[i])
+        assert len(journal_lines(store)) == 6
+        state["phase"] = "chapters_processed"
+        store.save("job-1", state)
+        assert len(journal_lines(store)) == 3
+        assert all(ch["processed"] for ch in store.load("job-1")["chapters"])
+
+    def test_torn_trailing_record_is_ignored(self, store):
+        store.save("job-1", make_state())
+        with open(store.journal_path("job-1"), "a", encoding="utf-8") as f:
+            f.write('1\t{"title": "Chapter 1", "proc')
+        assert store.load("job-1")["chapters"][1]["title"] == "Chapter 1"
+
+
+class TestLazyLoading:
+    """Tests for header-only and partial chapter loads."""
+
+    def test_header_only_load(self, store):
+        store.save("job-1", make_state())
+        header = store.load("job-1", include_chapters=False)
+        assert "chapters" not in header
+        assert header["chapter_count"] == 3
+
+    def test_load_selected_chapters(self, store):
+        state = make_state(chapters=5)
+        store.save("job-1", state)
+        chapters = store.load_chapters("job-1", [0, 3])
+        assert set(chapters) == {0, 3}
+        assert chapters[3]["title"] == "Chapter 3"
+
+    def test_header_only_save_keeps_chapters(self, store):
+        store.save("job-1", make_state())
+        header = store.load("job-1", include_chapters=False)
+        header["metadata"]["title"] = "Renamed"
+        store.save("job-1", header)
+        loaded = store.load("job-1")
+        assert loaded["metadata"]["title"] == "Renamed"
+        assert len(loaded["chapters"]) == 3
+
+    def test_header_fields_keep_the_other_fields(self, store):
+        store.save("job-1", make_state())
+        processing = store.load("job-1")
+        metadata_task = store.load("job-1", include_chapters=False)
+
+        metadata_task["metadata"] = {"title": "Test Book", "author": "A. Author"}
+        metadata_task["cover_urls"] = {"cover_art_url": "https://cover"}
+        store.save("job-1", metadata_task, header_fields=["metadata", "cover_urls"])
+        processing["progress"]["processed_chapters"] = 1
+        processing["chapters"][0]["processed"] = True
+        store.save("job-1", processing, chapters=[0], header_fields=["progress"])
+
+        loaded = store.load("job-1")
+        assert loaded["metadata"]["author"] == "A. Author"
+        assert loaded["cover_urls"] == {"cover_art_url": "https://cover"}
+        assert loaded["progress"]["processed_chapters"] == 1 and loaded["chapters"][0]["processed"]
+
+    def test_header_fields_phase_change_compacts(self, store):
+        state = make_state()
+        store.save("job-1", state)
+        store.save("job-1", state, chapters=[1])
+
+        state["phase"] = "chapters_processed"
+        state["metadata"] = {"title": "Stale"}
+        store.save("job-1", state, header_fields=["phase"])
+
+        assert len(journal_lines(store)) == 3
+        assert store.load("job-1", include_chapters=False)["metadata"] == {"title": "Test Book"}
+
+    def test_missing_job(self, store):
+        assert store.load("nope") is None
+
+
+class TestLegacyJobs:
+    """Tests for single-file job states written before the journal existed."""
+
+    def test_reads_legacy_file(self, store):
+        legacy = make_state()
+        with open(store.header_path("job-1"), "w", encoding="utf-8") as f:
+            json.dump(legacy, f)
+        assert store.load("job-1")["chapters"] == legacy["chapters"]
+        assert store.load_chapters("job-1", [2])[2]["title"] == "Chapter 2"
+
+    def test_legacy_file_migrates_on_save(self, store):
+        legacy = make_state()
+        with open(store.header_path("job-1"), "w", encoding="utf-8") as f:
+            json.dump(legacy, f)
+        store.save("job-1", store.load("job-1"))
+        assert os.path.exists(store.journal_path("job-1"))
+        assert len(journal_lines(store)) == 3
+        assert store.load("job-1")["chapters"] == legacy["chapters"]
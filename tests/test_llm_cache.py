@@ -0,0 +1,151 @@
+"""
+Unit tests for llm_cache module
+Tests: content-addressed keys, hits/misses, validation, bypass, LRU eviction,
+echo-mode Gemini responses only cached when complete
+"""
+
+import os
+import time
+
+import pytest
+from app import llm_cache
+from app.config import Config
+from app.llm_cache import LLMCache, cached_generate, llm_cache_bypass, make_cache_key
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "LLM_CACHE_DIR", str(tmp_path / "llm_cache"))
+    monkeypatch.setattr(Config, "LLM_CACHE_BYPASS", False)
+    monkeypatch.setattr(llm_cache, "_llm_cache", None)
+    yield
+
+
+class Counter:
+    def __init__(self, response="response"):
+        self.calls = 0
+        self.response = response
+
+    def __call__(self):
+        self.calls += 1
+        return self.response
+
+
+class TestCacheKey:
+    """Tests for make_cache_key."""
+
+    def test_same_inputs_same_key(self):
+        assert make_cache_key("m", "v1", "text", {"a": 1}) == make_cache_key("m", "v1", "text", {"a": 1})
+
+    def test_every_component_changes_key(self):
+        base = make_cache_key("m", "v1", "text", {"a": 1})
+        assert make_cache_key("m2", "v1", "text", {"a": 1}) != base
+        assert make_cache_key("m", "v2", "text", {"a": 1}) != base
+        assert make_cache_key("m", "v1", "text!", {"a": 1}) != base
+        assert make_cache_key("m", "v1", "text", {"a": 2}) != base
+
+
+class TestCachedGenerate:
+    """Tests for cached_generate."""
+
+    def test_second_call_is_a_hit(self):
+        gen = Counter()
+        assert cached_generate("m", "v1", "prompt", gen) == "response"
+        assert cached_generate("m", "v1", "prompt", gen) == "response"
+        assert gen.calls == 1
+        stats = llm_cache.get_llm_cache_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+
+    def test_invalid_response_not_cached(self):
+        gen = Counter("not json")
+        cached_generate("m", "v1", "prompt", gen, validate=lambda t: t.startswith("{"))
+        cached_generate("m", "v1", "prompt", gen, validate=lambda t: t.startswith("{"))
+        assert gen.calls == 2
+
+    def test_bypass_argument(self):
+        gen = Counter()
+        cached_generate("m", "v1", "prompt", gen)
+        cached_generate("m", "v1", "prompt", gen, bypass=True)
+        assert gen.calls == 2
+
+    def test_bypass_context_manager(self):
+        gen = Counter()
+        cached_generate("m", "v1", "prompt", gen)
+        with llm_cache_bypass():
+            cached_generate("m", "v1", "prompt", gen)
+        cached_generate("m", "v1", "prompt", gen)
+        assert gen.calls == 2
+
+    def test_bypass_config_flag(self, monkeypatch):
+        gen = Counter()
+        cached_generate("m", "v1", "prompt", gen)
+        monkeypatch.setattr(Config, "LLM_CACHE_BYPASS", True)
+        cached_generate("m", "v1", "prompt", gen)
+        assert gen.calls == 2
+
+
+class TestEchoResponses:
+    """call_gemini() with echo_response_check: truncated echoes are never cached."""
+
+    SOURCE = " ".join(f"Word{i}" for i in range(300))
+
+    @pytest.fixture
+    def gemini(self, monkeypatch):
+        from app import glm_processor
+
+        responses = []
+        monkeypatch.setattr(glm_processor, "get_gemini_model", lambda: None)
+        monkeypatch.setattr(glm_processor, "run_gemini",
+                            lambda model, call, prompt=None: type("Response", (), {"text": responses.pop(0)})())
+        return glm_processor, responses
+
+    def call(self, glm_processor):
+        return glm_processor.call_gemini(f"Split: {self.SOURCE}", prompt_version="test-echo",
+                                         validate=glm_processor.echo_response_check(self.SOURCE, "[PARAGRAPH]"))
+
+    def test_truncated_echo_is_not_cached(self, gemini):
+        glm_processor, responses = gemini
+        half = " ".join(f"Word{i}" for i in range(150))
+        whole = self.SOURCE[:600] + " [PARAGRAPH] " + self.SOURCE[600:]
+        responses.extend([half + " [PARAGRAPH] end", whole])
+
+        assert self.call(glm_processor).startswith("Word0")
+        assert self.call(glm_processor) == whole
+        assert self.call(glm_processor) == whole  # cached now
+        assert responses == []
+
+    def test_echo_without_markers_is_not_cached(self, gemini):
+        glm_processor, responses = gemini
+        responses.extend([self.SOURCE, self.SOURCE])
+
+        self.call(glm_processor)
+        self.call(glm_processor)
+
+        assert responses == []
+
+    def test_short_source_needs_no_marker(self):
+        from app.glm_processor import echo_response_check
+
+        assert echo_response_check("One short paragraph.", "[PARAGRAPH]")("One short paragraph.")
+        assert not echo_response_check("One short paragraph.", "[PARAGRAPH]")("")
+
+
+class TestEviction:
+    """Tests for size-based LRU eviction."""
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        cache = LLMCache(str(tmp_path / "lru"), max_bytes=250)
+        now = time.time()
+        for age, key in [(200, "aa01"), (100, "bb02")]:
+            cache.put(key, "x" * 100)
+            os.utime(cache._path(key), (now - age, now - age))
+
+        cache.get("aa01")  # touch -> most recently used
+        cache.put("cc03", "x" * 100)
+
+        assert cache.get("aa01") is not None
+        assert cache.get("bb02") is None
+        assert cache.get("cc03") is not None
+        assert cache.stats()["size_bytes"] <= 250
+        assert cache.evictions == 1
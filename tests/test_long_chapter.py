@@ -0,0 +1,139 @@
+"""
+Unit tests for long_chapter module
+Tests: window building, overlap reconciliation, text-loss detection, window reports
+"""
+
+import re
+import threading
+import time
+
+import pytest
+from app import long_chapter
+from app.config import Config
+from app.long_chapter import TextLossError, build_windows, stitch_windows
+
+
+def make_chapter(n=30):
+    """Chapter of n distinct sentences plus their (start, end) spans."""
+    sentences = [f"Sentence number {i} tells the reader about topic{i} in some detail." for i in range(n)]
+    text = " ".join(sentences)
+    spans, pos = [], 0
+    for s in sentences:
+        spans.append((pos, pos + len(s)))
+        pos += len(s) + 1
+    return text, spans
+
+
+def echo(text, spans, window, starts, drop=()):
+    """Simulate an echo response: paragraphs starting at `starts` (window-local ok)."""
+    first, end = window
+    bounds = sorted({first} | {s for s in starts if first < s < end})
+    paragraphs = []
+    for k, b in enumerate(bounds):
+        e = bounds[k + 1] if k + 1 < len(bounds) else end
+        pieces = [text[spans[i][0]:spans[i][1]] for i in range(b, e) if i not in drop]
+        if pieces:
+            paragraphs.append(" ".join(pieces))
+    return paragraphs
+
+
+def words(paragraphs):
+    return re.findall(r"\w+", " ".join(paragraphs))
+
+
+class TestBuildWindows:
+    """Tests for sentence-aligned window building."""
+
+    def test_windows_cover_all_sentences_with_overlap(self):
+        text, spans = make_chapter(40)
+        windows = build_windows(spans, window_chars=700, overlap=3)
+        assert windows[0][0] == 0
+        assert windows[-1][1] == len(spans)
+        for (a1, b1), (a2, b2) in zip(windows, windows[1:]):
+            assert a1 < a2 < b1 <= b2
+
+    def test_short_text_is_one_window(self):
+        text, spans = make_chapter(5)
+        assert build_windows(spans, window_chars=10000, overlap=3) == [(0, 5)]
+
+
+class TestStitching:
+    """Tests for reconciling overlapping window outputs."""
+
+    PARAGRAPH_STARTS = [0, 4, 9, 13, 18, 22, 27, 31, 36]
+
+    def test_agreed_boundaries_give_exact_paragraphs(self):
+        text, spans = make_chapter(40)
+        # Overlap longer than a paragraph, as with the production settings
+        windows = build_windows(spans, window_chars=1400, overlap=6)
+        outputs = [echo(text, spans, w, self.PARAGRAPH_STARTS) for w in windows]
+
+        paragraphs, owned = stitch_windows(text, spans, windows, outputs)
+
+        assert len(windows) > 2
+        assert paragraphs == echo(text, spans, (0, 40), self.PARAGRAPH_STARTS)
+        assert owned[0][0] == 0 and owned[-1][1] == 40
+
+    def test_disagreeing_windows_lose_and_duplicate_nothing(self):
+        text, spans = make_chapter(40)
+        windows = build_windows(spans, window_chars=700, overlap=4)
+        # Every window invents its own paragraph breaks
+        outputs = [echo(text, spans, w, range(w[0] + k % 3 + 1, w[1], 3 + k % 2)) for k, w in enumerate(windows)]
+
+        paragraphs, _ = stitch_windows(text, spans, windows, outputs)
+
+        assert words(paragraphs) == re.findall(r"\w+", text)
+        assert all(p.endswith(".") for p in paragraphs)
+
+    def test_dropped_noise_is_not_text_loss(self):
+        text, spans = make_chapter(20)
+        text = text[:spans[7][0]] + "23 / 47" + " " * (spans[7][1] - spans[7][0] - 7) + text[spans[7][1]:]
+        windows = build_windows(spans, window_chars=700, overlap=3)
+        outputs = [echo(text, spans, w, [0, 10], drop={7}) for w in windows]
+
+        paragraphs, _ = stitch_windows(text, spans, windows, outputs)
+
+        assert "47" not in " ".join(paragraphs)
+
+    def test_truncated_window_raises(self):
+        text, spans = make_chapter(40)
+        windows = build_windows(spans, window_chars=700, overlap=4)
+        outputs = [echo(text, spans, w, self.PARAGRAPH_STARTS) for w in windows]
+        # First window's output stops half way (e.g. output token limit)
+        first, end = windows[0]
+        outputs[0] = echo(text, spans, (first, first + (end - first) // 3), self.PARAGRAPH_STARTS)
+
+        with pytest.raises(TextLossError, match="Window 1"):
+            stitch_windows(text, spans, windows, outputs)
+
+
+class TestSplitLongChapter:
+    """Tests for the concurrent window driver."""
+
+    def test_windows_run_concurrently_and_report_timing(self, monkeypatch):
+        text, spans = make_chapter(60)
+        monkeypatch.setattr(Config, "V3_WINDOW_CHARS", 700)
+        monkeypatch.setattr(Config, "V3_WINDOW_OVERLAP_SENTENCES", 4)
+        monkeypatch.setattr(Config, "V3_WINDOW_CONCURRENCY", 4)
+        monkeypatch.setattr("app.sentence_detector.detect_sentence_spans", lambda t: spans)
+
+        active, peak = [0], [0]
+        lock = threading.Lock()
+
+        def fake_window(text, spans, window):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            return echo(text, spans, window, range(0, 60, 5)), 0.05
+
+        monkeypatch.setattr(long_chapter, "_process_window", fake_window)
+
+        paragraphs, report = long_chapter.split_long_chapter_paragraphs(text)
+
+        assert words(paragraphs) == re.findall(r"\w+", text)
+        assert peak[0] > 1
+        assert [r["window"] for r in report] == list(range(1, len(report) + 1))
+        assert all(r["seconds"] == 0.05 for r in report)
@@ -205,6 +205,91 @@ class TestSectionSplitting:
                 assert len(section) >= 5, f"Section {i} too short: '{section}'"
 
 
+class TestOffsetParagraphs:
+    """Tests for offset-based paragraph splitting (boundaries only, local rebuild)."""
+    
+    TEXT = "The sun rose.  Birds sang.\n23 / 47\nSarah woke up. Traffic grew in the city."
+    SPANS = [(0, 13), (15, 26), (27, 34), (35, 49), (50, 75)]
+    
+    def test_sentences_to_numbered_text_start(self):
+        """Chunked prompts keep chapter-level sentence numbers."""
+        from app.sentence_detector import sentences_to_numbered_text
+        
+        numbered = sentences_to_numbered_text(["A.", "B."], start=401)
+        assert numbered == "401. A.\n402. B."
+    
+    def test_parse_boundaries_filters_and_adds_first(self):
+        """Out-of-range and duplicate indices are dropped; first sentence always starts."""
+        from app.glm_processor import parse_paragraph_boundaries
+        
+        starts, drop = parse_paragraph_boundaries('{"starts": [4, 4, 99, "x"], "drop": [3]}', 1, 5)
+        assert starts == [1, 4]
+        assert drop == [3]
+    
+    def test_parse_boundaries_from_markdown(self):
+        """JSON wrapped in prose or code fences is still parsed."""
+        from app.glm_processor import parse_paragraph_boundaries
+        
+        starts, _ = parse_paragraph_boundaries('```json\n{"starts": [1, 3]}\n```', 1, 5)
+        assert starts == [1, 3]
+    
+    def test_rebuild_uses_verbatim_source(self):
+        """Paragraphs are rebuilt from source sentences, noise is dropped."""
+        from app.glm_processor import rebuild_paragraphs
+        
+        paragraphs = rebuild_paragraphs(self.TEXT, self.SPANS, starts=[0, 3], drop=[2])
+        assert paragraphs == ["The sun rose. Birds sang.", "Sarah woke up. Traffic grew in the city."]
+    
+    def test_rebuild_without_drop_keeps_all_text(self):
+        """Without drops every source word ends up in exactly one paragraph."""
+        from app.glm_processor import rebuild_paragraphs
+        
+        paragraphs = rebuild_paragraphs(self.TEXT, self.SPANS, starts=[2])
+        assert " ".join(paragraphs).split() == self.TEXT.split()
+
+
+class TestLocalSectioner:
+    """Tests for deterministic local sections derived from paragraphs."""
+    
+    PARAGRAPHS = [
+        {"id": "p1", "text": "Short paragraph here."},
+        {"id": "p2", "text": " ".join(["This sentence is reasonably long and keeps going for a while."] * 12)},
+        {"id": "p3", "text": "One enormous sentence, " + ", ".join(["with many clauses"] * 40) + "."},
+    ]
+    
+    def test_sections_stay_inside_one_paragraph(self):
+        """Every section's text is contained in the paragraph it points to."""
+        from app.glm_processor import process_chapter_sections_local
+        
+        by_id = {p["id"]: p["text"] for p in self.PARAGRAPHS}
+        sections = process_chapter_sections_local(self.PARAGRAPHS)
+        
+        for section in sections:
+            assert section["text"] in by_id[section["paragraph_id"]]
+    
+    def test_sections_respect_max_chars(self):
+        """No local section exceeds the limit, even for one huge sentence."""
+        from app.glm_processor import process_chapter_sections_local, SECTION_MAX_CHARS
+        
+        for section in process_chapter_sections_local(self.PARAGRAPHS):
+            assert len(section["text"]) <= SECTION_MAX_CHARS
+    
+    def test_no_text_lost(self):
+        """Sections of a paragraph re-join to the paragraph's words."""
+        from app.glm_processor import process_chapter_sections_local
+        
+        sections = process_chapter_sections_local(self.PARAGRAPHS)
+        for para in self.PARAGRAPHS:
+            joined = " ".join(s["text"] for s in sections if s["paragraph_id"] == para["id"])
+            assert joined.split() == para["text"].split()
+    
+    def test_deterministic(self):
+        """Same paragraphs always give the same sections."""
+        from app.glm_processor import process_chapter_sections_local
+        
+        assert process_chapter_sections_local(self.PARAGRAPHS) == process_chapter_sections_local(self.PARAGRAPHS)
+
+
 # Run tests if executed directly
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
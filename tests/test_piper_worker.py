@@ -0,0 +1,196 @@
+"""
+Unit tests for the persistent Piper worker pool
+Tests: model loaded once per worker, WAV/PCM output, per-request errors, crash and
+timeout recovery, CLI fallback in PiperEngine
+"""
+
+import base64
+import os
+import sys
+import threading
+import wave
+
+import pytest
+
+TTS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "HonoraLocalTTS")
+if TTS_PATH not in sys.path:
+    # Appended, not prepended: HonoraLocalTTS/app.py must not shadow the app package
+    sys.path.append(TTS_PATH)
+
+from piper_worker import PiperWorkerError, PiperWorkerPool, PiperWorkerStartError
+
+SAMPLE_RATE = 22050
+
+# Runs the real worker loop (piper_worker.serve) with a fake voice instead of an ONNX model.
+# Every model load appends a byte to "<model>.loads".
+FAKE_WORKER = f"""
+import os, sys, time
+sys.path.append({TTS_PATH!r})
+import piper_worker
+
+class FakeVoice:
+    class config:
+        sample_rate = {SAMPLE_RATE}
+
+    def synthesize_wav(self, text, wav_file):
+        if text == "CRASH":
+            os._exit(3)
+        if text == "SLOW":
+            time.sleep(5)
+        if text == "FAIL":
+            raise ValueError("cannot speak this")
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate({SAMPLE_RATE})
+        wav_file.writeframes(b"\\x00\\x00" * 2205 * len(text))
+
+def load(path):
+    with open(path + ".loads", "a") as f:
+        f.write("x")
+    return FakeVoice()
+
+piper_worker._load_voice = load
+sys.exit(piper_worker.serve(sys.argv[1]))
+"""
+
+
+@pytest.fixture
+def model(tmp_path):
+    path = tmp_path / "en_US-test-medium.onnx"
+    path.write_bytes(b"onnx")
+    return str(path)
+
+
+@pytest.fixture
+def make_pool(tmp_path, model):
+    script = tmp_path / "fake_worker.py"
+    script.write_text(FAKE_WORKER)
+    pools = []
+
+    def make(size=2):
+        pool = PiperWorkerPool(model, size=size, command=[sys.executable, str(script), model])
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.close()
+
+
+def model_loads(model):
+    path = model + ".loads"
+    return len(open(path).read()) if os.path.exists(path) else 0
+
+
+class TestPool:
+    """Tests for PiperWorkerPool against the real worker loop."""
+
+    def test_model_loaded_once_for_many_segments(self, make_pool, model, tmp_path):
+        pool = make_pool(size=2)
+        for i in range(10):
+            out = str(tmp_path / f"seg_{i}.wav")
+            response = pool.synthesize(f"Segment {i}", out)
+            assert response["ok"]
+            with wave.open(out, "rb") as w:
+                assert w.getnframes() == 2205 * len(f"Segment {i}")
+
+        assert model_loads(model) == 1
+        assert pool.stats()["requests"] == 10
+
+    def test_concurrent_requests_use_at_most_pool_size_workers(self, make_pool, model, tmp_path):
+        pool = make_pool(size=3)
+        results = {}
+
+        def run(i):
+            results[i] = pool.synthesize("x" * (i + 1), str(tmp_path / f"seg_{i}.wav"))
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(12)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert all(results[i]["ok"] and results[i]["audio_ms"] == (i + 1) * 100 for i in range(12))
+        assert 1 <= model_loads(model) <= 3
+        assert pool.stats()["running"] <= 3
+
+    def test_pcm_returned_without_output_path(self, make_pool):
+        response = make_pool(size=1).synthesize("abcd")
+
+        assert response["sample_rate"] == SAMPLE_RATE
+        assert len(base64.b64decode(response["pcm_b64"])) == 2205 * 4 * 2
+
+    def test_request_error_keeps_worker(self, make_pool, model, tmp_path):
+        pool = make_pool(size=1)
+
+        failed = pool.synthesize("FAIL", str(tmp_path / "bad.wav"))
+        ok = pool.synthesize("fine", str(tmp_path / "good.wav"))
+
+        assert not failed["ok"] and "cannot speak this" in failed["error"]
+        assert ok["ok"]
+        assert model_loads(model) == 1
+
+    def test_crashed_worker_is_replaced(self, make_pool, model, tmp_path):
+        pool = make_pool(size=1)
+        pool.synthesize("warm up", str(tmp_path / "a.wav"))
+
+        with pytest.raises(PiperWorkerError):
+            pool.synthesize("CRASH", str(tmp_path / "b.wav"))
+        assert pool.synthesize("again", str(tmp_path / "c.wav"))["ok"]
+
+        assert model_loads(model) == 2
+        assert pool.stats()["restarts"] == 1
+
+    def test_hung_worker_times_out(self, make_pool, tmp_path):
+        pool = make_pool(size=1)
+
+        with pytest.raises(PiperWorkerError, match="did not answer"):
+            pool.synthesize("SLOW", str(tmp_path / "a.wav"), timeout=0.5)
+        assert pool.synthesize("next", str(tmp_path / "b.wav"))["ok"]
+
+    def test_start_failure(self, model):
+        command = [sys.executable, "-c", "print('{\"ready\": false, \"error\": \"No module named piper\"}')"]
+        pool = PiperWorkerPool(model, size=1, command=command)
+
+        with pytest.raises(PiperWorkerStartError, match="No module named piper"):
+            pool.synthesize("hello")
+        assert pool.stats()["running"] == 0
+
+
+class TestPiperEngine:
+    """Tests for PiperEngine on top of the pool."""
+
+    @pytest.fixture
+    def engine(self, tmp_path, monkeypatch, model):
+        from tts_engines import PiperEngine
+
+        monkeypatch.setattr(PiperEngine, "MODEL_DIR", str(tmp_path))
+        return PiperEngine(workers=1)
+
+    def test_voice_listing_is_cached(self, engine, make_pool, monkeypatch, tmp_path):
+        pool = make_pool(size=1)
+        monkeypatch.setattr(engine, "_get_pool", lambda model_path: pool)
+        listings = []
+        real_listdir = os.listdir
+        monkeypatch.setattr(os, "listdir", lambda path: listings.append(path) or real_listdir(path))
+
+        for i in range(5):
+            assert engine.generate(f"Segment {i}", "en_US-test-medium", "en", str(tmp_path / f"s{i}.wav"))
+
+        assert len(listings) <= 1
+
+    def test_falls_back_to_cli_when_workers_cannot_start(self, engine, model, monkeypatch, tmp_path):
+        broken = PiperWorkerPool(model, size=1, command=[sys.executable, "-c", "import sys; sys.exit(1)"])
+        monkeypatch.setattr(engine, "_get_pool", lambda model_path: broken)
+        cli_calls = []
+
+        def fake_cli(text, model_path, output_path):
+            cli_calls.append(text)
+            return True
+
+        monkeypatch.setattr(engine, "_generate_cli", fake_cli)
+
+        assert engine.generate("one", "default", "en", str(tmp_path / "a.wav"))
+        assert engine.generate("two", "default", "en", str(tmp_path / "b.wav"))
+        assert cli_calls == ["one", "two"]
+        assert engine._pool_disabled
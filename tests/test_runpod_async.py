@@ -0,0 +1,279 @@
+"""
+Unit tests for the async RunPod engine against the local RunPod stand-in
+Tests: /run + /status flow, in-flight cap, results written as they complete, failures,
+segments-mode batching (single-job fallback for older workers), /run retries (connect errors,
+429/503 with Retry-After), cancelling abandoned jobs
+"""
+
+import asyncio
+import os
+import sys
+import time
+import wave
+
+import pytest
+
+TTS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "HonoraLocalTTS")
+if TTS_PATH not in sys.path:
+    # Appended, not prepended: HonoraLocalTTS/app.py must not shadow the app package
+    sys.path.append(TTS_PATH)
+
+from runpod_standin import FAIL_MARKER, silent_wav, start_standin
+
+
+@pytest.fixture
+def standin():
+    server, standin, api_base = start_standin(workers=4, latency=0.1)
+    yield standin, api_base
+    server.shutdown()
+    standin.shutdown()
+
+
+@pytest.fixture
+def engine(standin, tmp_path, monkeypatch):
+    from tts_engines import XTTSRunPodAsyncEngine
+
+    _, api_base = standin
+    monkeypatch.setenv("RUNPOD_API_KEY", "test-key")
+    monkeypatch.setenv("RUNPOD_ENDPOINT_ID", "local")
+    monkeypatch.setenv("RUNPOD_API_BASE", api_base)
+    monkeypatch.setenv("SUPABASE_URL", "")
+    # One segment per job; batching is covered by TestBatches
+    engine = XTTSRunPodAsyncEngine(max_in_flight=3, batch_size=1)
+    engine.POLL_INTERVAL = 0.02
+
+    voices = tmp_path / "voices"
+    voices.mkdir()
+    (voices / "AI_Voice_Honora_Test.wav").write_bytes(silent_wav(0.1))
+    engine._voice_folder = str(voices)
+    return engine
+
+
+def make_items(tmp_path, texts):
+    return [
+        {"id": i, "text": text, "output_path": str(tmp_path / f"seg_{i}.wav")}
+        for i, text in enumerate(texts)
+    ]
+
+
+class TestGenerateMany:
+    """Tests for concurrent /run + /status generation."""
+
+    def test_all_segments_written(self, engine, standin, tmp_path):
+        items = make_items(tmp_path, [f"Segment number {i}." for i in range(9)])
+
+        results = asyncio.run(engine.generate_many(items, voice="Test", language="en"))
+
+        assert all(r["success"] for r in results.values())
+        for item in items:
+            with wave.open(item["output_path"]) as w:
+                assert w.getnframes() > 0
+        assert standin[0].requests["run"] == 9
+        assert standin[0].requests["runsync"] == 0
+
+    def test_in_flight_cap_and_parallelism(self, engine, standin, tmp_path):
+        items = make_items(tmp_path, [f"Segment {i}." for i in range(9)])
+
+        start = time.monotonic()
+        asyncio.run(engine.generate_many(items, voice="Test", language="en"))
+        elapsed = time.monotonic() - start
+
+        assert engine.stats["max_in_flight"] == 3
+        assert standin[0].max_running <= 3
+        # 9 jobs x 0.1s serially would take 0.9s
+        assert elapsed < 0.75
+
+    def test_results_reported_as_they_complete(self, engine, tmp_path):
+        items = make_items(tmp_path, [f"Segment {i}." for i in range(6)])
+        seen = []
+
+        def on_complete(item_id, result):
+            # The file must already be on disk when the callback fires
+            seen.append((item_id, os.path.exists(result["output_path"])))
+
+        asyncio.run(engine.generate_many(items, voice="Test", language="en", on_complete=on_complete))
+
+        assert sorted(i for i, _ in seen) == list(range(6))
+        assert all(exists for _, exists in seen)
+
+    def test_failed_job_does_not_stop_others(self, engine, tmp_path):
+        items = make_items(tmp_path, ["Fine.", f"Broken {FAIL_MARKER}.", "Also fine."])
+
+        results = asyncio.run(engine.generate_many(items, voice="Test", language="en"))
+
+        assert results[0]["success"] and results[2]["success"]
+        assert not results[1]["success"]
+        assert "failed" in results[1]["error"].lower()
+        assert not os.path.exists(items[1]["output_path"])
+        assert engine.stats["failed"] == 1
+
+
+class TestBatches:
+    """Tests for packing many segments into one segments-mode job."""
+
+    def test_segments_are_sent_in_batches(self, engine, standin, tmp_path):
+        engine.batch_size = 4
+        items = make_items(tmp_path, [f"Segment number {i}." for i in range(10)])
+
+        results = asyncio.run(engine.generate_many(items, voice="Test", language="en"))
+
+        assert all(r["success"] for r in results.values())
+        assert standin[0].requests["run"] == 3  # 4 + 4 + 2
+        assert engine.stats["submitted"] == 3
+        assert engine.stats["completed"] == 10
+        for item in items:
+            with wave.open(item["output_path"]) as w:
+                assert w.getnframes() > 0
+
+    def test_failed_segment_does_not_fail_batch(self, engine, tmp_path):
+        engine.batch_size = 20
+        items = make_items(tmp_path, ["Fine.", f"Broken {FAIL_MARKER}.", "Also fine."])
+        seen = []
+
+        results = asyncio.run(engine.generate_many(
+            items, voice="Test", language="en", on_complete=lambda i, r: seen.append(i)
+        ))
+
+        assert results[0]["success"] and results[2]["success"]
+        assert not results[1]["success"]
+        assert "failed" in results[1]["error"].lower()
+        assert not os.path.exists(items[1]["output_path"])
+        assert sorted(seen) == [0, 1, 2]
+
+    def test_worker_without_segments_mode_gets_single_jobs(self, engine, standin, tmp_path):
+        standin[0].segments_mode = False  # older handler: "Invalid input" for segments jobs
+        engine.batch_size = 4
+        items = make_items(tmp_path, [f"Segment number {i}." for i in range(6)])
+
+        results = asyncio.run(engine.generate_many(items, voice="Test", language="en"))
+
+        assert all(r["success"] for r in results.values())
+        assert engine.segments_mode is False
+        assert standin[0].requests["run"] == 2 + 6  # two rejected batches, then one job per segment
+
+        more = make_items(tmp_path, ["Next call.", "Goes single."])
+        results = asyncio.run(engine.generate_many(more, voice="Test", language="en"))
+
+        assert all(r["success"] for r in results.values())
+        assert standin[0].requests["run"] == 8 + 2
+
+    def test_streamed_output_list_is_accepted(self, engine):
+        job = {"status": "COMPLETED", "output": [
+            {"segment_id": "0", "audio_b64": "AAAA"},
+            {"segment_id": "1", "audio_b64": None, "error": "boom"},
+        ]}
+        outputs = engine._segment_outputs(job)
+        assert outputs["0"]["audio_b64"] == "AAAA"
+        assert outputs["1"]["error"] == "boom"
+
+
+def test_sync_generate_uses_api_base(engine, standin, tmp_path):
+    """The inherited /runsync path also talks to the configured API base."""
+    output = str(tmp_path / "single.wav")
+    assert engine.generate("Hello there.", voice="Test", language="en", output_path=output)
+    assert standin[0].requests["runsync"] == 1
+
+
+class FlakyClient:
+    """httpx client stand-in: raises the queued errors, or answers with queued (status, headers), first."""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def request(self, method, url, headers=None, **kwargs):
+        import httpx
+
+        self.calls += 1
+        if self.errors:
+            error = self.errors.pop(0)
+            if isinstance(error, tuple):
+                status, response_headers = error
+                return httpx.Response(status, headers=response_headers, json={}, request=httpx.Request(method, url))
+            raise error
+        return httpx.Response(200, json={"id": "job-1", "status": "IN_QUEUE"}, request=httpx.Request(method, url))
+
+
+class TestRetries:
+    """POST /run must not be retried when it may already have queued the job."""
+
+    def submit(self, engine, client):
+        engine.INITIAL_BACKOFF = 0
+        return asyncio.run(engine._request_with_retry(client, "POST", "http://runpod/run", "req",
+                                                      idempotent=False, json={}))
+
+    def test_connect_errors_are_retried(self, engine):
+        import httpx
+
+        client = FlakyClient([httpx.ConnectError("refused"), httpx.ConnectTimeout("slow")])
+
+        assert self.submit(engine, client)["id"] == "job-1"
+        assert client.calls == 3
+
+    @pytest.mark.parametrize("error", ["read_timeout", "remote_protocol"])
+    def test_run_is_not_retried_after_the_request_was_sent(self, engine, error):
+        import httpx
+
+        errors = {"read_timeout": httpx.ReadTimeout("no answer"),
+                  "remote_protocol": httpx.RemoteProtocolError("connection dropped")}
+        client = FlakyClient([errors[error]])
+
+        with pytest.raises(type(errors[error])):
+            self.submit(engine, client)
+        assert client.calls == 1
+
+    @pytest.mark.parametrize("status", [429, 503])
+    def test_run_rejected_without_queueing_is_retried(self, engine, status, monkeypatch):
+        waits = []
+
+        async def sleep(seconds):
+            waits.append(seconds)
+
+        monkeypatch.setattr(asyncio, "sleep", sleep)
+        client = FlakyClient([(status, {"Retry-After": "7"}), (status, {})])
+
+        assert self.submit(engine, client)["id"] == "job-1"
+        assert client.calls == 3 and waits == [7.0, engine.INITIAL_BACKOFF * 2]
+
+    def test_run_is_not_retried_after_other_server_errors(self, engine):
+        client = FlakyClient([(500, {})])
+
+        with pytest.raises(Exception, match="HTTP 500"):
+            self.submit(engine, client)
+        assert client.calls == 1
+
+    def test_status_polls_are_retried(self, engine):
+        import httpx
+
+        engine.INITIAL_BACKOFF = 0
+        client = FlakyClient([httpx.ReadTimeout("no answer")])
+
+        asyncio.run(engine._request_with_retry(client, "GET", "http://runpod/status/job-1", "req"))
+        assert client.calls == 2
+
+
+def test_job_past_deadline_is_cancelled(tmp_path, monkeypatch):
+    from tts_engines import XTTSRunPodAsyncEngine
+
+    server, slow, api_base = start_standin(workers=1, latency=0.5)
+    try:
+        monkeypatch.setenv("RUNPOD_API_KEY", "test-key")
+        monkeypatch.setenv("RUNPOD_ENDPOINT_ID", "local")
+        monkeypatch.setenv("RUNPOD_API_BASE", api_base)
+        monkeypatch.setenv("SUPABASE_URL", "")
+        engine = XTTSRunPodAsyncEngine(max_in_flight=1, batch_size=1)
+        engine.POLL_INTERVAL = 0.02
+        engine.JOB_TIMEOUT = 0.1
+        voices = tmp_path / "voices"
+        voices.mkdir()
+        (voices / "AI_Voice_Honora_Test.wav").write_bytes(silent_wav(0.1))
+        engine._voice_folder = str(voices)
+
+        results = asyncio.run(engine.generate_many(make_items(tmp_path, ["Too slow."]), voice="Test", language="en"))
+    finally:
+        server.shutdown()
+        slow.shutdown()
+
+    assert not results[0]["success"] and "not finished" in results[0]["error"]
+    assert slow.requests["cancel"] == 1 and engine.stats["cancelled"] == 1
+    assert [job["status"] for job in slow.jobs.values()] == ["CANCELLED"]
@@ -0,0 +1,107 @@
+"""
+Unit tests for the RunPod worker handler
+Tests: segments mode (voice resolved once, per-segment audio + timing), streaming variant
+"""
+
+import base64
+import os
+import sys
+
+import pytest
+
+TTS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "HonoraLocalTTS")
+if TTS_PATH not in sys.path:
+    # Appended, not prepended: HonoraLocalTTS/app.py must not shadow the app package
+    sys.path.append(TTS_PATH)
+
+import runpod_handler
+from runpod_standin import silent_wav
+
+
+class FakeModel:
+    """Stands in for the XTTS model: writes a silent WAV, fails on 'BOOM'."""
+
+    def __init__(self):
+        self.calls = []
+
+    def tts_to_file(self, text, speaker_wav, language, file_path):
+        self.calls.append((text, speaker_wav, language))
+        if "BOOM" in text:
+            raise RuntimeError("CUDA out of memory")
+        with open(file_path, "wb") as f:
+            f.write(silent_wav(0.05))
+
+
+@pytest.fixture
+def model(monkeypatch):
+    fake = FakeModel()
+    monkeypatch.setattr(runpod_handler, "tts_model", fake)
+    return fake
+
+
+def segments_job(segments, **extra):
+    return {"input": {
+        "segments": segments,
+        "speaker_wav_b64": base64.b64encode(silent_wav(0.1)).decode(),
+        "language": "da",
+        "request_id": "req-1",
+        **extra,
+    }}
+
+
+class TestSegmentsMode:
+    """Tests for many segments in one job."""
+
+    def test_all_segments_returned_inline(self, model):
+        job = segments_job([{"segment_id": f"s{i}", "text": f"Segment {i}."} for i in range(3)])
+
+        result = runpod_handler.handler(job)
+
+        assert result["status"] == "complete"
+        assert [s["segment_id"] for s in result["segments"]] == ["s0", "s1", "s2"]
+        assert all(base64.b64decode(s["audio_b64"])[:4] == b"RIFF" for s in result["segments"])
+        assert all(s["inference_time"] >= 0 and s["error"] is None for s in result["segments"])
+        assert result["processed"] == 3 and result["failed"] == 0
+        assert "version" in result
+
+    def test_voice_is_resolved_once(self, model):
+        job = segments_job([{"segment_id": i, "text": f"Segment {i}."} for i in range(4)])
+
+        runpod_handler.handler(job)
+
+        voices = {speaker_wav for _, speaker_wav, _ in model.calls}
+        assert len(voices) == 1
+        # Decoded legacy voice is a temp file and is cleaned up after the job
+        assert not os.path.exists(voices.pop())
+        assert all(language == "da" for _, _, language in model.calls)
+
+    def test_failing_segment_is_reported_per_segment(self, model):
+        job = segments_job([
+            {"segment_id": "a", "text": "Fine."},
+            {"segment_id": "b", "text": "BOOM."},
+            {"segment_id": "c", "text": "   "},
+            {"segment_id": "d", "text": "Also fine."},
+        ])
+
+        result = runpod_handler.handler(job)
+
+        by_id = {s["segment_id"]: s for s in result["segments"]}
+        assert by_id["a"]["audio_b64"] and by_id["d"]["audio_b64"]
+        assert "out of memory" in by_id["b"]["error"]
+        assert by_id["c"]["error"] == "Empty text"
+        assert result["processed"] == 2 and result["failed"] == 2
+
+    def test_missing_voice_is_an_error(self, model):
+        job = {"input": {"segments": [{"segment_id": "a", "text": "Hi."}]}}
+        result = runpod_handler.handler(job)
+        assert result["status"] == "error"
+        assert "voice" in result["error"]
+
+
+def test_stream_handler_yields_each_segment(model):
+    job = segments_job([{"segment_id": f"s{i}", "text": f"Segment {i}."} for i in range(3)])
+
+    partials = list(runpod_handler.stream_handler(job))
+
+    assert [p["segment_id"] for p in partials] == ["s0", "s1", "s2"]
+    assert all(p["audio_b64"] for p in partials)
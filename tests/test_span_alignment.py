@@ -0,0 +1,123 @@
+"""
+Unit tests for paragraph-to-segment span alignment
+Tests: exact char offsets on randomized chapters (property test), title paragraph,
+rewritten paragraphs, segment -> paragraph mapping, canonical text
+"""
+
+import random
+
+import pytest
+
+from app.audio_segments import normalize_text, process_segments
+from app.span_alignment import align_paragraphs, canonical_text, prefix_offsets
+
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "hund", "kat", "æble", "Ørsted", "1984", "far-mor"]
+
+
+def random_paragraph(rng):
+    sentences = []
+    for _ in range(rng.randint(1, 12)):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(1, 30))]
+        sentences.append(" ".join(words).capitalize() + rng.choice([".", "!", "?"]))
+    text = " ".join(sentences)
+    return text.replace(" ", "  \n", 2) if rng.random() < 0.2 else text  # stray whitespace is normalized away
+
+
+def random_chapter(rng, paragraph_count):
+    """Title + paragraphs, and segments built from sections the way the pipeline does."""
+    paragraphs = [{"text": "Kapitel " + str(rng.randint(1, 99))}]
+    paragraphs += [{"text": random_paragraph(rng)} for _ in range(paragraph_count)]
+    sections = []
+    for para in paragraphs[1:]:
+        sentences = para["text"].replace("! ", "!\n").replace("? ", "?\n").replace(". ", ".\n").split("\n")
+        while sentences:
+            take = rng.randint(1, 4)
+            sections.append(" ".join(sentences[:take]))
+            sentences = sentences[take:]
+    return paragraphs, process_segments(sections)
+
+
+def check_invariants(result, paragraphs, segments):
+    spans = result["spans"]
+    assert [s["paragraph_index"] for s in spans] == list(range(len(paragraphs)))
+    previous = None
+    for span in spans:
+        assert 0 <= span["start_segment_index"] <= span["end_segment_index"] < len(segments)
+        assert span["start_char"] <= span["end_char"]
+        if previous:
+            assert span["start_segment_index"] >= previous["start_segment_index"]
+            assert span["end_segment_index"] >= previous["end_segment_index"]
+            assert span["start_char"] >= previous["start_char"]
+        previous = span
+
+    covered = set()
+    for span in spans:
+        covered.update(range(span["start_segment_index"], span["end_segment_index"] + 1))
+    assert covered == set(range(len(segments)))
+
+    for seg_idx, para_idx in enumerate(result["segment_paragraphs"]):
+        span = spans[para_idx]
+        assert span["start_segment_index"] <= seg_idx <= span["end_segment_index"]
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_random_chapters_align_exactly(seed):
+    rng = random.Random(seed)
+    paragraphs, segments = random_chapter(rng, rng.randint(1, 60))
+
+    result = align_paragraphs(paragraphs, segments)
+
+    check_invariants(result, paragraphs, segments)
+    canonical = canonical_text(segments)
+    starts = prefix_offsets([s["text_normalized"] for s in segments])
+    for para, span in zip(paragraphs[1:], result["spans"][1:]):
+        assert canonical[span["start_char"]:span["end_char"]] == normalize_text(para["text"])
+        first = span["start_segment_index"]
+        last = span["end_segment_index"]
+        assert starts[first] <= span["start_char"] < starts[first] + len(segments[first]["text_normalized"]) + 1
+        assert starts[last] < span["end_char"] <= starts[last] + len(segments[last]["text_normalized"])
+    assert result["anchored"] == len(paragraphs) - 1  # every paragraph but the title
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_rewritten_paragraphs_stay_monotonic(seed):
+    rng = random.Random(1000 + seed)
+    paragraphs, segments = random_chapter(rng, rng.randint(5, 60))
+    rewritten = set(rng.sample(range(1, len(paragraphs)), k=len(paragraphs) // 3))
+    for idx in rewritten:
+        paragraphs[idx] = {"text": paragraphs[idx]["text"].replace("1984", "nitten hundrede og fireogfirs")}
+
+    result = align_paragraphs(paragraphs, segments)
+
+    check_invariants(result, paragraphs, segments)
+    canonical = canonical_text(segments)
+    for idx, span in enumerate(result["spans"]):
+        if idx and idx not in rewritten:
+            assert canonical[span["start_char"]:span["end_char"]] == normalize_text(paragraphs[idx]["text"])
+
+
+def test_title_maps_to_first_segment_and_owns_nothing():
+    paragraphs = [{"text": "Kapitel 1"}, {"text": "One two. Three four."}, {"text": "Five six."}]
+    segments = process_segments(["One two. Three four. Five six."])
+
+    result = align_paragraphs(paragraphs, segments)
+
+    assert [(s["start_segment_index"], s["end_segment_index"]) for s in result["spans"]] == [(0, 0), (0, 0), (0, 0)]
+    assert result["spans"][1]["start_char"] == 0 and result["spans"][2]["start_char"] == 21
+    assert result["segment_paragraphs"] == [1]
+
+
+def test_segment_straddling_two_paragraphs():
+    segments = [{"text_normalized": t} for t in ["Aa bb.", "Cc. Dd ee.", "Ff."]]
+    paragraphs = [{"text": "Aa bb. Cc."}, {"text": "Dd ee. Ff."}]
+
+    result = align_paragraphs(paragraphs, segments)
+
+    assert [(s["start_segment_index"], s["end_segment_index"]) for s in result["spans"]] == [(0, 1), (1, 2)]
+    assert result["segment_paragraphs"] == [0, 0, 1]
+    assert result["exact"]
+
+
+def test_empty_inputs():
+    assert align_paragraphs([], [{"text_normalized": "x"}])["spans"] == []
+    assert align_paragraphs([{"text": "x"}], [])["segment_paragraphs"] == []
@@ -0,0 +1,222 @@
+"""
+Unit tests for the XTTS speaker latent cache
+Tests: computed once per voice content, memory/disk tiers, eviction, tts_to_file
+equivalence path, RunPod worker integration
+"""
+
+import base64
+import os
+import sys
+import wave
+
+import pytest
+
+TTS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "HonoraLocalTTS")
+if TTS_PATH not in sys.path:
+    # Appended, not prepended: HonoraLocalTTS/app.py must not shadow the app package
+    sys.path.append(TTS_PATH)
+
+import runpod_handler
+from runpod_standin import silent_wav
+from speaker_latents import SENTENCE_PAUSE_SAMPLES, SpeakerLatentCache, synthesize_to_file
+
+
+class FakeConfig:
+    gpt_cond_len = 12
+    gpt_cond_chunk_len = 4
+    max_ref_len = 10
+    sound_norm_refs = False
+    temperature = 0.75
+    top_k = 50
+
+
+class FakeXtts:
+    """Xtts stand-in: latents derived from the reference file, 100 samples per character."""
+
+    def __init__(self):
+        self.config = FakeConfig()
+        self.latent_calls = []
+        self.inference_calls = []
+
+    def get_conditioning_latents(self, audio_path, **settings):
+        self.latent_calls.append((audio_path, settings))
+        with open(audio_path, "rb") as f:
+            content = f.read()
+        return [len(content)], [content[-4:]]
+
+    def inference(self, text, language, gpt_cond_latent, speaker_embedding, **settings):
+        self.inference_calls.append((text, language, gpt_cond_latent, speaker_embedding, settings))
+        return {"wav": [0.1] * (100 * len(text))}
+
+
+class FakeSynthesizer:
+    def __init__(self):
+        self.tts_model = FakeXtts()
+
+    def split_into_sentences(self, text):
+        return [s.strip() + "." for s in text.split(".") if s.strip()]
+
+    def save_wav(self, wav, path):
+        with wave.open(path, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(24000)
+            w.writeframes(b"\x00\x00" * len(wav))
+
+
+class FakeTTS:
+    """TTS.api.TTS stand-in for an XTTS checkpoint."""
+
+    def __init__(self):
+        self.synthesizer = FakeSynthesizer()
+        self.tts_to_file_calls = 0
+
+    def tts_to_file(self, text, speaker_wav, language, file_path):
+        self.tts_to_file_calls += 1
+
+
+@pytest.fixture
+def voice(tmp_path):
+    path = tmp_path / "voice.wav"
+    path.write_bytes(silent_wav(0.2))
+    return str(path)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SpeakerLatentCache(cache_dir=str(tmp_path / "latents"), max_entries=4, max_bytes=1 << 20)
+
+
+class TestCache:
+    """Tests for the memory + disk tiers."""
+
+    def test_computed_once_per_voice(self, cache, voice):
+        xtts = FakeXtts()
+        first = cache.get(xtts, voice)
+        for _ in range(9):
+            assert cache.get(xtts, voice) == first
+
+        assert len(xtts.latent_calls) == 1
+        assert xtts.latent_calls[0][1] == {
+            "gpt_cond_len": 12, "gpt_cond_chunk_len": 4, "max_ref_length": 10, "sound_norm_refs": False,
+        }
+        assert cache.stats()["memory_hits"] == 9 and cache.stats()["misses"] == 1
+
+    def test_keyed_by_content_not_path(self, cache, voice, tmp_path):
+        xtts = FakeXtts()
+        copy = tmp_path / "same_voice_other_name.wav"
+        copy.write_bytes(open(voice, "rb").read())
+        other = tmp_path / "other.wav"
+        other.write_bytes(silent_wav(0.3))
+
+        cache.get(xtts, voice)
+        cache.get(xtts, str(copy))
+        cache.get(xtts, str(other))
+
+        assert len(xtts.latent_calls) == 2
+
+    def test_model_tag_separates_checkpoints(self, cache, voice):
+        xtts = FakeXtts()
+        cache.get(xtts, voice, model_tag="clone")
+        cache.get(xtts, voice, model_tag="own")
+        assert len(xtts.latent_calls) == 2
+
+    def test_disk_survives_restart(self, cache, voice):
+        computed = cache.get(FakeXtts(), voice)
+
+        restarted = SpeakerLatentCache(cache_dir=cache.cache_dir, max_entries=4)
+        xtts = FakeXtts()
+
+        assert restarted.get(xtts, voice) == computed
+        assert xtts.latent_calls == []
+        assert restarted.stats()["disk_hits"] == 1
+
+    def test_memory_lru(self, cache, tmp_path):
+        xtts = FakeXtts()
+        voices = []
+        for i in range(5):
+            path = tmp_path / f"v{i}.wav"
+            path.write_bytes(silent_wav(0.1 + i / 100))
+            voices.append(str(path))
+            cache.get(xtts, voices[-1])
+
+        assert cache.stats()["memory_entries"] == 4
+        cache.get(xtts, voices[0])  # evicted from memory, read back from disk
+        assert cache.stats()["disk_hits"] == 1
+        assert len(xtts.latent_calls) == 5
+
+    def test_disk_budget(self, tmp_path):
+        cache = SpeakerLatentCache(cache_dir=str(tmp_path / "latents"), max_entries=1, max_bytes=100)
+        xtts = FakeXtts()
+        for i in range(5):
+            path = tmp_path / f"v{i}.wav"
+            path.write_bytes(silent_wav(0.1 + i / 100))
+            cache.get(xtts, str(path))
+
+        size = sum(os.path.getsize(os.path.join(cache.cache_dir, n)) for n in os.listdir(cache.cache_dir))
+        assert size <= 100
+        assert cache.stats()["evictions"] > 0
+
+
+class TestSynthesize:
+    """Tests for synthesize_to_file()."""
+
+    def test_uses_cached_latents_per_sentence(self, cache, voice, tmp_path):
+        model = FakeTTS()
+        out = str(tmp_path / "out.wav")
+
+        synthesize_to_file(model, "One. Two two.", voice, "da", out, cache)
+        synthesize_to_file(model, "Three.", voice, "da", out, cache)
+
+        xtts = model.synthesizer.tts_model
+        assert len(xtts.latent_calls) == 1
+        assert [c[0] for c in xtts.inference_calls] == ["One.", "Two two.", "Three."]
+        assert all(c[1] == "da" for c in xtts.inference_calls)
+        assert xtts.inference_calls[0][4] == {"temperature": 0.75, "top_k": 50}
+        assert model.tts_to_file_calls == 0
+        with wave.open(out, "rb") as w:
+            assert w.getnframes() == 100 * len("Three.") + SENTENCE_PAUSE_SAMPLES
+
+    def test_non_xtts_model_falls_back(self, cache, voice, tmp_path):
+        class PlainModel:
+            calls = 0
+
+            def tts_to_file(self, text, speaker_wav, language, file_path):
+                PlainModel.calls += 1
+
+        synthesize_to_file(PlainModel(), "Hello.", voice, "en", str(tmp_path / "o.wav"), cache)
+        assert PlainModel.calls == 1
+
+
+class TestRunPodWorker:
+    """Latent cache in the RunPod handler."""
+
+    @pytest.fixture
+    def worker(self, monkeypatch, tmp_path):
+        model = FakeTTS()
+        monkeypatch.setattr(runpod_handler, "tts_model", model)
+        monkeypatch.setattr(runpod_handler, "latent_cache", SpeakerLatentCache(cache_dir=str(tmp_path / "latents")))
+        return model
+
+    def test_segments_job_computes_latents_once(self, worker):
+        job = {"input": {
+            "segments": [{"segment_id": i, "text": f"Segment {i}."} for i in range(5)],
+            "speaker_wav_b64": base64.b64encode(silent_wav(0.1)).decode(),
+            "request_id": "req-1",
+        }}
+
+        result = runpod_handler.handler(job)
+
+        assert result["processed"] == 5
+        assert len(worker.synthesizer.tts_model.latent_calls) == 1
+
+    def test_health_reports_cache_hits(self, worker):
+        job = {"input": {"text": "Hello.", "speaker_wav_b64": base64.b64encode(silent_wav(0.1)).decode()}}
+        runpod_handler.handler(job)
+        runpod_handler.handler(job)
+
+        health = runpod_handler.handler({"input": {"health": True}})
+
+        assert health["latent_cache"]["misses"] == 1
+        assert health["latent_cache"]["memory_hits"] == 1
+        assert health["version"]["handler_version"] == "audio_transport_v6"
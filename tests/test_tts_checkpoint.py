@@ -0,0 +1,213 @@
+"""
+Unit tests for tts_checkpoint module
+Tests: segment checkpoints, torn writes, chapter completion, cleanup,
+checkpoints written off the event loop by v3_generate_tts_audio, resume retries failed segments
+"""
+
+import asyncio
+import os
+import threading
+import wave
+
+from app.tts_checkpoint import SEGMENT_LOG, TTSWorkDir, chapter_is_complete
+
+
+def write_audio(path):
+    with open(path, "wb") as f:
+        f.write(b"RIFF")
+    return path
+
+
+def chapter_paths(work_dir, ch_idx, count):
+    chapter_dir = work_dir.chapter_dir(ch_idx)
+    return [os.path.join(chapter_dir, f"seg_{i}.wav") for i in range(count)]
+
+
+class TestSegmentCheckpoints:
+    """Tests for recording and reading finished segments."""
+
+    def test_resume_returns_recorded_segments(self, tmp_path):
+        work_dir = TTSWorkDir("job-1", base_dir=str(tmp_path))
+        keys = ["k0", "k1", "k2", "k3"]
+        paths = chapter_paths(work_dir, 0, 4)
+        for i in (0, 2):
+            write_audio(paths[i])
+            work_dir.record_segment(0, i, keys[i])
+
+        # A new instance (new process after a crash) sees the same checkpoints
+        resumed = TTSWorkDir("job-1", base_dir=str(tmp_path))
+        assert resumed.finished_segments(0, keys, paths) == [0, 2]
+
+    def test_changed_text_is_not_resumed(self, tmp_path):
+        work_dir = TTSWorkDir("job-1", base_dir=str(tmp_path))
+        paths = chapter_paths(work_dir, 0, 2)
+        for i in range(2):
+            write_audio(paths[i])
+            work_dir.record_segment(0, i, f"old{i}")
+
+        assert work_dir.finished_segments(0, ["old0", "new1"], paths) == [0]
+
+    def test_missing_file_is_not_resumed(self, tmp_path):
+        work_dir = TTSWorkDir("job-1", base_dir=str(tmp_path))
+        paths = chapter_paths(work_dir, 3, 1)
+        work_dir.record_segment(3, 0, "k0")
+
+        assert work_dir.finished_segments(3, ["k0"], paths) == []
+
+    def test_torn_trailing_line_is_ignored(self, tmp_path):
+        work_dir = TTSWorkDir("job-1", base_dir=str(tmp_path))
+        paths = chapter_paths(work_dir, 0, 2)
+        write_audio(paths[0])
+        write_audio(paths[1])
+        work_dir.record_segment(0, 0, "k0")
+        with open(os.path.join(work_dir.chapter_dir(0), SEGMENT_LOG), "a") as f:
+            f.write('{"segment": 1, "ke')
+
+        assert work_dir.finished_segments(0, ["k0", "k1"], paths) == [0]
+
+    def test_unknown_chapter(self, tmp_path):
+        work_dir = TTSWorkDir("job-1", base_dir=str(tmp_path))
+        assert work_dir.finished_segments(7, ["k0"], ["/nope.wav"]) == []
+        assert not os.path.exists(work_dir.path)
+
+
+class TestChapterCompletion:
+    """Tests for skipping finished chapters."""
+
+    def make_chapter(self, tmp_path, keys):
+        groups = []
+        for i in range(2):
+            path = write_audio(str(tmp_path / f"group_{i}.m4a"))
+            groups.append({"group_index": i, "local_audio_path": path})
+        segments = [{"segment_index": i, "audio_path": f"/work/seg_{i}.wav"} for i in range(len(keys))]
+        return {"audio_groups": groups, "segments": segments, "tts_segment_keys": keys}
+
+    def test_complete_when_keys_and_files_match(self, tmp_path):
+        chapter = self.make_chapter(tmp_path, ["a", "b"])
+        assert chapter_is_complete(chapter, ["a", "b"])
+
+    def test_incomplete_when_keys_differ(self, tmp_path):
+        chapter = self.make_chapter(tmp_path, ["a", "b"])
+        assert not chapter_is_complete(chapter, ["a", "c"])
+
+    def test_incomplete_when_group_file_missing(self, tmp_path):
+        chapter = self.make_chapter(tmp_path, ["a", "b"])
+        os.remove(chapter["audio_groups"][1]["local_audio_path"])
+        assert not chapter_is_complete(chapter, ["a", "b"])
+
+    def test_incomplete_when_a_segment_failed(self, tmp_path):
+        chapter = self.make_chapter(tmp_path, ["a", "b"])
+        chapter["segments"][1].pop("audio_path")
+        assert not chapter_is_complete(chapter, ["a", "b"])
+
+    def test_never_generated(self):
+        assert not chapter_is_complete({"title": "Intro"}, ["a"])
+
+
+def test_cleanup_removes_work_dir(tmp_path):
+    work_dir = TTSWorkDir("job-1", base_dir=str(tmp_path))
+    write_audio(chapter_paths(work_dir, 0, 1)[0])
+    work_dir.record_segment(0, 0, "k0")
+
+    work_dir.cleanup()
+
+    assert not os.path.exists(work_dir.path)
+    work_dir.cleanup()  # idempotent
+
+
+class BatchEngine:
+    """Engine with generate_many that reports each segment as it finishes."""
+
+    def __init__(self):
+        self.generated = []
+        self.failing = set()  # texts containing one of these fail
+
+    def get_voices(self):
+        return []
+
+    async def generate_many(self, items, voice, language, on_complete=None):
+        results = {}
+        for item in items:
+            self.generated.append(item["text"])
+            if any(marker in item["text"] for marker in self.failing):
+                results[item["id"]] = {"success": False, "output_path": item["output_path"], "error": "boom"}
+                on_complete(item["id"], results[item["id"]])
+                continue
+            with wave.open(item["output_path"], "wb") as w:
+                w.setnchannels(1)
+                w.setsampwidth(2)
+                w.setframerate(16000)
+                w.writeframes(b"\x00\x00" * 1600)
+            results[item["id"]] = {"success": True, "output_path": item["output_path"]}
+            on_complete(item["id"], results[item["id"]])
+        return results
+
+
+def test_generate_checkpoints_off_the_event_loop(tmp_path, monkeypatch):
+    import app.pipeline_v3 as pipeline
+    from app.config import Config
+
+    state = {"phase": "chapters_processed", "chapters": [{
+        "title": "Kapitel 1",
+        "sections": [{"text": f"Section {i} has more than enough words to be spoken on its own." * 2}
+                     for i in range(5)],
+    }]}
+    threads = []
+    record_segment = TTSWorkDir.record_segment
+
+    def recording(self, ch_idx, seg_idx, key):
+        threads.append(threading.current_thread())
+        record_segment(self, ch_idx, seg_idx, key)
+
+    monkeypatch.setattr(Config, "V3_TTS_WORK_DIR", str(tmp_path))
+    monkeypatch.setattr(Config, "AUDIO_CACHE_BYPASS", True)
+    monkeypatch.setattr(TTSWorkDir, "record_segment", recording)
+    monkeypatch.setattr(pipeline, "get_v3_job_state", lambda job_id, include_chapters=True: state)
+    monkeypatch.setattr(pipeline, "save_v3_job_state", lambda *args, **kwargs: None)
+    monkeypatch.setattr(pipeline, "_create_tts_engine", lambda name: BatchEngine())
+    monkeypatch.setattr(pipeline, "encode_chapter_groups", lambda groups, output_dir: None)
+
+    result = asyncio.run(pipeline.v3_generate_tts_audio("job-1"))
+
+    chapter = state["chapters"][0]
+    paths = [s["audio_path"] for s in chapter["segments"]]
+    assert result["success"] and len(threads) == len(paths)
+    assert threading.main_thread() not in threads
+    assert TTSWorkDir("job-1").finished_segments(0, chapter["tts_segment_keys"], paths) == list(range(len(paths)))
+
+
+def test_resume_retries_failed_segments(tmp_path, monkeypatch):
+    import app.pipeline_v3 as pipeline
+    from app.config import Config
+
+    state = {"phase": "chapters_processed", "chapters": [{
+        "title": "Kapitel 1",
+        "sections": [{"text": f"Section {i} has more than enough words to be spoken on its own." * 2}
+                     for i in range(5)],
+    }]}
+    engine = BatchEngine()
+    engine.failing = {"Section 2 "}
+
+    def encode(groups, output_dir):
+        for group in groups:
+            group["local_audio_path"] = write_audio(os.path.join(output_dir, f"group_{group['group_index']}.m4a"))
+
+    monkeypatch.setattr(Config, "V3_TTS_WORK_DIR", str(tmp_path))
+    monkeypatch.setattr(Config, "AUDIO_CACHE_BYPASS", True)
+    monkeypatch.setattr(pipeline, "get_v3_job_state", lambda job_id, include_chapters=True: state)
+    monkeypatch.setattr(pipeline, "save_v3_job_state", lambda *args, **kwargs: None)
+    monkeypatch.setattr(pipeline, "_create_tts_engine", lambda name: engine)
+    monkeypatch.setattr(pipeline, "encode_chapter_groups", encode)
+
+    asyncio.run(pipeline.v3_generate_tts_audio("job-1"))
+    segments = state["chapters"][0]["segments"]
+    failed = [i for i, seg in enumerate(segments) if not seg.get("audio_path")]
+    assert failed and len(failed) < len(segments)
+
+    engine.failing = set()
+    engine.generated.clear()
+    asyncio.run(pipeline.v3_generate_tts_audio("job-1", resume=True))
+
+    segments = state["chapters"][0]["segments"]
+    assert all(seg.get("audio_path") for seg in segments)
+    assert engine.generated == [segments[i]["text"] for i in failed]  # checkpointed segments are reused
@@ -0,0 +1,296 @@
+"""
+Unit tests for the TTS routing engine
+Tests: ranking by latency/cost within a quality tier, failover on errors and timeouts,
+per-engine concurrency limits, circuit breaker, profile parsing, /api/engines stats,
+audio cache keys per producing engine, timing of segments no engine could voice
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import wave
+
+import pytest
+
+TTS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "HonoraLocalTTS")
+if TTS_PATH not in sys.path:
+    # Appended, not prepended: HonoraLocalTTS/app.py must not shadow the app package
+    sys.path.append(TTS_PATH)
+
+from tts_router import EngineStats, engine_profiles, parse_engine_profiles
+
+
+class FakeEngine:
+    """TTSEngine stand-in: writes a marker file after `delay`, or fails as configured."""
+
+    def __init__(self, name, delay=0.0, fail=False, raises=False, configured=True):
+        self._name = name
+        self.delay = delay
+        self.fail = fail
+        self.raises = raises
+        self.configured = configured
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def is_configured(self):
+        return self.configured
+
+    def get_voices(self):
+        return [{"id": f"{self._name}-voice"}]
+
+    def generate(self, text, voice, language, output_path):
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delay)
+            if self.raises:
+                raise RuntimeError(f"{self._name} exploded")
+            if self.fail:
+                return False
+            with open(output_path, "w") as f:
+                f.write(self._name)
+            return True
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def profile(tier="standard", cost=0.0, limit=4, prior=1.0):
+    return {"tier": tier, "cost_per_second": cost, "max_concurrency": limit, "prior_seconds": prior}
+
+
+@pytest.fixture
+def make_router():
+    from tts_engines import RoutingEngine
+
+    def make(engines, profiles, **kwargs):
+        return RoutingEngine(engines, profiles=profiles, **kwargs)
+    return make
+
+
+class TestRouting:
+    """Tests for engine choice and failover."""
+
+    def test_fastest_engine_within_tier(self, make_router, tmp_path):
+        engines = {"piper": FakeEngine("piper"), "slow": FakeEngine("slow"), "fast": FakeEngine("fast")}
+        router = make_router(engines, {
+            "piper": profile("draft", prior=0.1), "slow": profile(prior=20), "fast": profile(prior=5),
+        }, tier="standard")
+
+        ok, engine_id, tried = router.generate_with_engine("Hello.", "v", "en", str(tmp_path / "a.wav"))
+
+        assert ok and engine_id == "fast" and tried == ["fast"]
+        assert (tmp_path / "a.wav").read_text() == "fast"
+        assert engines["piper"].calls == 0
+
+    def test_cost_outweighs_small_latency_gain(self, make_router, tmp_path):
+        engines = {"gpu": FakeEngine("gpu"), "free": FakeEngine("free")}
+        router = make_router(engines, {"gpu": profile(cost=0.001, prior=5), "free": profile(prior=6)},
+                             seconds_per_dollar=3600)
+
+        assert router.ranked() == ["free", "gpu"]
+
+    def test_fails_over_on_false_and_exception(self, make_router, tmp_path):
+        engines = {
+            "a": FakeEngine("a", fail=True),
+            "b": FakeEngine("b", raises=True),
+            "c": FakeEngine("c"),
+        }
+        router = make_router(engines, {"a": profile(prior=1), "b": profile(prior=2), "c": profile(prior=3)})
+
+        ok, engine_id, tried = router.generate_with_engine("x", "v", "en", str(tmp_path / "a.wav"))
+
+        assert ok and engine_id == "c" and tried == ["a", "b", "c"]
+        stats = router.engine_stats()
+        assert stats["a"]["failures"] == 1 and stats["b"]["failures"] == 1 and stats["c"]["failures"] == 0
+        assert sorted(os.listdir(tmp_path)) == ["a.wav"]
+
+    def test_timeout_fails_over_and_cleans_up(self, make_router, tmp_path):
+        engines = {"hung": FakeEngine("hung", delay=0.6), "backup": FakeEngine("backup")}
+        router = make_router(engines, {"hung": profile(prior=1), "backup": profile(prior=2)}, timeout=0.1)
+
+        ok, engine_id, _ = router.generate_with_engine("x", "v", "en", str(tmp_path / "a.wav"))
+        assert ok and engine_id == "backup"
+        assert router.engine_stats()["hung"]["timeouts"] == 1
+
+        time.sleep(0.8)  # the abandoned call finishes in the background
+        assert sorted(os.listdir(tmp_path)) == ["a.wav"]
+        assert (tmp_path / "a.wav").read_text() == "backup"
+        assert router.engine_stats()["hung"]["in_flight"] == 0
+
+    def test_all_engines_failing(self, make_router, tmp_path):
+        router = make_router({"a": FakeEngine("a", fail=True)}, {"a": profile()})
+        assert router.generate("x", "v", "en", str(tmp_path / "a.wav")) is False
+
+    def test_unconfigured_engine_is_skipped(self, make_router, tmp_path):
+        engines = {"cloud": FakeEngine("cloud", configured=False), "local": FakeEngine("local")}
+        router = make_router(engines, {"cloud": profile(prior=0.1), "local": profile(prior=10)})
+
+        assert router.ranked() == ["local"]
+        assert router.get_voices() == [{"id": "local-voice"}]
+
+    def test_latency_is_learned(self, make_router, tmp_path):
+        engines = {"a": FakeEngine("a", delay=0.15), "b": FakeEngine("b")}
+        router = make_router(engines, {"a": profile(prior=0.01), "b": profile(prior=0.05)})
+
+        router.generate("x", "v", "en", str(tmp_path / "1.wav"))  # prior says a is faster
+        router.generate("x", "v", "en", str(tmp_path / "2.wav"))
+
+        assert engines["a"].calls == 1 and engines["b"].calls == 1
+        assert router.ranked() == ["b", "a"]
+
+
+class TestConcurrency:
+    """Tests for per-engine limits in generate_many()."""
+
+    def test_limits_respected_and_overflow_routed(self, make_router, tmp_path):
+        engines = {"best": FakeEngine("best", delay=0.1), "other": FakeEngine("other", delay=0.1)}
+        router = make_router(engines, {"best": profile(limit=2, prior=1), "other": profile(limit=3, prior=2)})
+        items = [{"id": i, "text": "x", "output_path": str(tmp_path / f"seg_{i}.wav")} for i in range(10)]
+        seen = []
+
+        results = asyncio.run(router.generate_many(items, "v", "en", on_complete=lambda i, r: seen.append(i)))
+
+        assert all(r["success"] for r in results.values())
+        assert engines["best"].max_in_flight <= 2 and engines["other"].max_in_flight <= 3
+        assert engines["other"].calls > 0
+        assert {r["engine"] for r in results.values()} == {"best", "other"}
+        assert sorted(seen) == list(range(10))
+
+
+class TestStats:
+    """Tests for EngineStats and profiles."""
+
+    def test_circuit_opens_after_consecutive_failures(self):
+        stats = EngineStats(profile(), window=10, max_failures=2, cooldown=60)
+        stats.record(False, 1.0)
+        assert not stats.is_open()
+        stats.record(False, 1.0)
+        assert stats.is_open()
+
+    def test_error_rate_penalizes_score(self):
+        healthy = EngineStats(profile(), window=10)
+        flaky = EngineStats(profile(), window=10, max_failures=99)
+        for i in range(4):
+            healthy.record(True, 2.0)
+            flaky.record(i % 2 == 0, 2.0)
+        assert flaky.error_rate() == 0.5
+        assert flaky.score(3600) == pytest.approx(2 * healthy.score(3600))
+
+    def test_parse_profiles(self):
+        assert parse_engine_profiles("xtts-runpod=standard:0.0002:4, piper=draft::2") == {
+            "xtts-runpod": ("standard", 0.0002, 4),
+            "piper": ("draft", 0.0, 2),
+        }
+        with pytest.raises(ValueError, match="tier"):
+            parse_engine_profiles("piper=premium:0:1")
+
+        profiles = engine_profiles(["xtts-runpod", "xtts-local"], spec="xtts-runpod=::2")
+        assert profiles["xtts-runpod"]["max_concurrency"] == 2
+        assert profiles["xtts-runpod"]["cost_per_second"] > 0
+        assert profiles["xtts-local"]["tier"] == "standard"
+
+
+def test_list_engines_includes_router_stats(monkeypatch):
+    from tts_engines import TTSEngineManager
+
+    monkeypatch.setenv("RUNPOD_API_KEY", "")
+    manager = TTSEngineManager()
+
+    engines = {e["id"]: e for e in manager.list_engines()}
+
+    assert "auto" in engines and engines["auto"]["tier"] == "standard"
+    assert engines["piper"]["stats"]["tier"] == "draft"
+    assert engines["piper"]["stats"]["eligible"] is False
+    assert "stats" not in engines["xtts-runpod-async"]
+
+
+def test_audio_cache_is_keyed_by_the_producing_engine(make_router, tmp_path):
+    from app.audio_cache import AudioCache
+    from app.pipeline_v3 import _cache_lookup, _produced_cache_key
+
+    engines = {"piper": FakeEngine("piper"), "xtts": FakeEngine("xtts")}
+    profiles = {"piper": profile(tier="draft", prior=0.1), "xtts": profile(prior=5)}
+    draft = make_router(engines, profiles, tier="draft")
+    standard = make_router(engines, profiles, tier="standard")
+    cache = AudioCache(str(tmp_path / "cache"), 1 << 20)
+    source = tmp_path / "seg.wav"
+    source.write_text("piper audio")
+
+    ok, engine_id, _ = draft.generate_with_engine("Hello.", "v", "en", str(source))
+    cache.put(_produced_cache_key(draft, "auto", "Hello.", "v", "en", engine_id), str(source), 1000)
+    paths = [str(tmp_path / "out.wav")]
+
+    assert engine_id == "piper"
+    assert asyncio.run(_cache_lookup(cache, standard, "auto", {0: "Hello."}, paths, "v", "en")) == {}
+    assert asyncio.run(_cache_lookup(cache, draft, "auto", {0: "Hello."}, paths, "v", "en")) == {0: 1000}
+    assert _produced_cache_key(standard, "auto", "Hello.", "v", "en", None) is None
+
+
+class WavEngine(FakeEngine):
+    """Writes a 6 s WAV; fails on every text containing "unspeakable"."""
+
+    def generate(self, text, voice, language, output_path):
+        with self._lock:
+            self.calls += 1
+        if "unspeakable" in text:
+            return False
+        with wave.open(output_path, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(16000)
+            w.writeframes(b"\x00\x00" * 16000 * 6)
+        return True
+
+
+def test_segment_no_engine_could_voice_takes_no_time(make_router, tmp_path, monkeypatch):
+    import app.pipeline_v3 as pipeline
+    from app.audio_segments import ChapterEncodeError
+    from app.config import Config
+
+    texts = [f"Section {i} is long enough to be spoken as a segment of its own, without merging." for i in range(8)]
+    texts[2] = texts[2].replace("spoken", "unspeakable")
+    state = {"phase": "chapters_processed", "chapters": [{"title": "Kapitel 1", "sections": [{"text": t} for t in texts]}]}
+    router = make_router({"xtts": WavEngine("xtts"), "replicate": WavEngine("replicate")},
+                         {"xtts": profile(), "replicate": profile(cost=1.0)})
+
+    def no_single_pass(groups, output_dir):
+        raise ChapterEncodeError("ffmpeg missing")
+
+    groups_seen = []
+
+    def concat(group, output_dir):
+        groups_seen.append(group)
+        path = os.path.join(output_dir, f"group_{group['group_index']}.m4a")
+        open(path, "wb").close()
+        return path
+
+    monkeypatch.setattr(Config, "V3_TTS_WORK_DIR", str(tmp_path))
+    monkeypatch.setattr(Config, "AUDIO_CACHE_BYPASS", True)
+    monkeypatch.setattr(pipeline, "get_v3_job_state", lambda job_id, include_chapters=True: state)
+    monkeypatch.setattr(pipeline, "save_v3_job_state", lambda *args, **kwargs: None)
+    monkeypatch.setattr(pipeline, "_create_tts_engine", lambda name: router)
+    monkeypatch.setattr(pipeline, "encode_chapter_groups", no_single_pass)
+    monkeypatch.setattr(pipeline, "concat_group_audio", concat)
+    monkeypatch.setattr(pipeline, "get_audio_duration_ms",
+                        lambda path: sum(s["duration_ms"] for s in groups_seen[-1]["segments"]) + 20)  # AAC padding
+
+    asyncio.run(pipeline.v3_generate_tts_audio("job-1", engine="auto"))
+
+    chapter = state["chapters"][0]
+    failed = chapter["segments"][2]
+    assert failed["duration_ms"] == 0 and "audio_path" not in failed
+    assert all(s["duration_ms"] == 6000 for i, s in enumerate(chapter["segments"]) if i != 2)
+    chapter_time = 0
+    for group in chapter["audio_groups"]:
+        assert group["start_time_ms"] == chapter_time
+        offsets = [s["offset_in_group_ms"] for s in group["segments"]]
+        durations = [s["duration_ms"] for s in group["segments"]]
+        assert offsets == [sum(durations[:k]) for k in range(len(durations))]
+        chapter_time += group["duration_ms"]
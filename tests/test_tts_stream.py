@@ -0,0 +1,301 @@
+"""
+Unit tests for tts_stream module
+Tests: incremental grouping, stage overlap, bounded disk usage, error propagation,
+partially voiced chapters keep the job rerunnable
+"""
+
+import asyncio
+import os
+import random
+import wave
+
+import pytest
+from app.audio_segments import group_segments
+from app.tts_stream import GroupAssembler, stream_chapter
+
+
+def make_segments(durations):
+    return [{"segment_index": i, "text": f"Segment {i}.", "duration_ms": d} for i, d in enumerate(durations)]
+
+
+def shape(groups):
+    return [
+        (g["group_index"], [s["segment_index"] for s in g["segments"]], g["duration_ms"], g["start_time_ms"])
+        for g in groups
+    ]
+
+
+class TestGroupAssembler:
+    """Tests for closing groups as segments become ready."""
+
+    DURATIONS = [8000, 12000, 9000, 7000, 15000, 4000, 20000, 3000, 11000, 6000, 9000]
+
+    def test_matches_group_segments_in_any_order(self):
+        expected = group_segments(make_segments(self.DURATIONS))
+
+        for seed in range(5):
+            order = list(range(len(self.DURATIONS)))
+            random.Random(seed).shuffle(order)
+            assembler = GroupAssembler(make_segments(self.DURATIONS))
+            closed = []
+            for i in order:
+                closed += assembler.mark_ready(i, self.DURATIONS[i])
+            closed += assembler.finish()
+
+            assert shape(closed) == shape(expected)
+
+    def test_group_closes_when_next_segment_is_ready(self):
+        assembler = GroupAssembler(make_segments([20000, 14000, 5000]))
+        assert assembler.mark_ready(0, 20000) == []
+        assert assembler.mark_ready(1, 14000) == []
+        closed = assembler.mark_ready(2, 5000)
+        assert [s["segment_index"] for s in closed[0]["segments"]] == [0, 1]
+
+    def test_failed_segment_takes_no_time(self):
+        assembler = GroupAssembler(make_segments([10000, 10000, 10000]))
+        for i, d in enumerate([10000, None, 10000]):
+            assembler.mark_ready(i, d)
+        group = assembler.finish()[0]
+        assert group["duration_ms"] == 20000
+        assert [s["offset_in_group_ms"] for s in group["segments"]] == [0, 10000, 10000]
+
+    def test_max_segments_per_group(self):
+        assembler = GroupAssembler(make_segments([100] * 7), max_segments=3)
+        closed = []
+        for i in range(7):
+            closed += assembler.mark_ready(i, 100)
+        closed += assembler.finish()
+        assert [len(g["segments"]) for g in closed] == [3, 3, 1]
+
+    def test_unfinished_segment_is_an_error(self):
+        assembler = GroupAssembler(make_segments([100, 100]))
+        assembler.mark_ready(1, 100)
+        with pytest.raises(RuntimeError, match="Segment 0"):
+            assembler.finish()
+
+
+class FakeStages:
+    """Synthesis/encode/upload stand-ins that track files on 'disk' and event order."""
+
+    def __init__(self, durations, encode_delay=0.01, upload_delay=0.01):
+        self.durations = durations
+        self.encode_delay = encode_delay
+        self.upload_delay = upload_delay
+        self.disk = set()
+        self.peak_disk = 0
+        self.events = []
+
+    def _disk_changed(self):
+        self.peak_disk = max(self.peak_disk, len(self.disk))
+
+    async def synthesize(self, indices, on_ready):
+        async def one(i):
+            await asyncio.sleep(random.uniform(0, 0.01))
+            self.disk.add(f"seg_{i}")
+            self._disk_changed()
+            self.events.append(("synth", i))
+            on_ready(i, self.durations[i])
+        await asyncio.gather(*(one(i) for i in indices))
+
+    async def encode(self, group):
+        await asyncio.sleep(self.encode_delay)
+        for seg in group["segments"]:
+            self.disk.discard(f"seg_{seg['segment_index']}")
+        self.disk.add(f"group_{group['group_index']}")
+        self._disk_changed()
+        group["local_audio_path"] = f"group_{group['group_index']}"
+        # Encoder reports the exact duration (slightly different from the estimate)
+        group["duration_ms"] = group["duration_ms"] + 7
+        self.events.append(("encode", group["group_index"]))
+
+    async def upload(self, group):
+        await asyncio.sleep(self.upload_delay)
+        self.disk.discard(group["local_audio_path"])
+        group["audio_url"] = f"https://storage/{group['group_index']}.m4a"
+        self.events.append(("upload", group["group_index"]))
+
+
+class TestStreamChapter:
+    """Tests for the overlapping stages."""
+
+    def test_uploads_start_before_synthesis_ends(self):
+        durations = [5000] * 80
+        stages = FakeStages(durations)
+        segments = make_segments(durations)
+
+        groups, stats = asyncio.run(stream_chapter(
+            segments, stages.synthesize, stages.encode, stages.upload,
+            chunk_size=10, max_pending=30, queue_groups=2,
+        ))
+
+        first_upload = stages.events.index(("upload", 0))
+        last_synth = max(k for k, e in enumerate(stages.events) if e[0] == "synth")
+        assert first_upload < last_synth
+        assert [g["group_index"] for g in groups] == list(range(len(groups)))
+        assert len(groups) > 1 and all(g["audio_url"] for g in groups)
+
+    def test_disk_usage_is_bounded(self):
+        durations = [5000] * 120
+        # Slow uploads: synthesis must wait instead of piling up files
+        stages = FakeStages(durations, upload_delay=0.03)
+
+        _, stats = asyncio.run(stream_chapter(
+            make_segments(durations), stages.synthesize, stages.encode, stages.upload,
+            chunk_size=10, max_pending=20, queue_groups=2,
+        ))
+
+        assert stats["peak_pending_segments"] <= 20
+        assert stats["peak_queued_groups"] <= 4
+        # Ungrouped segment files (permits), plus 7 segment files for each group
+        # that is queued, blocked on the full queue or being encoded, plus encoded
+        # group files that are queued, blocked or being uploaded
+        assert stages.peak_disk <= 20 + (2 + 1 + 1) * 7 + (2 + 1 + 1 + 1)
+        assert not stages.disk
+
+    def test_start_times_follow_encoded_durations(self):
+        durations = [10000] * 12
+        stages = FakeStages(durations)
+
+        groups, _ = asyncio.run(stream_chapter(
+            make_segments(durations), stages.synthesize, stages.encode, stages.upload,
+            chunk_size=4, max_pending=12, queue_groups=1,
+        ))
+
+        assert [g["duration_ms"] for g in groups] == [30007] * 4
+        assert [g["start_time_ms"] for g in groups] == [0, 30007, 60014, 90021]
+
+    def test_stage_error_propagates_without_hanging(self):
+        durations = [5000] * 40
+        stages = FakeStages(durations)
+
+        async def broken_upload(group):
+            if group["group_index"] == 1:
+                raise RuntimeError("storage unavailable")
+            await stages.upload(group)
+
+        async def run():
+            return await asyncio.wait_for(stream_chapter(
+                make_segments(durations), stages.synthesize, stages.encode, broken_upload,
+                chunk_size=5, max_pending=10, queue_groups=1,
+            ), timeout=5)
+
+        with pytest.raises(RuntimeError, match="storage unavailable"):
+            asyncio.run(run())
+
+    def test_groups_match_batch_grouping(self):
+        rng = random.Random(3)
+        durations = [rng.randint(2000, 15000) for _ in range(50)]
+        expected = group_segments(make_segments(durations))
+        stages = FakeStages(durations, encode_delay=0, upload_delay=0)
+
+        groups, _ = asyncio.run(stream_chapter(
+            make_segments(durations), stages.synthesize, stages.encode, stages.upload,
+            chunk_size=8, max_pending=64, queue_groups=2,
+        ))
+
+        assert [[s["segment_index"] for s in g["segments"]] for g in groups] == \
+            [[s["segment_index"] for s in g["segments"]] for g in expected]
+
+
+class FakeEngine:
+    """Writes a short WAV per segment, like an engine that synthesized it."""
+
+    def __init__(self):
+        self.generated = []
+        self.failing = set()  # texts containing one of these fail
+
+    def get_voices(self):
+        return []
+
+    def generate(self, text, voice, language, output_path):
+        if any(marker in text for marker in self.failing):
+            return False
+        with wave.open(output_path, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(16000)
+            w.writeframes(b"\x00\x00" * 16000 * 6)  # 6 s
+        self.generated.append(text)
+        return True
+
+
+class TestStreamTTSAudio:
+    """v3_stream_tts_audio() end to end with a fake engine, encoder and storage."""
+
+    @pytest.fixture
+    def job(self, monkeypatch, tmp_path):
+        import app.pipeline_v3 as pipeline
+        from app.audio_cache import AudioCache
+        from app.audio_segments import plan_chapter_encode
+        from app.config import Config
+
+        state = {
+            "phase": "uploaded",
+            "chapters": [{
+                "title": "Kapitel 1",
+                "db_chapter_id": "ch-1",
+                "sections": [{"text": f"Section number {i} has more than enough words to be spoken on its own. " * 3}
+                             for i in range(12)],
+            }],
+        }
+        engine = FakeEngine()
+        cache = AudioCache(str(tmp_path / "cache"), 50 * 1024 * 1024)
+        uploads = []
+
+        def encode(groups, output_dir):
+            # The real layout step: fails when a segment has no audio_path
+            plan = plan_chapter_encode(groups)
+            for group, planned in zip(groups, plan["groups"]):
+                group["local_audio_path"] = os.path.join(output_dir, f"group_{group['group_index']}.m4a")
+                open(group["local_audio_path"], "wb").close()
+                group["duration_ms"] = planned["sample_count"] * 1000 // plan["params"][2]
+
+        monkeypatch.setattr(Config, "AUDIO_CACHE_BYPASS", False)
+        monkeypatch.setattr(pipeline, "get_v3_job_state", lambda job_id, include_chapters=True: state)
+        monkeypatch.setattr(pipeline, "save_v3_job_state", lambda *args, **kwargs: None)
+        monkeypatch.setattr(pipeline, "_create_tts_engine", lambda name: engine)
+        monkeypatch.setattr(pipeline, "get_audio_cache", lambda: cache)
+        monkeypatch.setattr(pipeline, "encode_chapter_groups", encode)
+        monkeypatch.setattr(pipeline, "upload_group_audio",
+                            lambda path, chapter_id, index: uploads.append(path) or f"https://storage/{index}.m4a")
+        monkeypatch.setattr(pipeline, "_save_chapter_audio_records",
+                            lambda chapter, chapter_id, groups, writer: (sum(len(g["segments"]) for g in groups), 0))
+        return pipeline, state, engine, uploads
+
+    def test_every_group_is_encoded_and_uploaded(self, job):
+        pipeline, state, engine, uploads = job
+
+        result = asyncio.run(pipeline.v3_stream_tts_audio("job-1", engine="piper"))
+
+        groups = state["chapters"][0]["audio_groups"]
+        assert result["errors"] == [] and engine.generated
+        assert all(seg.get("audio_path") for g in groups for seg in g["segments"])
+        assert result["groups_uploaded"] == len(groups) == len(uploads)
+        assert len(groups) > 1 and all(g["audio_url"] for g in groups)
+
+    def test_cache_hits_are_uploaded_too(self, job):
+        pipeline, state, engine, uploads = job
+        asyncio.run(pipeline.v3_stream_tts_audio("job-1", engine="piper"))
+        state["phase"] = "uploaded"
+        engine.generated.clear()
+        uploads.clear()
+
+        result = asyncio.run(pipeline.v3_stream_tts_audio("job-1", engine="piper"))
+
+        assert engine.generated == [] and result["audio_cache"]["hit_rate"] == 1.0
+        assert result["groups_uploaded"] == len(state["chapters"][0]["audio_groups"]) == len(uploads)
+
+    def test_partial_chapter_keeps_the_phase(self, job):
+        pipeline, state, engine, uploads = job
+        engine.failing = {"Section number 3 "}
+
+        result = asyncio.run(pipeline.v3_stream_tts_audio("job-1", engine="piper"))
+
+        assert not result["success"] and result["errors"][0]["chapter"] == "Kapitel 1"
+        assert state["phase"] == "uploaded"
+
+        engine.failing = set()
+        result = asyncio.run(pipeline.v3_stream_tts_audio("job-1", engine="piper"))
+
+        assert result["success"] and state["phase"] == "audio_uploaded"
+        assert all(seg.get("audio_path") for seg in state["chapters"][0]["segments"])
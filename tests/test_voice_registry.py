@@ -0,0 +1,172 @@
+"""
+Unit tests for the per-process voice registry
+Tests: one listing + one upload per voice version, TTL, invalidation, versioned URLs,
+RunPod engine resolving the voice once per book instead of once per segment
+"""
+
+import os
+import sys
+
+import pytest
+
+TTS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "HonoraLocalTTS")
+if TTS_PATH not in sys.path:
+    # Appended, not prepended: HonoraLocalTTS/app.py must not shadow the app package
+    sys.path.append(TTS_PATH)
+
+from runpod_standin import silent_wav, start_standin
+from voice_registry import VoiceRegistry, get_voice_registry
+
+SUPABASE_URL = "https://project.supabase.co"
+
+
+class FakeBucket:
+    def __init__(self, uploads, errors):
+        self.uploads = uploads
+        self.errors = errors
+
+    def upload(self, name, data, options):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.uploads.append((name, len(data)))
+
+
+class FakeSupabase:
+    """Records storage uploads; `errors` are raised by the next uploads, in order."""
+
+    def __init__(self, errors=None):
+        self.uploads = []
+        self.errors = list(errors or [])
+
+    class _Storage:
+        def __init__(self, uploads, errors):
+            self.uploads = uploads
+            self.errors = errors
+
+        def from_(self, bucket):
+            return FakeBucket(self.uploads, self.errors)
+
+    @property
+    def storage(self):
+        return self._Storage(self.uploads, self.errors)
+
+
+@pytest.fixture
+def voice_folder(tmp_path):
+    folder = tmp_path / "voices"
+    folder.mkdir()
+    (folder / "AI_Voice_Honora_Anna.wav").write_bytes(silent_wav(0.1))
+    (folder / "AI_Voice_Honora_Bo.wav").write_bytes(silent_wav(0.2))
+    return folder
+
+
+@pytest.fixture
+def registry(voice_folder):
+    registry = VoiceRegistry(str(voice_folder), SUPABASE_URL, "key", ttl=3600)
+    registry._supabase = FakeSupabase()
+    return registry
+
+
+class TestRegistry:
+    """Tests for VoiceRegistry.resolve()."""
+
+    def test_resolved_once(self, registry, voice_folder):
+        results = {registry.resolve("Anna") for _ in range(50)}
+
+        assert len(results) == 1
+        voice_url, voice_path = results.pop()
+        assert voice_path == str(voice_folder / "AI_Voice_Honora_Anna.wav")
+        assert voice_url.startswith(f"{SUPABASE_URL}/storage/v1/object/public/voices/AI_Voice_Honora_Anna.wav?v=")
+        assert registry._supabase.uploads == [("AI_Voice_Honora_Anna.wav", len(silent_wav(0.1)))]
+        assert registry.stats()["hits"] == 49 and registry.stats()["listings"] == 1
+
+    def test_lookup_by_id_name_and_fallback(self, registry, voice_folder):
+        assert registry.resolve("AI_Voice_Honora_Bo.wav")[1].endswith("Bo.wav")
+        assert registry.resolve("bo")[1].endswith("Bo.wav")
+        assert registry.resolve("unknown")[1].endswith("Anna.wav")
+
+    def test_expired_entries_do_not_reupload_unchanged_files(self, voice_folder):
+        registry = VoiceRegistry(str(voice_folder), SUPABASE_URL, "key", ttl=0)
+        registry._supabase = FakeSupabase()
+
+        for _ in range(3):
+            registry.resolve("Anna")
+
+        assert registry.stats()["listings"] == 3
+        assert len(registry._supabase.uploads) == 1
+
+    def test_invalidate_picks_up_new_recording(self, registry, voice_folder):
+        old_url, _ = registry.resolve("Anna")
+        (voice_folder / "AI_Voice_Honora_Anna.wav").write_bytes(silent_wav(0.3))
+
+        assert registry.resolve("Anna")[0] == old_url  # cached until invalidated
+        registry.invalidate("Anna")
+        new_url, _ = registry.resolve("Anna")
+
+        assert new_url != old_url
+        assert len(registry._supabase.uploads) == 2
+
+    def test_new_voice_file_after_invalidate_all(self, registry, voice_folder):
+        assert len(registry.voices()) == 2
+        (voice_folder / "AI_Voice_Honora_Cy.wav").write_bytes(silent_wav(0.1))
+        assert len(registry.voices()) == 2
+
+        registry.invalidate()
+        assert [v["name"] for v in registry.voices()] == ["Anna", "Bo", "Cy"]
+
+    def test_without_supabase(self, voice_folder):
+        registry = VoiceRegistry(str(voice_folder))
+        voice_url, voice_path = registry.resolve("Anna")
+        assert voice_url is None and voice_path.endswith("Anna.wav")
+        assert VoiceRegistry(str(voice_folder / "missing")).resolve("Anna") == (None, None)
+
+    def test_failed_upload_is_retried(self, registry):
+        registry._supabase = FakeSupabase(errors=[Exception("503 Service Unavailable")])
+
+        first_url, _ = registry.resolve("Anna")
+        second_url, _ = registry.resolve("Anna")
+        registry.resolve("Anna")
+
+        assert first_url == second_url
+        assert registry._supabase.uploads == [("AI_Voice_Honora_Anna.wav", len(silent_wav(0.1)))]
+        assert registry.stats()["misses"] == 2 and registry.stats()["hits"] == 1
+
+    def test_already_exists_counts_as_uploaded(self, registry):
+        registry._supabase = FakeSupabase(errors=[Exception("{'statusCode': 409, 'error': 'Duplicate'}")])
+
+        registry.resolve("Anna")
+        registry.resolve("Anna")
+
+        assert registry._supabase.uploads == [] and registry.stats()["misses"] == 1
+
+    def test_preload(self, registry):
+        resolved = registry.preload(["Anna", "Bo"])
+        assert set(resolved) == {"Anna", "Bo"}
+        assert registry.stats()["resolved"] == 2 and len(registry._supabase.uploads) == 2
+
+
+def test_runpod_engine_resolves_voice_once_per_process(voice_folder, tmp_path, monkeypatch):
+    from tts_engines import XTTSRunPodEngine
+
+    server, standin, api_base = start_standin(workers=2, latency=0.01)
+    try:
+        monkeypatch.setenv("RUNPOD_API_KEY", "test-key")
+        monkeypatch.setenv("RUNPOD_ENDPOINT_ID", "local")
+        monkeypatch.setenv("RUNPOD_API_BASE", api_base)
+        monkeypatch.setenv("SUPABASE_URL", SUPABASE_URL)
+        monkeypatch.setenv("SUPABASE_SERVICE_ROLE_KEY", "key")
+        engine = XTTSRunPodEngine()
+        engine._voice_folder = str(voice_folder)
+        registry = get_voice_registry(engine._voice_folder, SUPABASE_URL, "key")
+        registry._supabase = FakeSupabase()
+
+        engine.preload_voices(["Bo"])
+        for i in range(5):
+            assert engine.generate(f"Segment {i}.", "Bo", "en", str(tmp_path / f"seg_{i}.wav"))
+    finally:
+        server.shutdown()
+        standin.shutdown()
+
+    assert registry._supabase.uploads == [("AI_Voice_Honora_Bo.wav", len(silent_wav(0.2)))]
+    assert registry.stats()["misses"] == 1
+    assert [v["source"] for v in engine.get_voices()] == ["xtts-runpod", "xtts-runpod"]